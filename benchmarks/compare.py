@@ -0,0 +1,63 @@
+"""
+Compares two benchmark result files and flags regressions.
+
+A scenario has regressed when its p95 latency rose, or its throughput fell, by more than
+the threshold (default 20%). The exit status is 1 if any scenario regressed.
+
+Usage:
+    python benchmarks/compare.py baseline.json bench_results.json --threshold 0.2
+"""
+import argparse
+import json
+import sys
+
+def index_results(document):
+    """Keys a results document's entries by (catalogue_size, scenario)."""
+    return {(result["catalogue_size"], result["scenario"]): result for result in document["results"]}
+
+def compare(baseline, current, threshold=0.2):
+    """
+    Compares each scenario present in both documents.
+
+    Returns:
+        list: One dict per scenario with the baseline and current p50/p95/p99 and throughput,
+              their relative changes and whether the scenario regressed.
+    """
+    before, after = index_results(baseline), index_results(current)
+    rows = []
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        row = {"catalogue_size": key[0], "scenario": key[1]}
+        for metric in ("p50", "p95", "p99"):
+            row[metric] = (old["latency_ms"][metric], new["latency_ms"][metric], relative_change(old["latency_ms"][metric], new["latency_ms"][metric]))
+        row["throughput_rps"] = (old["throughput_rps"], new["throughput_rps"], relative_change(old["throughput_rps"], new["throughput_rps"]))
+        p95_change, throughput_change = row["p95"][2], row["throughput_rps"][2]
+        row["regressed"] = (p95_change is not None and p95_change > threshold) or \
+                           (throughput_change is not None and throughput_change < -threshold)
+        rows.append(row)
+    return rows
+
+def relative_change(old, new):
+    if old is None or new is None or old == 0:
+        return None
+    return (new - old) / old
+
+def format_change(change):
+    return "   n/a" if change is None else f"{change * 100:+6.1f}%"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative change counted as a regression (default 0.2)")
+    args = parser.parse_args()
+
+    with open(args.baseline) as baseline_file, open(args.current) as current_file:
+        rows = compare(json.load(baseline_file), json.load(current_file), args.threshold)
+
+    for row in rows:
+        print(f"{row['catalogue_size']:>6} {row['scenario']:<20} "
+              + "  ".join(f"{metric} {row[metric][1]} ms ({format_change(row[metric][2])})" for metric in ("p50", "p95", "p99"))
+              + f"  {row['throughput_rps'][1]} req/s ({format_change(row['throughput_rps'][2])})"
+              + ("  REGRESSED" if row["regressed"] else ""))
+    sys.exit(1 if any(row["regressed"] for row in rows) else 0)
@@ -0,0 +1,90 @@
+"""
+Closed-loop concurrent load generator.
+
+Each of `concurrency` workers sends one request at a time over its own keep-alive session,
+drawing from a shared request counter until `requests` have been sent. Latencies are taken
+from just before sending to the full body being read.
+"""
+import threading
+import time
+import numpy as np
+import requests
+
+def percentiles(latencies):
+    """
+    Summarises latencies (in seconds) in milliseconds.
+
+    Returns:
+        dict: p50, p95, p99, mean and max, or None for each if there were no requests.
+    """
+    if not latencies:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    milliseconds = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+    return {"p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3),
+            "mean": round(float(milliseconds.mean()), 3), "max": round(float(milliseconds.max()), 3)}
+
+def run_load(make_request, requests_total, concurrency, expected_statuses=(200,), warmup=0, timeout=60):
+    """
+    Sends requests_total requests from concurrency workers.
+
+    make_request(i) returns (method, url, kwargs) for the i-th request. The first warmup
+    requests are sent but not measured. Requests that raise, or answer with a status not in
+    expected_statuses, are counted as errors (their latency is still recorded).
+
+    Returns:
+        dict: requests, errors, statuses, duration_s, throughput_rps and latency_ms.
+    """
+    counter = iter(range(warmup + requests_total))
+    counter_lock = threading.Lock()
+    latencies, statuses, errors = [], {}, [0]
+    results_lock = threading.Lock()
+    started = [None]
+    start_barrier = threading.Barrier(concurrency + 1)
+
+    def next_index():
+        with counter_lock:
+            index = next(counter, None)
+            if index == warmup and started[0] is None:
+                started[0] = time.perf_counter()
+            return index
+
+    def worker():
+        session = requests.Session()
+        start_barrier.wait()
+        while (index := next_index()) is not None:
+            method, url, kwargs = make_request(index)
+            request_started = time.perf_counter()
+            try:
+                response = session.request(method, url, timeout=timeout, **kwargs)
+                response.content
+                status = response.status_code
+            except requests.exceptions.RequestException:
+                status = "error"
+            elapsed = time.perf_counter() - request_started
+            if index < warmup:
+                continue
+            with results_lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status not in expected_statuses:
+                    errors[0] += 1
+        session.close()
+
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in workers:
+        thread.start()
+    start_barrier.wait()
+    for thread in workers:
+        thread.join()
+    finished = time.perf_counter()
+
+    duration = finished - (started[0] or finished)
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "statuses": statuses,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 2) if duration > 0 else None,
+        "latency_ms": percentiles(latencies),
+    }
@@ -0,0 +1,321 @@
+"""
+Benchmarks the three services against a local AudD.io stand-in.
+
+Starts the database, catalogue and audio recognition services and the stub AudD.io server
+(stub_audd.py) on their usual ports, with the database in a scratch directory. Then, for
+each catalogue size, it loads that many synthetic tracks and drives each scenario with the
+concurrent load generator. Results (p50/p95/p99 latency, throughput, errors and the RSS
+of every process) are written as JSON, to be compared between runs with compare.py.
+
+Usage:
+    python benchmarks/run_benchmarks.py --sizes 10,1000,10000 --output bench_results.json
+"""
+import argparse
+import base64
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import psutil
+import requests
+from load_generator import run_load
+from synthetic_catalogue import load_catalogue, synthetic_fragment, synthetic_title, synthetic_track, unique_fragment
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DATABASE_URL = "http://localhost:3002"
+CATALOGUE_URL = "http://localhost:3000"
+AUDIO_URL = "http://localhost:3001"
+STUB_AUDD_URL = "http://localhost:3003"
+
+# Service name -> (script, port)
+SERVICES = {
+    "database": ("src/Database_management_microservice/database_management_microservice.py", 3002),
+    "catalogue": ("src/Catalogue_management_microservice/catalogue_management_microservice.py", 3000),
+    "audio": ("src/Audio_recognition_microservice/audio_recognition_microservice.py", 3001),
+}
+ASYNC_AUDIO_SCRIPT = "src/Audio_recognition_microservice/async_audio_recognition_microservice.py"
+
+# Single-process deployment serving every route on the catalogue's port (--composed)
+COMPOSED_SCRIPT = "src/composed_microservice.py"
+COMPOSED_PORT = 3000
+
+# How often process memory is sampled during a scenario, in seconds
+RSS_SAMPLE_INTERVAL = 0.05
+
+def scenario_db_search(size, choices):
+    """Exact title lookups on the database service."""
+    return (lambda i: ("GET", f"{DATABASE_URL}/db/tracks/search", {"params": {"title": synthetic_title(choices[i])}})), (200,)
+
+def scenario_db_search_fuzzy(size, choices):
+    """Misspelt title lookups that fall through to the trigram index."""
+    def make_request(i):
+        title = synthetic_title(choices[i]).replace("Track", "Trak")
+        return "GET", f"{DATABASE_URL}/db/tracks/search", {"params": {"title": title}}
+    return make_request, (200,)
+
+def scenario_catalogue_list(size, choices):
+    """First page of the catalogue's title listing."""
+    return (lambda i: ("GET", f"{CATALOGUE_URL}/tracks", {"params": {"limit": 100}})), (200,)
+
+def scenario_track_audio_range(size, choices):
+    """Seeking into a track through the catalogue (4 KiB ranges)."""
+    def make_request(i):
+        return "GET", f"{CATALOGUE_URL}/tracks/{synthetic_title(choices[i])}/audio", {"headers": {"Range": "bytes=44-4139"}}
+    return make_request, (206,)
+
+def scenario_recognise_cached(size, choices):
+    """The same fragment over and over, answered from the recognition cache."""
+    payload = {"encoded_track_fragment": base64.b64encode(synthetic_fragment()).decode("ascii")}
+    return (lambda i: ("POST", f"{AUDIO_URL}/recognise", {"json": payload})), (200,)
+
+def scenario_recognise_uncached(size, choices):
+    """A different fragment every time: preprocessing, AudD.io and the database lookup."""
+    fragment = synthetic_fragment()
+
+    def make_request(i):
+        encoded = base64.b64encode(unique_fragment(fragment, size * 1_000_000 + i)).decode("ascii")
+        return "POST", f"{AUDIO_URL}/recognise", {"json": {"encoded_track_fragment": encoded}}
+    return make_request, (200,)
+
+def scenario_catalogue_add(size, choices):
+    """Adding new tracks through the catalogue (grows the catalogue, so it runs last)."""
+    def make_request(i):
+        encoded = base64.b64encode(synthetic_track(size + i)).decode("ascii")
+        return "POST", f"{CATALOGUE_URL}/tracks", {"json": {"title": f"Benchmark Added {i:06d}", "encoded_track": encoded}}
+    return make_request, (202,)
+
+# Scenario name -> builder, in the order they run
+SCENARIOS = {
+    "db_search": scenario_db_search,
+    "db_search_fuzzy": scenario_db_search_fuzzy,
+    "catalogue_list": scenario_catalogue_list,
+    "track_audio_range": scenario_track_audio_range,
+    "recognise_cached": scenario_recognise_cached,
+    "recognise_uncached": scenario_recognise_uncached,
+    "catalogue_add": scenario_catalogue_add,
+}
+
+class Services:
+    """Starts the services and the stub AudD.io server, and stops them on exit."""
+
+    def __init__(self, scratch_dir, async_audio=False, composed=False, stub_args=()):
+        self.scratch_dir = scratch_dir
+        self.async_audio = async_audio
+        self.composed = composed
+        self.stub_args = list(stub_args)
+        self.processes = {}
+
+    def __enter__(self):
+        # The stub has no plan limits, so AudD.io calls are not paced
+        env = dict(os.environ, DATABASE_DIR=os.path.join(self.scratch_dir, "data"), AUDDIO_API_URL=f"{STUB_AUDD_URL}/",
+                   AUDDIO_TOKEN="benchmark", RECOGNITION_BACKEND="audd", DATABASE_URL=DATABASE_URL, AUDD_RATE_LIMIT="0")
+        try:
+            self.start("stub_audd", [os.path.join(BENCHMARKS_DIR, "stub_audd.py")] + self.stub_args, env, f"{STUB_AUDD_URL}/_stats")
+            if self.composed:
+                self.start("composed", [os.path.join(ROOT, COMPOSED_SCRIPT)], dict(env, COMPOSED_PORT=str(COMPOSED_PORT)),
+                           f"http://localhost:{COMPOSED_PORT}/metrics")
+                return self
+            for name, (script, port) in SERVICES.items():
+                if name == "audio" and self.async_audio:
+                    script = ASYNC_AUDIO_SCRIPT
+                command = [os.path.join(BENCHMARKS_DIR, "serve.py"), os.path.join(ROOT, script), str(port)]
+                self.start(name, command, env, f"http://localhost:{port}/metrics")
+        except BaseException:
+            self.__exit__()
+            raise
+        return self
+
+    def start(self, name, command, env, ready_url, timeout=30):
+        """Starts one process and waits until ready_url answers."""
+        log = open(os.path.join(self.scratch_dir, f"{name}.out"), "w")
+        self.processes[name] = subprocess.Popen([sys.executable] + command, env=env, cwd=ROOT, stdout=log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.processes[name].poll() is not None:
+                raise RuntimeError(f"{name} exited on start-up, see {log.name}")
+            try:
+                requests.get(ready_url, timeout=1)
+                return
+            except requests.exceptions.RequestException:
+                time.sleep(0.1)
+        raise RuntimeError(f"{name} did not start within {timeout} s, see {log.name}")
+
+    def rss(self):
+        """Returns each process's resident memory in MiB, including its child processes."""
+        usage = {}
+        for name, process in self.processes.items():
+            try:
+                parent = psutil.Process(process.pid)
+                members = [parent] + parent.children(recursive=True)
+                usage[name] = sum(member.memory_info().rss for member in members) / (1024 * 1024)
+            except psutil.Error:
+                usage[name] = None
+        return usage
+
+    def __exit__(self, *exc_info):
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+class RssSampler:
+    """Records the peak and final RSS of every process while a scenario runs."""
+
+    def __init__(self, services):
+        self.services = services
+        self.peak = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        usage = self.services.rss()
+        for name, value in usage.items():
+            if value is not None:
+                self.peak[name] = max(self.peak.get(name, 0.0), value)
+        return usage
+
+    def _run(self):
+        while not self._stop.wait(RSS_SAMPLE_INTERVAL):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        final = self._sample()
+        self.result = {name: {"end": round(final[name], 1) if final[name] is not None else None,
+                              "peak": round(self.peak[name], 1) if name in self.peak else None} for name in final}
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def use_composed_urls():
+    """Points every scenario at the composed deployment, which serves all routes on one port."""
+    global DATABASE_URL, CATALOGUE_URL, AUDIO_URL
+    DATABASE_URL = CATALOGUE_URL = AUDIO_URL = f"http://localhost:{COMPOSED_PORT}"
+
+def seed_catalogue(session, size, snapshot_dir=None):
+    """
+    Loads size synthetic tracks into the database service.
+
+    With a snapshot directory, a snapshot saved there by an earlier run is imported through
+    POST /db/import, which skips describing and fingerprinting every track again. Without one
+    the tracks are generated and added in batches, then exported to the directory for next time.
+
+    Returns:
+        str: Where the tracks came from, for the progress output.
+    """
+    path = os.path.join(snapshot_dir, f"catalogue-{size}.ndjson") if snapshot_dir else None
+    if path and os.path.exists(path):
+        with open(path, "rb") as snapshot:
+            session.post(f"{DATABASE_URL}/db/import", data=snapshot, timeout=3600).raise_for_status()
+        return path
+
+    load_catalogue(DATABASE_URL, size, session=session)
+    if path:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        with session.get(f"{DATABASE_URL}/db/export", stream=True, timeout=3600) as response:
+            response.raise_for_status()
+            with open(path + ".part", "wb") as snapshot:
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    snapshot.write(chunk)
+        os.replace(path + ".part", path)
+    return "synthetic batches"
+
+def run_benchmarks(args):
+    """Runs every scenario for every catalogue size and returns the results document."""
+    if args.composed:
+        use_composed_urls()
+    scratch_dir = tempfile.mkdtemp(prefix="shamzam-bench-")
+    stub_args = ["--latency-ms", str(args.audd_latency_ms), "--jitter-ms", str(args.audd_jitter_ms),
+                 "--error-rate", str(args.audd_error_rate), "--seed", str(args.seed)]
+    document = {
+        "metadata": {
+            "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "settings": vars(args),
+        },
+        "results": [],
+    }
+
+    try:
+        with Services(scratch_dir, async_audio=args.async_audio, composed=args.composed, stub_args=stub_args) as services:
+            session = requests.Session()
+            for size in args.sizes:
+                session.post(f"{DATABASE_URL}/db/reset", timeout=60).raise_for_status()
+                load_started = time.perf_counter()
+                source = seed_catalogue(session, size, args.snapshot_dir)
+                print(f"Loaded {size} tracks from {source} in {time.perf_counter() - load_started:.1f} s")
+                session.post(f"{STUB_AUDD_URL}/_config", json={"catalogue_size": size}, timeout=10).raise_for_status()
+
+                for name in args.scenarios:
+                    rng = random.Random(f"{args.seed}-{name}-{size}")
+                    choices = [rng.randrange(size) for _ in range(args.warmup + args.requests)]
+                    make_request, expected_statuses = SCENARIOS[name](size, choices)
+                    with RssSampler(services) as sampler:
+                        result = run_load(make_request, args.requests, args.concurrency, expected_statuses, warmup=args.warmup)
+                    result = dict({"catalogue_size": size, "scenario": name, "concurrency": args.concurrency}, **result, rss_mb=sampler.result)
+                    document["results"].append(result)
+                    latency = result["latency_ms"]
+                    print(f"{size:>6} {name:<20} {result['throughput_rps']:>8} req/s  p50 {latency['p50']:>8} ms  "
+                          f"p95 {latency['p95']:>8} ms  p99 {latency['p99']:>8} ms  errors {result['errors']}")
+    finally:
+        if not args.keep_data:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+        else:
+            print(f"Service output and data kept in {scratch_dir}")
+    return document
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the services against a local AudD.io stand-in.")
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")], default=[10, 1000, 10000],
+                        help="Comma-separated catalogue sizes (default 10,1000,10000)")
+    parser.add_argument("--scenarios", type=lambda value: value.split(","), default=list(SCENARIOS),
+                        help=f"Comma-separated scenarios (default all: {','.join(SCENARIOS)})")
+    parser.add_argument("--requests", type=int, default=500, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests sent first")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--audd-latency-ms", type=float, default=200.0, help="Stub AudD.io mean response time")
+    parser.add_argument("--audd-jitter-ms", type=float, default=50.0, help="Stub AudD.io response time spread")
+    parser.add_argument("--audd-error-rate", type=float, default=0.0, help="Fraction of stub AudD.io calls answered with error 902")
+    parser.add_argument("--async-audio", action="store_true", help="Benchmark the asynchronous audio recognition service")
+    parser.add_argument("--composed", action="store_true", help="Benchmark the single-process composed deployment instead")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json", help="Results file (default bench_results.json)")
+    parser.add_argument("--keep-data", action="store_true", help="Keep the scratch database and service output")
+    parser.add_argument("--snapshot-dir", help="Seed each catalogue size from a snapshot kept here, saving one on the first run")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    document = run_benchmarks(args)
+    with open(args.output, "w") as output_file:
+        json.dump(document, output_file, indent=2)
+    print(f"Results written to {args.output}")
@@ -0,0 +1,19 @@
+"""
+Runs one microservice for benchmarking.
+
+The services' own __main__ blocks start Flask in debug mode, whose reloader runs the app
+in a second process and slows every request down. This imports the service module and
+runs its app without the reloader, so measurements (and RSS) cover a single process.
+
+Usage:
+    python benchmarks/serve.py src/Database_management_microservice/database_management_microservice.py 3002
+"""
+import importlib
+import os
+import sys
+
+if __name__ == "__main__":
+    path, port = os.path.abspath(sys.argv[1]), int(sys.argv[2])
+    sys.path.insert(0, os.path.dirname(path))
+    service = importlib.import_module(os.path.splitext(os.path.basename(path))[0])
+    service.app.run(host="localhost", port=port)
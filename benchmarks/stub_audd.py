@@ -0,0 +1,123 @@
+"""
+Local stand-in for the AudD.io recognition API, for benchmarks.
+
+Answers POST / like AudD.io after a configurable delay. The recognised title is derived
+from a digest of the uploaded audio, so the same fragment is always recognised as the same
+"Synthetic Track NNNNN" of the generated catalogue. Configurable fractions of requests get
+an AudD.io error (902, quota reached, by default), a 503 or no match.
+
+Point the audio recognition service at it with AUDDIO_API_URL=http://localhost:3003/.
+
+Usage:
+    python benchmarks/stub_audd.py --latency-ms 300 --jitter-ms 100 --error-rate 0.01
+"""
+import argparse
+import base64
+import binascii
+import hashlib
+import random
+import threading
+import time
+from flask import Flask, jsonify, request
+from synthetic_catalogue import synthetic_title
+
+app = Flask(__name__)
+
+# Behaviour of the stub, changed at runtime with POST /_config
+config = {
+    "latency_ms": 0.0,         # Mean delay before answering
+    "jitter_ms": 0.0,          # Delay varies uniformly by up to this much either way
+    "error_rate": 0.0,         # Fraction answered with an AudD.io error
+    "error_code": 902,         # AudD.io error code used for those
+    "server_error_rate": 0.0,  # Fraction answered with HTTP 503
+    "miss_rate": 0.0,          # Fraction answered with no match
+    "catalogue_size": 10,      # Titles are drawn from the first catalogue_size synthetic tracks
+}
+counters = {"requests": 0, "recognised": 0, "errors": 0, "server_errors": 0, "misses": 0}
+lock = threading.Lock()
+rng = random.Random(0)
+
+def count(name):
+    with lock:
+        counters[name] += 1
+
+@app.route("/", methods=["POST"])
+def recognise():
+    """
+    Recognises a fragment the way AudD.io would.
+
+    Returns:
+        AudD.io's JSON response shape: {"status": "success", "result": {"title": ...}} or
+        {"status": "error", "error": {"error_code": ..., "error_message": ...}}.
+    """
+    count("requests")
+    with lock:
+        settings = dict(config)
+        delay = max(0.0, settings["latency_ms"] + rng.uniform(-settings["jitter_ms"], settings["jitter_ms"])) / 1000
+        roll = rng.random()
+    time.sleep(delay)
+
+    if not request.form.get("api_token"):
+        return jsonify({"status": "error", "error": {"error_code": 901, "error_message": "No api_token passed"}}), 200
+    try:
+        audio = base64.b64decode(request.form.get("audio", ""), validate=True)
+    except binascii.Error:
+        audio = b""
+    if not audio:
+        return jsonify({"status": "error", "error": {"error_code": 700, "error_message": "No file sent for recognition"}}), 200
+
+    if roll < settings["server_error_rate"]:
+        count("server_errors")
+        return "", 503
+    roll -= settings["server_error_rate"]
+    if roll < settings["error_rate"]:
+        count("errors")
+        return jsonify({"status": "error", "error": {"error_code": settings["error_code"], "error_message": "Stub error"}}), 200
+    roll -= settings["error_rate"]
+    if roll < settings["miss_rate"]:
+        count("misses")
+        return jsonify({"status": "success", "result": None}), 200
+
+    count("recognised")
+    index = int.from_bytes(hashlib.sha256(audio).digest()[:8], "big") % max(1, settings["catalogue_size"])
+    return jsonify({"status": "success", "result": {"title": synthetic_title(index)}}), 200
+
+@app.route("/_config", methods=["GET", "POST"])
+def configure():
+    """
+    Reads or updates the stub's behaviour (a JSON object with any of the config keys).
+
+    Returns:
+        The configuration in effect, or 400 for unknown keys.
+    """
+    if request.method == "POST":
+        changes = request.get_json(silent=True)
+        if not isinstance(changes, dict) or not set(changes) <= set(config):
+            return "", 400
+        with lock:
+            config.update(changes)
+    with lock:
+        return jsonify(config), 200
+
+@app.route("/_stats", methods=["GET"])
+def stats():
+    """Returns how many requests the stub has answered, by outcome."""
+    with lock:
+        return jsonify(counters), 200
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the AudD.io API.")
+    parser.add_argument("--port", type=int, default=3003)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-code", type=int, default=902)
+    parser.add_argument("--server-error-rate", type=float, default=0.0)
+    parser.add_argument("--miss-rate", type=float, default=0.0)
+    parser.add_argument("--catalogue-size", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config.update({key: getattr(args, key) for key in config})
+    rng.seed(args.seed)
+    app.run(host="localhost", port=args.port, threaded=True)
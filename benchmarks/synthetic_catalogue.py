@@ -0,0 +1,89 @@
+"""
+Synthetic WAV tracks and fragments for benchmarks.
+
+Every track is short, distinct (its own tone and noise, so the content-addressed blob store
+keeps one blob per track) and generated from its index alone, so catalogues of any size
+can be rebuilt identically on every run.
+
+Usage (loads 1000 tracks into a running database service):
+    python benchmarks/synthetic_catalogue.py 1000
+"""
+import argparse
+import base64
+import os
+import sys
+import numpy as np
+import requests
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Shared"))
+from wav_utils import write_wav
+
+# Length and format of generated tracks (0.5 s of 8 kHz mono keeps a 10k catalogue around 80 MB)
+TRACK_SECONDS = 0.5
+TRACK_SAMPLE_RATE = 8000
+
+# Generated fragments are client-style recordings: 44.1 kHz stereo
+FRAGMENT_SECONDS = 3.0
+FRAGMENT_SAMPLE_RATE = 44100
+
+# Tracks per POST /db/tracks/batch request (the service's maximum)
+LOAD_BATCH_SIZE = 500
+
+def synthetic_title(index):
+    return f"Synthetic Track {index:05d}"
+
+def synthetic_track(index, seconds=TRACK_SECONDS, sample_rate=TRACK_SAMPLE_RATE):
+    """Returns the WAV bytes of track index: a tone whose pitch depends on index, with seeded noise."""
+    rng = np.random.default_rng(index)
+    times = np.arange(int(seconds * sample_rate)) / sample_rate
+    frequency = 110.0 * 2 ** ((index % 480) / 96)  # Five octaves in 1/8 semitone steps
+    samples = 0.4 * np.sin(2 * np.pi * frequency * times) + 0.05 * rng.standard_normal(len(times))
+    return write_wav(samples.astype(np.float32), sample_rate)
+
+def synthetic_catalogue(count):
+    """Yields (title, wav bytes) for the first count synthetic tracks."""
+    for index in range(count):
+        yield synthetic_title(index), synthetic_track(index)
+
+def synthetic_fragment(seed=0, seconds=FRAGMENT_SECONDS, sample_rate=FRAGMENT_SAMPLE_RATE):
+    """Returns the WAV bytes of a stereo recording, as a client would send for recognition."""
+    rng = np.random.default_rng(seed)
+    times = np.arange(int(seconds * sample_rate)) / sample_rate
+    tone = 0.3 * np.sin(2 * np.pi * 440.0 * times) + 0.05 * rng.standard_normal(len(times))
+    return write_wav(np.stack([tone, tone], axis=1).astype(np.float32), sample_rate)
+
+def unique_fragment(fragment, counter):
+    """Returns a copy of fragment whose last samples encode counter, so no two requests share a cache entry."""
+    return fragment[:-8] + counter.to_bytes(8, "little")
+
+def load_catalogue(database_url, count, batch_size=LOAD_BATCH_SIZE, session=None):
+    """
+    Adds the first count synthetic tracks through the database service's batch endpoint.
+
+    Raises:
+        RuntimeError: If a batch is rejected or any track is not created.
+    """
+    session = session or requests.Session()
+    batch = []
+    for title, audio in synthetic_catalogue(count):
+        batch.append({"title": title, "encoded_track": base64.b64encode(audio).decode("ascii")})
+        if len(batch) == batch_size:
+            post_batch(session, database_url, batch)
+            batch = []
+    if batch:
+        post_batch(session, database_url, batch)
+
+def post_batch(session, database_url, batch):
+    response = session.post(f"{database_url}/db/tracks/batch", json={"tracks": batch}, timeout=600)
+    if response.status_code != 200:
+        raise RuntimeError(f"Loading the catalogue failed with status {response.status_code}")
+    statuses = [result["status"] for result in response.json()["results"]]
+    if any(status != "created" for status in statuses):
+        raise RuntimeError(f"Loading the catalogue failed: {statuses.count('created')} of {len(statuses)} tracks created")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load synthetic tracks into a running database service.")
+    parser.add_argument("count", type=int, help="Number of tracks")
+    parser.add_argument("--database-url", default="http://localhost:3002")
+    args = parser.parse_args()
+    load_catalogue(args.database_url, args.count)
+    print(f"Loaded {args.count} synthetic tracks")
@@ -0,0 +1,396 @@
+"""
+Asynchronous variant of the audio recognition microservice.
+
+Serves the same routes and status codes as audio_recognition_microservice.py (including
+POST /recognise/batch), but on an ASGI stack (Quart on Hypercorn) with non-blocking calls to
+AudD.io and the database service, so one process can hold hundreds of recognitions open while
+they wait on upstream latency. Outstanding AudD.io requests are capped by AUDD_MAX_CONCURRENCY,
+and paced by the same rate limiter as the synchronous service.
+
+Usage:
+    python src/Audio_recognition_microservice/async_audio_recognition_microservice.py
+"""
+import asyncio
+import base64
+import binascii
+import json
+import logging
+import os
+import sys
+import httpx
+from quart import Quart, Response, request, jsonify
+from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "Shared"))
+from fingerprint import fingerprint_wav
+from recognition_cache import RecognitionCache
+from service_client import CircuitBreaker
+from instrumentation import instrument_async_app, time_outbound
+from tracing import LOG_FORMAT, span, stream_with_trace_async, trace_async_app, trace_headers
+from audd_client import AUDDIO_API_URL, AuddRateLimiter, AuddThrottled, audd_request_data, interpret_audd_result
+from fragment_preprocessor import PREPROCESS_FRAGMENTS, preprocess_encoded_fragment
+
+# Define log directory within the microservice folder
+log_dir = os.path.join(os.path.dirname(__file__))
+
+# Configure logging
+logging.basicConfig(filename=os.path.join(log_dir, "audio.log"), level=logging.INFO, format=LOG_FORMAT)
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Select the recognition backend: "audd" (AudD.io API) or "local" (offline fingerprint index)
+RECOGNITION_BACKEND: str = os.getenv("RECOGNITION_BACKEND", "audd").lower()
+
+if RECOGNITION_BACKEND not in ("audd", "local"):
+    raise ValueError(f"Unknown RECOGNITION_BACKEND '{RECOGNITION_BACKEND}', expected 'audd' or 'local'")
+
+# Retrieve the API token
+AUDDIO_TOKEN: str = os.getenv("AUDDIO_TOKEN", "")
+
+if RECOGNITION_BACKEND == "audd" and not AUDDIO_TOKEN:
+    raise ValueError("AUDDIO_TOKEN is not set in the environment or .env file!")
+
+# Maximum number of AudD.io requests outstanding at once
+AUDD_MAX_CONCURRENCY = int(os.getenv("AUDD_MAX_CONCURRENCY", "32"))
+
+app = Quart(__name__)
+instrument_async_app(app, "audio")
+trace_async_app(app, "audio")
+DATABASE_URL = os.getenv("DATABASE_URL", "http://localhost:3002")
+
+recognition_cache = RecognitionCache(
+    max_entries=int(os.getenv("RECOGNITION_CACHE_MAX_ENTRIES", "1024")),
+    max_bytes=int(os.getenv("RECOGNITION_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    positive_ttl=float(os.getenv("RECOGNITION_CACHE_POSITIVE_TTL", "300")),
+    negative_ttl=float(os.getenv("RECOGNITION_CACHE_NEGATIVE_TTL", "30")),
+)
+database_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("DATABASE_BREAKER_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("DATABASE_BREAKER_RESET", "10")),
+)
+
+# Batch recognition limits
+MAX_RECOGNITION_BATCH_SIZE = int(os.getenv("RECOGNITION_BATCH_MAX_SIZE", "100"))
+RECOGNITION_BATCH_CONCURRENCY = int(os.getenv("RECOGNITION_BATCH_CONCURRENCY", "8"))
+
+# Created on startup so they belong to the server's event loop
+http_client: httpx.AsyncClient = None
+audd_semaphore: asyncio.Semaphore = None
+audd_limiter = AuddRateLimiter()
+audd_in_flight = 0
+
+@app.before_serving
+async def open_clients():
+    """Opens the shared keep-alive HTTP client and the AudD concurrency limit."""
+    global http_client, audd_semaphore
+    http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(float(os.getenv("DATABASE_READ_TIMEOUT", "10")), connect=float(os.getenv("DATABASE_CONNECT_TIMEOUT", "2"))),
+        limits=httpx.Limits(max_connections=int(os.getenv("DATABASE_POOL_SIZE", "100")) + AUDD_MAX_CONCURRENCY),
+    )
+    audd_semaphore = asyncio.Semaphore(AUDD_MAX_CONCURRENCY)
+
+@app.after_serving
+async def close_clients():
+    await http_client.aclose()
+
+@app.errorhandler(AuddThrottled)
+async def audd_throttled(e):
+    """Answers a recognition that could not be sent to AudD.io in time, saying when to retry."""
+    logging.warning(str(e))
+    return "", e.status, {"Retry-After": e.retry_after_header}
+
+@app.route("/recognise", methods=["POST"])
+async def recognise():
+    """
+    Recognizes an audio fragment and checks if it exists in the database.
+
+    Returns:
+        A JSON response with track details if found, or an error message.
+    """
+    if not request.is_json:
+        logging.warning("No json content type")
+        return "", 415
+
+    data = await request.get_json()
+    encoded_track_fragment = data.get("encoded_track_fragment") if isinstance(data, dict) else None
+
+    if not encoded_track_fragment:
+        logging.warning("Missing encoded_track_fragment")
+        return "", 400
+
+    status, body = await recognition_cache.get_or_compute_async(
+        RecognitionCache.key_for(encoded_track_fragment),
+        lambda: recognise_fragment(encoded_track_fragment)
+    )
+
+    if not body:
+        return "", status
+    return Response(body, status=status, mimetype="application/json")
+
+@app.route("/recognise/batch", methods=["POST"])
+async def recognise_batch():
+    """
+    Recognizes many audio fragments at once.
+
+    Expects a JSON body of the form {"fragments": [<base64 fragment>, ...]}. Identical fragments
+    are recognised once, distinct ones concurrently (up to RECOGNITION_BATCH_CONCURRENCY at a time),
+    and every recognised title is resolved with a single database lookup.
+
+    Returns:
+        An NDJSON stream with one {"index", "status", "track"?} line per fragment, written as
+        each result becomes available (failures first, then found tracks after the lookup).
+    """
+    if not request.is_json:
+        logging.warning("No json content type")
+        return "", 415
+
+    data = await request.get_json()
+    fragments = data.get("fragments") if isinstance(data, dict) else None
+
+    if not isinstance(fragments, list) or not fragments or not all(isinstance(fragment, str) and fragment for fragment in fragments):
+        logging.warning("Missing fragments")
+        return "", 400
+
+    if len(fragments) > MAX_RECOGNITION_BATCH_SIZE:
+        logging.warning("Recognition batch too large")
+        return "", 413
+
+    # Group duplicate payloads by the digest of their decoded bytes (or the raw string if not base64)
+    groups = {}
+    for index, fragment in enumerate(fragments):
+        cache_key = RecognitionCache.key_for(fragment)
+        group = groups.setdefault(cache_key or ("raw", fragment), {"cache_key": cache_key, "fragment": fragment, "indices": []})
+        group["indices"].append(index)
+
+    return Response(stream_with_trace_async(stream_batch_results(list(groups.values()))), status=200, mimetype="application/x-ndjson")
+
+async def stream_batch_results(groups):
+    """Recognises each group of identical fragments and yields one NDJSON line per original fragment."""
+    batch_semaphore = asyncio.Semaphore(RECOGNITION_BATCH_CONCURRENCY)
+
+    async def recognise_group(group):
+        async with batch_semaphore:
+            try:
+                return group, await get_track_title(group["fragment"])
+            except AuddThrottled as e:
+                return group, e
+
+    tasks = []
+    for group in groups:
+        cached = recognition_cache.get(group["cache_key"])
+        if cached is not None:
+            for line in batch_result_lines(group, *cached):
+                yield line
+        else:
+            tasks.append(asyncio.ensure_future(recognise_group(group)))
+
+    recognised = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            group, result = await next_done
+            if isinstance(result, AuddThrottled):
+                logging.warning(str(result))
+                for line in batch_result_lines(group, result.status, b""):
+                    yield line
+            elif result.get("success"):
+                group["title"] = result["title"]
+                recognised.append(group)
+            else:
+                logging.warning(f"API error: {result.get('error_message')}")
+                recognition_cache.put(group["cache_key"], result["error_code"], b"")
+                for line in batch_result_lines(group, result["error_code"], b""):
+                    yield line
+    finally:
+        # Stops the remaining recognitions if the client goes away mid-stream
+        for task in tasks:
+            task.cancel()
+
+    if not recognised:
+        return
+
+    try:
+        response = await database_request("POST", "/db/tracks/search/batch", json={"titles": [group["title"] for group in recognised]})
+        tracks, status = (response.json()["tracks"], 200) if response.status_code == 200 else (None, response.status_code)
+    except httpx.HTTPError as e:
+        logging.warning(f"Database service unavailable: {e}")
+        tracks, status = None, 503
+
+    for group in recognised:
+        if tracks is None:
+            lines = batch_result_lines(group, status, b"")
+        elif group["title"] in tracks:
+            body = json.dumps(tracks[group["title"]]).encode()
+            recognition_cache.put(group["cache_key"], 200, body)
+            lines = batch_result_lines(group, 200, body)
+        else:
+            recognition_cache.put(group["cache_key"], 404, b"")
+            lines = batch_result_lines(group, 404, b"")
+        for line in lines:
+            yield line
+
+def batch_result_lines(group, status, body):
+    """Yields the NDJSON line for every fragment index in a group, embedding the track JSON if there is one."""
+    for index in group["indices"]:
+        if body:
+            yield f'{{"index": {index}, "status": {status}, "track": '.encode() + body + b"}\n"
+        else:
+            yield f'{{"index": {index}, "status": {status}}}\n'.encode()
+
+@app.route("/recognise/cache", methods=["GET"])
+async def recognition_cache_stats():
+    """
+    Reports the recognition cache counters (hits, misses, evictions, ...) and size.
+
+    Returns:
+        A JSON object of cache statistics.
+    """
+    return jsonify(recognition_cache.stats()), 200
+
+@app.route("/health", methods=["GET"])
+async def health():
+    """
+    Reports the database circuit breaker state, AudD.io concurrency usage, pace and remaining quota.
+
+    Returns:
+        A JSON object of client statistics.
+    """
+    return jsonify({
+        "database": {"base_url": DATABASE_URL, "breaker": database_breaker.stats()},
+        "audd": dict(audd_limiter.stats(), max_concurrency=AUDD_MAX_CONCURRENCY, in_flight=audd_in_flight),
+    }), 200
+
+async def recognise_fragment(encoded_track_fragment: str):
+    """
+    Recognises the fragment's title and looks the track up in the database.
+
+    Returns:
+        tuple: (HTTP status code, JSON response body as bytes, empty on failure).
+    """
+    result = await get_track_title(encoded_track_fragment)
+
+    if not result.get("success"):
+        logging.warning(f"API error: {result.get('error_message')}")
+        return result.get("error_code"), b""
+
+    try:
+        response = await database_request("GET", "/db/tracks/search", params={"title": result.get("title")})
+    except httpx.HTTPError as e:
+        logging.warning(f"Database service unavailable: {e}")
+        return 503, b""
+
+    if response.status_code == 200:
+        logging.info("Track found in database")
+        return 200, response.content
+    elif response.status_code == 404:
+        logging.info("Track not found in database")
+        return 404, b""
+    else:
+        logging.warning("Unexpected error from database service")
+        return response.status_code, b""
+
+async def database_request(method: str, path: str, **kwargs):
+    """
+    Calls the database service through its circuit breaker.
+
+    Raises:
+        httpx.HTTPError: If the breaker is open or the call failed.
+    """
+    if not database_breaker.allow():
+        raise httpx.ConnectError(f"Circuit open for {DATABASE_URL}")
+    try:
+        with time_outbound("database", method) as call:
+            response = await http_client.request(method, DATABASE_URL + path, headers=trace_headers(kwargs.pop("headers", None)), **kwargs)
+            call["outcome"] = response.status_code
+    except httpx.HTTPError:
+        database_breaker.record_failure()
+        raise
+    if response.status_code >= 502:
+        database_breaker.record_failure()
+    else:
+        database_breaker.record_success()
+    return response
+
+async def get_track_title(encoded_track_fragment: str):
+    """
+    Recognises the track title using the configured backend.
+
+    Returns:
+        dict: Same shape as get_track_title_from_api.
+    """
+    if RECOGNITION_BACKEND == "local":
+        return await get_track_title_from_fingerprints(encoded_track_fragment)
+    return await get_track_title_from_api(encoded_track_fragment)
+
+async def get_track_title_from_fingerprints(encoded_track_fragment: str):
+    """
+    Recognises the track title offline against the database service's fingerprint index.
+
+    Fingerprinting is CPU bound, so it runs in a worker thread to keep the event loop free.
+    """
+    try:
+        fragment = base64.b64decode(encoded_track_fragment, validate=True)
+        with span("fingerprint_fragment"):
+            hashes = await asyncio.to_thread(fingerprint_wav, fragment)
+    except (binascii.Error, ValueError) as e:
+        return {"success": False, "error_code": 400, "error_message": f"Fragment could not be decoded: {str(e)}"}
+
+    if not hashes:
+        return {"success": False, "error_code": 422, "error_message": "Fingerprinting error"}
+
+    try:
+        response = await database_request("POST", "/db/fingerprints/match", json={"hashes": hashes})
+    except httpx.HTTPError as e:
+        return {"success": False, "error_code": 503, "error_message": f"Database service unavailable: {str(e)}"}
+
+    if response.status_code == 200:
+        return {"success": True, "title": response.json()["title"]}
+    elif response.status_code == 404:
+        return {"success": False, "error_code": 404, "error_message": "Track not recognised"}
+    return {"success": False, "error_code": response.status_code, "error_message": "Fingerprint lookup failed"}
+
+async def get_track_title_from_api(encoded_track_fragment: str):
+    """
+    Calls the external AudD.io API to recognize the track title without blocking the event loop.
+
+    WAV fragments are first shrunk to compact mono audio in a worker thread. Calls wait their
+    turn under audd_limiter, and at most AUDD_MAX_CONCURRENCY are outstanding.
+
+    Returns:
+        dict: On success, returns {"success": True, "title": <track title>}.
+              On failure, returns {"success": False, "error_code": <HTTP code>, "error_message": <description>}.
+
+    Raises:
+        AuddThrottled: If the rate, quota or backoff leave no turn within the deadline.
+    """
+    global audd_in_flight
+    if PREPROCESS_FRAGMENTS:
+        with span("preprocess_fragment"):
+            encoded_track_fragment, stats = await asyncio.to_thread(preprocess_encoded_fragment, encoded_track_fragment)
+        if stats:
+            logging.info(f"Preprocessed fragment from {stats['original_bytes']} to {stats['processed_bytes']} bytes "
+                         f"in {stats['seconds'] * 1000:.1f} ms")
+
+    wait = audd_limiter.reserve()
+    if wait > 0:
+        await asyncio.sleep(wait)
+    try:
+        async with audd_semaphore:
+            audd_in_flight += 1
+            try:
+                with time_outbound("audd", "POST", size=len(encoded_track_fragment)) as call:
+                    response = await http_client.post(AUDDIO_API_URL, data=audd_request_data(AUDDIO_TOKEN, encoded_track_fragment),
+                                                      headers=trace_headers(), timeout=30.0)
+                    call["outcome"] = response.status_code
+            finally:
+                audd_in_flight -= 1
+        response.raise_for_status()
+        result = interpret_audd_result(response.json())
+    except (httpx.HTTPError, ValueError) as e:
+        # Only outages count against AudD.io, not the 4xx answers to this fragment
+        if not isinstance(e, httpx.HTTPStatusError) or e.response.status_code >= 500:
+            audd_limiter.record_failure()
+        return {"success": False, "error_code": 500, "error_message": f"External API request failed: {str(e)}"}
+    return audd_limiter.record_result(result)
+
+if __name__ == "__main__":
+    app.run(host="localhost", port=3001)
@@ -0,0 +1,250 @@
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "Shared"))
+from instrumentation import AUDD_THROTTLED
+
+# AudD.io recognition endpoint (overridable to point at a stand-in server)
+AUDDIO_API_URL: str = os.getenv("AUDDIO_API_URL", "https://api.audd.io/")
+
+# Calls per second to AudD.io (0 for no limit) and how many may go at once after an idle spell
+AUDD_RATE_LIMIT = float(os.getenv("AUDD_RATE_LIMIT", "10"))
+AUDD_BURST = int(os.getenv("AUDD_BURST", "10"))
+
+# Calls per UTC day (0 for no limit)
+AUDD_DAILY_QUOTA = int(os.getenv("AUDD_DAILY_QUOTA", "0"))
+
+# Requests waiting for a turn, and the longest a request waits before it is refused
+AUDD_MAX_QUEUED = int(os.getenv("AUDD_MAX_QUEUED", "64"))
+AUDD_QUEUE_TIMEOUT = float(os.getenv("AUDD_QUEUE_TIMEOUT", "5"))
+
+# Pause after a failed call, doubled on each consecutive failure up to the maximum (seconds)
+AUDD_BACKOFF_BASE = float(os.getenv("AUDD_BACKOFF_BASE", "1"))
+AUDD_BACKOFF_MAX = float(os.getenv("AUDD_BACKOFF_MAX", "60"))
+
+# Maps AudD.io error codes onto the HTTP status we answer with
+AUDD_ERROR_MAPPING = {
+    902: 429,  # API limit reached
+    901: 401,  # No api_token passed
+    900: 401,  # Wrong API token.
+    600: 400,  # Incorrect audio URL.
+    700: 400,  # No file sent for recognition.
+    500: 422,  # Incorrect audio file.
+    400: 413,  # Too big audio file.
+    300: 422,  # Fingerprinting error.
+    100: 500   # Unknown error.
+}
+
+def audd_request_data(token: str, encoded_track_fragment: str):
+    """Builds the form fields for an AudD.io recognition request."""
+    return {
+        "api_token": token,
+        "audio": encoded_track_fragment,
+        "return": "title",
+    }
+
+def interpret_audd_result(result: dict):
+    """
+    Turns a decoded AudD.io JSON response into a recognition result.
+
+    Returns:
+        dict: On success, returns {"success": True, "title": <track title>}.
+              On failure, returns {"success": False, "error_code": <HTTP code>, "error_message": <description>}.
+    """
+    if result.get("status") == "success" and result.get("result"):
+        return {"success": True, "title": result["result"]["title"]}
+    elif result.get("status") == "error":
+        error_info = result.get("error", {})
+        error_code = error_info.get("error_code", "#100")
+        error_message = error_info.get("error_message", "An unknown error occurred.")
+        http_status = AUDD_ERROR_MAPPING.get(error_code, 500)
+        logging.warning(error_message)
+        return {"success": False, "error_code": http_status, "error_message": "AUDD.io API Error", "audd_error_code": error_code}
+
+    # Fallback error:
+    return {"success": False, "error_code": 500, "error_message": "Track not recognised"}
+
+class AuddThrottled(Exception):
+    """
+    Raised when a call to AudD.io cannot be made within the request's deadline.
+
+    status is the HTTP status to answer with (429 when over the rate or quota, 503 while
+    backing off after failures) and retry_after the seconds until a call may succeed.
+    """
+
+    def __init__(self, status, retry_after, reason):
+        super().__init__(f"AudD.io call refused ({reason}), retry after {retry_after:.1f} s")
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+    @property
+    def retry_after_header(self):
+        """The Retry-After header value: whole seconds, at least one."""
+        return str(max(1, math.ceil(self.retry_after)))
+
+class AuddRateLimiter:
+    """
+    Paces calls to AudD.io within a rate, a burst and a daily quota.
+
+    The rate is a token bucket, kept as the time the next token is due (GCRA): a caller
+    takes a token with reserve() and is told how long to wait for it, so waiting callers
+    are served in arrival order. A caller is refused straight away, rather than left to
+    fail upstream, if the daily quota is spent, if more than max_queued callers are waiting,
+    or if its turn would come after max_wait seconds.
+
+    The pace adapts to AudD.io's answers. A 5xx, a failed call or an error answer meaning
+    AudD.io itself failed (#100 or an unknown code) halves the rate and pauses calls for an
+    exponentially growing backoff; each successful answer restores a tenth of the configured
+    rate and clears the backoff's count. Error 902 (API limit reached) marks the quota spent until the next
+    UTC day. Limits are per process, so divide them by the number of worker processes.
+    """
+
+    def __init__(self, rate=AUDD_RATE_LIMIT, burst=AUDD_BURST, daily_quota=AUDD_DAILY_QUOTA, max_queued=AUDD_MAX_QUEUED,
+                 max_wait=AUDD_QUEUE_TIMEOUT, backoff_base=AUDD_BACKOFF_BASE, backoff_max=AUDD_BACKOFF_MAX,
+                 clock=time.monotonic, wall_clock=time.time):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.daily_quota = daily_quota
+        self.max_queued = max_queued
+        self.max_wait = max_wait
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self.wall_clock = wall_clock
+
+        self._next_token = clock()  # When the bucket next has a token, if calls keep coming
+        self._waiting = deque()  # Start times of the calls still waiting for their turn
+        self._backoff_until = 0.0
+        self._failures = 0
+        self._day = None
+        self._used = 0
+        self._limit_reached = False
+        self._lock = threading.Lock()
+        self._counters = {"sent": 0, "queued": 0, "rejected": 0, "failures": 0, "limit_reached": 0}
+
+    def reserve(self, max_wait=None):
+        """
+        Takes a turn for one call.
+
+        Returns:
+            float: Seconds the caller must wait before making the call.
+
+        Raises:
+            AuddThrottled: If the call cannot be made within max_wait seconds (default self.max_wait).
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        with self._lock:
+            now = self.clock()
+            self._roll_day()
+            if self._limit_reached or (self.daily_quota and self._used >= self.daily_quota):
+                self._refuse(429, self.seconds_until_reset(), "quota")
+
+            start = max(now, self._backoff_until)
+            if self.rate > 0:
+                # A full bucket lets burst calls through together
+                start = max(start, self._next_token - (self.burst - 1) / self.rate)
+            while self._waiting and self._waiting[0] <= now:
+                self._waiting.popleft()
+
+            wait = start - now
+            if wait > 0 and (wait > max_wait or len(self._waiting) >= self.max_queued):
+                if self._backoff_until >= start:
+                    self._refuse(503, wait, "backoff")
+                self._refuse(429, wait, "rate")
+
+            if self.rate > 0:
+                self._next_token = max(self._next_token, start) + 1 / self.rate
+            if wait > 0:
+                self._waiting.append(start)
+                self._counters["queued"] += 1
+            self._used += 1
+            self._counters["sent"] += 1
+            return wait
+
+    def acquire(self, max_wait=None):
+        """Waits for a turn for one call (see reserve)."""
+        wait = self.reserve(max_wait)
+        if wait > 0:
+            time.sleep(wait)
+
+    def record_result(self, result):
+        """
+        Adapts to an interpreted AudD.io answer (see interpret_audd_result).
+
+        Error answers that blame the fragment or the token (those mapped to a 4xx) leave the
+        pace as it is.
+
+        Returns:
+            dict: result, unchanged.
+
+        Raises:
+            AuddThrottled: If AudD.io reported that the API limit was reached.
+        """
+        if result.get("audd_error_code") == 902:
+            with self._lock:
+                self._roll_day()
+                self._limit_reached = True
+                self._counters["limit_reached"] += 1
+                self._refuse(429, self.seconds_until_reset(), "quota")
+        if "audd_error_code" in result:
+            if result["error_code"] >= 500:
+                self.record_failure()
+            return result
+        with self._lock:
+            self._failures = 0
+            if self.max_rate > 0:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+        return result
+
+    def record_failure(self):
+        """Backs off after a 5xx answer, an AudD.io internal error or a call that failed outright."""
+        with self._lock:
+            self._failures += 1
+            self._counters["failures"] += 1
+            backoff = min(self.backoff_base * 2 ** (self._failures - 1), self.backoff_max)
+            self._backoff_until = max(self._backoff_until, self.clock() + backoff)
+            if self.max_rate > 0:
+                self.rate = max(self.max_rate / 16, self.rate / 2)
+
+    def seconds_until_reset(self):
+        """Seconds until the daily quota is renewed, at the next UTC midnight."""
+        return 86400 - self.wall_clock() % 86400
+
+    def stats(self):
+        """Reports the current pace, quota use and counters."""
+        with self._lock:
+            now = self.clock()
+            self._roll_day()
+            while self._waiting and self._waiting[0] <= now:
+                self._waiting.popleft()
+            return dict(
+                self._counters,
+                rate=self.rate,
+                max_rate=self.max_rate,
+                burst=self.burst,
+                daily_quota=self.daily_quota,
+                used_today=self._used,
+                remaining_today=0 if self._limit_reached else (max(0, self.daily_quota - self._used) if self.daily_quota else None),
+                waiting=len(self._waiting),
+                backoff_seconds=max(0.0, self._backoff_until - now),
+            )
+
+    def _roll_day(self):
+        """Starts a new quota day at UTC midnight. Caller must hold the lock."""
+        day = int(self.wall_clock() // 86400)
+        if day != self._day:
+            self._day = day
+            self._used = 0
+            self._limit_reached = False
+
+    def _refuse(self, status, retry_after, reason):
+        """Counts and raises a refusal. Caller must hold the lock."""
+        self._counters["rejected"] += 1
+        AUDD_THROTTLED.labels(reason).inc()
+        raise AuddThrottled(status, retry_after, reason)
@@ -1,106 +1,333 @@
 import requests
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from dotenv import load_dotenv
 import logging
+import base64
+import binascii
+import contextvars
+import json
 import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "Shared"))
+from fingerprint import fingerprint_wav
+from executors import PerProcessExecutor
+from recognition_cache import RecognitionCache
+from service_client import ServiceClient
+from database_transport import HttpDatabaseTransport
+from instrumentation import instrument_app, time_outbound
+from tracing import LOG_FORMAT, span, stream_with_trace, trace_app, trace_headers
+from audd_client import AUDDIO_API_URL, AuddRateLimiter, AuddThrottled, audd_request_data, interpret_audd_result
+from fragment_preprocessor import PREPROCESS_FRAGMENTS, preprocess_encoded_fragment
 
 # Define log directory within the microservice folder
 log_dir = os.path.join(os.path.dirname(__file__))
 
 # Configure logging
-logging.basicConfig(filename=os.path.join(log_dir, "audio.log"), level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logging.basicConfig(filename=os.path.join(log_dir, "audio.log"), level=logging.INFO, format=LOG_FORMAT)
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Select the recognition backend: "audd" (AudD.io API) or "local" (offline fingerprint index)
+RECOGNITION_BACKEND: str = os.getenv("RECOGNITION_BACKEND", "audd").lower()
+
+if RECOGNITION_BACKEND not in ("audd", "local"):
+    raise ValueError(f"Unknown RECOGNITION_BACKEND '{RECOGNITION_BACKEND}', expected 'audd' or 'local'")
+
 # Retrieve the API token
 AUDDIO_TOKEN: str = os.getenv("AUDDIO_TOKEN", "")
 
-if not AUDDIO_TOKEN:
+if RECOGNITION_BACKEND == "audd" and not AUDDIO_TOKEN:
     raise ValueError("AUDDIO_TOKEN is not set in the environment or .env file!")
 
 app = Flask(__name__)
+instrument_app(app, "audio")
+trace_app(app, "audio")
 DATABASE_URL = "http://localhost:3002"
 
+# Shared keep-alive client for the database service (timeouts, retries and circuit breaker)
+database_client = ServiceClient.from_env(DATABASE_URL, "DATABASE")
+
+# The database service's operations, over HTTP (the composed deployment swaps in an in-process transport)
+database = HttpDatabaseTransport(database_client)
+
+recognition_cache = RecognitionCache(
+    max_entries=int(os.getenv("RECOGNITION_CACHE_MAX_ENTRIES", "1024")),
+    max_bytes=int(os.getenv("RECOGNITION_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    positive_ttl=float(os.getenv("RECOGNITION_CACHE_POSITIVE_TTL", "300")),
+    negative_ttl=float(os.getenv("RECOGNITION_CACHE_NEGATIVE_TTL", "30")),
+)
+
+# Paces calls to AudD.io within the plan's rate and quota (see audd_client.py)
+audd_limiter = AuddRateLimiter()
+
+# Batch recognition limits
+MAX_RECOGNITION_BATCH_SIZE = int(os.getenv("RECOGNITION_BATCH_MAX_SIZE", "100"))
+# Made per process, as the module is imported before the launcher forks its workers
+recognition_executor = PerProcessExecutor(lambda: ThreadPoolExecutor(max_workers=int(os.getenv("RECOGNITION_BATCH_CONCURRENCY", "8"))))
+
+@app.errorhandler(AuddThrottled)
+def audd_throttled(e):
+    """Answers a recognition that could not be sent to AudD.io in time, saying when to retry."""
+    logging.warning(str(e))
+    return "", e.status, {"Retry-After": e.retry_after_header}
+
 @app.route("/recognise", methods=["POST"])
 def recognise():
     """
     Recognizes an audio fragment and checks if it exists in the database.
 
+    Outcomes are cached by a digest of the decoded fragment, so resubmitting the same clip
+    skips both the recognition backend and the database lookup.
+
     Returns:
         A JSON response with track details if found, or an error message.
     """
-    data = request.json
-    encoded_track_fragment = data.get("encoded_track_fragment")
+    if not request.is_json:
+        logging.warning("No json content type")
+        return "", 415
+
+    data = request.get_json()
+    encoded_track_fragment = data.get("encoded_track_fragment") if isinstance(data, dict) else None
 
     if not encoded_track_fragment:
         logging.warning("Missing encoded_track_fragment")
         return "", 400
 
-    result = get_track_title_from_api(encoded_track_fragment)
+    status, body = recognition_cache.get_or_compute(
+        RecognitionCache.key_for(encoded_track_fragment),
+        lambda: recognise_fragment(encoded_track_fragment)
+    )
+
+    if not body:
+        return "", status
+    return Response(body, status=status, mimetype="application/json")
+
+@app.route("/recognise/batch", methods=["POST"])
+def recognise_batch():
+    """
+    Recognizes many audio fragments at once.
+
+    Expects a JSON body of the form {"fragments": [<base64 fragment>, ...]}. Identical fragments
+    are recognised once, distinct ones in parallel (up to RECOGNITION_BATCH_CONCURRENCY at a time),
+    and every recognised title is resolved with a single database lookup.
+
+    Returns:
+        An NDJSON stream with one {"index", "status", "track"?} line per fragment, written as
+        each result becomes available (failures first, then found tracks after the lookup).
+    """
+    if not request.is_json:
+        logging.warning("No json content type")
+        return "", 415
+
+    data = request.get_json()
+    fragments = data.get("fragments") if isinstance(data, dict) else None
+
+    if not isinstance(fragments, list) or not fragments or not all(isinstance(fragment, str) and fragment for fragment in fragments):
+        logging.warning("Missing fragments")
+        return "", 400
+
+    if len(fragments) > MAX_RECOGNITION_BATCH_SIZE:
+        logging.warning("Recognition batch too large")
+        return "", 413
+
+    # Group duplicate payloads by the digest of their decoded bytes (or the raw string if not base64)
+    groups = {}
+    for index, fragment in enumerate(fragments):
+        cache_key = RecognitionCache.key_for(fragment)
+        group = groups.setdefault(cache_key or ("raw", fragment), {"cache_key": cache_key, "fragment": fragment, "indices": []})
+        group["indices"].append(index)
+
+    return Response(stream_with_context(stream_with_trace(stream_batch_results(list(groups.values())))), status=200, mimetype="application/x-ndjson")
+
+def stream_batch_results(groups):
+    """Recognises each group of identical fragments and yields one NDJSON line per original fragment."""
+    futures = {}
+    for group in groups:
+        cached = recognition_cache.get(group["cache_key"])
+        if cached is not None:
+            yield from batch_result_lines(group, *cached)
+        else:
+            # Run in a copy of this request's context so the worker's calls and logs carry its request ID
+            futures[recognition_executor.submit(contextvars.copy_context().run, get_track_title, group["fragment"])] = group
+
+    recognised = []
+    for future in as_completed(futures):
+        group = futures[future]
+        try:
+            result = future.result()
+        except AuddThrottled as e:
+            logging.warning(str(e))
+            yield from batch_result_lines(group, e.status, b"")
+            continue
+        if result.get("success"):
+            group["title"] = result["title"]
+            recognised.append(group)
+        else:
+            logging.warning(f"API error: {result.get('error_message')}")
+            recognition_cache.put(group["cache_key"], result["error_code"], b"")
+            yield from batch_result_lines(group, result["error_code"], b"")
+
+    if not recognised:
+        return
+
+    try:
+        reply = database.search_tracks([group["title"] for group in recognised])
+        tracks, status = reply.body, reply.status
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Database service unavailable: {e}")
+        tracks, status = None, 503
+
+    for group in recognised:
+        if tracks is None:
+            yield from batch_result_lines(group, status, b"")
+        elif group["title"] in tracks:
+            body = json.dumps(tracks[group["title"]]).encode()
+            recognition_cache.put(group["cache_key"], 200, body)
+            yield from batch_result_lines(group, 200, body)
+        else:
+            recognition_cache.put(group["cache_key"], 404, b"")
+            yield from batch_result_lines(group, 404, b"")
+
+def batch_result_lines(group, status, body):
+    """Yields the NDJSON line for every fragment index in a group, embedding the track JSON if there is one."""
+    for index in group["indices"]:
+        if body:
+            yield f'{{"index": {index}, "status": {status}, "track": '.encode() + body + b"}\n"
+        else:
+            yield f'{{"index": {index}, "status": {status}}}\n'.encode()
+
+@app.route("/recognise/cache", methods=["GET"])
+def recognition_cache_stats():
+    """
+    Reports the recognition cache counters (hits, misses, evictions, ...) and size.
+
+    Returns:
+        A JSON object of cache statistics.
+    """
+    return jsonify(recognition_cache.stats()), 200
+
+@app.route("/health", methods=["GET"])
+def health():
+    """
+    Reports the state of the connection pool and circuit breaker for the database service,
+    and the AudD.io pace and remaining quota.
+
+    Returns:
+        A JSON object of client statistics.
+    """
+    return jsonify({"database": database.stats(), "audd": audd_limiter.stats()}), 200
+
+def recognise_fragment(encoded_track_fragment: str):
+    """
+    Recognises the fragment's title and looks the track up in the database.
+
+    Returns:
+        tuple: (HTTP status code, JSON response body as bytes, empty on failure).
+    """
+    result = get_track_title(encoded_track_fragment)
 
     if not result.get("success"):
         logging.warning(f"API error: {result.get('error_message')}")
-        return "", result.get("error_code")
-    
+        return result.get("error_code"), b""
+
     title = result.get("title")
 
-    response = requests.get(f"{DATABASE_URL}/db/tracks/search", params={"title": title})
-    if response.status_code == 200:
+    try:
+        reply = database.search_track(title)
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Database service unavailable: {e}")
+        return 503, b""
+
+    if reply.status == 200:
         logging.info("Track found in database")
-        return jsonify(response.json()), 200
-    elif response.status_code == 404:
+        return 200, reply.body
+    elif reply.status == 404:
         logging.info("Track not found in database")
-        return "", 404
+        return 404, b""
     else:
         logging.warning("Unexpected error from database service")
-        return "", response.status_code
+        return reply.status, b""
+
+def get_track_title(encoded_track_fragment: str):
+    """
+    Recognises the track title using the configured backend.
+
+    Returns:
+        dict: Same shape as get_track_title_from_api.
+    """
+    if RECOGNITION_BACKEND == "local":
+        return get_track_title_from_fingerprints(encoded_track_fragment)
+    return get_track_title_from_api(encoded_track_fragment)
+
+def get_track_title_from_fingerprints(encoded_track_fragment: str):
+    """
+    Recognises the track title offline by matching the fragment's landmark hashes against the
+    fingerprint index held by the database service.
+
+    Returns:
+        dict: On success, returns {"success": True, "title": <track title>}.
+              On failure, returns {"success": False, "error_code": <HTTP code>, "error_message": <description>}.
+    """
+    try:
+        with span("fingerprint_fragment"):
+            hashes = fingerprint_wav(base64.b64decode(encoded_track_fragment, validate=True))
+    except (binascii.Error, ValueError) as e:
+        return {"success": False, "error_code": 400, "error_message": f"Fragment could not be decoded: {str(e)}"}
+
+    if not hashes:
+        return {"success": False, "error_code": 422, "error_message": "Fingerprinting error"}
+
+    try:
+        reply = database.match_fingerprints(hashes)
+    except requests.exceptions.RequestException as e:
+        return {"success": False, "error_code": 503, "error_message": f"Database service unavailable: {str(e)}"}
+
+    if reply.status == 200:
+        return {"success": True, "title": reply.body["title"]}
+    elif reply.status == 404:
+        return {"success": False, "error_code": 404, "error_message": "Track not recognised"}
+    return {"success": False, "error_code": reply.status, "error_message": "Fingerprint lookup failed"}
 
 def get_track_title_from_api(encoded_track_fragment: str):
     """
     Calls the external AudD.io API to recognize the track title.
 
+    WAV fragments are first shrunk to compact mono audio (see fragment_preprocessor.py). The
+    call waits its turn under audd_limiter.
+
     Returns:
         dict: On success, returns {"success": True, "title": <track title>}.
               On failure, returns {"success": False, "error_code": <HTTP code>, "error_message": <description>}.
+
+    Raises:
+        AuddThrottled: If the rate, quota or backoff leave no turn within the deadline.
     """
-    url = "https://api.audd.io/"
-    data = {
-        "api_token": AUDDIO_TOKEN,
-        "audio": encoded_track_fragment,
-        "return": "title",
-    }
-    
+    if PREPROCESS_FRAGMENTS:
+        with span("preprocess_fragment"):
+            encoded_track_fragment, stats = preprocess_encoded_fragment(encoded_track_fragment)
+        if stats:
+            logging.info(f"Preprocessed fragment from {stats['original_bytes']} to {stats['processed_bytes']} bytes "
+                         f"in {stats['seconds'] * 1000:.1f} ms")
+
+    audd_limiter.acquire()
     try:
-        response = requests.post(url, data=data)
+        started = time.perf_counter()
+        with time_outbound("audd", "POST", size=len(encoded_track_fragment)) as call:
+            response = requests.post(AUDDIO_API_URL, data=audd_request_data(AUDDIO_TOKEN, encoded_track_fragment),
+                                     headers=trace_headers())
+            call["outcome"] = response.status_code
         response.raise_for_status()
-        result = response.json()
-
-        if result.get("status") == "success" and result.get("result"):
-            return {"success": True, "title": result["result"]["title"]}
-        elif result.get("status") == "error":
-            error_info = result.get("error", {})
-            error_code = error_info.get("error_code", "#100")
-            error_message = error_info.get("error_message", "An unknown error occurred.")
-            error_mapping = {
-                902: 401,  # API limit reached 
-                901: 401,  # No api_token passed
-                900: 401,  # Wrong API token.
-                600: 400,  # Incorrect audio URL.
-                700: 400,  # No file sent for recognition.
-                500: 422,  # Incorrect audio file.
-                400: 413,  # Too big audio file.
-                300: 422,  # Fingerprinting error.
-                100: 500   # Unknown error.
-            }
-            http_status = error_mapping.get(error_code, 500)
-            logging.warning(error_message)
-            return {"success": False, "error_code": http_status, "error_message": "AUDD.io API Error"}
+        logging.info(f"AudD.io answered in {(time.perf_counter() - started) * 1000:.1f} ms for a {len(encoded_track_fragment)} character fragment")
+        result = interpret_audd_result(response.json())
     except requests.exceptions.RequestException as e:
+        # Only outages count against AudD.io, not the 4xx answers to this fragment
+        if getattr(e, "response", None) is None or e.response.status_code >= 500:
+            audd_limiter.record_failure()
         return {"success": False, "error_code": 500, "error_message": f"External API request failed: {str(e)}"}
-    
-    # Fallback error:
-    return {"success": False, "error_code": 500, "error_message": "Track not recognised"}
+    return audd_limiter.record_result(result)
 
 if __name__ == "__main__":
     app.run(host="localhost", port=3001, debug=True)
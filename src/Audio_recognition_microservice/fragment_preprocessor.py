@@ -0,0 +1,159 @@
+"""
+Shrinks audio fragments before they are sent to AudD.io.
+
+Clients tend to send full-rate (often stereo) WAV recordings, which are far larger than
+recognition needs, so uploading them dominates recognition latency. Each fragment is
+mixed down to mono, resampled, trimmed of leading silence, capped in length and
+re-encoded as 16-bit PCM.
+
+Run this module directly to report the size and latency reduction on a folder of fragments:
+    python src/Audio_recognition_microservice/fragment_preprocessor.py Music/Fragments
+"""
+import argparse
+import base64
+import binascii
+import glob
+import logging
+import os
+import sys
+import time
+import numpy as np
+import requests
+from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "Shared"))
+from wav_utils import read_wav, resample, to_mono, write_wav
+from audd_client import AUDDIO_API_URL, audd_request_data, interpret_audd_result
+
+# Whether fragments are preprocessed before recognition
+PREPROCESS_FRAGMENTS = os.getenv("PREPROCESS_FRAGMENTS", "true").lower() != "false"
+
+# Sample rate fragments are resampled to (16 kHz keeps everything recognition relies on)
+PREPROCESS_SAMPLE_RATE = int(os.getenv("PREPROCESS_SAMPLE_RATE", "16000"))
+
+# Longest fragment sent, in seconds, after leading silence is trimmed
+PREPROCESS_MAX_SECONDS = float(os.getenv("PREPROCESS_MAX_SECONDS", "15"))
+
+# Level (dB relative to full scale) below which leading audio counts as silence
+PREPROCESS_SILENCE_DB = float(os.getenv("PREPROCESS_SILENCE_DB", "-45"))
+
+# Length of the frames silence is measured over, in seconds
+SILENCE_FRAME_SECONDS = 0.01
+
+def trim_leading_silence(samples, sample_rate, threshold_db=PREPROCESS_SILENCE_DB):
+    """
+    Drops the quiet start of a mono signal.
+
+    The signal is cut at the first 10 ms frame whose RMS level reaches threshold_db. A signal
+    that is silent throughout is returned unchanged.
+    """
+    frame = max(1, int(sample_rate * SILENCE_FRAME_SECONDS))
+    frames = len(samples) // frame
+    if frames == 0:
+        return samples
+
+    rms = np.sqrt(np.mean(np.square(samples[:frames * frame].reshape(frames, frame), dtype=np.float32), axis=1))
+    loud = np.flatnonzero(rms >= 10 ** (threshold_db / 20))
+    if len(loud) == 0:
+        return samples
+    return samples[loud[0] * frame:]
+
+def preprocess_fragment(audio, sample_rate=PREPROCESS_SAMPLE_RATE, max_seconds=PREPROCESS_MAX_SECONDS,
+                        silence_db=PREPROCESS_SILENCE_DB):
+    """
+    Converts WAV bytes into a compact mono 16-bit WAV for recognition.
+
+    Raises:
+        WavFormatError: If the audio is not a PCM WAV file.
+    """
+    samples, rate = read_wav(audio)
+    samples = to_mono(samples)
+    samples = resample(samples, rate, min(rate, sample_rate))
+    rate = min(rate, sample_rate)
+    samples = trim_leading_silence(samples, rate, silence_db)
+    samples = samples[:int(max_seconds * rate)]
+    return write_wav(samples, rate)
+
+def preprocess_encoded_fragment(encoded_track_fragment):
+    """
+    Preprocesses a base64 fragment for AudD.io.
+
+    Fragments that are not PCM WAV (AudD also accepts compressed formats), or that would not
+    get smaller, are passed on untouched.
+
+    Returns:
+        tuple: (base64 fragment to send, stats dict with original_bytes, processed_bytes and seconds).
+    """
+    started = time.perf_counter()
+    try:
+        audio = base64.b64decode(encoded_track_fragment, validate=True)
+        processed = preprocess_fragment(audio)
+    except (binascii.Error, ValueError) as e:  # WavFormatError is a ValueError
+        logging.info(f"Fragment sent unprocessed: {e}")
+        return encoded_track_fragment, None
+
+    stats = {"original_bytes": len(audio), "processed_bytes": len(processed), "seconds": time.perf_counter() - started}
+    if len(processed) >= len(audio):
+        stats["processed_bytes"] = len(audio)
+        return encoded_track_fragment, stats
+    return base64.b64encode(processed).decode("ascii"), stats
+
+def timed_recognition(api_url, token, encoded_track_fragment):
+    """Sends one fragment to AudD.io, returning (title or error, seconds taken)."""
+    started = time.perf_counter()
+    response = requests.post(api_url, data=audd_request_data(token, encoded_track_fragment), timeout=60)
+    elapsed = time.perf_counter() - started
+    result = interpret_audd_result(response.json())
+    return result.get("title") or result.get("error_message"), elapsed
+
+def report(directory, api_url=None, token=None):
+    """
+    Preprocesses every .wav fragment in directory and prints the size (and, given an AudD.io
+    token, the recognition latency) before and after.
+
+    Returns:
+        list: One dict per fragment with the measured values.
+    """
+    rows = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.wav"))):
+        with open(path, "rb") as fragment_file:
+            original = base64.b64encode(fragment_file.read()).decode("ascii")
+        processed, stats = preprocess_encoded_fragment(original)
+        row = {
+            "fragment": os.path.basename(path),
+            "original_bytes": stats["original_bytes"] if stats else len(original) * 3 // 4,
+            "processed_bytes": stats["processed_bytes"] if stats else len(original) * 3 // 4,
+            "preprocess_ms": round(stats["seconds"] * 1000, 1) if stats else None,
+        }
+        if token:
+            row["original_title"], original_seconds = timed_recognition(api_url, token, original)
+            row["processed_title"], processed_seconds = timed_recognition(api_url, token, processed)
+            row["original_recognition_ms"] = round(original_seconds * 1000, 1)
+            row["processed_recognition_ms"] = round(processed_seconds * 1000, 1)
+        rows.append(row)
+
+    for row in rows:
+        reduction = 100 * (1 - row["processed_bytes"] / row["original_bytes"]) if row["original_bytes"] else 0
+        line = (f"{row['fragment']:<50} {row['original_bytes']:>9} B -> {row['processed_bytes']:>9} B "
+                f"({reduction:5.1f}% smaller, {row['preprocess_ms']} ms)")
+        if token:
+            line += (f"  recognition {row['original_recognition_ms']} ms -> {row['processed_recognition_ms']} ms"
+                     f"  [{row['original_title']} / {row['processed_title']}]")
+        print(line)
+
+    total_original = sum(row["original_bytes"] for row in rows)
+    total_processed = sum(row["processed_bytes"] for row in rows)
+    if total_original:
+        print(f"Total: {total_original} B -> {total_processed} B ({100 * (1 - total_processed / total_original):.1f}% smaller)")
+    return rows
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Report the payload and latency reduction from fragment preprocessing.")
+    parser.add_argument("directory", help="Folder of .wav fragments")
+    parser.add_argument("--recognise", action="store_true", help="Also time AudD.io recognition of each version (needs AUDDIO_TOKEN)")
+    args = parser.parse_args()
+
+    token = os.getenv("AUDDIO_TOKEN") if args.recognise else None
+    if args.recognise and not token:
+        parser.error("AUDDIO_TOKEN is not set in the environment or .env file!")
+    report(args.directory, AUDDIO_API_URL, token)
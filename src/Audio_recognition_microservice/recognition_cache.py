@@ -0,0 +1,202 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Outcomes that are a property of the fragment itself and safe to remember for a while.
+# Anything else (401 for AudD 900/901 token errors, 429 for the 902 limit, which raises AuddThrottled,
+# 5xx, upstream failures) is never cached.
+POSITIVE_STATUSES = {200}
+NEGATIVE_STATUSES = {400, 404, 413, 422}
+
+class RecognitionCache:
+    """
+    Bounded LRU cache of recognition outcomes keyed by a digest of the decoded fragment bytes.
+
+    Entries are evicted least recently used first once either max_entries or max_bytes is
+    exceeded, and expire after positive_ttl (successful recognitions) or negative_ttl
+    (deterministic failures) seconds. Concurrent lookups of the same key are coalesced so
+    only one upstream recognition is in flight per fragment.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, positive_ttl=300, negative_ttl=30, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+
+        self._entries = OrderedDict()  # key -> (expires_at, status, body)
+        self._in_flight = {}           # key -> Future (or asyncio Task) shared by coalesced callers
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expirations": 0, "uncacheable": 0}
+
+    @staticmethod
+    def key_for(encoded_track_fragment):
+        """Returns the cache key for a base64 fragment, or None if it is not valid base64."""
+        try:
+            decoded = base64.b64decode(encoded_track_fragment, validate=True)
+        except (binascii.Error, ValueError):
+            return None
+        return hashlib.sha256(decoded).hexdigest()
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached (status, body) for key, computing it with compute() on a miss.
+
+        compute must return a (status code, response body bytes) tuple.
+        """
+        if key is None:
+            return compute()
+
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self._counters["hits"] += 1
+                return entry
+
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._counters["coalesced"] += 1
+                leader = False
+            else:
+                self._counters["misses"] += 1
+                future = Future()
+                self._in_flight[key] = future
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            status, body = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._in_flight[key]
+            self._store(key, status, body)
+        future.set_result((status, body))
+        return status, body
+
+    async def get_or_compute_async(self, key, compute):
+        """
+        Async counterpart of get_or_compute for use on an event loop.
+
+        compute must be a coroutine function returning a (status code, response body bytes) tuple.
+        The leader runs it in a task of its own, which the leader and coalesced callers await
+        through asyncio.shield, so cancelling one caller (e.g. its client disconnected) leaves
+        the others waiting for the result.
+        """
+        if key is None:
+            return await compute()
+
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self._counters["hits"] += 1
+                return entry
+
+            task = self._in_flight.get(key)
+            if task is not None:
+                self._counters["coalesced"] += 1
+            else:
+                self._counters["misses"] += 1
+                task = asyncio.ensure_future(self._compute_and_store(key, compute))
+                # Mark a failure as retrieved in case every caller was cancelled before it ended
+                task.add_done_callback(lambda done: done.cancelled() or done.exception())
+                self._in_flight[key] = task
+
+        return await asyncio.shield(task)
+
+    async def _compute_and_store(self, key, compute):
+        """Runs an async leader's compute, caching its outcome and ending its in-flight entry."""
+        try:
+            status, body = await compute()
+        except BaseException:
+            with self._lock:
+                del self._in_flight[key]
+            raise
+
+        with self._lock:
+            del self._in_flight[key]
+            self._store(key, status, body)
+        return status, body
+
+    def get(self, key):
+        """Returns the cached (status, body) for key, or None on a miss."""
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._lookup(key)
+            self._counters["hits" if entry is not None else "misses"] += 1
+            return entry
+
+    def put(self, key, status, body):
+        """Caches an outcome computed outside get_or_compute (subject to the same status and size rules)."""
+        if key is None:
+            return
+        with self._lock:
+            self._store(key, status, body)
+
+    def stats(self):
+        """Returns the cache counters and current size."""
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), bytes=self._bytes, in_flight=len(self._in_flight),
+                        max_entries=self.max_entries, max_bytes=self.max_bytes)
+
+    def clear(self):
+        """Drops every cached entry (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _lookup(self, key):
+        """Returns a live entry and marks it recently used. Caller must hold the lock."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, status, body = entry
+        if expires_at <= self.clock():
+            self._remove(key)
+            self._counters["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return status, body
+
+    def _store(self, key, status, body):
+        """Caches an outcome if its status allows it, then evicts down to the bounds. Caller must hold the lock."""
+        if status in POSITIVE_STATUSES:
+            ttl = self.positive_ttl
+        elif status in NEGATIVE_STATUSES:
+            ttl = self.negative_ttl
+        else:
+            self._counters["uncacheable"] += 1
+            return
+
+        size = len(body)
+        if ttl <= 0 or size > self.max_bytes:
+            self._counters["uncacheable"] += 1
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (self.clock() + ttl, status, body)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._counters["evictions"] += 1
+
+    def _remove(self, key):
+        _, _, body = self._entries.pop(key)
+        self._bytes -= len(body)
@@ -1,25 +1,54 @@
 import requests
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+import itertools
 import logging
 import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "Shared"))
+from service_client import ServiceClient
+from database_transport import HttpDatabaseTransport
+from instrumentation import instrument_app
+from tracing import LOG_FORMAT, trace_app
+from wav_utils import HEADER_PREFIX_BYTES, WavFormatError, check_wav_header, parse_wav_header, validate_encoded_wav
 
 # Define log directory within the microservice folder
 log_dir = os.path.join(os.path.dirname(__file__))
 
 # Configure logging
-logging.basicConfig(filename=os.path.join(log_dir, "catalogue.log"), level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logging.basicConfig(filename=os.path.join(log_dir, "catalogue.log"), level=logging.INFO, format=LOG_FORMAT)
 
 app = Flask(__name__)
+instrument_app(app, "catalogue")
+trace_app(app, "catalogue")
 DATABASE_MANAGEMENT_MICROSERVICE_URL = "http://localhost:3002"
 
+# Shared keep-alive client for the database service (timeouts, retries and circuit breaker)
+database_client = ServiceClient.from_env(DATABASE_MANAGEMENT_MICROSERVICE_URL, "DATABASE")
+
+# The database service's operations, over HTTP (the composed deployment swaps in an in-process transport)
+database = HttpDatabaseTransport(database_client)
+
+# Raw uploads are forwarded to the database service in chunks of this many bytes
+UPLOAD_CHUNK_SIZE = 64 * 1024
+WAV_CONTENT_TYPES = {"audio/wav", "audio/x-wav", "audio/wave", "audio/vnd.wave", "application/octet-stream"}
+
+# Headers relayed by the audio proxy in each direction
+AUDIO_REQUEST_HEADERS = ("Range", "If-Range", "If-None-Match", "If-Modified-Since")
+AUDIO_RESPONSE_HEADERS = ("Content-Type", "Content-Length", "Content-Range", "Content-Disposition", "Accept-Ranges",
+                          "ETag", "Last-Modified", "Cache-Control")
+
 # Add a new track
 @app.route("/tracks", methods=["POST"])
 def add_track():
     """
-    Adds a new track to the database.
+    Queues a new track to be added to the database.
+
+    The track is validated here, then handed to the database service's ingestion queue, so
+    the response does not wait for it to be processed and committed. Poll the job's URL (the
+    Location header) for the outcome.
 
     Returns:
-        A JSON response with the track addition status.
+        A JSON response with the queued job.
     """
 
     if not request.is_json:
@@ -31,10 +60,122 @@ def add_track():
         logging.warning("Missing required fields")
         return "", 400
 
-    #ADD CHECK FOR ENDCODED TRACK DECODING INTO A .WAV
-    
-    response = requests.post(f"{DATABASE_MANAGEMENT_MICROSERVICE_URL}/db/tracks", json=data)
-    return "", response.status_code
+    if not isinstance(data["encoded_track"], str):
+        logging.warning("encoded_track is not a string")
+        return "", 400
+
+    try:
+        validate_encoded_wav(data["encoded_track"])
+    except WavFormatError as e:
+        logging.warning(f"Rejected malformed track: {e}")
+        return jsonify({"error": str(e)}), 422
+
+    try:
+        reply = database.submit_track(data)
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Database service unavailable: {e}")
+        return "", 503
+    if reply.status != 202:
+        return "", reply.status
+    return jsonify(reply.body), 202, {"Location": f"/tracks/jobs/{reply.body['job_id']}"}
+
+# Check on a queued track
+@app.route("/tracks/jobs/<string:job_id>", methods=["GET"])
+def get_job(job_id: str):
+    """
+    Reports the status of a track queued by POST /tracks: queued, running, done or failed.
+
+    Returns:
+        A JSON response with the job, or 404 if it is unknown or has expired.
+    """
+    try:
+        reply = database.ingestion_job(job_id)
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Database service unavailable: {e}")
+        return "", 503
+    if reply.status != 200:
+        return "", reply.status
+    return jsonify(reply.body), 200
+
+# Add a track from raw WAV bytes
+@app.route("/tracks/upload", methods=["POST"])
+def upload_track():
+    """
+    Adds a new track from raw WAV bytes, streamed through to the database service.
+
+    Accepts either the file itself as the request body (audio/wav or application/octet-stream,
+    titled by the title query parameter) or a multipart/form-data upload with a "track" file
+    part (titled by the title form field, or else the file name). The audio is forwarded in
+    fixed-size chunks and never held in memory whole or base64 encoded.
+
+    Returns:
+        A JSON response with the track addition status.
+    """
+    if request.mimetype == "multipart/form-data":
+        upload = request.files.get("track")
+        if upload is None:
+            logging.warning("Missing track file part")
+            return "", 400
+        title = request.form.get("title") or os.path.splitext(os.path.basename(upload.filename or ""))[0]
+        source = upload.stream
+        # Form files are spooled to disk by the time the route runs, so their size is known
+        size = source.seek(0, os.SEEK_END)
+        source.seek(0)
+    elif request.mimetype in WAV_CONTENT_TYPES:
+        title = request.args.get("title")
+        source = request.stream
+        size = request.content_length  # None for a chunked body
+    else:
+        logging.warning("Unsupported upload content type")
+        return "", 415
+
+    if not title:
+        logging.warning("Missing title")
+        return "", 400
+
+    # Check the header before anything is sent on, then forward it ahead of the rest of the body
+    prefix = source.read(HEADER_PREFIX_BYTES)
+    if len(prefix) < HEADER_PREFIX_BYTES:
+        size = len(prefix)
+    try:
+        header = parse_wav_header(prefix, total_size=size)
+        # Without the total size (a chunked body), the database service catches truncation once it has staged the body
+        if size is not None:
+            check_wav_header(header)
+    except WavFormatError as e:
+        logging.warning(f"Rejected malformed track: {e}")
+        return jsonify({"error": str(e)}), 422
+
+    chunks = itertools.chain([prefix], iter(lambda: source.read(UPLOAD_CHUNK_SIZE), b""))
+    try:
+        reply = database.upload_track(title, chunks)
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Database service unavailable: {e}")
+        return "", 503
+    return "", reply.status
+
+# Add many tracks at once
+@app.route("/tracks/batch", methods=["POST"])
+def add_tracks_batch():
+    """
+    Adds a batch of tracks to the database in one transaction.
+
+    Expects a JSON body of the form {"tracks": [{"title": ..., "encoded_track": ...}, ...]}.
+
+    Returns:
+        The database service's per-item results (created / conflict / invalid).
+    """
+    if not request.is_json:
+        logging.warning("No json content type")
+        return "", 415
+
+    # Forward the body as received rather than parsing and re-serialising every track
+    try:
+        reply = database.add_tracks(request.get_data())
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Database service unavailable: {e}")
+        return "", 503
+    return Response(reply.body, status=reply.status, mimetype="application/json")
 
 # Delete a track
 @app.route("/tracks/<string:title>", methods=["DELETE"])
@@ -50,8 +191,12 @@ def delete_track(title: str):
         logging.warning("Title provided wasnt a string")
         return "", 415
 
-    response = requests.delete(f"{DATABASE_MANAGEMENT_MICROSERVICE_URL}/db/tracks/{title}")
-    return "", response.status_code
+    try:
+        reply = database.delete_track(title)
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Database service unavailable: {e}")
+        return "", 503
+    return "", reply.status
 
 # Delete with no title to catch error
 @app.route("/tracks/", methods=["DELETE"])
@@ -69,13 +214,72 @@ def delete_without_title():
 @app.route("/tracks", methods=["GET"])
 def get_tracks():
     """
-    Retrieves all tracks from the database.
+    Retrieves one page of track titles from the database.
+
+    Query parameters:
+        after: Cursor from a previous page's X-Next-Cursor header.
+        limit: Page size.
+
+    Returns:
+        A JSON list of {"title": ...} objects, streamed through from the database service, or
+        304 Not Modified if the client's If-None-Match still holds the listing's ETag.
+    """
+    params = {"fields": "title"}
+    for name in ("after", "limit"):
+        if name in request.args:
+            params[name] = request.args[name]
+
+    try:
+        reply = database.list_tracks(params, request.headers.get("If-None-Match"))
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Database service unavailable: {e}")
+        return "", 503
+
+    if reply.status == 304:
+        return "", 304, {"ETag": reply.headers["ETag"]}
+
+    if reply.status != 200:
+        return "", reply.status
+
+    proxied = Response(stream_with_context(reply.body), status=200, mimetype="application/json")
+    proxied.headers.update(reply.headers)
+    return proxied
+
+# Stream a track's audio
+@app.route("/tracks/<string:title>/audio", methods=["GET"])
+def get_track_audio(title: str):
+    """
+    Streams a track's audio as audio/wav, proxied from the database service.
+
+    Range and conditional request headers are passed through, so players can seek (206
+    Partial Content) and revalidate (304 Not Modified) without downloading the whole track.
+
+    Returns:
+        The audio bytes (or the requested range), streamed through in chunks.
+    """
+    headers = {name: request.headers[name] for name in AUDIO_REQUEST_HEADERS if name in request.headers}
+    try:
+        reply = database.track_audio(title, request.method, headers, AUDIO_RESPONSE_HEADERS)
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Database service unavailable: {e}")
+        return "", 503
+
+    if reply.body is None:
+        return "", reply.status
+
+    proxied = Response(stream_with_context(reply.body), status=reply.status)
+    proxied.headers.update(reply.headers)
+    return proxied
+
+@app.route("/health", methods=["GET"])
+def health():
+    """
+    Reports the state of the connection pool and circuit breaker for the database service.
 
     Returns:
-        A JSON list of tracks.
+        A JSON object of client statistics.
     """
-    response = requests.get(f"{DATABASE_MANAGEMENT_MICROSERVICE_URL}/db/tracks")
-    return "", response.status_code
+    return jsonify({"database": database.stats()}), 200
 
 if __name__ == "__main__":
     app.run(host="localhost", port=3000, debug=True)
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""
+Bulk-loads a directory of .wav files into the catalogue.
+
+Files are read and base64 encoded in a process pool while earlier batches are being sent,
+and each batch is committed by the database service in a single transaction.
+
+Usage:
+    python src/Catalogue_management_microservice/track_importer.py Music/Tracks
+"""
+import argparse
+import base64
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import requests
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "Shared"))
+from service_client import ServiceClient
+
+CATALOGUE_URL = "http://localhost:3000"
+
+def find_tracks(directory, extension=".wav"):
+    """Walks a directory and returns every matching file path, sorted."""
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths += [os.path.join(root, name) for name in files if name.lower().endswith(extension)]
+    return sorted(paths)
+
+def encode_track(path):
+    """Reads a file and returns it as a track: its name (without extension) and base64 contents."""
+    with open(path, "rb") as audio_file:
+        encoded_track = base64.b64encode(audio_file.read()).decode("ascii")
+    return {"title": os.path.splitext(os.path.basename(path))[0], "encoded_track": encoded_track}
+
+def encoded_tracks(paths, workers):
+    """
+    Yields encoded tracks in path order, encoding ahead in a process pool.
+
+    At most 2 * workers files are in flight at once so memory stays bounded however many
+    files there are.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for path in paths:
+            pending.append(executor.submit(encode_track, path))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def batches(tracks, batch_size, batch_bytes):
+    """Groups tracks into batches of at most batch_size tracks or roughly batch_bytes of payload."""
+    batch, size = [], 0
+    for track in tracks:
+        batch.append(track)
+        size += len(track["encoded_track"])
+        if len(batch) >= batch_size or size >= batch_bytes:
+            yield batch
+            batch, size = [], 0
+    if batch:
+        yield batch
+
+def import_directory(directory, post_batch, batch_size=50, batch_bytes=64 * 1024 * 1024, workers=None):
+    """
+    Imports every .wav file under directory.
+
+    Args:
+        post_batch: Callable sending a list of tracks and returning the per-item result list.
+
+    Returns:
+        dict: Totals of created / conflict / invalid / failed tracks and the elapsed seconds.
+    """
+    workers = workers or os.cpu_count() or 1
+    totals = {"created": 0, "conflict": 0, "invalid": 0, "failed": 0}
+    started = time.monotonic()
+
+    for batch in batches(encoded_tracks(find_tracks(directory), workers), batch_size, batch_bytes):
+        try:
+            results = post_batch(batch)
+        except Exception as e:
+            logging.warning(f"Batch of {len(batch)} tracks failed: {e}")
+            totals["failed"] += len(batch)
+            continue
+        for result in results:
+            totals[result["status"]] += 1
+            if result["status"] != "created":
+                logging.info(f"{result['title']}: {result['status']}")
+
+    totals["seconds"] = round(time.monotonic() - started, 3)
+    return totals
+
+def http_batch_poster(catalogue_url):
+    """Returns a post_batch callable that sends batches to the catalogue's POST /tracks/batch."""
+    client = ServiceClient(catalogue_url, read_timeout=300, retries=0)
+
+    def post_batch(batch):
+        response = client.post("/tracks/batch", json={"tracks": batch})
+        if response.status_code != 200:
+            raise requests.exceptions.HTTPError(f"Catalogue answered {response.status_code}")
+        return response.json()["results"]
+
+    return post_batch
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import a directory of .wav files into the catalogue.")
+    parser.add_argument("directory", help="Directory to walk for .wav files")
+    parser.add_argument("--url", default=os.getenv("CATALOGUE_URL", CATALOGUE_URL), help="Catalogue service base URL")
+    parser.add_argument("--batch-size", type=int, default=50, help="Maximum tracks per batch")
+    parser.add_argument("--batch-bytes", type=int, default=64 * 1024 * 1024, help="Approximate maximum encoded bytes per batch")
+    parser.add_argument("--workers", type=int, default=None, help="Encoding processes (default: CPU count)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    summary = import_directory(args.directory, http_batch_poster(args.url), args.batch_size, args.batch_bytes, args.workers)
+    print(summary)
@@ -0,0 +1,294 @@
+"""
+Lossless block compression for stored WAV audio.
+
+A file is cut into blocks of about AUDIO_BLOCK_BYTES, each compressed on its own so any byte
+range can be read back by decoding only the blocks that cover it. Blocks of PCM samples are
+predicted per channel (the order 0, 1 or 2 fixed predictor that leaves the smallest residuals),
+the residuals are zigzag encoded and split into byte planes, and the planes are compressed with
+zlib (Huffman coding only, as residuals have few repeats for it to find) or lzma. Everything
+else (the WAV header, trailing chunks, or a file that is not PCM WAV at all) is compressed as
+plain bytes. Each block is decoded again as it is written, and kept
+uncompressed if it does not come back byte for byte or would not get smaller.
+
+Layout: MAGIC, then the blocks, then an index of (original offset, original length, stored
+offset, stored length) per block, then a footer holding the index offset, the block count, the
+original size and MAGIC again.
+
+To report the compression ratio and decode speed on a folder of WAV files, run the module:
+    python src/Database_management_microservice/audio_codec.py Music/Tracks
+"""
+import argparse
+import bisect
+import glob
+import io
+import json
+import lzma
+import os
+import struct
+import sys
+import time
+import zlib
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "Shared"))
+from wav_utils import parse_wav_header, WavFormatError
+
+# Compressor for stored audio: "zlib", "lzma" or "none" (blobs are stored as uploaded)
+AUDIO_CODEC = os.getenv("AUDIO_CODEC", "zlib")
+
+# Bytes of original audio per independently decodable block (a Range read decodes at least one)
+AUDIO_BLOCK_BYTES = int(os.getenv("AUDIO_BLOCK_BYTES", str(64 * 1024)))
+
+# zlib compression level (1 fastest to 9 smallest)
+AUDIO_ZLIB_LEVEL = int(os.getenv("AUDIO_ZLIB_LEVEL", "6"))
+
+MAGIC = b"SHZC"
+FORMAT_VERSION = 1
+INDEX_ENTRY = struct.Struct("<QIQI")
+FOOTER = struct.Struct("<QIQ4s")
+# kind, compressor, prediction order, sample width, residual width, channels
+BLOCK_HEADER = struct.Struct("<BBBBBH")
+
+RAW_BLOCK, PCM_BLOCK = 0, 1
+COMPRESSORS = {"none": 0, "zlib": 1, "lzma": 2}
+RESIDUAL_TYPES = {1: np.uint8, 2: np.uint16, 4: np.uint32, 8: np.uint64}
+
+def is_encoded(prefix):
+    """Checks whether a stored file (given its first bytes) is in this format rather than as uploaded."""
+    return bytes(prefix[:len(MAGIC)]) == MAGIC
+
+def compress(data, compressor, residuals=False):
+    """Compresses a block body, with zlib only Huffman coding residual planes."""
+    if compressor == COMPRESSORS["zlib"]:
+        strategy = zlib.Z_HUFFMAN_ONLY if residuals else zlib.Z_DEFAULT_STRATEGY
+        deflate = zlib.compressobj(AUDIO_ZLIB_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS, 9, strategy)
+        return deflate.compress(data) + deflate.flush()
+    if compressor == COMPRESSORS["lzma"]:
+        return lzma.compress(data, preset=6)
+    return bytes(data)
+
+def decompress(data, compressor):
+    if compressor == COMPRESSORS["zlib"]:
+        return zlib.decompress(data)
+    if compressor == COMPRESSORS["lzma"]:
+        return lzma.decompress(data)
+    return bytes(data)
+
+def samples_from_bytes(data, width):
+    """Reads little-endian PCM samples of width bytes (8-bit ones unsigned) as int64."""
+    if width == 3:
+        triples = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int64)
+        values = triples[:, 0] | (triples[:, 1] << 8) | (triples[:, 2] << 16)
+        return np.where(values & 0x800000, values - (1 << 24), values)
+    dtype = {1: np.uint8, 2: "<i2", 4: "<i4"}[width]
+    return np.frombuffer(data, dtype=dtype).astype(np.int64)
+
+def samples_to_bytes(values, width):
+    """Writes int64 samples back as little-endian PCM of width bytes."""
+    if width == 3:
+        values = values & 0xFFFFFF
+        return np.stack([values & 0xFF, (values >> 8) & 0xFF, values >> 16], axis=1).astype(np.uint8).tobytes()
+    dtype = {1: np.uint8, 2: "<i2", 4: "<i4"}[width]
+    return values.astype(dtype).tobytes()
+
+def encode_pcm(data, channels, width, compressor):
+    """Predicts, zigzag encodes, byte-plane splits and compresses one block of whole PCM frames."""
+    samples = samples_from_bytes(data, width).reshape(-1, channels)
+    # Residuals of the fixed predictors, each channel starting from silence so the block stands alone
+    candidates = [samples]
+    for _ in range(2):
+        candidates.append(np.diff(candidates[-1], axis=0, prepend=0))
+    order = min(range(3), key=lambda index: int(np.abs(candidates[index]).sum()))
+    residuals = candidates[order].T.ravel()
+
+    zigzag = ((residuals << 1) ^ (residuals >> 63)).astype(np.uint64)
+    peak = int(zigzag.max()) if len(zigzag) else 0
+    residual_width = next(size for size in (1, 2, 4, 8) if peak < 1 << (8 * size))
+    planes = zigzag.astype(RESIDUAL_TYPES[residual_width]).view(np.uint8).reshape(-1, residual_width).T
+    body = compress(np.ascontiguousarray(planes).tobytes(), compressor, residuals=True)
+    return BLOCK_HEADER.pack(PCM_BLOCK, compressor, order, width, residual_width, channels) + body
+
+def decode_block(stored):
+    """Decodes one stored block back to its original bytes."""
+    kind, compressor, order, width, residual_width, channels = BLOCK_HEADER.unpack_from(stored)
+    body = decompress(memoryview(stored)[BLOCK_HEADER.size:], compressor)
+    if kind == RAW_BLOCK:
+        return body
+
+    planes = np.frombuffer(body, dtype=np.uint8).reshape(residual_width, -1)
+    zigzag = np.ascontiguousarray(planes.T).view(RESIDUAL_TYPES[residual_width]).ravel().astype(np.uint64)
+    residuals = ((zigzag >> np.uint64(1)).astype(np.int64) ^ -(zigzag & np.uint64(1)).astype(np.int64))
+    samples = residuals.reshape(channels, -1).T
+    for _ in range(order):
+        samples = np.cumsum(samples, axis=0)
+    return samples_to_bytes(samples.ravel(), width)
+
+def encode_block(data, compressor, pcm=None):
+    """
+    Stores one block, as PCM when pcm=(channels, width) is given, checking that it decodes exactly.
+
+    Returns:
+        bytes: The stored block.
+    """
+    if compressor != COMPRESSORS["none"]:
+        try:
+            stored = encode_pcm(data, *pcm, compressor) if pcm else \
+                BLOCK_HEADER.pack(RAW_BLOCK, compressor, 0, 0, 0, 0) + compress(data, compressor)
+            if len(stored) < len(data) and decode_block(stored) == bytes(data):
+                return stored
+        except (ValueError, zlib.error, lzma.LZMAError):
+            pass
+    return BLOCK_HEADER.pack(RAW_BLOCK, COMPRESSORS["none"], 0, 0, 0, 0) + bytes(data)
+
+def plan_blocks(data, block_bytes=AUDIO_BLOCK_BYTES):
+    """
+    Splits a file into (start, end, pcm) blocks: the samples of a PCM WAV in blocks of whole
+    frames, everything else as plain bytes.
+    """
+    size = len(data)
+    try:
+        header = parse_wav_header(data)
+        width = header["bit_depth"] // 8
+        frame = header["channels"] * width
+        if header["data_size"] % frame:
+            raise WavFormatError("Partial frame")
+        regions = [(0, header["data_offset"], None),
+                   (header["data_offset"], header["data_offset"] + header["data_size"], (header["channels"], width)),
+                   (header["data_offset"] + header["data_size"], size, None)]
+    except WavFormatError:
+        regions, frame = [(0, size, None)], 1
+
+    for start, end, pcm in regions:
+        step = max(1, block_bytes // frame) * frame if pcm else block_bytes
+        for block_start in range(start, end, step):
+            yield block_start, min(block_start + step, end), pcm
+
+def encode_chunks(data, codec=AUDIO_CODEC, block_bytes=AUDIO_BLOCK_BYTES):
+    """
+    Yields the encoded form of data (bytes or a memory map) block by block, so only one block's
+    worth of the original is held in memory at a time.
+    """
+    compressor = COMPRESSORS[codec]
+    index = []
+    position = len(MAGIC)
+    yield MAGIC
+    for start, end, pcm in plan_blocks(data, block_bytes):
+        stored = encode_block(data[start:end], compressor, pcm)
+        index.append(INDEX_ENTRY.pack(start, end - start, position, len(stored)))
+        position += len(stored)
+        yield stored
+    yield b"".join(index)
+    yield FOOTER.pack(position, len(index), len(data), MAGIC)
+
+def encode(data, codec=AUDIO_CODEC, block_bytes=AUDIO_BLOCK_BYTES):
+    """Encodes a whole file in memory."""
+    return b"".join(encode_chunks(data, codec, block_bytes))
+
+class EncodedAudio(io.RawIOBase):
+    """
+    Reads an encoded file as the original bytes, decoding only the blocks that are read.
+
+    It is seekable, so a Range request is served by decoding the blocks under the range. The
+    last decoded block is kept, so sequential small reads decode each block once.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        file.seek(-FOOTER.size, os.SEEK_END)
+        index_offset, count, self.size, magic = FOOTER.unpack(file.read(FOOTER.size))
+        if magic != MAGIC:
+            raise ValueError("Not an encoded audio file")
+        file.seek(index_offset)
+        self.entries = list(INDEX_ENTRY.iter_unpack(file.read(INDEX_ENTRY.size * count)))
+        self.starts = [entry[0] for entry in self.entries]
+        self.position = 0
+        self.cached = (None, b"")
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self.position, os.SEEK_END: self.size}[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def block(self, number):
+        """Returns the original bytes of one block, decoding it unless it was the last one read."""
+        if self.cached[0] != number:
+            _, _, stored_offset, stored_length = self.entries[number]
+            self.file.seek(stored_offset)
+            self.cached = (number, decode_block(self.file.read(stored_length)))
+        return self.cached[1]
+
+    def readinto(self, buffer):
+        if self.position >= self.size or len(buffer) == 0:
+            return 0
+        number = bisect.bisect_right(self.starts, self.position) - 1
+        offset = self.position - self.starts[number]
+        chunk = self.block(number)[offset:offset + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self.position += len(chunk)
+        return len(chunk)
+
+    def readall(self):
+        parts = []
+        while self.position < self.size:
+            number = bisect.bisect_right(self.starts, self.position) - 1
+            parts.append(self.block(number)[self.position - self.starts[number]:])
+            self.position += len(parts[-1])
+        return b"".join(parts)
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+def report(paths, codec=AUDIO_CODEC, block_bytes=AUDIO_BLOCK_BYTES):
+    """
+    Encodes each WAV file, checks it decodes exactly, and measures the sizes and decode speed.
+
+    Returns:
+        dict: Per-file and total original and stored bytes, ratio and decode throughput (MB/s).
+    """
+    files = []
+    for path in paths:
+        with open(path, "rb") as audio_file:
+            original = audio_file.read()
+        started = time.perf_counter()
+        encoded = encode(original, codec, block_bytes)
+        encode_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        decoded = EncodedAudio(io.BytesIO(encoded)).readall()
+        decode_seconds = time.perf_counter() - started
+        if decoded != original:
+            raise AssertionError(f"{path} did not decode to the original bytes")
+        files.append({"file": os.path.basename(path), "original_bytes": len(original), "stored_bytes": len(encoded),
+                      "ratio": round(len(original) / len(encoded), 3), "encode_seconds": encode_seconds,
+                      "decode_seconds": decode_seconds})
+
+    original_bytes = sum(entry["original_bytes"] for entry in files)
+    stored_bytes = sum(entry["stored_bytes"] for entry in files)
+    decode_seconds = sum(entry.pop("decode_seconds") for entry in files)
+    encode_seconds = sum(entry.pop("encode_seconds") for entry in files)
+    return {
+        "codec": codec,
+        "block_bytes": block_bytes,
+        "files": files,
+        "original_bytes": original_bytes,
+        "stored_bytes": stored_bytes,
+        "ratio": round(original_bytes / stored_bytes, 3) if stored_bytes else None,
+        "encode_mb_per_second": round(original_bytes / encode_seconds / 1e6, 1) if encode_seconds else None,
+        "decode_mb_per_second": round(original_bytes / decode_seconds / 1e6, 1) if decode_seconds else None,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report lossless compression of the WAV files in a folder.")
+    parser.add_argument("folder", help="Folder of .wav files, e.g. Music/Tracks")
+    parser.add_argument("--codec", choices=[name for name in COMPRESSORS if name != "none"], default="zlib" if AUDIO_CODEC == "none" else AUDIO_CODEC)
+    parser.add_argument("--block-bytes", type=int, default=AUDIO_BLOCK_BYTES)
+    args = parser.parse_args()
+    print(json.dumps(report(sorted(glob.glob(os.path.join(args.folder, "*.wav"))), args.codec, args.block_bytes), indent=2))
@@ -0,0 +1,202 @@
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+from contextlib import contextmanager
+from audio_codec import AUDIO_CODEC, MAGIC, EncodedAudio, encode_chunks, is_encoded
+
+# Streamed uploads are written in chunks of this many bytes
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# A streamed blob written to the temporary directory but not yet moved into the store
+StagedBlob = namedtuple("StagedBlob", ["path", "digest", "size"])
+
+# A stored blob opened for serving: a seekable file of the original bytes, their size and the write time
+BlobFile = namedtuple("BlobFile", ["file", "size", "modified"])
+
+class BlobStore:
+    """
+    Content-addressed store for raw audio payloads.
+
+    Each blob is saved once under its SHA-256 digest in a two-level sharded directory tree
+    (e.g. ab/cd/abcd...). Writes go to a temporary file that is renamed into place, so
+    readers never see a partially written blob.
+
+    Blobs are compressed losslessly with audio_codec unless codec is "none". Blobs stored
+    before compression was turned on are still read as they are.
+    """
+
+    def __init__(self, root, codec=AUDIO_CODEC):
+        self.root = root
+        self.codec = codec
+        self.temp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+    def path_for(self, digest):
+        """Returns the on-disk path of a blob."""
+        return os.path.join(self.root, digest[0:2], digest[2:4], digest)
+
+    def exists(self, digest):
+        """Checks whether a blob is stored."""
+        return os.path.exists(self.path_for(digest))
+
+    def size(self, digest):
+        """Returns the original size in bytes of a stored blob."""
+        blob = self.open_file(digest)
+        blob.file.close()
+        return blob.size
+
+    def put(self, data, digest=None):
+        """Stores a bytes-like payload (if not already present) and returns its digest."""
+        if digest is None:
+            digest = hashlib.sha256(data).hexdigest()
+        if not self.exists(digest):
+            self._write_atomically(digest, self._stored_chunks(data))
+        return digest
+
+    def put_stream(self, chunks):
+        """
+        Stores a payload arriving as an iterable of byte chunks, without holding it in memory.
+
+        Returns:
+            tuple: (digest, size in bytes) of the stored blob.
+        """
+        staged = self.stage(chunks)
+        self.commit(staged)
+        return staged.digest, staged.size
+
+    def stage(self, chunks):
+        """
+        Writes chunks to a temporary file, hashing and counting them as they arrive.
+
+        The blob is invisible to readers until commit() moves it into place; discard() drops it.
+
+        Returns:
+            StagedBlob: The temporary path, digest and size.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        handle, temp_path = tempfile.mkstemp(dir=self.temp_dir)
+        try:
+            with os.fdopen(handle, "wb") as temp_file:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    temp_file.write(chunk)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return StagedBlob(temp_path, digest.hexdigest(), size)
+
+    def commit(self, staged):
+        """Moves a staged blob into the store (or drops it if identical content is already stored)."""
+        if self.exists(staged.digest):
+            self.discard(staged)
+            return
+        with self.open_staged(staged) as data:
+            if self._stores_as_uploaded(data):
+                path = self.path_for(staged.digest)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(staged.path, path)
+                return
+            self._write_atomically(staged.digest, self._stored_chunks(data))
+        self.discard(staged)
+
+    def discard(self, staged):
+        """Removes a staged blob that will not be committed."""
+        try:
+            os.remove(staged.path)
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def open(self, digest):
+        """
+        Reads a stored blob as its original bytes.
+
+        Yields:
+            A seekable, read-only file of the blob (see open_file), closed on exit. A compressed
+            blob only has the blocks that are read decoded, so reading its header, or reading
+            it in pieces, never inflates the whole file.
+        """
+        with self.open_file(digest).file as audio:
+            yield audio
+
+    def open_file(self, digest):
+        """
+        Opens a stored blob as a seekable file of its original bytes, for serving byte ranges.
+
+        A compressed blob only has the blocks that are read decoded. The caller closes the file.
+
+        Returns:
+            BlobFile: The file, the original size and the blob's write time.
+        """
+        blob_file = open(self.path_for(digest), "rb")
+        try:
+            status = os.fstat(blob_file.fileno())
+            if not is_encoded(blob_file.read(len(MAGIC))):
+                blob_file.seek(0)
+                return BlobFile(blob_file, status.st_size, status.st_mtime)
+            audio = EncodedAudio(blob_file)
+            return BlobFile(audio, audio.size, status.st_mtime)
+        except BaseException:
+            blob_file.close()
+            raise
+
+    def open_staged(self, staged):
+        """Memory-maps a staged blob for reading."""
+        return self._map(staged.path)
+
+    @contextmanager
+    def _map(self, path):
+        with open(path, "rb") as blob_file:
+            if os.fstat(blob_file.fileno()).st_size == 0:
+                yield memoryview(b"")
+                return
+            with mmap.mmap(blob_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+    def delete(self, digest):
+        """Removes a blob if it exists."""
+        try:
+            os.remove(self.path_for(digest))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """Removes every stored blob."""
+        for entry in os.listdir(self.root):
+            path = os.path.join(self.root, entry)
+            if entry != "tmp" and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _stores_as_uploaded(self, data):
+        """Checks whether a payload is kept as it is: compression is off and it cannot be mistaken for a compressed blob."""
+        return self.codec == "none" and not is_encoded(data)
+
+    def _stored_chunks(self, data):
+        """Returns the chunks to write for a payload, compressed unless it is kept as it is."""
+        if self._stores_as_uploaded(data):
+            return [data]
+        return encode_chunks(data, self.codec)
+
+    def _write_atomically(self, digest, chunks):
+        """Writes chunks to a temporary file and renames it to the blob's final path."""
+        path = self.path_for(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=self.temp_dir)
+        try:
+            with os.fdopen(handle, "wb") as temp_file:
+                for chunk in chunks:
+                    temp_file.write(chunk)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
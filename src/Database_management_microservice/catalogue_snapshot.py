@@ -0,0 +1,196 @@
+"""
+Exports the catalogue to, and imports it from, a snapshot in newline-delimited JSON.
+
+The first line is a header ({"format": "shamzam-catalogue", "version": 1}). Each following
+line is one track: its title, audio format, fingerprints and base64 audio. The last line
+({"end": true, "tracks": <count>}) marks the snapshot as complete, so a truncated copy is
+detected. Exports are read from a SQLite cursor in title order, and imports are parsed line
+by line and written in batched transactions, so only a few tracks are held in memory however
+large the catalogue is. Fingerprints are carried in the snapshot rather than recomputed.
+
+The database service serves this as GET /db/export and POST /db/import. Run this module
+to do the same offline, e.g. to seed a new node's data directory before it starts.
+
+Usage:
+    python src/Database_management_microservice/catalogue_snapshot.py export catalogue.ndjson
+    python src/Database_management_microservice/catalogue_snapshot.py import catalogue.ndjson --on-conflict replace
+"""
+import argparse
+import base64
+import binascii
+import heapq
+import json
+import logging
+import os
+import sys
+from database_helper import TRACK_COLUMNS, base64_chunks
+from wav_utils import WavFormatError
+from sharded_database import open_database
+from rebalance_shards import copy_tracks, layout_shards
+
+SNAPSHOT_FORMAT = "shamzam-catalogue"
+SNAPSHOT_VERSION = 1
+
+# What an import does with a title that is already stored (see MusicTrackDatabase.insert_described)
+CONFLICT_MODES = ("skip", "replace", "fail")
+
+# Imported tracks are written in one transaction per shard once there are this many, or this much audio
+IMPORT_BATCH_TRACKS = int(os.getenv("IMPORT_BATCH_TRACKS", "500"))
+IMPORT_BATCH_BYTES = int(os.getenv("IMPORT_BATCH_BYTES", str(64 * 1024 * 1024)))
+
+class SnapshotError(ValueError):
+    """Raised when a snapshot being imported is malformed or truncated."""
+
+def export_chunks(db):
+    """
+    Yields the catalogue as snapshot text (str), each track's line in pieces.
+
+    Each shard is read in one transaction, so its tracks and fingerprints are consistent
+    with each other, and the shards are merged in title order. A track's audio is read and
+    base64 encoded a block at a time, so not even one whole track is held in memory.
+    """
+    yield json.dumps({"format": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION, "catalogue": db.catalogue_tag}) + "\n"
+    count = 0
+    for _, pieces in heapq.merge(*(shard_lines(shard) for shard in layout_shards(db)), key=lambda entry: entry[0]):
+        count += 1
+        yield from pieces
+    yield json.dumps({"end": True, "tracks": count}) + "\n"
+
+def export_lines(db):
+    """Yields the catalogue as snapshot lines (str, each ending in a newline)."""
+    line = []
+    for chunk in export_chunks(db):
+        line.append(chunk)
+        if chunk.endswith("\n"):
+            yield "".join(line)
+            line = []
+
+def shard_lines(shard):
+    """Yields (title, pieces of its snapshot line) for every track of one shard, reading one row at a time."""
+    with shard.connection() as connection:
+        # A read transaction: later statements see the same snapshot as the cursor
+        connection.execute("BEGIN")
+        rows = connection.execute(f"SELECT {', '.join(TRACK_COLUMNS)} FROM {shard.table} ORDER BY title")
+        for row in rows:
+            values = dict(zip(TRACK_COLUMNS, row))
+            hashes = connection.execute(
+                f"SELECT hash, offset FROM {shard.table}_fingerprints WHERE title=?", (values["title"],)
+            ).fetchall()
+            try:
+                audio = shard.blob_store.open_file(values["digest"]).file
+            except FileNotFoundError:
+                # Only happens if the track was deleted after the read began
+                logging.warning(f"Audio of {values['title']} is missing; left out of the export")
+                continue
+            yield values["title"], track_line(json.dumps(dict(values, fingerprints=hashes)), audio)
+
+def track_line(fields, audio):
+    """Yields one track's snapshot line in pieces: its JSON fields, then its audio in base64, closing the audio file."""
+    with audio:
+        yield fields[:-1] + ', "encoded_track": "'
+        yield from base64_chunks(audio)
+        yield '"}\n'
+
+def read_snapshot(db, lines):
+    """
+    Parses snapshot lines (str or bytes) into the (row, audio, hashes) tuples insert_described takes.
+
+    The audio is described again, and must match the digest recorded with it. Tracks without
+    fingerprints are fingerprinted.
+
+    Raises:
+        SnapshotError: If the header, a track line or the end marker is missing or malformed.
+    """
+    lines = iter(lines)
+    header = parse_line(next(lines, b""), 1)
+    if header.get("format") != SNAPSHOT_FORMAT or header.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Not a version {SNAPSHOT_VERSION} {SNAPSHOT_FORMAT} snapshot")
+
+    count = 0
+    for number, line in enumerate(lines, start=2):
+        if not line.strip():
+            continue
+        values = parse_line(line, number)
+        if values.get("end") is True:
+            if values.get("tracks") != count:
+                raise SnapshotError(f"Snapshot should hold {values.get('tracks')} tracks but holds {count}")
+            return
+        yield parse_track(db, values, number)
+        count += 1
+    raise SnapshotError(f"Snapshot is truncated after {count} tracks")
+
+def parse_line(line, number):
+    """Decodes one snapshot line into a dict."""
+    try:
+        values = json.loads(line)
+    except ValueError:
+        raise SnapshotError(f"Line {number} is not valid JSON")
+    if not isinstance(values, dict):
+        raise SnapshotError(f"Line {number} is not a JSON object")
+    return values
+
+def parse_track(db, values, number):
+    """Builds the (row, audio, hashes) tuple for one track line."""
+    title = values.get("title")
+    if not isinstance(title, str) or not title or not isinstance(values.get("encoded_track"), str):
+        raise SnapshotError(f"Line {number} is missing title or encoded_track")
+    try:
+        audio = base64.b64decode(values["encoded_track"], validate=True)
+    except binascii.Error:
+        raise SnapshotError(f"Audio of {title} is not valid base64")
+
+    try:
+        row = db.describe_audio(title, audio)
+    except WavFormatError as e:
+        raise SnapshotError(f"Audio of {title} is not a complete PCM WAV file: {e}")
+    if values.get("digest") not in (None, row["digest"]):
+        raise SnapshotError(f"Audio of {title} does not match its digest")
+    if values.get("fingerprints") is None:
+        return row, audio, db.fingerprint(audio)
+    try:
+        hashes = [(int(hash_value), int(offset)) for hash_value, offset in values["fingerprints"]]
+    except (TypeError, ValueError):
+        raise SnapshotError(f"Fingerprints of {title} are malformed")
+    return row, audio, hashes
+
+def import_snapshot(db, lines, on_conflict="skip", summary=None):
+    """
+    Adds every track of a snapshot to db, in batched transactions as the lines are read.
+
+    Tracks in batches already written stay imported if the snapshot turns out to be broken,
+    so an interrupted import can be repeated with on_conflict "skip".
+
+    Returns:
+        dict: How many tracks were created, replaced and skipped (conflict). Counts are added
+              to summary if it is given, so the caller keeps them if the import stops early.
+
+    Raises:
+        SnapshotError: If the snapshot is malformed or truncated.
+        TrackExists: If on_conflict is "fail" and a title is already stored.
+    """
+    if on_conflict not in CONFLICT_MODES:
+        raise ValueError(f"on_conflict must be one of {', '.join(CONFLICT_MODES)}")
+    summary = {} if summary is None else summary
+    for status in ("created", "replaced", "conflict"):
+        summary.setdefault(status, 0)
+    copy_tracks(read_snapshot(layout_shards(db)[0], lines), layout_shards(db), on_conflict=on_conflict, counts=summary,
+                batch_tracks=IMPORT_BATCH_TRACKS, batch_bytes=IMPORT_BATCH_BYTES)
+    return summary
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Export the catalogue to, or import it from, an NDJSON snapshot.")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("path", help="Snapshot file, or - for standard output/input")
+    parser.add_argument("--table", default="tracks", help="Catalogue table name (default tracks)")
+    parser.add_argument("--on-conflict", choices=CONFLICT_MODES, default="skip", help="What to do with titles already stored")
+    args = parser.parse_args()
+
+    db = open_database(args.table)
+    if args.action == "export":
+        with (open(args.path, "w", encoding="utf-8") if args.path != "-" else sys.stdout) as snapshot:
+            snapshot.writelines(export_chunks(db))
+    else:
+        with (open(args.path, "rb") if args.path != "-" else sys.stdin.buffer) as snapshot:
+            print(json.dumps(import_snapshot(db, snapshot, args.on_conflict), indent=2))
+    db.close()
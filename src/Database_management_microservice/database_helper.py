@@ -1,81 +1,928 @@
 import sqlite3
+import base64
+import binascii
+import hashlib
+import logging
 import os
+import queue
+import re
+import sys
+import unicodedata
+import uuid
+from difflib import SequenceMatcher
+from contextlib import contextmanager
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "Shared"))
+from fingerprint import fingerprint_wav, best_match
+from wav_utils import HEADER_PREFIX_BYTES, check_wav_header, parse_wav_header, WavFormatError
+from blob_store import BlobStore
+from track_cache import TrackCache
+from instrumentation import timed_method
+
+# Directory holding the database files and blob stores (overridable, e.g. to benchmark against scratch data)
+DATABASE_DIR = os.getenv("DATABASE_DIR", os.path.join(os.path.dirname(__file__), "..", "..", "data"))
+
+# Bounds of the in-process find_track_by_title cache
+TRACK_CACHE_MAX_ENTRIES = int(os.getenv("TRACK_CACHE_MAX_ENTRIES", "1024"))
+TRACK_CACHE_MAX_BYTES = int(os.getenv("TRACK_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Whether other processes may write the same database files (set by launcher.py when several workers
+# serve the database). The stored catalogue version is then read before each cached lookup and ETag.
+TRACK_CACHE_CHECK_VERSION = os.getenv("TRACK_CACHE_CHECK_VERSION", "0") == "1"
+
+# SQLite's default limit on host parameters per statement is 999
+MAX_QUERY_PARAMETERS = 900
+
+# Listing fields and the tracks table column each one is read from
+TRACK_FIELDS = {
+    "title": "title",
+    "byte_size": "byte_size",
+    "duration": "duration",
+    "channels": "channels",
+    "sample_rate": "sample_rate",
+    "bit_depth": "bit_depth",
+    "encoded_track": "digest",
+}
+DEFAULT_LISTING_FIELDS = ("title", "encoded_track")
+
+# Columns of the tracks table, in insert order
+TRACK_COLUMNS = ("title", "normalised_title", "digest", "byte_size", "duration", "channels", "sample_rate", "bit_depth")
+
+# Pragmas applied to every pooled connection. WAL lets readers run alongside a writer, and
+# NORMAL sync is durable in WAL mode apart from the last transactions on power loss.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",      # 64 MiB page cache per connection
+    "PRAGMA mmap_size=268435456",    # 256 MiB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+# Trailing "(Radio Edit)", "[Remastered 2011]" or " - Live" style qualifiers that recognition services
+# add to or drop from a title. Only qualifiers naming one of these keywords are removed, so
+# "Everybody (Backstreet's Back)" keeps its bracket.
+TITLE_QUALIFIER_KEYWORDS = r"(?:radio|edit|remix|mix|version|remaster(?:ed)?|live|mono|stereo|explicit|clean|acoustic|single|album|extended|feat\.?|ft\.?)"
+TITLE_QUALIFIER_SUFFIXES = (
+    re.compile(rf"\s*[(\[][^()\[\]]*\b{TITLE_QUALIFIER_KEYWORDS}(?![\w])[^()\[\]]*[)\]]\s*$", re.IGNORECASE),
+    re.compile(rf"\s+-\s+[^-]*\b{TITLE_QUALIFIER_KEYWORDS}(?![\w])[^-]*$", re.IGNORECASE),
+)
+
+# Fuzzy title search: FTS5 candidates fetched per result, and the least similarity accepted as a match
+FUZZY_CANDIDATES_PER_RESULT = 5
+FUZZY_MIN_SCORE = 0.8
+
+# Stored audio read and base64 encoded at a time for the JSON API (a multiple of 3, so the pieces join without padding)
+BASE64_READ_BYTES = 3 * 64 * 1024
+
+class TrackExists(Exception):
+    """Raised when a track is written with a title that is already stored and conflicts are not allowed."""
+
+    def __init__(self, title):
+        super().__init__(f"A track titled {title!r} already exists")
+        self.title = title
+
+def searchable_title(title):
+    """
+    Reduces a title to lower-case words for fuzzy matching.
+
+    Accents, qualifier suffixes and punctuation are dropped (apostrophes join their word, so
+    "Don't" becomes "dont") and whitespace is collapsed to single spaces.
+    """
+    title = "".join(c for c in unicodedata.normalize("NFKD", title) if not unicodedata.combining(c))
+    previous = None
+    while previous != title:
+        previous = title
+        for suffix in TITLE_QUALIFIER_SUFFIXES:
+            title = suffix.sub("", title)
+    title = re.sub(r"['\u2019`]", "", title.casefold())
+    return " ".join("".join(c if c.isalnum() else " " for c in title).split())
+
+def normalise_title(title):
+    """Returns the key two titles share when they differ only in case, punctuation, spacing or qualifiers."""
+    return searchable_title(title).replace(" ", "")
+
+def base64_chunks(audio, read_bytes=BASE64_READ_BYTES):
+    """
+    Yields the base64 encoding of a readable file (such as a blob opened by BlobStore.open) piece by piece.
+
+    Reads may come back short (a compressed blob stops at the end of each block), so bytes left
+    over from a read are carried into the next piece and only the last piece is padded.
+    """
+    carry = b""
+    while True:
+        data = audio.read(read_bytes)
+        if not data:
+            break
+        data = carry + data
+        whole = len(data) - len(data) % 3
+        carry = data[whole:]
+        if whole:
+            yield base64.b64encode(data[:whole]).decode("ascii")
+    if carry:
+        yield base64.b64encode(carry).decode("ascii")
+
+def title_trigrams(text):
+    """Returns the distinct three-character substrings of text, in order."""
+    return list(dict.fromkeys(text[i:i + 3] for i in range(len(text) - 2)))
 
 class MusicTrackDatabase:
-    def __init__(self, table="tracks"):
+    def __init__(self, table="tracks", pool_size=8, cache_entries=TRACK_CACHE_MAX_ENTRIES, cache_bytes=TRACK_CACHE_MAX_BYTES,
+                 check_version=TRACK_CACHE_CHECK_VERSION):
         self.table = table
-        self.database_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../data"))
+        self.check_version = check_version
+        self.database_dir = os.path.abspath(DATABASE_DIR)
         self.database_path = os.path.join(self.database_dir, self.table + ".db")
+        self.pool = queue.LifoQueue(maxsize=pool_size)
 
         self.ensure_data_directory()
+        self.blob_store = BlobStore(os.path.join(self.database_dir, self.table + "_blobs"))
+        self.track_cache = TrackCache(max_entries=cache_entries, max_bytes=cache_bytes)
         self.make()
 
+    @property
+    def version(self):
+        """The catalogue version: raised by every committed insert, delete and reset."""
+        return self.track_cache.version
+
+    @property
+    def catalogue_tag(self):
+        """Identifies the catalogue's current contents, for ETags (the epoch tells apart recreated databases)."""
+        self.sync_version()
+        return f"{self.epoch}.{self.version}"
+
+    def sync_version(self):
+        """
+        Catches up with changes committed by other processes, if check_version is set.
+
+        The in-process version and track cache only see this process's writes. When another
+        worker shares the database file, the stored version is read instead, and if it has moved
+        on the whole cache is dropped.
+        """
+        if not self.check_version:
+            return
+        with self.connection() as connection:
+            stored = connection.execute(f"SELECT version FROM {self.table}_version").fetchone()[0]
+        if stored > self.track_cache.version:
+            self.track_cache.invalidate(None, stored)
+
+    def cache_stats(self):
+        """Returns the track cache's counters, with the catalogue epoch and version."""
+        return dict(self.track_cache.stats(), epoch=self.epoch)
+
     def ensure_data_directory(self):
         """Ensure that the /data directory exists."""
         if not os.path.exists(self.database_dir):
             os.makedirs(self.database_dir)
 
+    def open_connection(self):
+        """Opens a new tuned connection to the database file."""
+        # Connections move between Flask worker threads, but the pool lends each to one thread at a time
+        connection = sqlite3.connect(self.database_path, check_same_thread=False, cached_statements=256)
+        for pragma in CONNECTION_PRAGMAS:
+            connection.execute(pragma)
+        return connection
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrows a connection from the pool for the duration of a with block.
+
+        The transaction is committed when the block exits (or rolled back on error) and the
+        connection is returned to the pool, keeping its page cache and prepared statements.
+        """
+        try:
+            connection = self.pool.get_nowait()
+        except queue.Empty:
+            connection = self.open_connection()
+
+        try:
+            with connection:
+                yield connection
+        finally:
+            try:
+                self.pool.put_nowait(connection)
+            except queue.Full:
+                connection.close()
+
+    def close(self):
+        """Closes every idle pooled connection."""
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                return
+
     def make(self):
         """Create the tracks table if it does not exist."""
-        with sqlite3.connect(self.database_path) as connection:
+        with self.connection() as connection:
             cursor = connection.cursor()
+            cursor.execute(f"PRAGMA table_info({self.table})")
+            columns = [column[1] for column in cursor.fetchall()]
+            if "encoded_track" in columns:
+                self.migrate_encoded_tracks(connection)
+            elif columns:
+                if "normalised_title" not in columns:
+                    self.migrate_normalised_titles(connection)
+                if "channels" not in columns:
+                    self.migrate_audio_format(connection)
+
+            self.create_tracks_table(cursor)
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_digest ON {self.table} (digest)")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_normalised_title ON {self.table} (normalised_title)")
+            self.make_title_index(cursor)
             cursor.execute(
                 f"""
-                CREATE TABLE IF NOT EXISTS {self.table} (
-                    title TEXT PRIMARY KEY,
-                    encoded_track TEXT NOT NULL
+                CREATE TABLE IF NOT EXISTS {self.table}_fingerprints (
+                    hash INTEGER NOT NULL,
+                    title TEXT NOT NULL,
+                    offset INTEGER NOT NULL
                 )
                 """
             )
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_fingerprints_hash ON {self.table}_fingerprints (hash)")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_fingerprints_title ON {self.table}_fingerprints (title)")
+            self.make_version(cursor)
             connection.commit()
 
+    def create_tracks_table(self, cursor):
+        """Creates the tracks table (metadata only; the audio itself lives in the blob store)."""
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                title TEXT PRIMARY KEY,
+                normalised_title TEXT,
+                digest TEXT NOT NULL,
+                byte_size INTEGER NOT NULL,
+                duration REAL,
+                channels INTEGER,
+                sample_rate INTEGER,
+                bit_depth INTEGER
+            )
+            """
+        )
+
+    def make_version(self, cursor):
+        """Creates the single-row catalogue version table if needed and loads the stored version."""
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {self.table}_version (epoch TEXT NOT NULL, version INTEGER NOT NULL)")
+        row = cursor.execute(f"SELECT epoch, version FROM {self.table}_version").fetchone()
+        if row is None:
+            row = (uuid.uuid4().hex[:8], 0)
+            cursor.execute(f"INSERT INTO {self.table}_version (epoch, version) VALUES (?, ?)", row)
+        self.epoch = row[0]
+        self.track_cache.invalidate(None, row[1])
+
+    def bump_version(self, cursor):
+        """Raises the stored catalogue version inside the caller's write transaction and returns it."""
+        cursor.execute(f"UPDATE {self.table}_version SET version = version + 1")
+        return cursor.execute(f"SELECT version FROM {self.table}_version").fetchone()[0]
+
+    def make_title_index(self, cursor):
+        """
+        Creates the FTS5 trigram index used for fuzzy title search, filling it from existing tracks.
+
+        Index rows share their track's rowid and hold its searchable_title. If this SQLite build
+        lacks FTS5 or the trigram tokenizer, fuzzy search is disabled and exact/normalised lookups
+        carry on working.
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name=?", (f"{self.table}_titles",))
+        if cursor.fetchone():
+            self.fuzzy_search = True
+            return
+        try:
+            cursor.execute(f"CREATE VIRTUAL TABLE {self.table}_titles USING fts5(search_title, tokenize='trigram')")
+        except sqlite3.OperationalError as e:
+            logging.warning(f"Fuzzy title search unavailable: {e}")
+            self.fuzzy_search = False
+            return
+        self.fuzzy_search = True
+        rows = cursor.execute(f"SELECT rowid, title FROM {self.table}").fetchall()
+        cursor.executemany(
+            f"INSERT INTO {self.table}_titles (rowid, search_title) VALUES (?, ?)",
+            ((rowid, searchable_title(title)) for rowid, title in rows)
+        )
+
+    def migrate_encoded_tracks(self, connection):
+        """Moves tracks from the old base64 encoded_track column into the blob store."""
+        logging.info("Migrating encoded tracks into the blob store")
+        cursor = connection.cursor()
+        cursor.execute(f"ALTER TABLE {self.table} RENAME TO {self.table}_legacy")
+        self.create_tracks_table(cursor)
+        for title, encoded_track in connection.execute(f"SELECT title, encoded_track FROM {self.table}_legacy"):
+            cursor.execute(
+                f"INSERT INTO {self.table} ({', '.join(TRACK_COLUMNS)}) VALUES ({', '.join(':' + column for column in TRACK_COLUMNS)})",
+                self.store_audio(title, base64.b64decode(encoded_track))
+            )
+        cursor.execute(f"DROP TABLE {self.table}_legacy")
+
+    def migrate_normalised_titles(self, connection):
+        """Adds the normalised_title column to a tracks table created before it existed."""
+        logging.info("Adding normalised titles")
+        cursor = connection.cursor()
+        cursor.execute(f"ALTER TABLE {self.table} ADD COLUMN normalised_title TEXT")
+        titles = [title for title, in cursor.execute(f"SELECT title FROM {self.table}").fetchall()]
+        cursor.executemany(
+            f"UPDATE {self.table} SET normalised_title=? WHERE title=?",
+            ((normalise_title(title), title) for title in titles)
+        )
+
+    def migrate_audio_format(self, connection):
+        """Adds the channels and bit_depth columns to a tracks table created before they existed."""
+        logging.info("Adding audio format columns")
+        cursor = connection.cursor()
+        cursor.execute(f"ALTER TABLE {self.table} ADD COLUMN channels INTEGER")
+        cursor.execute(f"ALTER TABLE {self.table} ADD COLUMN bit_depth INTEGER")
+        for title, digest in cursor.execute(f"SELECT title, digest FROM {self.table}").fetchall():
+            # One read covers the header: a compressed WAV keeps it in a block of its own, so only that block is decoded
+            blob = self.blob_store.open_file(digest)
+            with blob.file as audio:
+                prefix = audio.read(HEADER_PREFIX_BYTES)
+            try:
+                header = parse_wav_header(prefix, total_size=blob.size)
+            except WavFormatError:
+                header = {}
+            connection.execute(
+                f"UPDATE {self.table} SET channels=?, bit_depth=? WHERE title=?",
+                (header.get("channels"), header.get("bit_depth"), title)
+            )
+
+    def store_audio(self, title, audio):
+        """
+        Writes raw audio to the blob store and reads its WAV metadata.
+
+        Returns:
+            dict: The tracks table row (one value per TRACK_COLUMNS entry).
+        """
+        # Kept as it was stored, even if it predates the WAV checks
+        row = self.describe_audio(title, audio, validate=False)
+        self.blob_store.put(audio, digest=row["digest"])
+        return row
+
+    def describe_audio(self, title, audio, digest=None, validate=True):
+        """
+        Computes the tracks table row for raw audio (bytes or a memory map) without storing it.
+
+        Raises:
+            WavFormatError: If validate is set and the audio is not a complete PCM WAV file.
+                            Otherwise the format columns of such audio are left empty.
+        """
+        try:
+            header = parse_wav_header(audio)
+            if validate:
+                check_wav_header(header)
+        except WavFormatError:
+            if validate:
+                raise
+            header = {}
+        return {
+            "title": title,
+            "normalised_title": normalise_title(title),
+            "digest": digest or hashlib.sha256(audio).hexdigest(),
+            "byte_size": len(audio),
+            "duration": header.get("duration"),
+            "channels": header.get("channels"),
+            "sample_rate": header.get("sample_rate"),
+            "bit_depth": header.get("bit_depth"),
+        }
+
+    @timed_method
     def insert(self, js):
-        """Insert a new track into the database if the title is not already present."""
-        with sqlite3.connect(self.database_path) as connection:
+        """
+        Insert a new track into the database if the title is not already present.
+
+        The base64 payload is decoded once and the raw audio is kept in the blob store;
+        only its metadata goes into the tracks table.
+
+        Raises:
+            ValueError: If encoded_track is not valid base64, or (as WavFormatError) not a
+                        complete PCM WAV file.
+        """
+        try:
+            audio = base64.b64decode(js["encoded_track"], validate=True)
+        except binascii.Error as e:
+            raise ValueError(f"encoded_track is not valid base64: {e}")
+
+        row = self.describe_audio(js["title"], audio)
+        # Fingerprint before taking the write lock so other writers are not held up
+        hashes = self.fingerprint(audio)
+        with self.connection() as connection:
             cursor = connection.cursor()
-            
-            # Check if the title already exists
-            cursor.execute(f"SELECT 1 FROM {self.table} WHERE title = ?", (js["title"],))
-            if cursor.fetchone():  # If a row is found, the title exists
+            # Take the write lock up front so the blob cannot be garbage collected by a concurrent delete
+            cursor.execute("BEGIN IMMEDIATE")
+
+            track_id = self.insert_prepared(cursor, row, hashes, lambda: self.blob_store.put(audio, digest=row["digest"]))
+            if track_id is None:  # The title already exists
                 return 409  # Conflict
-            
-            # Insert the new track
+            version = self.bump_version(cursor)
+
+        # Only once committed, so a concurrent reader cannot cache the track's absence again
+        self.track_cache.invalidate([row["title"]], version)
+        return track_id
+
+    @timed_method
+    def insert_stream(self, title, chunks):
+        """
+        Insert a new track whose raw audio arrives as an iterable of byte chunks.
+
+        The audio is written to a staging file as it arrives, so it is never held in memory
+        whole. It is described and fingerprinted from a memory map of that file, and only moved
+        into the blob store once its row is inserted.
+
+        Raises:
+            ValueError: If no audio was sent, or (as WavFormatError) it is not a complete PCM
+                        WAV file. Either way nothing is moved into the blob store.
+        """
+        staged = self.blob_store.stage(chunks)
+        try:
+            if staged.size == 0:
+                raise ValueError("Uploaded track is empty")
+
+            with self.blob_store.open_staged(staged) as audio:
+                row = self.describe_audio(title, audio, digest=staged.digest)
+                hashes = self.fingerprint(audio)
+
+            with self.connection() as connection:
+                cursor = connection.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                track_id = self.insert_prepared(cursor, row, hashes, lambda: self.blob_store.commit(staged))
+                if track_id is not None:
+                    version = self.bump_version(cursor)
+        finally:
+            # Nothing to do once committed; otherwise drops the staging file
+            self.blob_store.discard(staged)
+
+        if track_id is None:  # The title already exists
+            return 409  # Conflict
+        self.track_cache.invalidate([title], version)
+        return track_id
+
+    @timed_method
+    def insert_many(self, tracks):
+        """
+        Inserts a batch of tracks in a single transaction.
+
+        Each item is decoded, checked to be a complete PCM WAV file and fingerprinted before the
+        write lock is taken, then every valid item is inserted and committed together.
+
+        Returns:
+            list: One {"title", "status"} dict per item, where status is "created", "conflict" or
+                  "invalid" (invalid items also carry an "error" message).
+        """
+        results = []
+        prepared = []
+        for js in tracks:
+            title = js.get("title") if isinstance(js, dict) else None
+            if not isinstance(title, str) or not title or not isinstance(js.get("encoded_track"), str):
+                results.append({"title": title, "status": "invalid", "error": "Missing required fields"})
+                continue
+            try:
+                audio = base64.b64decode(js["encoded_track"], validate=True)
+            except binascii.Error:
+                results.append({"title": title, "status": "invalid", "error": "encoded_track is not valid base64"})
+                continue
+            try:
+                row = self.describe_audio(title, audio)
+            except WavFormatError as e:
+                results.append({"title": title, "status": "invalid", "error": str(e)})
+                continue
+            results.append({"title": title, "status": None})
+            prepared.append((row, audio, self.fingerprint(audio)))
+
+        statuses = self.insert_described(prepared)
+        pending = [result for result in results if result["status"] is None]
+        for result, status in zip(pending, statuses):
+            result["status"] = status
+        return results
+
+    def insert_described(self, tracks, on_conflict="skip"):
+        """
+        Inserts already described and fingerprinted tracks in a single transaction.
+
+        Each item is a (row, audio, hashes) tuple as built by describe_audio and fingerprint,
+        so callers that already hold them (such as the shard rebalancer) skip that work.
+        on_conflict says what happens to a title that already exists: "skip" leaves the stored
+        track, "replace" deletes it first, and "fail" inserts nothing from the batch.
+
+        Returns:
+            list: "created", "replaced" or "conflict" (skipped) for each item.
+
+        Raises:
+            TrackExists: If on_conflict is "fail" and a title already exists or is repeated in the batch.
+        """
+        statuses = []
+        unlinked = set()
+        with self.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            if on_conflict == "fail":
+                self.check_new_titles(cursor, [row["title"] for row, _, _ in tracks])
+            for row, audio, hashes in tracks:
+                save_audio = lambda audio=audio, digest=row["digest"]: self.blob_store.put(audio, digest=digest)
+                status = "created"
+                if self.insert_prepared(cursor, row, hashes, save_audio) is None:
+                    status = "conflict"
+                    if on_conflict == "replace":
+                        self.delete_prepared(cursor, row["title"], unlinked)
+                        self.insert_prepared(cursor, row, hashes, save_audio)
+                        status = "replaced"
+                statuses.append(status)
+            changed_titles = [row["title"] for (row, _, _), status in zip(tracks, statuses) if status != "conflict"]
+            if changed_titles:
+                version = self.bump_version(cursor)
+
+        self.drop_unreferenced_blobs(unlinked)
+        if changed_titles:
+            self.track_cache.invalidate(changed_titles, version)
+        return statuses
+
+    def check_new_titles(self, cursor, titles):
+        """Raises TrackExists for the first of titles that is already stored or repeated."""
+        seen = set()
+        for title in titles:
+            if title in seen:
+                raise TrackExists(title)
+            seen.add(title)
+        for start in range(0, len(titles), MAX_QUERY_PARAMETERS):
+            chunk = titles[start:start + MAX_QUERY_PARAMETERS]
+            cursor.execute(f"SELECT title FROM {self.table} WHERE title IN ({','.join('?' * len(chunk))}) LIMIT 1", chunk)
+            existing = cursor.fetchone()
+            if existing:
+                raise TrackExists(existing[0])
+
+    def insert_prepared(self, cursor, row, hashes, save_audio):
+        """
+        Inserts one described track inside the caller's write transaction.
+
+        save_audio is called to put the audio in the blob store once the row is known to be new.
+
+        Returns:
+            int: The new row id, or None if the title already exists.
+        """
+        # A single round-trip both checks for and inserts the title
+        cursor.execute(
+            f"INSERT INTO {self.table} ({', '.join(TRACK_COLUMNS)}) VALUES ({', '.join(':' + column for column in TRACK_COLUMNS)}) "
+            "ON CONFLICT (title) DO NOTHING",
+            row
+        )
+        if cursor.rowcount == 0:
+            return None
+
+        track_id = cursor.lastrowid
+        save_audio()
+        if self.fuzzy_search:
             cursor.execute(
-                f"INSERT INTO {self.table} (title, encoded_track) VALUES (?, ?)",
-                (js["title"], js["encoded_track"])
+                f"INSERT INTO {self.table}_titles (rowid, search_title) VALUES (?, ?)",
+                (track_id, searchable_title(row["title"]))
             )
-            connection.commit()
-            return cursor.lastrowid
+        cursor.executemany(
+            f"INSERT INTO {self.table}_fingerprints (hash, title, offset) VALUES (?, ?, ?)",
+            ((hash_value, row["title"], offset) for hash_value, offset in hashes)
+        )
+        return track_id
 
+    @timed_method
     def remove_track_by_title(self, title):
-        """Deletes a track by ID and returns the number of deleted rows."""
-        with sqlite3.connect(self.database_path) as connection:
+        """Deletes a track by title and returns the number of deleted rows."""
+        unlinked = set()
+        with self.connection() as connection:
             cursor = connection.cursor()
-            cursor.execute(f"DELETE FROM {self.table} WHERE title=?", (title,))
+            cursor.execute("BEGIN IMMEDIATE")
+            deleted_rows = self.delete_prepared(cursor, title, unlinked)
+            if deleted_rows:
+                version = self.bump_version(cursor)
             connection.commit()
-            return cursor.rowcount
 
+        self.drop_unreferenced_blobs(unlinked)
+        if deleted_rows:
+            self.track_cache.invalidate([title], version)
+        return deleted_rows
+
+    def delete_prepared(self, cursor, title, unlinked):
+        """
+        Deletes a track and its index rows inside the caller's write transaction, returning the rows deleted.
+
+        The blob is left on disk, so a rollback restores a playable track. Its digest is added
+        to unlinked if nothing else references it, for drop_unreferenced_blobs once committed.
+        """
+        cursor.execute(f"SELECT rowid, digest FROM {self.table} WHERE title=?", (title,))
+        row = cursor.fetchone()
+        cursor.execute(f"DELETE FROM {self.table} WHERE title=?", (title,))
+        deleted_rows = cursor.rowcount
+        cursor.execute(f"DELETE FROM {self.table}_fingerprints WHERE title=?", (title,))
+
+        if row:
+            if self.fuzzy_search:
+                cursor.execute(f"DELETE FROM {self.table}_titles WHERE rowid=?", (row[0],))
+            # Blobs are shared by identical uploads, so only drop one nothing else references
+            cursor.execute(f"SELECT 1 FROM {self.table} WHERE digest=? LIMIT 1", (row[1],))
+            if not cursor.fetchone():
+                unlinked.add(row[1])
+        return deleted_rows
+
+    def drop_unreferenced_blobs(self, digests):
+        """
+        Deletes the blobs of digests that no track references, after their tracks' deletion has committed.
+
+        References are checked again under the write lock, since another writer may have stored
+        the same audio in the meantime (inserts write their blob inside their transaction).
+        """
+        if not digests:
+            return
+        with self.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            for digest in digests:
+                cursor.execute(f"SELECT 1 FROM {self.table} WHERE digest=? LIMIT 1", (digest,))
+                if not cursor.fetchone():
+                    self.blob_store.delete(digest)
+
+    @timed_method
     def find_track_by_title(self, title):
-        """Retrieves a single track with given details (returns None if not found)."""
-        with sqlite3.connect(self.database_path) as connection:
+        """
+        Retrieves a single track with given details (returns None if not found).
+
+        Results, including misses, are served from the track cache until the title changes.
+        """
+        self.sync_version()
+        hit, track = self.track_cache.get(title)
+        if hit:
+            return track
+
+        read_version = self.version
+        with self.connection() as connection:
             cursor = connection.cursor()
-            cursor.execute(f"SELECT title, encoded_track FROM {self.table} WHERE title=?", (title,))
+            cursor.execute(f"SELECT title, digest FROM {self.table} WHERE title=?", (title,))
             row = cursor.fetchone()
-            if row:
-                return {"title": row[0], "encoded_track": row[1]}
-            return None
+            track = {"title": row[0], "encoded_track": self.encode_audio(row[1])} if row else None
+        self.track_cache.put(title, track, read_version)
+        return track
+
+    def blob_store_for(self, title):
+        """Returns the blob store holding a track's audio."""
+        return self.blob_store
+
+    @timed_method
+    def find_audio_digest(self, title):
+        """Returns the blob store digest of a track's audio, or None if the title is not found."""
+        with self.connection() as connection:
+            row = connection.execute(f"SELECT digest FROM {self.table} WHERE title=?", (title,)).fetchone()
+        return row[0] if row else None
+
+    @timed_method
+    def search_track(self, title, fuzzy=True, min_score=FUZZY_MIN_SCORE):
+        """
+        Finds the track a possibly inexact title refers to.
+
+        Tries an exact title match, then the normalised-title index, then (if fuzzy) the best
+        ranked trigram match scoring at least min_score.
+
+        Returns:
+            tuple: (track dict, how it matched: "exact", "normalised" or "fuzzy"), or (None, None).
+        """
+        track = self.find_track_by_title(title)
+        if track is not None:
+            return track, "exact"
+
+        track = self.find_track_by_normalised_title(title)
+        if track is not None:
+            return track, "normalised"
+
+        if fuzzy:
+            matches = self.rank_titles(title, limit=1)
+            if matches and matches[0]["score"] >= min_score:
+                return self.find_track_by_title(matches[0]["title"]), "fuzzy"
+        return None, None
+
+    @timed_method
+    def find_track_by_normalised_title(self, title):
+        """Retrieves the first track (by title) sharing title's normalised form, or None."""
+        with self.connection() as connection:
+            row = connection.execute(
+                f"SELECT title, digest FROM {self.table} WHERE normalised_title=? ORDER BY title LIMIT 1",
+                (normalise_title(title),)
+            ).fetchone()
+        return {"title": row[0], "encoded_track": self.encode_audio(row[1])} if row else None
+
+    @timed_method
+    def rank_titles(self, title, limit=10):
+        """
+        Ranks catalogue titles by similarity to title using the trigram index.
+
+        FTS5 narrows the catalogue to the titles sharing the most trigrams with the query (by
+        bm25), which are then scored by how closely their searchable forms match.
 
-    def get_all_tracks(self):
-        """Retrieves all tracks from the database (returns an empty list if none exist)."""
-        with sqlite3.connect(self.database_path) as connection:
+        Returns:
+            list: Up to limit {"title", "score"} dicts, best first, with scores between 0 and 1.
+        """
+        query = searchable_title(title)
+        trigrams = title_trigrams(query)
+        if not self.fuzzy_search or not trigrams:
+            return []
+
+        with self.connection() as connection:
+            rows = connection.execute(
+                f"SELECT t.title FROM {self.table}_titles JOIN {self.table} AS t ON t.rowid = {self.table}_titles.rowid "
+                f"WHERE {self.table}_titles MATCH ? ORDER BY rank LIMIT ?",
+                (" OR ".join(f'"{trigram}"' for trigram in trigrams), limit * FUZZY_CANDIDATES_PER_RESULT)
+            ).fetchall()
+
+        matches = [
+            {"title": candidate, "score": round(SequenceMatcher(None, query, searchable_title(candidate)).ratio(), 4)}
+            for candidate, in rows
+        ]
+        matches.sort(key=lambda match: (-match["score"], match["title"]))
+        return matches[:limit]
+
+    @timed_method
+    def find_tracks_by_titles(self, titles):
+        """
+        Retrieves every track whose title is in titles, as a {title: track} dict (missing titles are left out).
+
+        Titles without an exact match fall back to the normalised-title index, so the result is
+        keyed by the title asked for. Exact matches (and misses) are shared with the track cache.
+        """
+        titles = list(dict.fromkeys(titles))
+        tracks = self.find_tracks_by_exact_titles(titles)
+        tracks.update(self.find_tracks_by_normalised_titles([title for title in titles if title not in tracks]))
+        return tracks
+
+    def find_tracks_by_exact_titles(self, titles):
+        """Retrieves the tracks whose title is exactly one of titles, as a {title: track} dict, through the track cache."""
+        self.sync_version()
+        tracks = {}
+        uncached = []
+        for title in titles:
+            hit, track = self.track_cache.get(title)
+            if not hit:
+                uncached.append(title)
+            elif track is not None:
+                tracks[title] = track
+
+        read_version = self.version
+        with self.connection() as connection:
+            cursor = connection.cursor()
+            for start in range(0, len(uncached), MAX_QUERY_PARAMETERS):
+                chunk = uncached[start:start + MAX_QUERY_PARAMETERS]
+                cursor.execute(f"SELECT title, digest FROM {self.table} WHERE title IN ({','.join('?' * len(chunk))})", chunk)
+                for title, digest in cursor.fetchall():
+                    tracks[title] = {"title": title, "encoded_track": self.encode_audio(digest)}
+        for title in uncached:
+            self.track_cache.put(title, tracks.get(title), read_version)
+        return tracks
+
+    def find_tracks_by_normalised_titles(self, titles):
+        """
+        Retrieves, for each of titles, the first track (by title) sharing its normalised form.
+
+        Returns:
+            dict: {requested title: track}, leaving out titles nothing matches.
+        """
+        missing = {}
+        for title in titles:
+            missing.setdefault(normalise_title(title), []).append(title)
+        keys = list(missing)
+        tracks = {}
+        with self.connection() as connection:
             cursor = connection.cursor()
-            cursor.execute(f"SELECT title, encoded_track FROM {self.table}")
-            rows = cursor.fetchall()
-            return [{"title": row[0], "encoded_track": row[1]} for row in rows] if rows else []
+            for start in range(0, len(keys), MAX_QUERY_PARAMETERS):
+                chunk = keys[start:start + MAX_QUERY_PARAMETERS]
+                # SQLite reads the bare digest column from the row holding MIN(title)
+                cursor.execute(
+                    f"SELECT normalised_title, MIN(title), digest FROM {self.table} "
+                    f"WHERE normalised_title IN ({','.join('?' * len(chunk))}) GROUP BY normalised_title",
+                    chunk
+                )
+                for key, title, digest in cursor.fetchall():
+                    track = {"title": title, "encoded_track": self.encode_audio(digest)}
+                    for requested in missing[key]:
+                        tracks[requested] = track
+        return tracks
+
+    @timed_method
+    def get_all_tracks(self, fields=DEFAULT_LISTING_FIELDS, after=None, limit=None):
+        """
+        Yields tracks ordered by title, one row at a time.
+
+        Uses keyset pagination: only titles greater than after are returned, at most limit of them.
+        Only the columns needed for the requested fields are read, so a title-only listing is
+        served from the primary key index and never touches the blob store.
+        """
+        unknown_fields = [field for field in fields if field not in TRACK_FIELDS]
+        if unknown_fields:
+            raise ValueError(f"Unknown fields: {', '.join(unknown_fields)}")
+
+        columns = list(dict.fromkeys(TRACK_FIELDS[field] for field in fields))
+        for values in self.list_rows(columns, after=after, limit=limit):
+            yield self.track_from_row(values, fields)
+
+    def list_rows(self, columns, after=None, limit=None):
+        """Yields {column: value} dicts of the tracks table ordered by title, keyset paginated like get_all_tracks."""
+        query = f"SELECT {', '.join(columns)} FROM {self.table}"
+        parameters = []
+        if after is not None:
+            query += " WHERE title > ?"
+            parameters.append(after)
+        query += " ORDER BY title"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+
+        with self.connection() as connection:
+            for row in connection.execute(query, parameters):
+                yield dict(zip(columns, row))
+
+    def track_from_row(self, values, fields):
+        """Builds a listing entry with the requested fields from a list_rows dict."""
+        track = {}
+        for field in fields:
+            if field == "encoded_track":
+                track[field] = self.encode_audio(values["digest"])
+            else:
+                track[field] = values[TRACK_FIELDS[field]]
+        return track
 
+    @timed_method
+    def next_cursor(self, after, limit):
+        """Returns the cursor for the page following (after, limit), or None if it is the last page."""
+        query = f"SELECT title FROM {self.table}"
+        parameters = []
+        if after is not None:
+            query += " WHERE title > ?"
+            parameters.append(after)
+        query += " ORDER BY title LIMIT 2 OFFSET ?"
+        parameters.append(limit - 1)
+
+        with self.connection() as connection:
+            rows = connection.execute(query, parameters).fetchall()
+        return rows[0][0] if len(rows) == 2 else None
+
+    def encode_audio(self, digest):
+        """Base64 encodes a stored blob for the JSON API, reading and encoding it a block at a time."""
+        with self.blob_store.open(digest) as audio:
+            return "".join(base64_chunks(audio))
+
+    @timed_method
     def reset_database(self):
-        """Deletes all tracks from the database."""
-        with sqlite3.connect(self.database_path) as connection:
+        """
+        Deletes all tracks from the database.
+
+        The blobs are removed only once the deletion has committed, so a failed reset leaves
+        every track playable.
+        """
+        with self.connection() as connection:
             cursor = connection.cursor()
-            cursor.execute("DELETE FROM tracks")
-            connection.commit()
\ No newline at end of file
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(f"DELETE FROM {self.table}_fingerprints")
+            if self.fuzzy_search:
+                cursor.execute(f"DELETE FROM {self.table}_titles")
+            version = self.bump_version(cursor)
+            connection.commit()
+
+        self.clear_blobs()
+        self.track_cache.invalidate(None, version)
+
+    def clear_blobs(self):
+        """
+        Removes every stored blob once a reset has committed, if the tracks table is still empty.
+
+        The check is made under the write lock: a track inserted since the reset keeps its blob
+        (the others are then left on disk unreferenced).
+        """
+        with self.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            if cursor.execute(f"SELECT 1 FROM {self.table} LIMIT 1").fetchone() is None:
+                self.blob_store.clear()
+
+    def fingerprint(self, audio):
+        """Fingerprints raw WAV bytes (returns an empty list if they cannot be decoded)."""
+        try:
+            return fingerprint_wav(audio)
+        except Exception as e:
+            logging.warning(f"Could not fingerprint track: {e}")
+            return []
+
+    @timed_method
+    def match_fingerprints(self, hashes):
+        """
+        Looks up fragment hashes in the fingerprint index and votes on the best matching track.
+
+        Returns:
+            dict: {"title", "score", "offset", "offset_seconds"} of the best match, or None.
+        """
+        return best_match(hashes, self.fingerprint_candidates(hashes))
+
+    def fingerprint_candidates(self, hashes):
+        """Returns the (hash, title, offset) index rows sharing a hash with the fragment's."""
+        unique_hashes = list({hash_value for hash_value, _ in hashes})
+        candidates = []
+        with self.connection() as connection:
+            cursor = connection.cursor()
+            for start in range(0, len(unique_hashes), MAX_QUERY_PARAMETERS):
+                chunk = unique_hashes[start:start + MAX_QUERY_PARAMETERS]
+                cursor.execute(
+                    f"SELECT hash, title, offset FROM {self.table}_fingerprints WHERE hash IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                candidates.extend(cursor.fetchall())
+        return candidates
\ No newline at end of file
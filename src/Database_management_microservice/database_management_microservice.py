@@ -1,17 +1,65 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.utils import send_file
 import logging
+import base64
+import binascii
+import hashlib
+import io
+import json
 import os
 import sys
-from database_helper import MusicTrackDatabase
+from urllib.parse import urlencode
+from werkzeug.datastructures import MultiDict
+from database_helper import TRACK_FIELDS, DEFAULT_LISTING_FIELDS, FUZZY_MIN_SCORE, TrackExists
+from sharded_database import open_database
+from blob_store import STREAM_CHUNK_SIZE
+from ingestion_queue import IngestionQueue
+from catalogue_snapshot import CONFLICT_MODES, SnapshotError, export_chunks, import_snapshot
+from instrumentation import instrument_app
+from tracing import LOG_FORMAT, stream_with_trace, trace_app
+from wav_utils import WavFormatError, check_wav_header, parse_wav_header
 
 # Define log directory within the microservice folder
 log_dir = os.path.join(os.path.dirname(__file__))
 
 # Configure logging
-logging.basicConfig(filename=os.path.join(log_dir, "database.log"), level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logging.basicConfig(filename=os.path.join(log_dir, "database.log"), level=logging.INFO, format=LOG_FORMAT)
 
 app = Flask(__name__)
-db = MusicTrackDatabase()
+instrument_app(app, "database")
+trace_app(app, "database")
+db = open_database()
+ingestion = IngestionQueue(db)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_SIZE = 500
+DEFAULT_SEARCH_RESULTS = 10
+MAX_SEARCH_RESULTS = 100
+
+def catalogue_etag():
+    """Returns the ETag for a read that depends only on the catalogue and this request's query parameters."""
+    return query_etag(db.catalogue_tag, request.args)
+
+def query_etag(catalogue_tag, params):
+    """
+    Returns the ETag for a read that depends only on the catalogue and its query parameters.
+
+    It is built from the catalogue version, so it is known before any SQLite work is done
+    and changes as soon as a track is added or removed. The parameters (a dict or MultiDict)
+    are hashed as sorted, URL encoded pairs, so the same read gets the same ETag whatever the
+    order or encoding of its query string, and from LocalDatabaseTransport as over HTTP.
+    """
+    pairs = params.items(multi=True) if isinstance(params, MultiDict) else params.items()
+    query = hashlib.sha256(urlencode(sorted(pairs)).encode()).hexdigest()[:16]
+    return f"{catalogue_tag}-{query}"
+
+def not_modified(etag):
+    """Returns an empty 304 response carrying etag."""
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
 
 @app.route("/db/tracks", methods=["POST"])
 def add_track():
@@ -39,10 +87,164 @@ def add_track():
         
         logging.info("Track added successfully")
         return jsonify({"title": track, "message": "Track added successfully"}), 201
+    except WavFormatError as e:
+        logging.warning(f"Rejected malformed track: {e}")
+        return jsonify({"error": str(e)}), 422
+    except ValueError as e:
+        logging.warning(str(e))
+        return jsonify({"error": "encoded_track is not valid base64"}), 400
+    except:
+        logging.warning("Database unreachable")
+        return "", 503
+
+@app.route("/db/tracks/upload", methods=["POST"])
+def upload_track():
+    """
+    Adds a new track from raw WAV bytes sent as the request body, titled by the title query parameter.
+
+    The body is streamed to storage in fixed-size chunks, so memory use does not grow with
+    the length of the track.
+
+    Returns:
+        A JSON response indicating success or failure.
+    """
+    title = request.args.get("title")
+
+    if not title:
+        logging.warning("Missing title query parameter")
+        return jsonify({"error": "Missing title"}), 400
+
+    try:
+        track = db.insert_stream(title, iter(lambda: request.stream.read(STREAM_CHUNK_SIZE), b""))
+        if track == 409:
+            logging.warning("Attempting to add duplicate track")
+            return "", 409
+
+        logging.info("Track uploaded successfully")
+        return jsonify({"title": track, "message": "Track added successfully"}), 201
+    except WavFormatError as e:
+        logging.warning(f"Rejected malformed track: {e}")
+        return jsonify({"error": str(e)}), 422
+    except ValueError as e:
+        logging.warning(str(e))
+        return jsonify({"error": str(e)}), 400
+    except:
+        logging.warning("Database unreachable")
+        return "", 503
+
+@app.route("/db/jobs", methods=["POST"])
+def submit_track():
+    """
+    Queues a new track to be added by the ingestion workers.
+
+    Only the payload is checked and saved here; describing, fingerprinting and committing the
+    track happen in the background. Titles already in the catalogue or already queued are
+    refused straight away.
+
+    Returns:
+        A JSON response with the queued job, and its URL in the Location header.
+    """
+    if not request.is_json:
+        logging.warning("No json content type")
+        return "", 415
+
+    data = request.get_json()
+
+    if not data or "title" not in data or "encoded_track" not in data:
+        logging.warning("Missing required fields")
+        return jsonify({"error": "Missing required fields"}), 400
+
+    try:
+        audio = base64.b64decode(data["encoded_track"], validate=True)
+    except (binascii.Error, TypeError) as e:
+        logging.warning(f"encoded_track is not valid base64: {e}")
+        return jsonify({"error": "encoded_track is not valid base64"}), 400
+
+    try:
+        check_wav_header(parse_wav_header(audio))
+    except WavFormatError as e:
+        logging.warning(f"Rejected malformed track: {e}")
+        return jsonify({"error": str(e)}), 422
+
+    try:
+        job = None
+        if db.find_audio_digest(data["title"]) is None:
+            job = ingestion.submit(data["title"], audio)
+    except:
+        logging.warning("Database unreachable")
+        return "", 503
+
+    if job is None:
+        logging.warning("Attempting to add duplicate track")
+        return "", 409
+
+    logging.info(f"Ingestion job {job['job_id']} queued")
+    return jsonify(job), 202, {"Location": f"/db/jobs/{job['job_id']}"}
+
+@app.route("/db/jobs/<string:job_id>", methods=["GET"])
+def get_job(job_id):
+    """
+    Reports an ingestion job's status: queued, running, done or failed (with the error).
+
+    Returns:
+        A JSON response with the job, or 404 if it is unknown or has expired.
+    """
+    try:
+        job = ingestion.job(job_id)
+    except:
+        logging.warning("Database unreachable")
+        return "", 503
+
+    if job is None:
+        logging.warning("Ingestion job not found")
+        return "", 404
+    return jsonify(job), 200
+
+@app.route("/db/jobs", methods=["GET"])
+def job_counts():
+    """
+    Returns the number of ingestion jobs in each state.
+
+    Returns:
+        A JSON response of {status: count}.
+    """
+    return jsonify(ingestion.counts()), 200
+
+@app.route("/db/tracks/batch", methods=["POST"])
+def add_tracks_batch():
+    """
+    Adds many tracks to the database in a single transaction.
+
+    Expects a JSON body of the form {"tracks": [{"title": ..., "encoded_track": ...}, ...]}.
+
+    Returns:
+        A JSON response with a per-item status (created / conflict / invalid) and totals.
+    """
+    if not request.is_json:
+        logging.warning("No json content type")
+        return "", 415
+
+    data = request.get_json()
+    tracks = data.get("tracks") if isinstance(data, dict) else None
+
+    if not isinstance(tracks, list) or not tracks:
+        logging.warning("Missing tracks")
+        return jsonify({"error": "Missing tracks"}), 400
+
+    if len(tracks) > MAX_BATCH_SIZE:
+        logging.warning("Batch too large")
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} tracks per batch"}), 413
+
+    try:
+        results = db.insert_many(tracks)
     except:
         logging.warning("Database unreachable")
         return "", 503
 
+    totals = {status: sum(1 for result in results if result["status"] == status) for status in ("created", "conflict", "invalid")}
+    logging.info(f"Batch added: {totals}")
+    return jsonify(dict(totals, results=results)), 200
+
 @app.route("/db/tracks/<string:title>", methods=["DELETE"])
 def delete_track(title):
     """
@@ -67,27 +269,155 @@ def delete_track(title):
 @app.route("/db/tracks", methods=["GET"])
 def get_tracks():
     """
-    Retrieves all tracks from the database.
+    Retrieves one page of tracks, ordered by title.
+
+    Query parameters:
+        fields: Comma separated fields to return (default "title,encoded_track").
+        after: Cursor from a previous page's X-Next-Cursor header.
+        limit: Page size (default 100, at most 1000).
 
     Returns:
-        A JSON list of tracks.
+        A JSON list of tracks, streamed as rows are read. The X-Next-Cursor header is set
+        when there are more tracks to fetch. A request whose If-None-Match holds the
+        current ETag is answered with 304 Not Modified.
     """
+    fields = request.args.get("fields", ",".join(DEFAULT_LISTING_FIELDS)).split(",")
+    limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+
+    try:
+        after = decode_cursor(request.args.get("after"))
+    except ValueError:
+        logging.warning("Malformed cursor")
+        return "", 400
+
+    if any(field not in TRACK_FIELDS for field in fields):
+        logging.warning("Unknown fields requested")
+        return "", 400
+
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        logging.warning("Invalid page size")
+        return "", 400
+
+    etag = catalogue_etag()
+    if request.if_none_match.contains(etag):
+        logging.info("Tracks not modified")
+        return not_modified(etag)
+
     try:
-        tracks = db.get_all_tracks()
-        logging.info("Tracks returned")
-        return jsonify(tracks if tracks else []), 200
+        tracks = iter(db.get_all_tracks(fields=fields, after=after, limit=limit))
+        # Read the first row before streaming so database failures still produce a 503
+        first_track = next(tracks, None)
+        cursor = db.next_cursor(after, limit)
     except:
         logging.warning("Databse unreachable")
         return "", 503
 
+    logging.info("Tracks returned")
+    response = Response(stream_with_context(stream_with_trace(stream_json_list(first_track, tracks))), status=200, mimetype="application/json")
+    response.set_etag(etag)
+    if cursor is not None:
+        response.headers["X-Next-Cursor"] = encode_cursor(cursor)
+    return response
+
+def encode_cursor(title):
+    """
+    Encodes the last title of a page as an X-Next-Cursor value.
+
+    Header values are sent as Latin-1, so the title's UTF-8 bytes are base64url encoded
+    (without padding) rather than put in the header as they are.
+    """
+    return base64.urlsafe_b64encode(title.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor):
+    """
+    Decodes an after cursor back to the title it was made from (None stays None).
+
+    Raises:
+        ValueError: If the cursor is not one encode_cursor made.
+    """
+    if cursor is None:
+        return None
+    try:
+        return base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True).decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("Malformed cursor")
+
+def stream_json_list(first_item, items):
+    """Yields a JSON array one element at a time."""
+    if first_item is None:
+        yield "[]"
+        return
+    yield "[" + json.dumps(first_item)
+    for item in items:
+        yield "," + json.dumps(item)
+    yield "]"
+
+def send_audio(blob_store, digest, title, environ):
+    """
+    Builds the response serving a stored blob as audio/wav, for the request in environ.
+
+    The blob's digest is its ETag and its write time is Last-Modified. Range requests are
+    answered from a seekable file of the original bytes, so only the compressed blocks under
+    the range are decoded.
+
+    Raises:
+        FileNotFoundError: If the blob has been deleted.
+        RequestedRangeNotSatisfiable: If the range starts past the end of the audio.
+    """
+    blob = blob_store.open_file(digest)
+    response = send_file(blob.file, environ, mimetype="audio/wav", download_name=f"{title}.wav", conditional=False,
+                         etag=digest, last_modified=blob.modified)
+    # send_file cannot tell the size of a file object, which Range and If-Range need
+    response.content_length = blob.size
+    try:
+        return response.make_conditional(environ, accept_ranges=True, complete_length=blob.size)
+    except RequestedRangeNotSatisfiable:
+        response.close()
+        raise
+
+@app.route("/db/tracks/<string:title>/audio", methods=["GET"])
+def get_track_audio(title: str):
+    """
+    Serves a track's raw WAV audio.
+
+    Range requests are answered with 206 Partial Content, reading only the requested span
+    from the blob file (see send_audio). Conditional requests can be answered with 304 Not
+    Modified.
+
+    Returns:
+        The audio/wav bytes, or an error.
+    """
+    try:
+        digest = db.find_audio_digest(title)
+    except:
+        logging.warning("Database unreachable")
+        return "", 503
+
+    if digest is None:
+        logging.warning("Track not found")
+        return "", 404
+
+    try:
+        return send_audio(db.blob_store_for(title), digest, title, request.environ)
+    except FileNotFoundError:
+        # The track was deleted between the lookup and the read
+        logging.warning("Track audio not found")
+        return "", 404
+
 @app.route("/db/tracks/search", methods=["GET"])
 def search_tracks():
     """
     Searches for a track by title.
 
+    Titles are matched exactly, then ignoring case, punctuation and "(Radio Edit)"-style
+    qualifiers, then (unless fuzzy=false) by the closest trigram match. With ranked=true the
+    best limit candidates are listed with their similarity scores instead.
+
     Returns:
-        A JSON response with the track details or an error.
-    """  
+        A JSON response with the track details or an error. The X-Title-Match header says
+        whether the match was exact, normalised or fuzzy. A request whose If-None-Match holds
+        the current ETag is answered with 304 Not Modified.
+    """
     title = request.args.get("title")
 
     if not title:
@@ -95,18 +425,192 @@ def search_tracks():
         return "", 400
 
     try:
-        track = db.find_track_by_title(title)
+        limit = int(request.args.get("limit", DEFAULT_SEARCH_RESULTS))
+        min_score = float(request.args.get("min_score", FUZZY_MIN_SCORE))
+    except ValueError:
+        logging.warning("Malformed search parameters")
+        return "", 400
+
+    if not 1 <= limit <= MAX_SEARCH_RESULTS:
+        logging.warning("Search limit out of range")
+        return "", 400
+
+    etag = catalogue_etag()
+    if request.if_none_match.contains(etag):
+        logging.info("Search result not modified")
+        return not_modified(etag)
+
+    try:
+        if request.args.get("ranked", "false").lower() == "true":
+            matches = db.rank_titles(title, limit=limit)
+            logging.info(f"Ranked {len(matches)} titles")
+            response = jsonify({"matches": matches})
+            response.set_etag(etag)
+            return response, 200
+
+        fuzzy = request.args.get("fuzzy", "true").lower() != "false"
+        track, match = db.search_track(title, fuzzy=fuzzy, min_score=min_score)
 
         if track is None:
             logging.warning("Track not found")
             return "", 404
 
-        logging.info("Track found")
-        return jsonify(track), 200
+        logging.info(f"Track found ({match} match)")
+        response = jsonify(track)
+        response.headers["X-Title-Match"] = match
+        response.set_etag(etag)
+        return response, 200
+    except:
+        logging.warning("Database unreachable")
+        return "", 503
+
+@app.route("/db/tracks/search/batch", methods=["POST"])
+def search_tracks_batch():
+    """
+    Looks up many tracks by title in one query.
+
+    Expects a JSON body of the form {"titles": [...]}.
+
+    Returns:
+        A JSON object {"tracks": {<title>: <track>, ...}} holding only the titles that were found.
+    """
+    if not request.is_json:
+        logging.warning("No json content type")
+        return "", 415
+
+    data = request.get_json()
+    titles = data.get("titles") if isinstance(data, dict) else None
+
+    if not isinstance(titles, list) or not titles or not all(isinstance(title, str) for title in titles):
+        logging.warning("Missing titles")
+        return "", 400
+
+    try:
+        tracks = db.find_tracks_by_titles(titles)
     except:
         logging.warning("Database unreachable")
         return "", 503
 
+    logging.info(f"Batch search found {len(tracks)} of {len(titles)} titles")
+    return jsonify({"tracks": tracks}), 200
+
+@app.route("/db/fingerprints/match", methods=["POST"])
+def match_fingerprints():
+    """
+    Matches fragment landmark hashes against the fingerprint index.
+
+    Expects a JSON body of the form {"hashes": [[hash, offset], ...]}.
+
+    Returns:
+        A JSON response with the best matching title and its score, or an error.
+    """
+    if not request.is_json:
+        logging.warning("No json content type")
+        return "", 415
+
+    data = request.get_json()
+    hashes = data.get("hashes") if isinstance(data, dict) else None
+
+    if not isinstance(hashes, list):
+        logging.warning("Missing hashes")
+        return "", 400
+
+    try:
+        match = db.match_fingerprints([(int(hash_value), int(offset)) for hash_value, offset in hashes])
+    except (TypeError, ValueError):
+        logging.warning("Malformed hashes")
+        return "", 400
+    except:
+        logging.warning("Database unreachable")
+        return "", 503
+
+    if match is None:
+        logging.info("No fingerprint match")
+        return "", 404
+
+    logging.info("Fingerprint match found")
+    return jsonify(match), 200
+
+@app.route("/db/cache", methods=["GET"])
+def cache_stats():
+    """
+    Reports the catalogue version and the track lookup cache's counters.
+
+    Returns:
+        A JSON object with the version, hits, misses, evictions, invalidations and size.
+    """
+    return jsonify(db.cache_stats()), 200
+
+@app.route("/db/export", methods=["GET"])
+def export_catalogue():
+    """
+    Streams the whole catalogue as an NDJSON snapshot (see catalogue_snapshot.py).
+
+    Tracks are read from a cursor and written out a block of audio at a time, so the response
+    can be far larger than memory.
+
+    Returns:
+        A chunked application/x-ndjson response, or 503 if the database cannot be read.
+    """
+    try:
+        chunks = export_chunks(db)
+        # Read the header and the start of the first track before streaming so database failures still produce a 503
+        first_chunks = [next(chunks), next(chunks)]
+    except:
+        logging.warning("Database unreachable")
+        return "", 503
+
+    logging.info("Catalogue export started")
+    response = Response(stream_with_context(stream_with_trace(stream_chunks(first_chunks, chunks))), status=200, mimetype="application/x-ndjson")
+    response.headers["Content-Disposition"] = "attachment; filename=catalogue.ndjson"
+    return response
+
+def stream_chunks(first_chunks, chunks):
+    """Yields chunks already read, then the rest, closing the export (and so its read transactions) when the stream ends."""
+    try:
+        yield from first_chunks
+        yield from chunks
+    finally:
+        chunks.close()
+
+@app.route("/db/import", methods=["POST"])
+def import_catalogue():
+    """
+    Adds the tracks of an NDJSON snapshot, as produced by GET /db/export, to the catalogue.
+
+    The body is read line by line and written in batched transactions, so tracks already
+    written stay imported if the upload breaks off.
+
+    Query parameters:
+        on_conflict: What to do with titles already stored: "skip" (default), "replace", or
+            "fail" (stop at the first one, answering 409).
+
+    Returns:
+        A JSON object counting the tracks created, replaced and skipped (conflict), with an
+        error message if the snapshot was malformed or truncated (400) or a title conflicted (409).
+    """
+    on_conflict = request.args.get("on_conflict", "skip")
+    if on_conflict not in CONFLICT_MODES:
+        logging.warning("Invalid conflict mode")
+        return "", 400
+
+    summary = {}
+    try:
+        # Buffered, as the raw request stream reads lines a byte at a time
+        import_snapshot(db, io.BufferedReader(request.stream, STREAM_CHUNK_SIZE), on_conflict, summary)
+    except SnapshotError as e:
+        logging.warning(f"Invalid snapshot: {e}")
+        return jsonify(dict(summary, error=str(e))), 400
+    except TrackExists as e:
+        logging.warning(str(e))
+        return jsonify(dict(summary, error=str(e))), 409
+    except:
+        logging.warning("Database unreachable")
+        return jsonify(summary), 503
+
+    logging.info(f"Catalogue imported: {summary}")
+    return jsonify(summary), 200
+
 @app.route("/db/reset", methods=["POST"])
 def reset_db():
     """
@@ -115,9 +619,13 @@ def reset_db():
     Returns:
         A JSON response indicating success.
     """
+    ingestion.reset()
     db.reset_database()
     logging.info("Database reset successfully")
     return jsonify({"message": "Database reset successfully"}), 200
 
 if __name__ == "__main__":
+    # Under the debug reloader, only the child process that serves requests drains the queue
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        ingestion.start()
     app.run(host="localhost", port=3002, debug=True)
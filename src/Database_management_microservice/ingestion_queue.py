@@ -0,0 +1,304 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from database_helper import DATABASE_DIR, CONNECTION_PRAGMAS
+from blob_store import STREAM_CHUNK_SIZE
+from instrumentation import INGEST_JOBS, INGEST_JOB_LATENCY, INGEST_JOB_WAIT
+
+# Worker threads draining the queue in each process
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+
+# Seconds an idle worker waits before looking for jobs queued by another process
+INGEST_POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", "1"))
+
+# Seconds a running job is reserved for its worker; a job not finished by then (e.g. because its
+# process died) is run again, up to INGEST_MAX_ATTEMPTS times in all
+INGEST_JOB_LEASE = float(os.getenv("INGEST_JOB_LEASE", "300"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+
+# Seconds a job waits before it is retried after a transient failure, doubled for each attempt
+# already made, up to INGEST_RETRY_BACKOFF_MAX, so a short database outage does not use up its attempts
+INGEST_RETRY_BACKOFF = float(os.getenv("INGEST_RETRY_BACKOFF", "2"))
+INGEST_RETRY_BACKOFF_MAX = float(os.getenv("INGEST_RETRY_BACKOFF_MAX", "60"))
+
+# Seconds finished jobs stay queryable before they are deleted
+INGEST_JOB_RETENTION = float(os.getenv("INGEST_JOB_RETENTION", str(24 * 60 * 60)))
+
+JOB_FIELDS = ("job_id", "title", "status", "error", "attempts", "submitted", "started", "finished", "not_before")
+
+class IngestionQueue:
+    """
+    Persistent queue of tracks waiting to be added to a MusicTrackDatabase (or sharded database).
+
+    submit() saves the raw audio to a spool directory and records a queued job in its own
+    SQLite file (data/<table>_jobs.db), so jobs survive restarts. Worker threads claim jobs
+    in submission order and run them through insert_stream(), which describes, fingerprints
+    and commits the track. Each job goes from queued to running to done or failed.
+
+    Claims are made in a write transaction with a lease, so the workers of several processes
+    (e.g. under launcher.py) can drain one queue, and a job whose process died is run again
+    once its lease expires. A job that failed for a transient reason is queued again with a
+    not_before time, and is not claimed before then.
+    """
+
+    def __init__(self, db, workers=INGEST_WORKERS):
+        self.db = db
+        self.workers = workers
+        self.database_path = os.path.join(os.path.abspath(DATABASE_DIR), f"{db.table}_jobs.db")
+        self.spool_dir = os.path.join(os.path.abspath(DATABASE_DIR), f"{db.table}_jobs")
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+        self._threads = []
+        self._pid = None
+        self._stopping = threading.Event()
+        self._wakeup = threading.Semaphore(0)
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self.make()
+
+    @contextmanager
+    def connection(self):
+        """Opens a connection to the jobs file for one transaction, committed when the with block exits."""
+        connection = sqlite3.connect(self.database_path, timeout=30)
+        try:
+            for pragma in CONNECTION_PRAGMAS:
+                connection.execute(pragma)
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def make(self):
+        """Create the jobs table if it does not exist."""
+        with self.connection() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    submitted REAL NOT NULL,
+                    started REAL,
+                    finished REAL,
+                    lease_expires REAL,
+                    not_before REAL
+                )
+            """)
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(jobs)")]
+            if "not_before" not in columns:
+                connection.execute("ALTER TABLE jobs ADD COLUMN not_before REAL")
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, submitted)")
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_title ON jobs (title, status)")
+
+    def spool_path(self, job_id):
+        """Returns where a job's audio is kept until it has been processed."""
+        return os.path.join(self.spool_dir, f"{job_id}.wav")
+
+    def submit(self, title, audio):
+        """
+        Queues raw WAV audio to be added under title, unless a job for the title is already pending.
+
+        Returns:
+            dict: The queued job, or None if the title is already queued or running.
+        """
+        job_id = uuid.uuid4().hex
+        path = self.spool_path(job_id)
+        with open(path + ".part", "wb") as spool:
+            spool.write(audio)
+        os.replace(path + ".part", path)
+
+        with self.connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            pending = connection.execute("SELECT 1 FROM jobs WHERE title=? AND status IN ('queued', 'running')",
+                                         (title,)).fetchone()
+            if pending is None:
+                connection.execute("INSERT INTO jobs (job_id, title, status, submitted) VALUES (?, ?, 'queued', ?)",
+                                   (job_id, title, time.time()))
+        if pending is not None:
+            os.remove(path)
+            return None
+
+        self.start()
+        self._wakeup.release()
+        self.record_depth()
+        return self.job(job_id)
+
+    def job(self, job_id):
+        """Returns a job's state as a dict, or None if it is unknown (or expired)."""
+        with self.connection() as connection:
+            row = connection.execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+        return dict(zip(JOB_FIELDS, row)) if row else None
+
+    def counts(self):
+        """Returns the number of jobs in each state."""
+        counts = dict.fromkeys(("queued", "running", "done", "failed"), 0)
+        with self.connection() as connection:
+            counts.update(connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return counts
+
+    def record_depth(self):
+        """Updates the queued and running job gauges."""
+        with self.connection() as connection:
+            counts = dict(connection.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') GROUP BY status").fetchall())
+        for status in ("queued", "running"):
+            INGEST_JOBS.labels(status).set(counts.get(status, 0))
+
+    def start(self):
+        """Starts the worker threads in this process, if they are not running (e.g. after a fork)."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._threads = [threading.Thread(target=self.run_worker, name=f"{self.db.table}-ingest-{index}", daemon=True)
+                             for index in range(self.workers)]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=None):
+        """Stops the worker threads once they finish the jobs they are running."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._pid = None
+            self._stopping.set()
+            for _ in self._threads:
+                self._wakeup.release()
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+    def run_worker(self):
+        """Runs jobs until stopped, waiting for a submission (or the poll interval) when there are none."""
+        while not self._stopping.is_set():
+            try:
+                job = self.claim()
+                if job is None:
+                    self.purge()
+                    self._wakeup.acquire(timeout=INGEST_POLL_INTERVAL)
+                    continue
+                self.process(job)
+            except Exception:
+                logging.exception("Ingestion worker failed")
+                self._stopping.wait(INGEST_POLL_INTERVAL)
+
+    def claim(self):
+        """
+        Marks the oldest queued job that is due (or running job whose lease expired) as running.
+
+        Returns:
+            dict: The claimed job, or None if there is nothing to run.
+        """
+        with self.connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            while True:
+                now = time.time()
+                row = connection.execute("""
+                    SELECT job_id, title, attempts, submitted FROM jobs
+                    WHERE (status='queued' AND (not_before IS NULL OR not_before <= ?))
+                       OR (status='running' AND lease_expires < ?)
+                    ORDER BY submitted LIMIT 1
+                """, (now, now)).fetchone()
+                if row is None:
+                    return None
+                job_id, title, attempts, submitted = row
+                if attempts >= INGEST_MAX_ATTEMPTS:
+                    logging.warning(f"Ingestion job {job_id} abandoned after {attempts} attempts")
+                    connection.execute("UPDATE jobs SET status='failed', error=?, finished=? WHERE job_id=?",
+                                       (f"Abandoned after {attempts} attempts", now, job_id))
+                    self.remove_spool(job_id)
+                    continue
+                connection.execute("UPDATE jobs SET status='running', attempts=attempts+1, started=?, lease_expires=? "
+                                   "WHERE job_id=?", (now, now + INGEST_JOB_LEASE, job_id))
+                break
+        INGEST_JOB_WAIT.observe(now - submitted)
+        self.record_depth()
+        return {"job_id": job_id, "title": title, "attempts": attempts + 1, "submitted": submitted}
+
+    def process(self, job):
+        """Adds a claimed job's track to the database and records the outcome."""
+        path = self.spool_path(job["job_id"])
+        try:
+            with open(path, "rb") as spool:
+                track_id = self.db.insert_stream(job["title"], iter(lambda: spool.read(STREAM_CHUNK_SIZE), b""))
+        except (ValueError, FileNotFoundError) as e:
+            self.finish(job, "failed", f"Invalid track: {e}" if isinstance(e, ValueError) else "Audio is missing")
+            return
+        except Exception as e:
+            logging.warning(f"Ingestion job {job['job_id']} failed on attempt {job['attempts']}: {e}")
+            if job["attempts"] >= INGEST_MAX_ATTEMPTS:
+                self.finish(job, "failed", f"Database unavailable: {e}")
+            else:
+                self.retry(job)
+            return
+
+        if track_id == 409 and self.db.find_audio_digest(job["title"]) != self.spool_digest(path):
+            self.finish(job, "failed", "A track with this title already exists")
+        else:
+            # A 409 for the same audio is an earlier attempt of this job that committed
+            self.finish(job, "done")
+
+    def finish(self, job, status, error=None):
+        """Records a job as done or failed and drops its spooled audio."""
+        now = time.time()
+        with self.connection() as connection:
+            connection.execute("UPDATE jobs SET status=?, error=?, finished=?, lease_expires=NULL WHERE job_id=?",
+                               (status, error, now, job["job_id"]))
+        self.remove_spool(job["job_id"])
+        INGEST_JOB_LATENCY.labels(status).observe(now - job["submitted"])
+        self.record_depth()
+        if status == "done":
+            logging.info(f"Ingestion job {job['job_id']} added {job['title']}")
+        else:
+            logging.warning(f"Ingestion job {job['job_id']} failed: {error}")
+
+    def retry(self, job):
+        """Puts a job back in the queue after a transient failure, to be run once its backoff has passed."""
+        delay = min(INGEST_RETRY_BACKOFF * 2 ** (job["attempts"] - 1), INGEST_RETRY_BACKOFF_MAX)
+        with self.connection() as connection:
+            connection.execute("UPDATE jobs SET status='queued', lease_expires=NULL, not_before=? WHERE job_id=?",
+                               (time.time() + delay, job["job_id"]))
+        logging.info(f"Ingestion job {job['job_id']} will be retried in {delay:g} seconds")
+        self.record_depth()
+
+    def purge(self):
+        """Deletes finished jobs older than INGEST_JOB_RETENTION, at most once a minute."""
+        now = time.time()
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        with self.connection() as connection:
+            connection.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished < ?",
+                               (now - INGEST_JOB_RETENTION,))
+
+    def remove_spool(self, job_id):
+        """Deletes a job's spooled audio, if it is still there."""
+        try:
+            os.remove(self.spool_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def spool_digest(path):
+        """Returns the SHA-256 digest the blob store would give a spooled file."""
+        digest = hashlib.sha256()
+        with open(path, "rb") as spool:
+            for chunk in iter(lambda: spool.read(STREAM_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def reset(self):
+        """Stops the workers and deletes every job and spooled file (for testing)."""
+        self.stop()
+        with self.connection() as connection:
+            connection.execute("DELETE FROM jobs")
+        for name in os.listdir(self.spool_dir):
+            os.remove(os.path.join(self.spool_dir, name))
+        self.record_depth()
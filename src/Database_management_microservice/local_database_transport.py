@@ -0,0 +1,208 @@
+import base64
+import binascii
+import json
+import logging
+from werkzeug.http import parse_etags, quote_etag
+from werkzeug.test import EnvironBuilder
+from database_helper import TRACK_FIELDS, DEFAULT_LISTING_FIELDS
+from database_management_microservice import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, MAX_BATCH_SIZE, decode_cursor, encode_cursor, query_etag, send_audio, stream_json_list
+from database_transport import DatabaseReply, DatabaseUnavailableError
+from wav_utils import WavFormatError, check_wav_header, parse_wav_header
+
+class LocalDatabaseTransport:
+    """
+    Performs the database service's operations by calling a MusicTrackDatabase (or sharded
+    database) and its IngestionQueue in the same process.
+
+    It answers with the same statuses as the database service's routes, but tracks are handed
+    over as Python objects and raw chunks instead of being JSON encoded, sent over loopback
+    HTTP and decoded again. Database failures raise DatabaseUnavailableError, which callers
+    already handle like an unreachable service.
+    """
+
+    def __init__(self, db, ingestion):
+        self.db = db
+        self.ingestion = ingestion
+
+    def add_track(self, track):
+        """Adds a {"title", "encoded_track"} track."""
+        if not track or "title" not in track or "encoded_track" not in track:
+            return DatabaseReply(400)
+        try:
+            track_id = self.db.insert(track)
+        except WavFormatError as e:
+            logging.warning(f"Rejected malformed track: {e}")
+            return DatabaseReply(422)
+        except ValueError as e:
+            logging.warning(str(e))
+            return DatabaseReply(400)
+        except Exception as e:
+            raise DatabaseUnavailableError(f"Database unreachable: {e}") from e
+        return DatabaseReply(409 if track_id == 409 else 201)
+
+    def submit_track(self, track):
+        """Queues a {"title", "encoded_track"} track for ingestion. A 202 reply's body is the job dict."""
+        if not track or "title" not in track or "encoded_track" not in track:
+            return DatabaseReply(400)
+        try:
+            audio = base64.b64decode(track["encoded_track"], validate=True)
+        except (binascii.Error, TypeError) as e:
+            logging.warning(f"encoded_track is not valid base64: {e}")
+            return DatabaseReply(400)
+        try:
+            check_wav_header(parse_wav_header(audio))
+        except WavFormatError as e:
+            logging.warning(f"Rejected malformed track: {e}")
+            return DatabaseReply(422)
+        try:
+            job = None
+            if self.db.find_audio_digest(track["title"]) is None:
+                job = self.ingestion.submit(track["title"], audio)
+        except Exception as e:
+            raise DatabaseUnavailableError(f"Database unreachable: {e}") from e
+        return DatabaseReply(409) if job is None else DatabaseReply(202, job)
+
+    def ingestion_job(self, job_id):
+        """Reports an ingestion job's status. A 200 reply's body is the job dict."""
+        try:
+            job = self.ingestion.job(job_id)
+        except Exception as e:
+            raise DatabaseUnavailableError(f"Database unreachable: {e}") from e
+        return DatabaseReply(404) if job is None else DatabaseReply(200, job)
+
+    def upload_track(self, title, chunks):
+        """Adds a track from an iterable of raw WAV byte chunks, written straight to the blob store."""
+        if not title:
+            return DatabaseReply(400)
+        try:
+            track_id = self.db.insert_stream(title, chunks)
+        except WavFormatError as e:
+            logging.warning(f"Rejected malformed track: {e}")
+            return DatabaseReply(422)
+        except ValueError as e:
+            logging.warning(str(e))
+            return DatabaseReply(400)
+        except Exception as e:
+            raise DatabaseUnavailableError(f"Database unreachable: {e}") from e
+        return DatabaseReply(409 if track_id == 409 else 201)
+
+    def add_tracks(self, body):
+        """Adds a batch from a raw {"tracks": [...]} JSON body. The reply body is the per-item results as JSON bytes."""
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return DatabaseReply(400, b"")
+        tracks = data.get("tracks") if isinstance(data, dict) else None
+        if not isinstance(tracks, list) or not tracks:
+            return DatabaseReply(400, json.dumps({"error": "Missing tracks"}).encode())
+        if len(tracks) > MAX_BATCH_SIZE:
+            return DatabaseReply(413, json.dumps({"error": f"At most {MAX_BATCH_SIZE} tracks per batch"}).encode())
+
+        try:
+            results = self.db.insert_many(tracks)
+        except Exception as e:
+            raise DatabaseUnavailableError(f"Database unreachable: {e}") from e
+        totals = {status: sum(1 for result in results if result["status"] == status) for status in ("created", "conflict", "invalid")}
+        logging.info(f"Batch added: {totals}")
+        return DatabaseReply(200, json.dumps(dict(totals, results=results)).encode())
+
+    def delete_track(self, title):
+        """Deletes a track by title."""
+        try:
+            deleted_rows = self.db.remove_track_by_title(title)
+        except Exception as e:
+            raise DatabaseUnavailableError(f"Database unreachable: {e}") from e
+        return DatabaseReply(200 if deleted_rows else 404)
+
+    def list_tracks(self, params, if_none_match=None):
+        """
+        Lists one page of tracks, with the same ETag and X-Next-Cursor semantics as GET /db/tracks.
+
+        A 200 reply's body is an iterable of JSON array chunks, read from SQLite as it is consumed.
+        """
+        fields = params.get("fields", ",".join(DEFAULT_LISTING_FIELDS)).split(",")
+        try:
+            after = decode_cursor(params.get("after"))
+            limit = int(params.get("limit", DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return DatabaseReply(400)
+        if any(field not in TRACK_FIELDS for field in fields) or not 0 < limit <= MAX_PAGE_SIZE:
+            return DatabaseReply(400)
+
+        etag = query_etag(self.db.catalogue_tag, params)
+        if if_none_match and parse_etags(if_none_match).contains(etag):
+            return DatabaseReply(304, None, {"ETag": quote_etag(etag)})
+
+        try:
+            tracks = iter(self.db.get_all_tracks(fields=fields, after=after, limit=limit))
+            first_track = next(tracks, None)
+            cursor = self.db.next_cursor(after, limit)
+        except Exception as e:
+            raise DatabaseUnavailableError(f"Database unreachable: {e}") from e
+
+        headers = {"ETag": quote_etag(etag)}
+        if cursor is not None:
+            headers["X-Next-Cursor"] = encode_cursor(cursor)
+        return DatabaseReply(200, (chunk.encode() for chunk in stream_json_list(first_track, tracks)), headers)
+
+    def track_audio(self, title, method, headers, response_headers):
+        """
+        Serves a track's audio straight from its blob file, honouring Range and conditional headers.
+
+        The body of a 200, 206, 304 or 416 reply is an iterable of byte chunks.
+        """
+        try:
+            digest = self.db.find_audio_digest(title)
+        except Exception as e:
+            raise DatabaseUnavailableError(f"Database unreachable: {e}") from e
+        if digest is None:
+            return DatabaseReply(404)
+
+        environ = EnvironBuilder(method=method, headers=headers).get_environ()
+        try:
+            response = send_audio(self.db.blob_store_for(title), digest, title, environ)
+        except FileNotFoundError:
+            # The track was deleted between the lookup and the read
+            return DatabaseReply(404)
+
+        relayed = {name: response.headers[name] for name in response_headers if name in response.headers}
+        return DatabaseReply(response.status_code, self.stream_response(response), relayed)
+
+    @staticmethod
+    def stream_response(response):
+        """Yields a Werkzeug response's body, closing its file once it has been read."""
+        try:
+            yield from response.iter_encoded()
+        finally:
+            response.close()
+
+    def search_track(self, title):
+        """Finds the track a possibly inexact title refers to. A 200 reply's body is the track as JSON bytes."""
+        try:
+            track, _ = self.db.search_track(title)
+        except Exception as e:
+            raise DatabaseUnavailableError(f"Database unreachable: {e}") from e
+        if track is None:
+            return DatabaseReply(404)
+        return DatabaseReply(200, json.dumps(track).encode())
+
+    def search_tracks(self, titles):
+        """Looks up many titles at once. A 200 reply's body is the {title: track} dict of those found."""
+        try:
+            return DatabaseReply(200, self.db.find_tracks_by_titles(titles))
+        except Exception as e:
+            raise DatabaseUnavailableError(f"Database unreachable: {e}") from e
+
+    def match_fingerprints(self, hashes):
+        """Matches (hash, offset) landmark pairs against the fingerprint index. A 200 reply's body is the match dict."""
+        try:
+            match = self.db.match_fingerprints([(int(hash_value), int(offset)) for hash_value, offset in hashes])
+        except (TypeError, ValueError):
+            return DatabaseReply(400)
+        except Exception as e:
+            raise DatabaseUnavailableError(f"Database unreachable: {e}") from e
+        return DatabaseReply(404) if match is None else DatabaseReply(200, match)
+
+    def stats(self):
+        """Reports that calls stay in process, with the catalogue's track cache counters."""
+        return {"transport": "local", "cache": self.db.cache_stats()}
@@ -0,0 +1,135 @@
+"""
+Moves the catalogue to a different number of shards.
+
+Run it while the database service is stopped. Every track stored under another shard count
+is copied, with its blob and fingerprints, into the shard its title hashes to under the new
+count. The old files are removed once all of their tracks have been copied. Fingerprints are
+copied rather than recomputed. A title that already exists in the new layout is skipped, so an
+interrupted run can simply be repeated.
+
+Usage:
+    python src/Database_management_microservice/rebalance_shards.py --shards 4
+    python src/Database_management_microservice/rebalance_shards.py --shards 1 --table tracks
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+from database_helper import MusicTrackDatabase, DATABASE_DIR, TRACK_COLUMNS
+from sharded_database import ShardedMusicTrackDatabase, existing_layouts, shard_index, shard_table
+
+# A shard's buffered tracks are written in one transaction once there are this many, or this much audio
+REBALANCE_BATCH_TRACKS = 200
+REBALANCE_BATCH_BYTES = 128 * 1024 * 1024
+
+def open_layout(table, shards):
+    """Opens (creating if needed) the layout of table with the given shard count."""
+    return MusicTrackDatabase(table=table) if shards == 1 else ShardedMusicTrackDatabase(table=table, shards=shards)
+
+def layout_shards(database):
+    """Returns the MusicTrackDatabase shards behind a database opened by open_layout."""
+    return getattr(database, "shards", [database])
+
+def stored_tracks(shard):
+    """
+    Yields every track of one shard as the (row, audio, hashes) tuple insert_described takes.
+
+    Rows are read from a cursor in title order, so only the track being copied is held in memory.
+    """
+    with shard.connection() as connection:
+        for values in shard.list_rows(TRACK_COLUMNS):
+            hashes = connection.execute(
+                f"SELECT hash, offset FROM {shard.table}_fingerprints WHERE title=?", (values["title"],)
+            ).fetchall()
+            with shard.blob_store.open(values["digest"]) as stored:
+                audio = stored.read()
+            yield values, audio, hashes
+
+def copy_tracks(tracks, targets, on_conflict="skip", counts=None, batch_tracks=REBALANCE_BATCH_TRACKS,
+                batch_bytes=REBALANCE_BATCH_BYTES):
+    """
+    Writes (row, audio, hashes) tracks into whichever of targets each title hashes to.
+
+    Each target's tracks are buffered and written in one transaction once there are batch_tracks
+    of them or batch_bytes of audio (see MusicTrackDatabase.insert_described for on_conflict).
+
+    Returns:
+        dict: How many tracks were created, replaced and left as they were (conflict). Counts
+              are added to counts if it is given, so the caller keeps them if the copy stops early.
+    """
+    counts = {"created": 0, "replaced": 0, "conflict": 0} if counts is None else counts
+    batches = [[] for _ in targets]
+    batch_sizes = [0 for _ in targets]
+
+    def flush(index):
+        for status in targets[index].insert_described(batches[index], on_conflict=on_conflict):
+            counts[status] = counts.get(status, 0) + 1
+        batches[index], batch_sizes[index] = [], 0
+
+    for track in tracks:
+        index = shard_index(track[0]["title"], len(targets))
+        batches[index].append(track)
+        batch_sizes[index] += len(track[1])
+        if len(batches[index]) >= batch_tracks or batch_sizes[index] >= batch_bytes:
+            flush(index)
+    for index in range(len(targets)):
+        if batches[index]:
+            flush(index)
+    return counts
+
+def remove_layout(table, shards):
+    """Deletes the database files and blob stores of a layout that has been copied."""
+    directory = os.path.abspath(DATABASE_DIR)
+    for index in range(shards):
+        name = shard_table(table, index, shards)
+        for suffix in (".db", ".db-wal", ".db-shm"):
+            path = os.path.join(directory, name + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.rmtree(os.path.join(directory, name + "_blobs"), ignore_errors=True)
+
+def rebalance(table="tracks", shards=1, keep_source=False):
+    """
+    Moves every track of table stored under another shard count into a layout of shards shards.
+
+    Returns:
+        dict: Tracks copied and skipped per source shard count, and the tracks now stored.
+    """
+    target = open_layout(table, shards)
+    targets = layout_shards(target)
+    summary = {"shards": shards, "sources": {}}
+    for count in existing_layouts(table):
+        if count == shards:
+            continue
+        logging.info(f"Moving tracks from {count} shard(s) to {shards}")
+        source_summary = {"copied": 0, "skipped": 0}
+        for index in range(count):
+            source = MusicTrackDatabase(table=shard_table(table, index, count))
+            counts = copy_tracks(stored_tracks(source), targets)
+            source_summary["copied"] += counts["created"]
+            source_summary["skipped"] += counts["conflict"]
+            source.close()
+        summary["sources"][count] = source_summary
+        if not keep_source:
+            remove_layout(table, count)
+
+    summary["tracks"] = sum(count_tracks(shard) for shard in targets)
+    target.close()
+    return summary
+
+def count_tracks(shard):
+    """Returns the number of tracks stored in one shard."""
+    with shard.connection() as connection:
+        return connection.execute(f"SELECT COUNT(*) FROM {shard.table}").fetchone()[0]
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Move the catalogue to a different number of SQLite shards.")
+    parser.add_argument("--shards", type=int, required=True, help="Number of shards to move to (1 for a single file)")
+    parser.add_argument("--table", default="tracks", help="Catalogue table name (default tracks)")
+    parser.add_argument("--keep-source", action="store_true", help="Leave the old layout's files in place")
+    args = parser.parse_args()
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+    print(json.dumps(rebalance(args.table, args.shards, args.keep_source), indent=2))
@@ -0,0 +1,273 @@
+import contextvars
+import glob
+import hashlib
+import heapq
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from database_helper import MusicTrackDatabase, DATABASE_DIR, TRACK_FIELDS, DEFAULT_LISTING_FIELDS, FUZZY_MIN_SCORE, \
+    TRACK_CACHE_MAX_ENTRIES, TRACK_CACHE_MAX_BYTES, TRACK_CACHE_CHECK_VERSION
+from fingerprint import best_match
+from executors import PerProcessExecutor
+
+# Number of SQLite files the catalogue is spread across (1 keeps the single data/<table>.db layout).
+# Changing it needs an offline run of rebalance_shards.py.
+DATABASE_SHARDS = int(os.getenv("DATABASE_SHARDS", "1"))
+
+# Counters from TrackCache.stats() that are summed across shards
+CACHE_COUNTERS = ("hits", "misses", "evictions", "invalidations", "stale_puts", "entries", "bytes", "version", "max_entries", "max_bytes")
+
+def shard_index(title, shards):
+    """Returns the shard a title belongs to: a stable hash, so it does not depend on the process or Python version."""
+    return int.from_bytes(hashlib.sha256(title.encode("utf-8")).digest()[:8], "big") % shards
+
+def shard_table(table, index, shards):
+    """Names the table (and so the data/<name>.db file) of one shard."""
+    return table if shards == 1 else f"{table}_shard{index}of{shards}"
+
+def existing_layouts(table="tracks"):
+    """Returns the shard counts that have database files for table in DATABASE_DIR, in ascending order."""
+    directory = os.path.abspath(DATABASE_DIR)
+    layouts = set()
+    if os.path.exists(os.path.join(directory, f"{table}.db")):
+        layouts.add(1)
+    pattern = re.compile(rf"{re.escape(table)}_shard\d+of(\d+)\.db$")
+    for path in glob.glob(os.path.join(glob.escape(directory), f"{glob.escape(table)}_shard*of*.db")):
+        match = pattern.match(os.path.basename(path))
+        if match:
+            layouts.add(int(match.group(1)))
+    return sorted(layouts)
+
+def open_database(table="tracks", shards=DATABASE_SHARDS, **options):
+    """
+    Opens the catalogue with the configured number of shards.
+
+    Returns:
+        MusicTrackDatabase for a single shard, otherwise a ShardedMusicTrackDatabase.
+    """
+    stale_layouts = [count for count in existing_layouts(table) if count != shards]
+    if stale_layouts:
+        logging.warning(f"Tracks stored with {', '.join(map(str, stale_layouts))} shard(s) are not served with {shards}; "
+                        "run rebalance_shards.py to move them")
+    if shards == 1:
+        return MusicTrackDatabase(table=table, **options)
+    return ShardedMusicTrackDatabase(table=table, shards=shards, **options)
+
+class ShardedMusicTrackDatabase:
+    """
+    Spreads the catalogue across several MusicTrackDatabase shards, each its own SQLite file
+    and blob store, by a stable hash of the title.
+
+    Writers of different shards never wait for each other's lock. Anything keyed by title
+    (inserts, deletes, exact lookups) goes to a single shard. Searches, listings and
+    fingerprint matches are sent to every shard in parallel and their results merged, so
+    callers see the same answers as from a single MusicTrackDatabase.
+    """
+
+    def __init__(self, table="tracks", shards=4, pool_size=8, cache_entries=TRACK_CACHE_MAX_ENTRIES, cache_bytes=TRACK_CACHE_MAX_BYTES,
+                 check_version=TRACK_CACHE_CHECK_VERSION):
+        if shards < 2:
+            raise ValueError("A sharded database needs at least two shards")
+        self.table = table
+        self.shards = [
+            MusicTrackDatabase(table=shard_table(table, index, shards), pool_size=pool_size,
+                               cache_entries=cache_entries // shards, cache_bytes=cache_bytes // shards, check_version=check_version)
+            for index in range(shards)
+        ]
+        # Made per process, as the database is opened before the launcher forks its workers
+        self.executor = PerProcessExecutor(lambda: ThreadPoolExecutor(max_workers=shards, thread_name_prefix=f"{table}-shard"))
+        self.epoch = hashlib.sha256("".join(shard.epoch for shard in self.shards).encode("ascii")).hexdigest()[:8]
+
+    @property
+    def version(self):
+        """The catalogue version: the sum of the shards' versions, so it rises with every change to any of them."""
+        return sum(shard.version for shard in self.shards)
+
+    @property
+    def catalogue_tag(self):
+        """Identifies the catalogue's current contents, for ETags."""
+        for shard in self.shards:
+            shard.sync_version()
+        return f"{self.epoch}.{self.version}"
+
+    @property
+    def fuzzy_search(self):
+        return all(shard.fuzzy_search for shard in self.shards)
+
+    def shard_for(self, title):
+        """Returns the shard holding (or due to hold) a title."""
+        return self.shards[shard_index(title, len(self.shards))]
+
+    def scatter(self, function, shards=None):
+        """
+        Calls function(shard) for every shard in parallel.
+
+        Returns:
+            list: The results, in shard order. The first exception raised is re-raised.
+        """
+        shards = self.shards if shards is None else shards
+        # Each call gets its own copy of the context, so request IDs reach the shards' spans
+        futures = [self.executor.submit(contextvars.copy_context().run, function, shard) for shard in shards]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """Closes every shard's idle pooled connections."""
+        for shard in self.shards:
+            shard.close()
+
+    def cache_stats(self):
+        """Returns the shards' track cache counters added together, with the catalogue epoch."""
+        stats = [shard.track_cache.stats() for shard in self.shards]
+        return dict({counter: sum(shard_stats[counter] for shard_stats in stats) for counter in CACHE_COUNTERS},
+                    epoch=self.epoch, shards=len(self.shards))
+
+    def blob_store_for(self, title):
+        """Returns the blob store holding a track's audio."""
+        return self.shard_for(title).blob_store
+
+    def insert(self, js):
+        """Inserts a track into its shard (see MusicTrackDatabase.insert)."""
+        return self.shard_for(js["title"]).insert(js)
+
+    def insert_stream(self, title, chunks):
+        """Inserts a streamed track into its shard (see MusicTrackDatabase.insert_stream)."""
+        return self.shard_for(title).insert_stream(title, chunks)
+
+    def insert_many(self, tracks):
+        """
+        Inserts a batch of tracks, one transaction per shard, with the shards written in parallel.
+
+        Returns:
+            list: One {"title", "status"} dict per item, in the order given (see MusicTrackDatabase.insert_many).
+        """
+        results = [None] * len(tracks)
+        batches = {}
+        for position, js in enumerate(tracks):
+            title = js.get("title") if isinstance(js, dict) else None
+            if not isinstance(title, str) or not title:
+                results[position] = {"title": title, "status": "invalid", "error": "Missing required fields"}
+                continue
+            batches.setdefault(self.shard_for(title), []).append(position)
+
+        shard_results = self.scatter(lambda shard: shard.insert_many([tracks[position] for position in batches[shard]]), list(batches))
+        for positions, batch_results in zip(batches.values(), shard_results):
+            for position, result in zip(positions, batch_results):
+                results[position] = result
+        return results
+
+    def remove_track_by_title(self, title):
+        """Deletes a track from its shard and returns the number of deleted rows."""
+        return self.shard_for(title).remove_track_by_title(title)
+
+    def find_track_by_title(self, title):
+        """Retrieves a single track from its shard (returns None if not found)."""
+        return self.shard_for(title).find_track_by_title(title)
+
+    def find_audio_digest(self, title):
+        """Returns the blob store digest of a track's audio, or None if the title is not found."""
+        return self.shard_for(title).find_audio_digest(title)
+
+    def find_track_by_normalised_title(self, title):
+        """Retrieves the first track (by title) in any shard sharing title's normalised form, or None."""
+        tracks = [track for track in self.scatter(lambda shard: shard.find_track_by_normalised_title(title)) if track]
+        return min(tracks, key=lambda track: track["title"]) if tracks else None
+
+    def search_track(self, title, fuzzy=True, min_score=FUZZY_MIN_SCORE):
+        """
+        Finds the track a possibly inexact title refers to, like MusicTrackDatabase.search_track.
+
+        Returns:
+            tuple: (track dict, how it matched: "exact", "normalised" or "fuzzy"), or (None, None).
+        """
+        track = self.find_track_by_title(title)
+        if track is not None:
+            return track, "exact"
+
+        track = self.find_track_by_normalised_title(title)
+        if track is not None:
+            return track, "normalised"
+
+        if fuzzy:
+            matches = self.rank_titles(title, limit=1)
+            if matches and matches[0]["score"] >= min_score:
+                return self.find_track_by_title(matches[0]["title"]), "fuzzy"
+        return None, None
+
+    def rank_titles(self, title, limit=10):
+        """
+        Ranks catalogue titles by similarity to title, merging each shard's best candidates.
+
+        Returns:
+            list: Up to limit {"title", "score"} dicts, best first.
+        """
+        matches = [match for shard_matches in self.scatter(lambda shard: shard.rank_titles(title, limit=limit))
+                   for match in shard_matches]
+        matches.sort(key=lambda match: (-match["score"], match["title"]))
+        return matches[:limit]
+
+    def find_tracks_by_titles(self, titles):
+        """
+        Retrieves every track whose title is in titles, as a {title: track} dict (missing titles are left out).
+
+        Exact titles are looked up in their own shard. Titles without an exact match fall back
+        to the normalised-title index of every shard, taking the first matching title overall.
+        """
+        titles = list(dict.fromkeys(titles))
+        batches = {}
+        for title in titles:
+            batches.setdefault(self.shard_for(title), []).append(title)
+
+        tracks = {}
+        for shard_tracks in self.scatter(lambda shard: shard.find_tracks_by_exact_titles(batches[shard]), list(batches)):
+            tracks.update(shard_tracks)
+
+        missing = [title for title in titles if title not in tracks]
+        if missing:
+            for shard_tracks in self.scatter(lambda shard: shard.find_tracks_by_normalised_titles(missing)):
+                for requested, track in shard_tracks.items():
+                    if requested not in tracks or track["title"] < tracks[requested]["title"]:
+                        tracks[requested] = track
+        return tracks
+
+    def get_all_tracks(self, fields=DEFAULT_LISTING_FIELDS, after=None, limit=None):
+        """
+        Yields tracks ordered by title, merged from every shard.
+
+        For a page (limit given), each shard's first limit rows after the cursor are read in
+        parallel without their audio; the merged page's audio is then read one track at a time
+        as it is yielded. Without a limit the shards are merged lazily, row by row.
+        """
+        unknown_fields = [field for field in fields if field not in TRACK_FIELDS]
+        if unknown_fields:
+            raise ValueError(f"Unknown fields: {', '.join(unknown_fields)}")
+
+        columns = list(dict.fromkeys(["title"] + [TRACK_FIELDS[field] for field in fields]))
+        if limit is None:
+            rows = heapq.merge(*(shard.list_rows(columns, after=after) for shard in self.shards), key=lambda values: values["title"])
+        else:
+            pages = self.scatter(lambda shard: list(shard.list_rows(columns, after=after, limit=limit)))
+            rows = islice(heapq.merge(*pages, key=lambda values: values["title"]), limit)
+        for values in rows:
+            yield self.shard_for(values["title"]).track_from_row(values, fields)
+
+    def next_cursor(self, after, limit):
+        """Returns the cursor for the page following (after, limit), or None if it is the last page."""
+        pages = self.scatter(lambda shard: [values["title"] for values in shard.list_rows(["title"], after=after, limit=limit + 1)])
+        titles = list(islice(heapq.merge(*pages), limit + 1))
+        return titles[limit - 1] if len(titles) == limit + 1 else None
+
+    def match_fingerprints(self, hashes):
+        """
+        Votes on the best matching track using every shard's fingerprint index.
+
+        Returns:
+            dict: {"title", "score", "offset", "offset_seconds"} of the best match, or None.
+        """
+        candidates = [row for shard_rows in self.scatter(lambda shard: shard.fingerprint_candidates(hashes)) for row in shard_rows]
+        return best_match(hashes, candidates)
+
+    def reset_database(self):
+        """Deletes all tracks from every shard."""
+        self.scatter(lambda shard: shard.reset_database())
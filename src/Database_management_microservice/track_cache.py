@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict
+
+class TrackCache:
+    """
+    Bounded LRU cache of find_track_by_title results, keyed by exact title.
+
+    Misses (None) are cached too, so repeated lookups of unknown titles skip SQLite as well.
+    Entries are evicted least recently used first once either max_entries or max_bytes of
+    encoded audio is exceeded.
+
+    The cache knows the catalogue version it is valid for. A reader notes the version before
+    querying and passes it to put(); if the catalogue changed in the meantime the result may
+    be stale and is not cached. Writers call invalidate() after committing, which drops the
+    titles they changed and advances the version.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, version=0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = version
+
+        self._entries = OrderedDict()  # title -> track dict or None
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "stale_puts": 0}
+
+    def get(self, title):
+        """Returns (True, track or None) on a hit, (False, None) on a miss."""
+        with self._lock:
+            if title not in self._entries:
+                self._counters["misses"] += 1
+                return False, None
+            self._entries.move_to_end(title)
+            self._counters["hits"] += 1
+            return True, self._entries[title]
+
+    def put(self, title, track, read_version):
+        """Caches a lookup result read at read_version, unless the catalogue has changed since."""
+        size = self._size(title, track)
+        with self._lock:
+            if read_version != self.version:
+                self._counters["stale_puts"] += 1
+                return
+            if self.max_entries <= 0 or size > self.max_bytes:
+                return
+            self._remove(title)
+            self._entries[title] = track
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+
+    def invalidate(self, titles, version):
+        """Drops the given titles (every entry if titles is None) after a change committed at version."""
+        with self._lock:
+            self.version = max(self.version, version)
+            if titles is None:
+                self._counters["invalidations"] += len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+                return
+            for title in titles:
+                if title in self._entries:
+                    self._remove(title)
+                    self._counters["invalidations"] += 1
+
+    def stats(self):
+        """Returns the cache counters and current size."""
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), bytes=self._bytes, version=self.version,
+                        max_entries=self.max_entries, max_bytes=self.max_bytes)
+
+    def _remove(self, title):
+        """Drops one entry if present. Caller must hold the lock."""
+        if title in self._entries:
+            self._bytes -= self._size(title, self._entries.pop(title))
+
+    @staticmethod
+    def _size(title, track):
+        return len(title) + (len(track["encoded_track"]) if track else 0)
@@ -0,0 +1,101 @@
+import requests
+from collections import namedtuple
+
+# The outcome of a database operation: an HTTP-style status, the operation's result (see each
+# method) and any response headers the caller should relay.
+DatabaseReply = namedtuple("DatabaseReply", ["status", "body", "headers"], defaults=(None, {}))
+
+class DatabaseUnavailableError(requests.exceptions.RequestException):
+    """Raised by an in-process transport when the database fails, as a failed HTTP call would be."""
+
+class HttpDatabaseTransport:
+    """
+    Performs the database service's operations over HTTP, through a ServiceClient.
+
+    This is the transport of the separate-microservice deployment. LocalDatabaseTransport
+    (in the database service's package) offers the same methods by calling a
+    MusicTrackDatabase in the same process, for the composed deployment.
+
+    Every method returns a DatabaseReply, or raises requests.exceptions.RequestException if
+    the service could not be reached.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def add_track(self, track):
+        """Adds a {"title", "encoded_track"} track. The reply carries only the status."""
+        return DatabaseReply(self.client.post("/db/tracks", json=track).status_code)
+
+    def submit_track(self, track):
+        """Queues a {"title", "encoded_track"} track for ingestion. A 202 reply's body is the job dict."""
+        response = self.client.post("/db/jobs", json=track)
+        return DatabaseReply(response.status_code, response.json() if response.status_code == 202 else None)
+
+    def ingestion_job(self, job_id):
+        """Reports an ingestion job's status. A 200 reply's body is the job dict."""
+        response = self.client.get(f"/db/jobs/{job_id}")
+        return DatabaseReply(response.status_code, response.json() if response.status_code == 200 else None)
+
+    def upload_track(self, title, chunks):
+        """Adds a track from an iterable of raw WAV byte chunks, sent with chunked transfer encoding."""
+        response = self.client.post("/db/tracks/upload", params={"title": title}, data=chunks,
+                                    headers={"Content-Type": "application/octet-stream"})
+        return DatabaseReply(response.status_code)
+
+    def add_tracks(self, body):
+        """Adds a batch from a raw {"tracks": [...]} JSON body. The reply body is the per-item results as JSON bytes."""
+        response = self.client.post("/db/tracks/batch", data=body, headers={"Content-Type": "application/json"})
+        return DatabaseReply(response.status_code, response.content)
+
+    def delete_track(self, title):
+        """Deletes a track by title."""
+        return DatabaseReply(self.client.delete(f"/db/tracks/{title}").status_code)
+
+    def list_tracks(self, params, if_none_match=None):
+        """
+        Lists one page of tracks (params as for GET /db/tracks).
+
+        A 200 reply's body is an iterable of JSON array chunks, with the ETag and X-Next-Cursor
+        headers. A 304 reply carries just the ETag.
+        """
+        headers = {"If-None-Match": if_none_match} if if_none_match else {}
+        response = self.client.get("/db/tracks", params=params, headers=headers, stream=True)
+        relayed = {name: response.headers[name] for name in ("ETag", "X-Next-Cursor") if name in response.headers}
+        if response.status_code != 200:
+            response.close()
+            return DatabaseReply(response.status_code, None, relayed)
+        return DatabaseReply(200, response.iter_content(chunk_size=64 * 1024), relayed)
+
+    def track_audio(self, title, method, headers, response_headers):
+        """
+        Fetches a track's audio, passing Range and conditional headers through.
+
+        The body of a 200, 206, 304 or 416 reply is an iterable of byte chunks, and the headers
+        are those of response_headers the service sent.
+        """
+        response = self.client.request(method, f"/db/tracks/{title}/audio", headers=headers, stream=True)
+        if response.status_code not in (200, 206, 304, 416):
+            response.close()
+            return DatabaseReply(response.status_code)
+        relayed = {name: response.headers[name] for name in response_headers if name in response.headers}
+        return DatabaseReply(response.status_code, response.iter_content(chunk_size=64 * 1024), relayed)
+
+    def search_track(self, title):
+        """Finds the track a possibly inexact title refers to. A 200 reply's body is the track as JSON bytes."""
+        response = self.client.get("/db/tracks/search", params={"title": title})
+        return DatabaseReply(response.status_code, response.content if response.status_code == 200 else None)
+
+    def search_tracks(self, titles):
+        """Looks up many titles at once. A 200 reply's body is the {title: track} dict of those found."""
+        response = self.client.post("/db/tracks/search/batch", json={"titles": titles})
+        return DatabaseReply(response.status_code, response.json()["tracks"] if response.status_code == 200 else None)
+
+    def match_fingerprints(self, hashes):
+        """Matches (hash, offset) landmark pairs against the fingerprint index. A 200 reply's body is the match dict."""
+        response = self.client.post("/db/fingerprints/match", json={"hashes": hashes})
+        return DatabaseReply(response.status_code, response.json() if response.status_code == 200 else None)
+
+    def stats(self):
+        """Returns the client's connection pool and circuit breaker state."""
+        return self.client.stats()
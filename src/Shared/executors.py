@@ -0,0 +1,30 @@
+import os
+import threading
+
+class PerProcessExecutor:
+    """
+    A concurrent.futures executor that is made on first use in each process.
+
+    The threads of an executor, and the pipes and children of a process pool, do not carry
+    over a fork. One made while a service module is imported in the Gunicorn master (see
+    launcher.py) would be unusable, or shared, in the forked workers, so each process that
+    submits work gets an executor of its own from factory().
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Returns this process's executor, making it if this process has not used one yet."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = self.factory()
+                    self._pid = os.getpid()
+        return self._executor
+
+    def submit(self, function, *args, **kwargs):
+        return self.get().submit(function, *args, **kwargs)
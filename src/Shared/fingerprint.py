@@ -0,0 +1,123 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from wav_utils import read_wav, to_mono, resample
+
+# Spectrogram settings (all tracks are analysed at the same rate so hashes are comparable)
+SAMPLE_RATE = 8000
+WINDOW_SIZE = 1024
+HOP_SIZE = 256
+
+# Peak picking settings
+PEAK_NEIGHBOURHOOD_FREQ = 15
+PEAK_NEIGHBOURHOOD_TIME = 11
+PEAK_MIN_DB = -60.0
+
+# Landmark pairing settings
+FAN_OUT = 10
+TARGET_MIN_DT = 1
+TARGET_MAX_DT = 63
+TARGET_MAX_DF = 127
+
+# Matching settings
+MIN_MATCH_SCORE = 10
+
+def spectrogram(samples):
+    """Computes a log-magnitude spectrogram of shape (frequency bins, frames)."""
+    if len(samples) < WINDOW_SIZE:
+        samples = np.pad(samples, (0, WINDOW_SIZE - len(samples)))
+    frames = sliding_window_view(samples, WINDOW_SIZE)[::HOP_SIZE]
+    window = np.hanning(WINDOW_SIZE).astype(np.float32)
+    magnitude = np.abs(np.fft.rfft(frames * window, axis=1)).T
+    return 20.0 * np.log10(np.maximum(magnitude, 1e-10))
+
+def _maximum_filter(values, size, axis):
+    """Running maximum of the given window size along one axis (same output shape)."""
+    pad = [(0, 0)] * values.ndim
+    pad[axis] = (size // 2, size // 2)
+    padded = np.pad(values, pad, mode="constant", constant_values=-np.inf)
+    return sliding_window_view(padded, size, axis=axis).max(axis=-1)
+
+def find_peaks(spec):
+    """
+    Picks the constellation points: bins that are the maximum of their neighbourhood.
+
+    Returns:
+        tuple: (frequency bin indices, frame indices), sorted by frame.
+    """
+    local_max = _maximum_filter(_maximum_filter(spec, PEAK_NEIGHBOURHOOD_FREQ, 0), PEAK_NEIGHBOURHOOD_TIME, 1)
+    threshold = max(PEAK_MIN_DB, spec.max() - 80.0)
+    freqs, times = np.nonzero((spec == local_max) & (spec > threshold))
+    order = np.argsort(times, kind="stable")
+    return freqs[order], times[order]
+
+def landmark_hashes(freqs, times):
+    """
+    Pairs each anchor peak with up to FAN_OUT later peaks in its target zone.
+
+    Each pair is packed into a 32-bit hash of (anchor frequency, target frequency, time delta).
+
+    Returns:
+        list: (hash, anchor frame) tuples.
+    """
+    hashes = []
+    count = len(freqs)
+    for i in range(count):
+        paired = 0
+        for j in range(i + 1, count):
+            dt = times[j] - times[i]
+            if dt < TARGET_MIN_DT:
+                continue
+            if dt > TARGET_MAX_DT:
+                break
+            if abs(int(freqs[j]) - int(freqs[i])) > TARGET_MAX_DF:
+                continue
+            hashes.append(((int(freqs[i]) << 19) | (int(freqs[j]) << 6) | int(dt), int(times[i])))
+            paired += 1
+            if paired == FAN_OUT:
+                break
+    return hashes
+
+def fingerprint_samples(samples, sample_rate):
+    """Fingerprints decoded samples (mono or multi-channel) at any sample rate."""
+    mono = resample(to_mono(samples), sample_rate, SAMPLE_RATE)
+    return landmark_hashes(*find_peaks(spectrogram(mono)))
+
+def fingerprint_wav(data):
+    """Fingerprints the raw bytes of a WAV file."""
+    samples, sample_rate = read_wav(data)
+    return fingerprint_samples(samples, sample_rate)
+
+def best_match(query_hashes, candidates):
+    """
+    Scores candidate matches by offset-histogram voting.
+
+    A true match lines up many hashes at the same (track offset - fragment offset), so each
+    track's score is the height of the tallest bin in its histogram of offset differences.
+
+    Args:
+        query_hashes: (hash, fragment offset) tuples from the fragment.
+        candidates: (hash, track title, track offset) rows from the index.
+
+    Returns:
+        dict: {"title", "score", "offset"} of the best track, or None if nothing scores MIN_MATCH_SCORE.
+    """
+    query_offsets = {}
+    for hash_value, offset in query_hashes:
+        query_offsets.setdefault(hash_value, []).append(offset)
+
+    votes = {}
+    for hash_value, title, track_offset in candidates:
+        for query_offset in query_offsets.get(hash_value, ()):
+            votes.setdefault(title, []).append(track_offset - query_offset)
+
+    best = None
+    for title, differences in votes.items():
+        values, counts = np.unique(np.asarray(differences), return_counts=True)
+        peak = int(counts.argmax())
+        if best is None or counts[peak] > best["score"]:
+            best = {"title": title, "score": int(counts[peak]), "offset": int(values[peak])}
+
+    if best is None or best["score"] < MIN_MATCH_SCORE:
+        return None
+    best["offset_seconds"] = best["offset"] * HOP_SIZE / SAMPLE_RATE
+    return best
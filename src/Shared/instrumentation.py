@@ -0,0 +1,215 @@
+"""
+Prometheus metrics shared by the microservices.
+
+instrument_app() adds GET /metrics to a Flask app (instrument_async_app() to a Quart app) and
+records per-route request counts, latency, payload sizes and in-flight requests. Outbound
+calls are timed with time_outbound() and SQLite access with the timed_method() decorator.
+
+Every metric carries the recording service's name where it applies, so apps sharing a
+process (e.g. under test) keep separate series. Under several worker processes (see
+launcher.py), PROMETHEUS_MULTIPROC_DIR is set and /metrics aggregates every worker's values.
+"""
+import functools
+import inspect
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from tracing import record_span, span
+
+# Latency buckets in seconds, from sub-millisecond SQLite lookups up to slow AudD.io calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Payload buckets in bytes, from 256 B JSON bodies up to 64 MiB tracks
+SIZE_BUCKETS = tuple(256 * 4 ** power for power in range(10))
+
+HTTP_REQUESTS = Counter("http_requests_total", "Requests handled, by route and status.",
+                        ["service", "method", "route", "status"])
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "Time to produce a response (first byte for streamed bodies).",
+                         ["service", "method", "route"], buckets=LATENCY_BUCKETS)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled.", ["service"],
+                       multiprocess_mode="livesum")
+HTTP_REQUEST_SIZE = Histogram("http_request_size_bytes", "Request body sizes.", ["service", "route"], buckets=SIZE_BUCKETS)
+HTTP_RESPONSE_SIZE = Histogram("http_response_size_bytes", "Response body sizes (when known before streaming).",
+                               ["service", "route"], buckets=SIZE_BUCKETS)
+
+OUTBOUND_LATENCY = Histogram("outbound_request_duration_seconds", "Calls to other services, by target and outcome.",
+                             ["target", "method", "outcome"], buckets=LATENCY_BUCKETS)
+AUDD_THROTTLED = Counter("audd_throttled_total", "AudD.io calls refused before being sent, by reason (rate, quota, backoff).",
+                         ["reason"])
+OUTBOUND_REQUEST_SIZE = Histogram("outbound_request_size_bytes", "Payload sizes sent to other services.",
+                                  ["target"], buckets=SIZE_BUCKETS)
+
+INGEST_JOBS = Gauge("ingest_jobs", "Ingestion jobs waiting or being processed.", ["status"], multiprocess_mode="mostrecent")
+INGEST_JOB_WAIT = Histogram("ingest_job_wait_seconds", "Time ingestion jobs spent queued before a worker started them.",
+                            buckets=LATENCY_BUCKETS)
+INGEST_JOB_LATENCY = Histogram("ingest_job_duration_seconds", "Time from submitting an ingestion job to its outcome.",
+                               ["outcome"], buckets=LATENCY_BUCKETS)
+
+SQLITE_LATENCY = Histogram("sqlite_method_duration_seconds", "Time spent in MusicTrackDatabase methods.",
+                           ["method"], buckets=LATENCY_BUCKETS)
+
+def route_label(url_rule):
+    """Labels a request by its route pattern rather than its URL, so titles do not create new series."""
+    return url_rule.rule if url_rule is not None else "unmatched"
+
+def metrics_response():
+    """Returns the Prometheus exposition body and content type, summed over worker processes if there are several."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+def instrument_app(app, service):
+    """Records request metrics for a Flask app and serves them at GET /metrics."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        HTTP_IN_FLIGHT.labels(service).inc()
+
+    @app.after_request
+    def record_request(response):
+        g.metrics_recorded = True
+        route = route_label(request.url_rule)
+        HTTP_REQUESTS.labels(service, request.method, route, response.status_code).inc()
+        HTTP_LATENCY.labels(service, request.method, route).observe(time.perf_counter() - g.metrics_started)
+        if request.content_length:
+            HTTP_REQUEST_SIZE.labels(service, route).observe(request.content_length)
+        if response.content_length is not None:
+            HTTP_RESPONSE_SIZE.labels(service, route).observe(response.content_length)
+        return response
+
+    @app.teardown_request
+    def finish_request(exception=None):
+        # Popped so a preserved context torn down twice (e.g. under the test client) counts once
+        started = g.pop("metrics_started", None)
+        recorded = g.pop("metrics_recorded", False)
+        if started is None:
+            return
+        HTTP_IN_FLIGHT.labels(service).dec()
+        if exception is not None and not recorded:  # Escaped without a response reaching after_request
+            route = route_label(request.url_rule)
+            HTTP_REQUESTS.labels(service, request.method, route, 500).inc()
+            HTTP_LATENCY.labels(service, request.method, route).observe(time.perf_counter() - started)
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        """
+        Reports request, outbound call and SQLite metrics in Prometheus text format.
+
+        Returns:
+            The current metric values.
+        """
+        body, content_type = metrics_response()
+        return Response(body, status=200, content_type=content_type)
+
+def instrument_async_app(app, service):
+    """Records request metrics for a Quart app and serves them at GET /metrics."""
+    from quart import Response, g, request
+
+    @app.before_request
+    async def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        HTTP_IN_FLIGHT.labels(service).inc()
+
+    @app.after_request
+    async def record_request(response):
+        g.metrics_recorded = True
+        route = route_label(request.url_rule)
+        HTTP_REQUESTS.labels(service, request.method, route, response.status_code).inc()
+        HTTP_LATENCY.labels(service, request.method, route).observe(time.perf_counter() - g.metrics_started)
+        if request.content_length:
+            HTTP_REQUEST_SIZE.labels(service, route).observe(request.content_length)
+        if response.content_length is not None:
+            HTTP_RESPONSE_SIZE.labels(service, route).observe(response.content_length)
+        return response
+
+    @app.teardown_request
+    async def finish_request(exception=None):
+        # Popped so a preserved context torn down twice (e.g. under the test client) counts once
+        started = g.pop("metrics_started", None)
+        recorded = g.pop("metrics_recorded", False)
+        if started is None:
+            return
+        HTTP_IN_FLIGHT.labels(service).dec()
+        if exception is not None and not recorded:  # Escaped without a response reaching after_request
+            route = route_label(request.url_rule)
+            HTTP_REQUESTS.labels(service, request.method, route, 500).inc()
+            HTTP_LATENCY.labels(service, request.method, route).observe(time.perf_counter() - started)
+
+    @app.route("/metrics", methods=["GET"])
+    async def metrics():
+        """
+        Reports request, outbound call and SQLite metrics in Prometheus text format.
+
+        Returns:
+            The current metric values.
+        """
+        body, content_type = metrics_response()
+        return Response(body, status=200, content_type=content_type)
+
+@contextmanager
+def time_outbound(target, method, size=None):
+    """
+    Times a call to another service, as a metric and a span.
+
+    Yields a dict; set its "outcome" (e.g. the status code) before the block exits. Calls
+    that raise are recorded with outcome "error".
+    """
+    if size is not None:
+        OUTBOUND_REQUEST_SIZE.labels(target).observe(size)
+    call = {"outcome": "unknown"}
+    started = time.perf_counter()
+    with span(f"{method} {target}", kind="client") as attributes:
+        try:
+            yield call
+        except BaseException:
+            call["outcome"] = "error"
+            raise
+        finally:
+            attributes["outcome"] = call["outcome"]
+            OUTBOUND_LATENCY.labels(target, method, str(call["outcome"])).observe(time.perf_counter() - started)
+
+def timed_method(function):
+    """
+    Records the time spent in a database method under its name, as a metric and a span.
+
+    For generator methods only the time spent producing rows is counted, not the time the
+    caller spends between them.
+    """
+    name = function.__name__
+    histogram = SQLITE_LATENCY.labels(name)
+
+    if inspect.isgeneratorfunction(function):
+        @functools.wraps(function)
+        def generator_wrapper(*args, **kwargs):
+            generator = function(*args, **kwargs)
+            elapsed, started_at = 0.0, time.time()
+            try:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        elapsed += time.perf_counter() - started
+                    yield item
+            finally:
+                generator.close()
+                histogram.observe(elapsed)
+                record_span(name, started_at, elapsed, kind="sqlite")
+        return generator_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            with span(name, kind="sqlite"):
+                return function(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+    return wrapper
@@ -0,0 +1,207 @@
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from instrumentation import time_outbound
+from tracing import trace_headers
+
+# Methods that are safe to send again if the first attempt failed
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# Responses that mean the service itself is unhealthy (retried for idempotent calls, counted by the breaker)
+RETRYABLE_STATUSES = {502, 503, 504}
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling a service whose circuit breaker is open."""
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing service so callers fail fast instead of waiting on timeouts.
+
+    After failure_threshold consecutive failures the circuit opens and every call is refused
+    for reset_timeout seconds. It then half-opens and lets a single trial call through:
+    success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=10.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._times_opened = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Returns True if a call may go ahead."""
+        with self._lock:
+            if self._state == "open" and self.clock() - self._opened_at >= self.reset_timeout:
+                self._state = "half_open"
+                self._trial_in_flight = False
+
+            if self._state == "closed":
+                return True
+            if self._state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    self._times_opened += 1
+                self._state = "open"
+                self._opened_at = self.clock()
+
+    def release_trial(self):
+        """Lets another trial call through after one that ended without an answer either way (e.g. the caller's own error)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def stats(self):
+        """Returns the breaker's state for health reporting."""
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "times_opened": self._times_opened,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout": self.reset_timeout,
+            }
+
+class ServiceClient:
+    """
+    Keep-alive HTTP client for calls between the microservices.
+
+    All calls share one pooled requests.Session, carry connect/read timeouts, are retried
+    with jittered exponential backoff when idempotent, and go through a circuit breaker.
+    Every attempt is timed in the outbound call metrics under name, and carries the
+    current request ID.
+    """
+
+    def __init__(self, base_url, connect_timeout=2.0, read_timeout=10.0, retries=2, backoff=0.05, pool_size=20, breaker=None, name=None):
+        self.base_url = base_url.rstrip("/")
+        self.name = name or self.base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.breaker = breaker or CircuitBreaker()
+
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+        self._counters = {"requests": 0, "failures": 0, "retries": 0, "rejected": 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, base_url, prefix):
+        """Builds a client configured by <prefix>_CONNECT_TIMEOUT, _READ_TIMEOUT, _RETRIES, _POOL_SIZE,
+        _BREAKER_THRESHOLD and _BREAKER_RESET environment variables."""
+        return cls(
+            os.getenv(f"{prefix}_URL", base_url),
+            connect_timeout=float(os.getenv(f"{prefix}_CONNECT_TIMEOUT", "2")),
+            read_timeout=float(os.getenv(f"{prefix}_READ_TIMEOUT", "10")),
+            retries=int(os.getenv(f"{prefix}_RETRIES", "2")),
+            pool_size=int(os.getenv(f"{prefix}_POOL_SIZE", "20")),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv(f"{prefix}_BREAKER_THRESHOLD", "5")),
+                reset_timeout=float(os.getenv(f"{prefix}_BREAKER_RESET", "10")),
+            ),
+            name=prefix.lower(),
+        )
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def request(self, method, path, **kwargs):
+        """
+        Sends a request to the service.
+
+        Raises:
+            CircuitOpenError: If the breaker is open.
+            requests.exceptions.RequestException: If every attempt failed to get a response.
+        """
+        attempts = self.retries + 1 if method in IDEMPOTENT_METHODS else 1
+        kwargs.setdefault("timeout", self.timeout)
+        headers = kwargs.pop("headers", None)
+
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                self._count("rejected")
+                raise CircuitOpenError(f"Circuit open for {self.base_url}")
+
+            self._count("requests")
+            try:
+                with time_outbound(self.name, method) as call:
+                    response = self.session.request(method, self.base_url + path, headers=trace_headers(headers), **kwargs)
+                    call["outcome"] = response.status_code
+            except requests.exceptions.RequestException:
+                self._count("failures")
+                self.breaker.record_failure()
+                if attempt + 1 == attempts:
+                    raise
+            except BaseException:
+                # Not the service's failure (e.g. the client's upload body broke off), but a half-open
+                # trial must not stay in flight, or the breaker would refuse every later call
+                self.breaker.release_trial()
+                raise
+            else:
+                if response.status_code not in RETRYABLE_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                self._count("failures")
+                self.breaker.record_failure()
+                if attempt + 1 == attempts:
+                    return response
+                response.close()
+
+            self._count("retries")
+            # Full jitter keeps retries from many callers from arriving in lockstep
+            time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def stats(self):
+        """Returns request counters, connection pool usage and breaker state."""
+        pools = self.adapter.poolmanager.pools
+        connection_pools = [pools[key] for key in list(pools.keys())]
+        with self._lock:
+            counters = dict(self._counters)
+        return dict(
+            counters,
+            base_url=self.base_url,
+            pool={
+                "max_size": self.pool_size,
+                "connections_opened": sum(pool.num_connections for pool in connection_pools),
+                "requests_sent": sum(pool.num_requests for pool in connection_pools),
+                # urllib3 pads its queue with None placeholders, so count only real connections
+                "idle_connections": sum(sum(1 for connection in list(pool.pool.queue) if connection is not None)
+                                        for pool in connection_pools if pool.pool is not None),
+            },
+            breaker=self.breaker.stats(),
+        )
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
@@ -0,0 +1,303 @@
+"""
+Request IDs and timing spans shared by the microservices.
+
+trace_app() (trace_async_app() for Quart) gives every incoming request an ID, reusing the
+caller's X-Request-ID header when there is one, and echoes it on the response. The ID is
+added to every log record as %(request_id)s and sent on by trace_headers() with each call
+to another service, so the log lines of one request can be followed across the hops.
+
+Each request, outbound call and timed database method is also recorded as a span. When
+TRACE_SPANS_PATH is set, finished spans are appended to that file as JSON lines. Run this
+module on the files written by each service to break one request down end to end:
+    python src/Shared/tracing.py src/*/spans.jsonl --request-id <id>
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+REQUEST_ID_HEADER = "X-Request-ID"
+PARENT_SPAN_HEADER = "X-Parent-Span-ID"
+
+# Longest request ID accepted from a caller; longer (or empty) ones are replaced
+MAX_REQUEST_ID_LENGTH = 128
+
+# Log format used by every service
+LOG_FORMAT = "%(asctime)s - %(levelname)s - [%(request_id)s] - %(message)s"
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_span_id = contextvars.ContextVar("span_id", default=None)
+_service = contextvars.ContextVar("service", default=None)
+
+def current_request_id():
+    """Returns the ID of the request being handled, or None outside a request."""
+    return _request_id.get()
+
+def new_id():
+    return uuid.uuid4().hex[:16]
+
+def accept_request_id(value):
+    """Reuses a caller's request ID if it is printable and of reasonable length, else makes a new one."""
+    if value and len(value) <= MAX_REQUEST_ID_LENGTH and value.isprintable():
+        return value
+    return uuid.uuid4().hex
+
+def trace_headers(headers=None):
+    """Returns headers (a copy) with the current request ID and span added, for an outbound call."""
+    headers = dict(headers or {})
+    request_id = _request_id.get()
+    if request_id is not None:
+        headers.setdefault(REQUEST_ID_HEADER, request_id)
+        if _span_id.get() is not None:
+            headers.setdefault(PARENT_SPAN_HEADER, _span_id.get())
+    return headers
+
+_default_record_factory = logging.getLogRecordFactory()
+
+def _record_with_request_id(*args, **kwargs):
+    record = _default_record_factory(*args, **kwargs)
+    record.request_id = _request_id.get() or "-"
+    return record
+
+# Every log record carries the request ID it was logged under ("-" outside a request)
+logging.setLogRecordFactory(_record_with_request_id)
+
+class SpanExporter:
+    """Appends finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+_exporter = SpanExporter(os.getenv("TRACE_SPANS_PATH")) if os.getenv("TRACE_SPANS_PATH") else None
+
+def configure_span_export(path):
+    """Writes spans to path from now on (None stops exporting)."""
+    global _exporter
+    if _exporter is not None:
+        _exporter.close()
+    _exporter = SpanExporter(path) if path else None
+
+def record_span(name, started, duration, span_id=None, parent_id=None, **attributes):
+    """
+    Exports one finished span of the current request.
+
+    started is a time.time() timestamp and duration is in seconds. Nothing is recorded
+    outside a request or when export is off.
+    """
+    request_id = _request_id.get()
+    if _exporter is None or request_id is None:
+        return
+    _exporter.export(dict(
+        attributes,
+        request_id=request_id,
+        span_id=span_id or new_id(),
+        parent_id=parent_id if span_id else _span_id.get(),
+        service=_service.get(),
+        name=name,
+        start=round(started, 6),
+        duration_ms=round(duration * 1000, 3),
+    ))
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Times a block as a child span of the current one.
+
+    Yields the span's attribute dict, so values only known at the end (such as a status
+    code) can be added to it. Calls made inside the block name this span as their parent.
+    """
+    if _exporter is None or _request_id.get() is None:
+        yield attributes
+        return
+
+    span_id = new_id()
+    parent_id = _span_id.get()
+    token = _span_id.set(span_id)
+    started, timer = time.time(), time.perf_counter()
+    try:
+        yield attributes
+    except BaseException as e:
+        attributes.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        _span_id.reset(token)
+        record_span(name, started, time.perf_counter() - timer, span_id=span_id, parent_id=parent_id, **attributes)
+
+def start_request(service, request_id, parent_id):
+    """Enters a request's context. Returns the state finish_request() needs."""
+    span_id = new_id()
+    tokens = (_request_id.set(accept_request_id(request_id)), _span_id.set(span_id), _service.set(service))
+    return {"tokens": tokens, "span_id": span_id, "parent_id": parent_id,
+            "started": time.time(), "timer": time.perf_counter()}
+
+def finish_request(state, name, status):
+    """Records the request's span and leaves its context."""
+    record_span(name, state["started"], time.perf_counter() - state["timer"], span_id=state["span_id"],
+                parent_id=state["parent_id"], kind="server", status=status)
+    for variable, token in zip((_request_id, _span_id, _service), state["tokens"]):
+        try:
+            variable.reset(token)
+        except ValueError:  # Torn down in another context than the one the request started in
+            variable.set(token.old_value if token.old_value is not token.MISSING else None)
+
+def stream_with_trace(generator):
+    """
+    Runs a streamed response's generator in the context of the request that created it.
+
+    Flask tears the request down once the view returns, before the body is streamed, so
+    without this the generator's calls and log lines would lose the request ID.
+    """
+    context = contextvars.copy_context()
+
+    def traced():
+        try:
+            while True:
+                try:
+                    item = context.run(next, generator)
+                except StopIteration:
+                    return
+                yield item
+        finally:
+            context.run(generator.close)
+    return traced()
+
+def stream_with_trace_async(generator):
+    """Runs a streamed Quart response's async generator in the context of the request that created it, like stream_with_trace()."""
+    context = contextvars.copy_context()
+
+    async def run(awaitable):
+        return await awaitable
+
+    async def traced():
+        try:
+            while True:
+                try:
+                    # Each step runs as a task of its own, as that is how asyncio runs code in a given context
+                    item = await asyncio.create_task(run(generator.__anext__()), context=context)
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            await asyncio.create_task(run(generator.aclose()), context=context)
+    return traced()
+
+def trace_app(app, service):
+    """Gives each request to a Flask app a request ID and records it as a span."""
+    from flask import g, request
+    from instrumentation import route_label
+
+    @app.before_request
+    def start_trace():
+        g.trace = start_request(service, request.headers.get(REQUEST_ID_HEADER), request.headers.get(PARENT_SPAN_HEADER))
+
+    @app.after_request
+    def add_request_id(response):
+        g.trace_status = response.status_code
+        response.headers[REQUEST_ID_HEADER] = _request_id.get()
+        return response
+
+    @app.teardown_request
+    def finish_trace(exception=None):
+        # Popped so a preserved context torn down twice (e.g. under the test client) finishes once
+        state = g.pop("trace", None)
+        if state is not None:
+            finish_request(state, f"{request.method} {route_label(request.url_rule)}", g.pop("trace_status", 500))
+
+def trace_async_app(app, service):
+    """Gives each request to a Quart app a request ID and records it as a span."""
+    from quart import g, request
+    from instrumentation import route_label
+
+    @app.before_request
+    async def start_trace():
+        g.trace = start_request(service, request.headers.get(REQUEST_ID_HEADER), request.headers.get(PARENT_SPAN_HEADER))
+
+    @app.after_request
+    async def add_request_id(response):
+        g.trace_status = response.status_code
+        response.headers[REQUEST_ID_HEADER] = _request_id.get()
+        return response
+
+    @app.teardown_request
+    async def finish_trace(exception=None):
+        state = g.pop("trace", None)
+        if state is not None:
+            finish_request(state, f"{request.method} {route_label(request.url_rule)}", g.pop("trace_status", 500))
+
+def load_spans(paths, request_id=None):
+    """Reads spans from JSON lines files, optionally only those of one request."""
+    spans = []
+    for path in paths:
+        with open(path, encoding="utf-8") as spans_file:
+            for line in spans_file:
+                if line.strip():
+                    span = json.loads(line)
+                    if request_id is None or span["request_id"] == request_id:
+                        spans.append(span)
+    return spans
+
+def format_trace(spans):
+    """
+    Lays out one request's spans as an indented tree, children under their parent.
+
+    Returns:
+        list: One line per span with its offset from the start of the request and its duration.
+    """
+    if not spans:
+        return []
+    children = {}
+    ids = {span["span_id"] for span in spans}
+    for span in sorted(spans, key=lambda span: span["start"]):
+        parent = span.get("parent_id") if span.get("parent_id") in ids else None
+        children.setdefault(parent, []).append(span)
+    origin = min(span["start"] for span in spans)
+
+    lines = []
+    def walk(parent, depth):
+        for span in children.get(parent, []):
+            extras = "".join(f" {key}={span[key]}" for key in ("status", "outcome", "error") if key in span)
+            lines.append(f"{(span['start'] - origin) * 1000:9.1f} ms {span['duration_ms']:9.1f} ms  "
+                         f"{'  ' * depth}{span['service']}: {span['name']}{extras}")
+            walk(span["span_id"], depth + 1)
+    walk(None, 0)
+    return lines
+
+def slowest_requests(spans, count=10):
+    """Returns (request_id, duration_ms, name) for the slowest requests that entered the system (no parent)."""
+    roots = [span for span in spans if span.get("kind") == "server" and not span.get("parent_id")]
+    roots.sort(key=lambda span: span["duration_ms"], reverse=True)
+    return [(span["request_id"], span["duration_ms"], f"{span['service']}: {span['name']}") for span in roots[:count]]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Break a request down by the spans each service recorded.")
+    parser.add_argument("paths", nargs="+", help="Span files written by the services (TRACE_SPANS_PATH)")
+    parser.add_argument("--request-id", help="Request to show; without it the slowest requests are listed")
+    args = parser.parse_args()
+
+    if args.request_id:
+        for line in format_trace(load_spans(args.paths, args.request_id)):
+            print(line)
+    else:
+        for request_id, duration_ms, name in slowest_requests(load_spans(args.paths)):
+            print(f"{request_id}  {duration_ms:9.1f} ms  {name}")
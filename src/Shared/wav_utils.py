@@ -0,0 +1,200 @@
+import base64
+import binascii
+import io
+import struct
+import numpy as np
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Data chunk sizes that streaming encoders write when the length is not known up front
+PLACEHOLDER_DATA_SIZES = (0, 0xFFFFFFFF)
+
+# Enough of the start of a file to reach the data chunk of any ordinary WAV header
+HEADER_PREFIX_BYTES = 64 * 1024
+
+# Base64 characters decoded at a time when validating a whole payload (a multiple of 4)
+VALIDATION_CHUNK_CHARS = 4 * 1024 * 1024
+
+class WavFormatError(ValueError):
+    """Raised when a payload is not a PCM WAV file we can read."""
+
+def parse_wav_header(data, total_size=None):
+    """
+    Parses the RIFF/WAVE header of a PCM WAV file without touching the samples.
+
+    Only the bytes up to the start of the "data" chunk are read, so a short prefix of the
+    file is enough when total_size (the length of the whole file) is supplied.
+
+    Returns:
+        dict: channels, sample_rate, bit_depth, data_offset, data_size, duration (seconds) and
+              truncated (whether the data chunk claims more bytes than the file holds).
+    """
+    view = memoryview(data)
+    total_size = len(view) if total_size is None else total_size
+
+    if len(view) < 12 or bytes(view[0:4]) != b"RIFF" or bytes(view[8:12]) != b"WAVE":
+        raise WavFormatError("Missing RIFF/WAVE header")
+
+    fmt = None
+    position = 12
+    while position + 8 <= len(view):
+        chunk_id = bytes(view[position:position + 4])
+        chunk_size = struct.unpack("<I", view[position + 4:position + 8])[0]
+        body = position + 8
+
+        if chunk_id == b"fmt ":
+            if chunk_size < 16 or body + 16 > len(view):
+                raise WavFormatError("Truncated fmt chunk")
+            format_tag, channels, sample_rate, _, block_align, bit_depth = struct.unpack("<HHIIHH", view[body:body + 16])
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40 and body + 26 <= len(view):
+                # The real format tag is the first two bytes of the sub-format GUID
+                format_tag = struct.unpack("<H", view[body + 24:body + 26])[0]
+            if format_tag != WAVE_FORMAT_PCM:
+                raise WavFormatError(f"Unsupported WAV format tag {format_tag}")
+            if channels == 0 or sample_rate == 0 or bit_depth not in (8, 16, 24, 32):
+                raise WavFormatError("Invalid WAV format parameters")
+            fmt = {"channels": channels, "sample_rate": sample_rate, "bit_depth": bit_depth, "block_align": block_align}
+
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise WavFormatError("data chunk found before fmt chunk")
+            # Streamed WAVs often carry a placeholder size, so clamp to what is actually there
+            data_size = min(chunk_size, total_size - body)
+            data_size -= data_size % fmt["block_align"]
+            return {
+                "channels": fmt["channels"],
+                "sample_rate": fmt["sample_rate"],
+                "bit_depth": fmt["bit_depth"],
+                "data_offset": body,
+                "data_size": data_size,
+                "duration": data_size / (fmt["block_align"] * fmt["sample_rate"]),
+                "truncated": chunk_size not in PLACEHOLDER_DATA_SIZES and chunk_size > total_size - body,
+            }
+
+        position = body + chunk_size + (chunk_size & 1)
+
+    raise WavFormatError("No data chunk found")
+
+def check_wav_header(header):
+    """
+    Rejects a parsed header that describes no audio or a data chunk cut short.
+
+    Raises:
+        WavFormatError: If the file would not play back in full.
+    """
+    if header["data_size"] == 0:
+        raise WavFormatError("WAV file contains no audio")
+    if header["truncated"]:
+        raise WavFormatError("WAV data chunk is truncated")
+
+def decoded_size(encoded):
+    """Returns the number of bytes a base64 string decodes to, without decoding it."""
+    return len(encoded) // 4 * 3 - len(encoded[-2:]) + len(encoded[-2:].rstrip("="))
+
+def parse_encoded_wav_header(encoded, prefix_bytes=HEADER_PREFIX_BYTES):
+    """
+    Parses and checks the header of a base64 encoded WAV file by decoding only its first prefix_bytes.
+
+    Raises:
+        WavFormatError: If the prefix is not valid base64 or the header is malformed.
+    """
+    if len(encoded) % 4:
+        raise WavFormatError("Track is not valid base64: incorrect padding")
+    try:
+        prefix = base64.b64decode(encoded[:prefix_bytes // 3 * 4], validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise WavFormatError(f"Track is not valid base64: {e}")
+    header = parse_wav_header(prefix, total_size=decoded_size(encoded))
+    check_wav_header(header)
+    return header
+
+def validate_encoded_wav(encoded, chunk_chars=VALIDATION_CHUNK_CHARS):
+    """
+    Fully validates a base64 encoded WAV file.
+
+    The header is checked first, then the rest of the payload is decoded chunk by chunk to
+    confirm it is all valid base64, so no more than one chunk is held decoded at a time.
+
+    Returns:
+        dict: The parsed header.
+
+    Raises:
+        WavFormatError: If the payload is not a complete, readable PCM WAV file.
+    """
+    header = parse_encoded_wav_header(encoded)
+    for start in range(0, len(encoded), chunk_chars):
+        try:
+            base64.b64decode(encoded[start:start + chunk_chars], validate=True)
+        except (binascii.Error, ValueError) as e:
+            raise WavFormatError(f"Track is not valid base64: {e}")
+    return header
+
+def read_wav(data):
+    """
+    Decodes a PCM WAV file into floating point samples in the range [-1, 1].
+
+    Returns:
+        tuple: (samples as a float32 array of shape (frames, channels), sample rate).
+    """
+    header = parse_wav_header(data)
+    raw = memoryview(data)[header["data_offset"]:header["data_offset"] + header["data_size"]]
+    bit_depth = header["bit_depth"]
+
+    if bit_depth == 8:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif bit_depth == 16:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif bit_depth == 24:
+        triplets = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = triplets[:, 0] | (triplets[:, 1] << 8) | (triplets[:, 2] << 16)
+        values = np.where(values & 0x800000, values - 0x1000000, values)
+        samples = values.astype(np.float32) / 8388608.0
+    else:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+
+    return samples.reshape(-1, header["channels"]), header["sample_rate"]
+
+def to_mono(samples):
+    """Mixes a (frames, channels) array down to a single channel."""
+    if samples.ndim == 1:
+        return samples
+    return samples.mean(axis=1, dtype=np.float32)
+
+def resample(samples, from_rate, to_rate):
+    """
+    Resamples a mono signal by linear interpolation.
+
+    When downsampling, a moving-average filter is applied first to limit aliasing.
+    """
+    if from_rate == to_rate or len(samples) == 0:
+        return samples.astype(np.float32, copy=False)
+
+    if to_rate < from_rate:
+        width = int(round(from_rate / to_rate))
+        if width > 1:
+            samples = np.convolve(samples, np.ones(width, dtype=np.float32) / width, mode="same")
+
+    duration = len(samples) / from_rate
+    target_length = int(duration * to_rate)
+    source_times = np.arange(len(samples), dtype=np.float64) / from_rate
+    target_times = np.arange(target_length, dtype=np.float64) / to_rate
+    return np.interp(target_times, source_times, samples).astype(np.float32)
+
+def write_wav(samples, sample_rate):
+    """Encodes float samples (mono or (frames, channels)) as a 16-bit PCM WAV file."""
+    if samples.ndim == 1:
+        samples = samples.reshape(-1, 1)
+    channels = samples.shape[1]
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+    buffer = io.BytesIO()
+    buffer.write(b"RIFF")
+    buffer.write(struct.pack("<I", 36 + len(pcm)))
+    buffer.write(b"WAVE")
+    buffer.write(b"fmt ")
+    buffer.write(struct.pack("<IHHIIHH", 16, WAVE_FORMAT_PCM, channels, sample_rate, sample_rate * channels * 2, channels * 2, 16))
+    buffer.write(b"data")
+    buffer.write(struct.pack("<I", len(pcm)))
+    buffer.write(pcm)
+    return buffer.getvalue()
@@ -0,0 +1,79 @@
+"""
+Runs the catalogue, database and audio recognition services in one process, as one app.
+
+The catalogue and recognition services normally reach the database service over loopback
+HTTP, JSON encoding and decoding every base64 track on each hop. Here they are given a
+LocalDatabaseTransport instead, which calls the shared MusicTrackDatabase directly. Requests
+are dispatched by path: /db/... to the database routes, /recognise... to the recognition
+routes and everything else (/tracks..., /health) to the catalogue routes. /metrics reports
+all three services, which record into this process's one Prometheus registry.
+
+Usage:
+    python src/composed_microservice.py
+"""
+import logging
+import os
+import sys
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+for service_dir in ("Shared", "Database_management_microservice", "Catalogue_management_microservice", "Audio_recognition_microservice"):
+    sys.path.append(os.path.join(SRC_DIR, service_dir))
+from tracing import LOG_FORMAT
+from instrumentation import metrics_response
+
+# Configure logging before the services are imported, so all three write to one file
+logging.basicConfig(filename=os.path.join(SRC_DIR, "composed.log"), level=logging.INFO, format=LOG_FORMAT)
+
+import database_management_microservice as database_service
+import catalogue_management_microservice as catalogue_service
+import audio_recognition_microservice as audio_service
+from local_database_transport import LocalDatabaseTransport
+from ingestion_queue import IngestionQueue
+
+# Where the composed app listens
+COMPOSED_HOST = os.getenv("COMPOSED_HOST", "localhost")
+COMPOSED_PORT = int(os.getenv("COMPOSED_PORT", "3000"))
+
+class ComposedApp:
+    """WSGI app that hands each request to the first app whose path prefix matches, else to default."""
+
+    def __init__(self, routes, default):
+        self.routes = routes
+        self.default = default
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        for prefix, app in self.routes:
+            if path == prefix or path.startswith(prefix + "/"):
+                return app(environ, start_response)
+        return self.default(environ, start_response)
+
+def metrics_app(environ, start_response):
+    """Serves GET /metrics for the composed app, covering every service's series (labelled by service)."""
+    if environ.get("REQUEST_METHOD") not in ("GET", "HEAD"):
+        start_response("405 METHOD NOT ALLOWED", [("Allow", "GET, HEAD"), ("Content-Length", "0")])
+        return [b""]
+    body, content_type = metrics_response()
+    start_response("200 OK", [("Content-Type", content_type), ("Content-Length", str(len(body)))])
+    return [body]
+
+def create_app(db=None):
+    """
+    Points the catalogue and recognition services at the database in process and combines the three apps.
+
+    Returns:
+        ComposedApp: The WSGI app serving every route.
+    """
+    if db is not None:
+        database_service.db = db
+        database_service.ingestion = IngestionQueue(db)
+    transport = LocalDatabaseTransport(database_service.db, database_service.ingestion)
+    catalogue_service.database = transport
+    audio_service.database = transport
+    return ComposedApp((("/db", database_service.app), ("/recognise", audio_service.app), ("/metrics", metrics_app)),
+                       catalogue_service.app)
+
+if __name__ == "__main__":
+    from werkzeug.serving import run_simple
+    app = create_app()
+    database_service.ingestion.start()
+    run_simple(COMPOSED_HOST, COMPOSED_PORT, app, threaded=True)
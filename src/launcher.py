@@ -0,0 +1,206 @@
+"""
+Runs the services for production under Gunicorn, a pre-forking multi-worker WSGI server.
+
+Each service gets a master process, which imports the app once (opening and migrating the
+database) and then forks the workers, each serving requests on several threads. Workers are
+recycled after a number of requests. SIGHUP restarts the workers gracefully, and SIGTERM or
+SIGINT stops accepting connections and waits for in-flight requests (and so their SQLite
+transactions) to finish before the workers exit. "all" runs the three separate services,
+each under its own master.
+
+Settings are read from <SERVICE>_SERVICE_<NAME> (e.g. DATABASE_SERVICE_WORKERS), falling back
+to SERVICE_<NAME> and then the defaults below.
+
+Usage:
+    python src/launcher.py database|catalogue|audio|composed|all
+"""
+import argparse
+import glob
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from gunicorn.app.base import BaseApplication
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Service name: (directory, module, default port)
+SERVICES = {
+    "database": ("Database_management_microservice", "database_management_microservice", 3002),
+    "catalogue": ("Catalogue_management_microservice", "catalogue_management_microservice", 3000),
+    "audio": ("Audio_recognition_microservice", "audio_recognition_microservice", 3001),
+    "composed": (None, "composed_microservice", 3000),
+}
+
+# The services run by "all" (the composed app already serves all three itself)
+ALL_SERVICES = ("database", "catalogue", "audio")
+
+# Defaults for every service: worker processes, threads per worker, requests before a worker is
+# recycled (plus up to the jitter, so workers do not restart together), and seconds to wait for
+# in-flight requests on shutdown and for a silent worker before it is killed
+DEFAULT_WORKERS = str(min(2 * (os.cpu_count() or 1) + 1, 8))
+DEFAULT_THREADS = "4"
+DEFAULT_MAX_REQUESTS = "10000"
+DEFAULT_MAX_REQUESTS_JITTER = "1000"
+DEFAULT_GRACEFUL_TIMEOUT = "30"
+DEFAULT_TIMEOUT = "120"
+
+def setting(service, name, default):
+    """Reads a service's setting from <SERVICE>_SERVICE_<NAME>, then SERVICE_<NAME>, then default."""
+    return os.getenv(f"{service.upper()}_SERVICE_{name}", os.getenv(f"SERVICE_{name}", default))
+
+def gunicorn_options(service):
+    """
+    Builds the Gunicorn settings for a service from the environment.
+
+    Returns:
+        dict: Gunicorn setting names and values.
+    """
+    host = setting(service, "HOST", "localhost")
+    port = setting(service, "PORT", str(SERVICES[service][2]))
+    return {
+        "bind": setting(service, "BIND", f"{host}:{port}"),
+        "workers": int(setting(service, "WORKERS", DEFAULT_WORKERS)),
+        "threads": int(setting(service, "THREADS", DEFAULT_THREADS)),
+        "worker_class": "gthread",
+        "preload_app": True,
+        "max_requests": int(setting(service, "MAX_REQUESTS", DEFAULT_MAX_REQUESTS)),
+        "max_requests_jitter": int(setting(service, "MAX_REQUESTS_JITTER", DEFAULT_MAX_REQUESTS_JITTER)),
+        "graceful_timeout": int(setting(service, "GRACEFUL_TIMEOUT", DEFAULT_GRACEFUL_TIMEOUT)),
+        "timeout": int(setting(service, "TIMEOUT", DEFAULT_TIMEOUT)),
+        "proc_name": f"shamzam-{service}",
+        "post_worker_init": start_ingestion,
+        "worker_exit": close_database,
+        "child_exit": forget_worker_metrics,
+    }
+
+def prepare_environment(workers):
+    """
+    Sets up sharing between worker processes, before any service module is imported.
+
+    With several workers, each keeps its own track cache, so the stored catalogue version is
+    checked before cached reads, and Prometheus values are written to PROMETHEUS_MULTIPROC_DIR
+    so /metrics reports every worker. A directory given in the environment is cleared of the
+    last run's values; otherwise a temporary one is used.
+
+    Returns:
+        str: A temporary metrics directory to remove on exit, or None.
+    """
+    if workers < 2:
+        return None
+    os.environ.setdefault("TRACK_CACHE_CHECK_VERSION", "1")
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        for path in glob.glob(os.path.join(metrics_dir, "*.db")):
+            os.remove(path)
+        return None
+    metrics_dir = tempfile.mkdtemp(prefix="shamzam-metrics-")
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+    return metrics_dir
+
+def load_service(service):
+    """
+    Imports a service's app, then closes the database connections opened while loading it, so
+    no SQLite connection is shared with the forked workers.
+
+    Returns:
+        The WSGI app.
+    """
+    directory, module_name, _ = SERVICES[service]
+    for path in ("Shared", directory):
+        if path is not None and os.path.join(SRC_DIR, path) not in sys.path:
+            sys.path.append(os.path.join(SRC_DIR, path))
+    if SRC_DIR not in sys.path:
+        sys.path.append(SRC_DIR)
+
+    module = __import__(module_name)
+    app = module.create_app() if service == "composed" else module.app
+    close_database()
+    return app
+
+def start_ingestion(worker):
+    """Starts a worker's ingestion threads, if it serves the database service, so queued tracks are processed."""
+    database_service = sys.modules.get("database_management_microservice")
+    if database_service is not None:
+        database_service.ingestion.start()
+
+def close_database(server=None, worker=None):
+    """
+    Lets the database service's ingestion threads finish their jobs, then closes its idle
+    pooled connections, if it is loaded in this process.
+    """
+    database_service = sys.modules.get("database_management_microservice")
+    if database_service is not None:
+        database_service.ingestion.stop()
+        database_service.db.close()
+
+def forget_worker_metrics(server, worker):
+    """Drops an exited worker's live gauge values (e.g. in-flight requests) from the aggregated metrics."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+class ServiceApplication(BaseApplication):
+    """Gunicorn application serving one service, configured from gunicorn_options()."""
+
+    def __init__(self, service, options):
+        self.service = service
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return load_service(self.service)
+
+def serve(service):
+    """Runs one service under Gunicorn until it is stopped."""
+    options = gunicorn_options(service)
+    metrics_dir = prepare_environment(options["workers"])
+    master_pid = os.getpid()
+    try:
+        ServiceApplication(service, options).run()
+    finally:
+        # Exiting workers unwind through here too, as they were forked from run()
+        if metrics_dir is not None and os.getpid() == master_pid:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+def serve_all():
+    """
+    Runs each separate service under its own Gunicorn master, passing signals on to them.
+
+    Returns:
+        int: The exit status of the first master to exit.
+    """
+    masters = [subprocess.Popen([sys.executable, os.path.abspath(__file__), service]) for service in ALL_SERVICES]
+
+    def forward(signum, frame):
+        for master in masters:
+            if master.poll() is None:
+                master.send_signal(signum)
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(signum, forward)
+
+    # One master exiting stops the others, so the deployment is never left half up
+    while all(master.poll() is None for master in masters):
+        time.sleep(0.5)
+    status = next(master.returncode for master in masters if master.returncode is not None)
+    for master in masters:
+        if master.poll() is None:
+            master.terminate()
+    for master in masters:
+        master.wait()
+    return status
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run services under Gunicorn with several worker processes.")
+    parser.add_argument("service", choices=list(SERVICES) + ["all"], help="The service to run, or all three separately")
+    args = parser.parse_args()
+    if args.service == "all":
+        sys.exit(serve_all())
+    serve(args.service)
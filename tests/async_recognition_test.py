@@ -0,0 +1,125 @@
+import pytest
+import asyncio
+import base64
+import json
+import sys
+import os
+import httpx
+from urllib.parse import parse_qs
+os.environ.setdefault("AUDDIO_TOKEN", "test-token")
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Audio_recognition_microservice"))
+import async_audio_recognition_microservice as service
+import audio_recognition_microservice as sync_service
+from audd_client import AuddRateLimiter
+
+class FakeUpstream:
+    """Stands in for AudD.io and the database service, recording peak AudD concurrency."""
+
+    def __init__(self, audd_error=None):
+        self.audd_error = audd_error
+        self.active = 0
+        self.peak = 0
+        self.audd_calls = 0
+        self.lookups = []
+
+    async def __call__(self, request):
+        if request.url.path == "/db/tracks/search/batch":
+            titles = json.loads(request.content)["titles"]
+            self.lookups.append((titles, request.headers.get("X-Request-ID")))
+            return httpx.Response(200, json={"tracks": {title: {"title": title, "encoded_track": "..."} for title in titles}})
+        if request.url.host == "api.audd.io":
+            self.audd_calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            await asyncio.sleep(0.02)
+            self.active -= 1
+            if self.audd_error:
+                return httpx.Response(200, json={"status": "error", "error": {"error_code": self.audd_error, "error_message": "error"}})
+            fragment = parse_qs(request.content.decode())["audio"][0]
+            return httpx.Response(200, json={"status": "success", "result": {"title": fragment}})
+        return httpx.Response(200, json={"title": request.url.params["title"], "encoded_track": "..."})
+
+def run_recognitions(upstream, fragments, max_concurrency=4):
+    """Starts the app against the fake upstream and posts every fragment concurrently."""
+    async def scenario():
+        service.AUDD_MAX_CONCURRENCY = max_concurrency
+        service.RECOGNITION_BACKEND = "audd"
+        service.recognition_cache.clear()
+        service.audd_limiter = AuddRateLimiter(rate=0)
+        async with service.app.test_app() as test_app:
+            service.http_client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+            client = test_app.test_client()
+            responses = await asyncio.gather(*[client.post("/recognise", json={"encoded_track_fragment": fragment}) for fragment in fragments])
+            return [(response.status_code, await response.get_data()) for response in responses]
+    return asyncio.run(scenario())
+
+#Helper Function
+def fragment(i):
+    return base64.b64encode(f"fragment {i}".encode()).decode()
+
+#Happy Paths
+def test_many_concurrent_recognitions():
+    """Test that hundreds of recognitions are served together with AudD calls capped by the semaphore."""
+    upstream = FakeUpstream()
+    results = run_recognitions(upstream, [fragment(i) for i in range(200)], max_concurrency=8)
+
+    assert all(status == 200 for status, _ in results)
+    assert json.loads(results[5][1])["title"] == fragment(5)
+    assert upstream.peak == 8
+
+def test_batch_recognises_each_distinct_fragment_once():
+    """Test that the batch route streams a line per fragment, recognising duplicates once and looking titles up together."""
+    upstream = FakeUpstream()
+    fragments = [fragment(0), fragment(1), fragment(0)]
+
+    async def scenario():
+        service.RECOGNITION_BACKEND = "audd"
+        service.recognition_cache.clear()
+        service.audd_limiter = AuddRateLimiter(rate=0)
+        async with service.app.test_app() as test_app:
+            service.http_client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+            response = await test_app.test_client().post("/recognise/batch", json={"fragments": fragments},
+                                                         headers={"X-Request-ID": "batch-1"})
+            return response.status_code, response.mimetype, await response.get_data(as_text=True)
+    status, mimetype, body = asyncio.run(scenario())
+
+    lines = {line["index"]: line for line in map(json.loads, body.splitlines())}
+    assert status == 200 and mimetype == "application/x-ndjson"
+    assert [lines[index]["track"]["title"] for index in range(3)] == fragments
+    assert upstream.audd_calls == 2
+    assert len(upstream.lookups) == 1 and sorted(upstream.lookups[0][0]) == sorted(set(fragments))
+    assert upstream.lookups[0][1] == "batch-1"
+
+#Unhappy Paths
+@pytest.mark.parametrize("path, kwargs, expected_status", [
+    ("/recognise", {"data": "fragment", "headers": {"Content-Type": "text/plain"}}, 415),
+    ("/recognise", {"json": ["fragment"]}, 400),
+    ("/recognise/batch", {"data": "fragment", "headers": {"Content-Type": "text/plain"}}, 415),
+    ("/recognise/batch", {"json": {"fragments": []}}, 400),
+])
+def test_bad_requests_match_the_synchronous_service(path, kwargs, expected_status):
+    """Test that both variants answer a non-JSON body with 415 and a malformed one with 400."""
+    async def scenario():
+        async with service.app.test_app() as test_app:
+            response = await test_app.test_client().post(path, **kwargs)
+            return response.status_code
+    sync_kwargs = dict(kwargs, content_type=kwargs["headers"]["Content-Type"]) if "headers" in kwargs else kwargs
+    sync_kwargs.pop("headers", None)
+
+    assert asyncio.run(scenario()) == expected_status
+    assert sync_service.app.test_client().post(path, **sync_kwargs).status_code == expected_status
+
+#Unhappy Paths
+@pytest.mark.parametrize("audd_error, expected_status", [(902, 429), (300, 422), (400, 413), (700, 400)])
+def test_audd_errors_use_existing_mapping(audd_error, expected_status):
+    """Test that AudD error codes map onto the same HTTP statuses as the synchronous service."""
+    results = run_recognitions(FakeUpstream(audd_error=audd_error), [fragment(0)])
+    assert results[0][0] == expected_status
+
+def test_missing_fragment():
+    """Test that a request without a fragment returns 400."""
+    async def scenario():
+        async with service.app.test_app() as test_app:
+            response = await test_app.test_client().post("/recognise", json={})
+            return response.status_code
+    assert asyncio.run(scenario()) == 400
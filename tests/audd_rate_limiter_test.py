@@ -0,0 +1,173 @@
+import pytest
+import base64
+import sys
+import os
+from types import SimpleNamespace
+os.environ.setdefault("AUDDIO_TOKEN", "test-token")
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Audio_recognition_microservice"))
+import audio_recognition_microservice as service
+from audd_client import AuddRateLimiter, AuddThrottled, interpret_audd_result
+
+class FakeClock:
+    """A clock that only moves when told to, standing in for time.monotonic and time.time."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+@pytest.fixture
+def clock():
+    return FakeClock(1000.0)
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(service, "RECOGNITION_BACKEND", "audd")
+    monkeypatch.setattr(service, "PREPROCESS_FRAGMENTS", False)
+    service.recognition_cache.clear()
+    service.app.config["TESTING"] = True
+    with service.app.test_client() as client:
+        yield client
+
+#Helper Function
+def make_limiter(clock, **settings):
+    """A limiter on the fake clock, with small limits unless overridden."""
+    options = dict(rate=2, burst=2, daily_quota=0, max_queued=10, max_wait=5, backoff_base=1, backoff_max=8)
+    options.update(settings)
+    return AuddRateLimiter(clock=clock, wall_clock=clock, **options)
+
+def fragment(i):
+    return base64.b64encode(f"fragment {i}".encode()).decode()
+
+#Happy Paths
+def test_burst_goes_straight_through_then_calls_are_paced(clock):
+    """Test that a full bucket lets burst calls through at once and later calls wait for tokens in turn."""
+    limiter = make_limiter(clock)
+
+    assert [limiter.reserve() for _ in range(4)] == [0, 0, 0.5, 1.0]
+    assert limiter.stats()["waiting"] == 2
+
+    clock.now += 10
+    assert limiter.reserve() == 0
+    assert limiter.stats()["waiting"] == 0
+
+def test_quota_is_tracked_and_renewed_each_day(clock):
+    """Test that the remaining quota counts down, refuses with 429 until midnight, then renews."""
+    limiter = make_limiter(clock, rate=0, daily_quota=2)
+    limiter.reserve()
+    assert limiter.stats()["remaining_today"] == 1
+    limiter.reserve()
+
+    with pytest.raises(AuddThrottled) as refused:
+        limiter.reserve()
+    assert (refused.value.status, refused.value.reason) == (429, "quota")
+    assert refused.value.retry_after == pytest.approx(86400 - 1000)
+
+    clock.now += refused.value.retry_after
+    assert limiter.reserve() == 0
+    assert limiter.stats()["remaining_today"] == 1
+
+def test_success_restores_the_rate_after_failures(clock):
+    """Test that failures halve the rate and successful answers bring it back to the configured one."""
+    limiter = make_limiter(clock, rate=10)
+    limiter.record_failure()
+    limiter.record_failure()
+    assert limiter.stats()["rate"] == 2.5
+
+    for _ in range(10):
+        limiter.record_result({"success": True, "title": "Davos"})
+    assert limiter.stats()["rate"] == 10
+
+def test_unlimited_rate_never_waits(clock):
+    """Test that a rate of 0 turns pacing off."""
+    limiter = make_limiter(clock, rate=0)
+
+    assert all(limiter.reserve() == 0 for _ in range(100))
+
+#Unhappy Paths
+def test_calls_beyond_the_deadline_or_queue_are_refused(clock):
+    """Test that a call whose turn is too far off, or that finds the queue full, is refused with 429."""
+    limiter = make_limiter(clock, max_wait=1)
+    for _ in range(4):
+        limiter.reserve()
+
+    with pytest.raises(AuddThrottled) as refused:
+        limiter.reserve()
+    assert (refused.value.status, refused.value.reason) == (429, "rate")
+    assert refused.value.retry_after_header == "2"
+
+    queue_limited = make_limiter(clock, max_queued=1)
+    queue_limited.reserve(), queue_limited.reserve(), queue_limited.reserve()
+    with pytest.raises(AuddThrottled):
+        queue_limited.reserve()
+    assert queue_limited.stats()["rejected"] == 1
+
+def test_limit_reached_error_refuses_until_midnight(clock):
+    """Test that AudD.io error 902 is answered with 429 and stops further calls for the day."""
+    limiter = make_limiter(clock)
+    limiter.reserve()
+
+    with pytest.raises(AuddThrottled) as refused:
+        limiter.record_result({"success": False, "error_code": 429, "audd_error_code": 902})
+    assert refused.value.status == 429
+    with pytest.raises(AuddThrottled):
+        limiter.reserve()
+    assert limiter.stats()["remaining_today"] == 0
+
+def test_failures_back_off_with_503(clock):
+    """Test that failed calls pause AudD.io calls for a doubling backoff, refused with 503 when too long."""
+    limiter = make_limiter(clock, max_wait=3)
+    limiter.record_failure()
+    assert limiter.reserve() == 1
+    limiter.record_failure()
+    limiter.record_failure()
+
+    with pytest.raises(AuddThrottled) as refused:
+        limiter.reserve()
+    assert (refused.value.status, refused.value.reason) == (503, "backoff")
+    assert refused.value.retry_after == 4
+
+def test_throttled_recognition_answers_with_retry_after(client, monkeypatch):
+    """Test that /recognise answers 429 with Retry-After, without calling AudD.io, once the quota is spent."""
+    limiter = AuddRateLimiter(rate=0, daily_quota=1)
+    monkeypatch.setattr(service, "audd_limiter", limiter)
+    calls = []
+    monkeypatch.setattr(service.requests, "post", lambda *args, **kwargs: calls.append(1) or FakeResponse({"status": "success", "result": {"title": "Davos"}}))
+    monkeypatch.setattr(service.database, "search_track", lambda title: SimpleNamespace(status=200, body=b"{}"))
+
+    assert client.post("/recognise", json={"encoded_track_fragment": fragment(0)}).status_code == 200
+    response = client.post("/recognise", json={"encoded_track_fragment": fragment(1)})
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) == pytest.approx(limiter.seconds_until_reset(), abs=1)
+    assert len(calls) == 1
+    assert client.get("/health").get_json()["audd"]["remaining_today"] == 0
+
+def test_audd_error_answers_back_off_like_failures(clock):
+    """Test that a run of AudD.io internal errors backs off, while an error blaming the fragment neither counts nor resets."""
+    limiter = make_limiter(clock, max_wait=3)
+    internal_error = interpret_audd_result({"status": "error", "error": {"error_code": 100, "error_message": "Unknown error"}})
+    fragment_error = interpret_audd_result({"status": "error", "error": {"error_code": 300, "error_message": "Fingerprinting error"}})
+
+    limiter.record_result(internal_error)
+    limiter.record_result(fragment_error)
+    limiter.record_result(interpret_audd_result({"status": "error", "error": {"error_code": 1234}}))
+    limiter.record_result(internal_error)
+    assert limiter.stats()["failures"] == 3
+
+    with pytest.raises(AuddThrottled) as refused:
+        limiter.reserve()
+    assert (refused.value.status, refused.value.retry_after) == (503, 4)
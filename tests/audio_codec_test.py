@@ -0,0 +1,158 @@
+import pytest
+import glob
+import io
+import os
+import sqlite3
+import struct
+import sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice"))
+import audio_codec
+import database_management_microservice
+from audio_codec import EncodedAudio, encode, is_encoded
+from blob_store import BlobStore
+from database_helper import MusicTrackDatabase
+
+TRACK_PATH = "./Music/Tracks/good 4 u.wav"
+
+@pytest.fixture
+def audio():
+    with open(TRACK_PATH, "rb") as audio_file:
+        return audio_file.read()
+
+@pytest.fixture
+def client(audio, monkeypatch):
+    test_db = MusicTrackDatabase(table="codec_test")
+    test_db.insert_stream("good 4 u", [audio])
+    monkeypatch.setattr(database_management_microservice, "db", test_db)
+    database_management_microservice.app.config["TESTING"] = True
+    with database_management_microservice.app.test_client() as client:
+        yield client, test_db
+    test_db.reset_database()
+
+#Helper Function
+def make_wav(samples, bit_depth, sample_rate=8000):
+    """Builds a PCM WAV file from an int array of shape (frames, channels)."""
+    width = bit_depth // 8
+    if width == 3:
+        values = samples.astype(np.int64).ravel() & 0xFFFFFF
+        data = np.stack([values & 0xFF, (values >> 8) & 0xFF, values >> 16], axis=1).astype(np.uint8).tobytes()
+    else:
+        data = samples.astype({1: np.uint8, 2: "<i2", 4: "<i4"}[width]).tobytes()
+    channels = samples.shape[1]
+    header = struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + len(data), b"WAVE", b"fmt ", 16, 1, channels, sample_rate,
+                         sample_rate * channels * width, channels * width, bit_depth, b"data", len(data))
+    return header + data
+
+def decoded(encoded):
+    return EncodedAudio(io.BytesIO(encoded)).read()
+
+#Happy Paths
+@pytest.mark.parametrize("codec", ["zlib", "lzma"])
+def test_tracks_round_trip_exactly_and_shrink(codec):
+    """Test that every catalogue track decodes to the original bytes and is stored smaller."""
+    summary = audio_codec.report(sorted(glob.glob("./Music/Tracks/*.wav")), codec)
+
+    assert summary["stored_bytes"] < summary["original_bytes"]
+    assert summary["ratio"] > 1.2
+
+@pytest.mark.parametrize("bit_depth", [8, 24])
+def test_other_sample_widths_round_trip(bit_depth):
+    """Test that 8-bit and 24-bit stereo audio, including clipped full-scale samples, decodes exactly."""
+    peak = 1 << (bit_depth - 1)
+    wave = (np.sin(np.arange(20000) / 9.0) * (peak - 1)).astype(np.int64)
+    samples = np.stack([wave, np.clip(wave * 3, -peak, peak - 1)], axis=1)
+    if bit_depth == 8:
+        samples += 128
+    wav = make_wav(samples, bit_depth) + b"LIST\x04\x00\x00\x00info"
+
+    encoded = encode(wav, block_bytes=4096)
+
+    assert decoded(encoded) == wav
+    assert len(encoded) < len(wav)
+
+def test_non_wav_data_round_trips():
+    """Test that data that is not PCM WAV, such as noise, is kept byte for byte."""
+    noise = np.random.default_rng(7).bytes(100000)
+
+    assert decoded(encode(noise)) == noise
+    assert decoded(encode(b"")) == b""
+
+def test_reads_decode_only_the_blocks_they_cover(audio, monkeypatch):
+    """Test that seeking and reading a short span decodes just the block holding it."""
+    encoded_audio = EncodedAudio(io.BytesIO(encode(audio, block_bytes=16384)))
+    calls = []
+    decode_block = audio_codec.decode_block
+    monkeypatch.setattr(audio_codec, "decode_block", lambda stored: calls.append(1) or decode_block(stored))
+
+    encoded_audio.seek(200000)
+    assert encoded_audio.read(100) == audio[200000:200100]
+    assert encoded_audio.read(100) == audio[200100:200200]
+    encoded_audio.seek(-44, os.SEEK_END)
+    assert encoded_audio.read() == audio[-44:]
+    assert len(calls) == 2
+    assert len(encoded_audio.entries) > 20
+
+def test_stored_blob_is_compressed_and_served_in_ranges(client, audio):
+    """Test that a track's blob is smaller on disk yet its audio is served whole and in byte ranges."""
+    client, test_db = client
+    digest = test_db.find_audio_digest("good 4 u")
+    path = test_db.blob_store.path_for(digest)
+
+    assert os.path.getsize(path) < len(audio)
+    assert test_db.blob_store.size(digest) == len(audio)
+    assert client.get("/db/tracks/good 4 u/audio").data == audio
+    response = client.get("/db/tracks/good 4 u/audio", headers={"Range": "bytes=100000-100099"})
+    assert response.status_code == 206
+    assert response.data == audio[100000:100100]
+    assert response.headers["Content-Range"] == f"bytes 100000-100099/{len(audio)}"
+
+def test_header_reads_decode_only_the_first_block(client, audio, monkeypatch):
+    """Test that opening a compressed blob and back-filling a track's format from its header decode one block."""
+    client, test_db = client
+    digest = test_db.find_audio_digest("good 4 u")
+    calls = []
+    decode_block = audio_codec.decode_block
+    monkeypatch.setattr(audio_codec, "decode_block", lambda stored: calls.append(1) or decode_block(stored))
+
+    with test_db.blob_store.open(digest) as blob:
+        assert blob.read(44) == audio[:44]
+    assert len(calls) == 1
+
+    test_db.close()
+    with sqlite3.connect(test_db.database_path) as connection:
+        connection.execute("ALTER TABLE codec_test DROP COLUMN channels")
+        connection.execute("ALTER TABLE codec_test DROP COLUMN bit_depth")
+    migrated_db = MusicTrackDatabase(table="codec_test")
+    assert list(migrated_db.get_all_tracks(fields=("channels", "bit_depth"))) == [{"channels": 1, "bit_depth": 16}]
+    assert len(calls) == 2
+
+def test_uncompressed_blobs_are_still_read(tmp_path, audio):
+    """Test that blobs written without compression, before or after it is turned off, read back as stored."""
+    plain = BlobStore(str(tmp_path), codec="none")
+    digest = plain.put(audio)
+    with open(plain.path_for(digest), "rb") as blob_file:
+        assert blob_file.read() == audio
+
+    store = BlobStore(str(tmp_path))
+    with store.open(digest) as blob:
+        assert blob.read() == audio
+    assert store.open_file(digest).size == len(audio)
+
+#Unhappy Paths
+def test_payload_that_looks_compressed_is_never_misread(tmp_path):
+    """Test that an uncompressed payload starting with the format's magic is wrapped rather than kept as it is."""
+    payload = audio_codec.MAGIC + b"not really compressed"
+    store = BlobStore(str(tmp_path), codec="none")
+    digest = store.put(payload)
+
+    with open(store.path_for(digest), "rb") as blob_file:
+        assert is_encoded(blob_file.read())
+    with store.open(digest) as blob:
+        assert blob.read() == payload
+
+def test_blocks_that_do_not_shrink_are_stored_raw():
+    """Test that incompressible blocks are kept uncompressed instead of growing."""
+    noise = np.random.default_rng(3).bytes(65536)
+
+    assert len(encode(noise)) < len(noise) + 200
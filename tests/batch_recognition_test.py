@@ -0,0 +1,89 @@
+import pytest
+import base64
+import json
+import threading
+import sys
+import os
+os.environ.setdefault("AUDDIO_TOKEN", "test-token")
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Audio_recognition_microservice"))
+import audio_recognition_microservice as service
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Fakes recognition (fragment text "song X" -> title "X") and the batch title lookup."""
+    calls = {"recognise": [], "lookup": []}
+    lock = threading.Lock()
+
+    def fake_get_track_title(fragment):
+        text = base64.b64decode(fragment).decode()
+        with lock:
+            calls["recognise"].append(text)
+        if not text.startswith("song "):
+            return {"success": False, "error_code": 422, "error_message": "Fingerprinting error"}
+        return {"success": True, "title": text[5:]}
+
+    def fake_post(path, json=None, **kwargs):
+        calls["lookup"].append((path, json))
+        return FakeResponse(200, {"tracks": {title: {"title": title, "encoded_track": "..."} for title in json["titles"] if title != "Missing"}})
+
+    service.recognition_cache.clear()
+    monkeypatch.setattr(service, "get_track_title", fake_get_track_title)
+    monkeypatch.setattr(service.database_client, "post", fake_post)
+    return calls
+
+#Helper Function
+def encode(text):
+    return base64.b64encode(text.encode()).decode()
+
+def post_batch(fragments):
+    response = service.app.test_client().post("/recognise/batch", json={"fragments": fragments})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    return response, {line["index"]: line for line in lines}
+
+#Happy Paths
+def test_batch_deduplicates_and_looks_up_once(upstream):
+    """Test that duplicates are recognised once and all titles are resolved in one lookup."""
+    response, results = post_batch([encode("song A"), encode("song B"), encode("song A"), encode("song Missing")])
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert sorted(upstream["recognise"]) == ["song A", "song B", "song Missing"]
+    assert len(upstream["lookup"]) == 1
+    assert sorted(upstream["lookup"][0][1]["titles"]) == ["A", "B", "Missing"]
+    assert results[0] == results[2] | {"index": 0}
+    assert results[1]["track"]["title"] == "B"
+    assert results[3]["status"] == 404
+
+def test_batch_uses_recognition_cache(upstream):
+    """Test that a second batch with the same fragment is served from the cache."""
+    post_batch([encode("song A")])
+    _, results = post_batch([encode("song A")])
+
+    assert upstream["recognise"] == ["song A"]
+    assert results[0]["status"] == 200
+
+#Unhappy Paths
+def test_batch_reports_per_item_failures(upstream):
+    """Test that a fragment that cannot be recognised fails on its own without sinking the batch."""
+    _, results = post_batch([encode("noise"), encode("song A")])
+
+    assert results[0] == {"index": 0, "status": 422}
+    assert results[1]["status"] == 200
+
+def test_batch_too_large(upstream):
+    """Test that a batch above the limit returns 413."""
+    response = service.app.test_client().post("/recognise/batch", json={"fragments": [encode("song A")] * (service.MAX_RECOGNITION_BATCH_SIZE + 1)})
+    assert response.status_code == 413
+
+def test_batch_missing_fragments(upstream):
+    """Test that a batch without fragments returns 400."""
+    response = service.app.test_client().post("/recognise/batch", json={"fragments": []})
+    assert response.status_code == 400
@@ -0,0 +1,123 @@
+import pytest
+import base64
+import threading
+import sys
+import os
+from werkzeug.serving import make_server
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Shared"))
+from wav_utils import parse_wav_header
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+import stub_audd
+from compare import compare
+from load_generator import percentiles, run_load
+from synthetic_catalogue import synthetic_catalogue, synthetic_fragment, synthetic_title, synthetic_track, unique_fragment
+
+@pytest.fixture
+def stub():
+    original = dict(stub_audd.config)
+    stub_audd.app.config["TESTING"] = True
+    with stub_audd.app.test_client() as client:
+        yield client
+    stub_audd.config.update(original)
+
+@pytest.fixture
+def stub_url():
+    """The stub served over HTTP on a free port, as a target for the load generator."""
+    server = make_server("localhost", 0, stub_audd.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://localhost:{server.server_port}"
+    server.shutdown()
+
+#Helper Function
+def result(scenario, p95, throughput):
+    """A minimal benchmark result entry."""
+    return {"catalogue_size": 10, "scenario": scenario, "throughput_rps": throughput,
+            "latency_ms": {"p50": p95 / 2, "p95": p95, "p99": p95 * 2}}
+
+#Happy Paths
+def test_synthetic_tracks_are_distinct_and_reproducible():
+    """Test that generated tracks are valid WAV, differ from each other and are rebuilt identically."""
+    tracks = list(synthetic_catalogue(20))
+
+    assert [title for title, _ in tracks][:2] == ["Synthetic Track 00000", "Synthetic Track 00001"]
+    assert len({audio for _, audio in tracks}) == 20
+    assert synthetic_track(7) == tracks[7][1]
+    header = parse_wav_header(tracks[0][1])
+    assert (header["channels"], header["sample_rate"], header["duration"]) == (1, 8000, 0.5)
+
+def test_unique_fragments_differ():
+    """Test that each uncached-recognition request sends different bytes of the same length."""
+    fragment = synthetic_fragment()
+
+    assert unique_fragment(fragment, 1) != unique_fragment(fragment, 2)
+    assert len(unique_fragment(fragment, 1)) == len(fragment)
+    assert parse_wav_header(unique_fragment(fragment, 1))["channels"] == 2
+
+def test_stub_recognises_fragments_consistently(stub):
+    """Test that the stub names the same catalogue track for the same fragment."""
+    stub.post("/_config", json={"catalogue_size": 1000})
+    audio = base64.b64encode(synthetic_fragment()).decode("ascii")
+
+    first = stub.post("/", data={"api_token": "token", "audio": audio}).get_json()
+    second = stub.post("/", data={"api_token": "token", "audio": audio}).get_json()
+
+    assert first["status"] == "success"
+    assert first == second
+    assert first["result"]["title"] in {synthetic_title(index) for index in range(1000)}
+
+def test_stub_injects_errors(stub):
+    """Test that the configured error rates produce AudD.io errors and 503s."""
+    audio = base64.b64encode(b"fragment").decode("ascii")
+
+    stub.post("/_config", json={"error_rate": 1.0, "error_code": 902})
+    assert stub.post("/", data={"api_token": "token", "audio": audio}).get_json()["error"]["error_code"] == 902
+
+    stub.post("/_config", json={"error_rate": 0.0, "server_error_rate": 1.0})
+    assert stub.post("/", data={"api_token": "token", "audio": audio}).status_code == 503
+
+def test_percentiles():
+    """Test that latencies are summarised in milliseconds."""
+    summary = percentiles([index / 1000 for index in range(1, 101)])
+
+    assert summary["p50"] == pytest.approx(50.5)
+    assert summary["p99"] == pytest.approx(99.01)
+    assert summary["max"] == 100.0
+
+def test_load_generator_counts_requests(stub_url):
+    """Test that the load generator sends and measures the requested number of calls."""
+    outcome = run_load(lambda i: ("GET", f"{stub_url}/_stats", {}), requests_total=20, concurrency=4, warmup=5)
+
+    assert outcome["requests"] == 20
+    assert outcome["statuses"] == {"200": 20}
+    assert outcome["errors"] == 0
+    assert outcome["throughput_rps"] > 0
+
+def test_compare_flags_regressions():
+    """Test that a slower p95 or lower throughput beyond the threshold is a regression."""
+    baseline = {"results": [result("db_search", 10.0, 100.0), result("catalogue_list", 10.0, 100.0)]}
+    current = {"results": [result("db_search", 10.5, 99.0), result("catalogue_list", 10.0, 70.0)]}
+
+    rows = {row["scenario"]: row for row in compare(baseline, current, threshold=0.2)}
+
+    assert not rows["db_search"]["regressed"]
+    assert rows["catalogue_list"]["regressed"]
+    assert rows["catalogue_list"]["throughput_rps"][2] == pytest.approx(-0.3)
+
+#Unhappy Paths
+def test_stub_rejects_requests_without_a_token(stub):
+    """Test that the stub answers a missing token the way AudD.io does."""
+    response = stub.post("/", data={"audio": base64.b64encode(b"fragment").decode("ascii")})
+
+    assert response.get_json()["error"]["error_code"] == 901
+
+def test_stub_rejects_unknown_settings(stub):
+    """Test that unknown configuration keys are refused."""
+    assert stub.post("/_config", json={"latency": 5}).status_code == 400
+
+def test_load_generator_counts_unexpected_statuses_as_errors(stub_url):
+    """Test that responses outside the expected statuses are errors."""
+    outcome = run_load(lambda i: ("GET", f"{stub_url}/unknown", {}), requests_total=5, concurrency=2)
+
+    assert outcome["errors"] == 5
+    assert outcome["statuses"] == {"404": 5}
@@ -0,0 +1,95 @@
+import pytest
+import base64
+import hashlib
+import sqlite3
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice"))
+from database_helper import MusicTrackDatabase
+from blob_store import BlobStore
+
+@pytest.fixture
+def sample_track():
+    return {
+        "title": "Blinding Lights",
+        "encoded_track": encode_audio_to_base64("./Music/Tracks/Blinding Lights.wav")
+    }
+
+@pytest.fixture
+def blob_db():
+    test_db = MusicTrackDatabase(table="blob_test")
+    yield test_db
+    test_db.reset_database()
+
+#Helper Function
+def encode_audio_to_base64(file_path):
+    """Reads a WAV file and encodes it to a base64 string."""
+    with open(file_path, "rb") as audio_file:
+        encoded_string = base64.b64encode(audio_file.read()).decode("utf-8")
+    return encoded_string
+
+#Happy Paths
+def test_blob_is_content_addressed(tmp_path):
+    """Test that blobs are stored once under their digest in sharded directories."""
+    store = BlobStore(str(tmp_path))
+    digest = store.put(b"audio bytes")
+
+    assert digest == hashlib.sha256(b"audio bytes").hexdigest()
+    assert store.put(b"audio bytes") == digest
+    assert store.path_for(digest) == os.path.join(str(tmp_path), digest[0:2], digest[2:4], digest)
+    with store.open(digest) as blob:
+        assert blob.read() == b"audio bytes"
+    assert os.listdir(store.temp_dir) == []
+
+def test_track_round_trips_through_blob_store(blob_db, sample_track):
+    """Test that the JSON API still returns the original base64 payload."""
+    blob_db.insert(sample_track)
+
+    assert blob_db.find_track_by_title(sample_track["title"]) == sample_track
+    assert list(blob_db.get_all_tracks()) == [sample_track]
+
+def test_tracks_table_holds_only_metadata(blob_db, sample_track):
+    """Test that the tracks table stores metadata rather than the audio itself."""
+    blob_db.insert(sample_track)
+
+    with sqlite3.connect(blob_db.database_path) as connection:
+        row = connection.execute("SELECT digest, byte_size, duration, sample_rate FROM blob_test").fetchone()
+    audio = base64.b64decode(sample_track["encoded_track"])
+    assert row[0] == hashlib.sha256(audio).hexdigest()
+    assert row[1] == len(audio)
+    assert row[2] == pytest.approx(8.86, abs=0.01)
+    assert row[3] == 48000
+
+def test_shared_blob_survives_single_delete(blob_db, sample_track):
+    """Test that a blob referenced by two titles is kept until both are removed."""
+    blob_db.insert(sample_track)
+    blob_db.insert({"title": "Copy", "encoded_track": sample_track["encoded_track"]})
+    digest = hashlib.sha256(base64.b64decode(sample_track["encoded_track"])).hexdigest()
+
+    blob_db.remove_track_by_title("Copy")
+    assert blob_db.blob_store.exists(digest)
+
+    blob_db.remove_track_by_title(sample_track["title"])
+    assert not blob_db.blob_store.exists(digest)
+
+def test_legacy_table_is_migrated(sample_track):
+    """Test that a table with the old encoded_track column is moved into the blob store."""
+    legacy_db = MusicTrackDatabase(table="blob_legacy_test")
+    legacy_db.reset_database()
+    with sqlite3.connect(legacy_db.database_path) as connection:
+        connection.execute("DROP TABLE blob_legacy_test")
+        connection.execute("CREATE TABLE blob_legacy_test (title TEXT PRIMARY KEY, encoded_track TEXT NOT NULL)")
+        connection.execute("INSERT INTO blob_legacy_test VALUES (?, ?)", (sample_track["title"], sample_track["encoded_track"]))
+
+    migrated_db = MusicTrackDatabase(table="blob_legacy_test")
+    try:
+        assert migrated_db.find_track_by_title(sample_track["title"]) == sample_track
+    finally:
+        migrated_db.reset_database()
+
+#Unhappy Paths
+def test_invalid_base64_is_rejected(blob_db):
+    """Test that a payload that is not base64 is refused before anything is stored."""
+    with pytest.raises(ValueError):
+        blob_db.insert({"title": "Broken", "encoded_track": "not base64!"})
+    assert blob_db.find_track_by_title("Broken") is None
@@ -0,0 +1,89 @@
+import pytest
+import base64
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Catalogue_management_microservice"))
+import database_management_microservice
+from database_management_microservice import app
+from database_helper import MusicTrackDatabase
+from track_importer import import_directory
+
+@pytest.fixture
+def batch_db(monkeypatch):
+    """Points the database service at a throwaway table."""
+    test_db = MusicTrackDatabase(table="batch_test")
+    monkeypatch.setattr(database_management_microservice, "db", test_db)
+    yield test_db
+    test_db.reset_database()
+
+#Helper Function
+def encode_audio_to_base64(file_path):
+    """Reads a WAV file and encodes it to a base64 string."""
+    with open(file_path, "rb") as audio_file:
+        encoded_string = base64.b64encode(audio_file.read()).decode("utf-8")
+    return encoded_string
+
+def post_batch_to_test_client(batch):
+    response = app.test_client().post("/db/tracks/batch", json={"tracks": batch})
+    assert response.status_code == 200
+    return response.get_json()["results"]
+
+#Happy Paths
+def test_batch_reports_each_item(batch_db):
+    """Test that one batch reports created, conflict and invalid items separately."""
+    encoded_track = encode_audio_to_base64("./Music/Fragments/_Davos.wav")
+    batch_db.insert({"title": "Existing", "encoded_track": encoded_track})
+
+    response = app.test_client().post("/db/tracks/batch", json={"tracks": [
+        {"title": "Davos", "encoded_track": encoded_track},
+        {"title": "Existing", "encoded_track": encoded_track},
+        {"title": "Broken", "encoded_track": "not base64!"},
+        {"title": "Davos", "encoded_track": encoded_track},
+        {"encoded_track": encoded_track},
+    ]})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [result["status"] for result in body["results"]] == ["created", "conflict", "invalid", "conflict", "invalid"]
+    assert (body["created"], body["conflict"], body["invalid"]) == (1, 2, 2)
+    assert batch_db.find_track_by_title("Davos") is not None
+
+def test_importer_loads_directory(batch_db):
+    """Test that the importer walks Music/Tracks and loads every file in batches."""
+    summary = import_directory("./Music/Tracks", post_batch_to_test_client, batch_size=3, workers=2)
+
+    assert summary["created"] == 4
+    assert summary["failed"] == 0
+    assert batch_db.find_track_by_title("good 4 u")["encoded_track"] == encode_audio_to_base64("./Music/Tracks/good 4 u.wav")
+
+    again = import_directory("./Music/Tracks", post_batch_to_test_client, batch_size=3, workers=2)
+    assert again["conflict"] == 4
+
+#Unhappy Paths
+def test_batch_items_that_are_not_wav_are_invalid(batch_db):
+    """Test that base64 payloads that are not complete PCM WAV files are reported invalid and never stored."""
+    encoded_track = encode_audio_to_base64("./Music/Fragments/_Davos.wav")
+    truncated = base64.b64decode(encoded_track)[:1000]
+
+    results = post_batch_to_test_client([
+        {"title": "Text", "encoded_track": base64.b64encode(b"just some text, not audio").decode()},
+        {"title": "Truncated", "encoded_track": base64.b64encode(truncated).decode()},
+        {"title": "Davos", "encoded_track": encoded_track},
+    ])
+
+    assert [result["status"] for result in results] == ["invalid", "invalid", "created"]
+    assert "RIFF" in results[0]["error"]
+    assert batch_db.find_track_by_title("Text") is None
+    assert batch_db.search_track("Text")[0] is None
+
+def test_empty_batch_is_rejected(batch_db):
+    """Test that a batch without tracks returns 400."""
+    response = app.test_client().post("/db/tracks/batch", json={"tracks": []})
+    assert response.status_code == 400
+
+def test_oversized_batch_is_rejected(batch_db):
+    """Test that a batch over the size limit returns 413."""
+    tracks = [{"title": str(i), "encoded_track": ""} for i in range(database_management_microservice.MAX_BATCH_SIZE + 1)]
+    response = app.test_client().post("/db/tracks/batch", json={"tracks": tracks})
+    assert response.status_code == 413
@@ -0,0 +1,187 @@
+import pytest
+import base64
+import json
+import sqlite3
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice"))
+import database_management_microservice
+import catalogue_snapshot
+from database_helper import MusicTrackDatabase, TrackExists
+from sharded_database import ShardedMusicTrackDatabase
+from rebalance_shards import remove_layout
+from catalogue_snapshot import SnapshotError, export_lines, import_snapshot
+
+TRACKS = {
+    "Blinding Lights": "./Music/Tracks/Blinding Lights.wav",
+    "good 4 u": "./Music/Tracks/good 4 u.wav",
+    "Davos": "./Music/Fragments/_Davos.wav",
+}
+
+@pytest.fixture
+def source_db():
+    test_db = MusicTrackDatabase(table="snapshot_source_test")
+    test_db.insert_many([{"title": title, "encoded_track": encode_audio_to_base64(path)} for title, path in TRACKS.items()])
+    yield test_db
+    test_db.reset_database()
+
+@pytest.fixture
+def target_db():
+    test_db = MusicTrackDatabase(table="snapshot_target_test")
+    yield test_db
+    test_db.reset_database()
+
+@pytest.fixture
+def client(monkeypatch):
+    database_management_microservice.app.config["TESTING"] = True
+    with database_management_microservice.app.test_client() as client:
+        yield client
+
+#Helper Function
+def encode_audio_to_base64(file_path):
+    """Reads a WAV file and encodes it to a base64 string."""
+    with open(file_path, "rb") as audio_file:
+        encoded_string = base64.b64encode(audio_file.read()).decode("utf-8")
+    return encoded_string
+
+def snapshot_of(db):
+    """Exports a database to a list of snapshot lines."""
+    return list(export_lines(db))
+
+def fingerprint_count(db, title):
+    with db.connection() as connection:
+        return connection.execute(f"SELECT COUNT(*) FROM {db.table}_fingerprints WHERE title=?", (title,)).fetchone()[0]
+
+#Happy Paths
+def test_export_and_import_round_trip(client, source_db, target_db, monkeypatch):
+    """Test that a catalogue exported over HTTP and imported elsewhere has the same tracks, audio and fingerprints."""
+    monkeypatch.setattr(database_management_microservice, "db", source_db)
+    exported = client.get("/db/export")
+    assert exported.status_code == 200
+    assert exported.is_streamed
+    assert exported.mimetype == "application/x-ndjson"
+    snapshot = exported.get_data()
+
+    monkeypatch.setattr(database_management_microservice, "db", target_db)
+    response = client.post("/db/import", data=snapshot, content_type="application/x-ndjson")
+
+    assert response.status_code == 200
+    assert response.get_json() == {"created": 3, "replaced": 0, "conflict": 0}
+    for title, path in TRACKS.items():
+        assert target_db.find_track_by_title(title)["encoded_track"] == encode_audio_to_base64(path)
+        assert fingerprint_count(target_db, title) == fingerprint_count(source_db, title) > 0
+    assert target_db.search_track("Good 4 U")[0]["title"] == "good 4 u"
+
+def test_snapshot_lines_are_ordered_and_framed(source_db):
+    """Test that a snapshot is a header, one line per track in title order, and an end marker with the count."""
+    lines = [json.loads(line) for line in snapshot_of(source_db)]
+
+    assert lines[0]["format"] == "shamzam-catalogue"
+    assert [line["title"] for line in lines[1:-1]] == sorted(TRACKS)
+    assert lines[-1] == {"end": True, "tracks": 3}
+
+def test_conflict_modes(source_db, target_db):
+    """Test that stored titles are skipped, replaced, or stop the import, as asked."""
+    snapshot = snapshot_of(source_db)
+    target_db.insert({"title": "Davos", "encoded_track": encode_audio_to_base64("./Music/Tracks/good 4 u.wav")})
+
+    with pytest.raises(TrackExists):
+        import_snapshot(target_db, snapshot, on_conflict="fail")
+    assert target_db.find_track_by_title("Blinding Lights") is None
+
+    assert import_snapshot(target_db, snapshot) == {"created": 2, "replaced": 0, "conflict": 1}
+    assert target_db.find_track_by_title("Davos")["encoded_track"] == encode_audio_to_base64("./Music/Tracks/good 4 u.wav")
+
+    assert import_snapshot(target_db, snapshot, on_conflict="replace") == {"created": 0, "replaced": 3, "conflict": 0}
+    assert target_db.find_track_by_title("Davos")["encoded_track"] == encode_audio_to_base64("./Music/Fragments/_Davos.wav")
+    assert target_db.match_fingerprints(target_db.fingerprint(open("./Music/Fragments/_Davos.wav", "rb").read()))["title"] == "Davos"
+
+def test_snapshot_moves_between_shard_layouts(source_db):
+    """Test that a sharded catalogue exports in title order and imports into a single file and back."""
+    sharded = ShardedMusicTrackDatabase(table="snapshot_sharded_test", shards=2)
+    try:
+        assert import_snapshot(sharded, snapshot_of(source_db))["created"] == 3
+        assert [json.loads(line).get("title") for line in snapshot_of(sharded)[1:-1]] == sorted(TRACKS)
+        assert sharded.find_track_by_title("good 4 u")["encoded_track"] == encode_audio_to_base64("./Music/Tracks/good 4 u.wav")
+    finally:
+        sharded.close()
+        remove_layout("snapshot_sharded_test", 2)
+
+#Unhappy Paths
+def test_truncated_import_keeps_written_batches(client, source_db, target_db, monkeypatch):
+    """Test that a snapshot cut short is refused with 400, keeping earlier batches, and can be imported again."""
+    monkeypatch.setattr(database_management_microservice, "db", target_db)
+    monkeypatch.setattr(catalogue_snapshot, "IMPORT_BATCH_TRACKS", 1)
+    snapshot = snapshot_of(source_db)
+
+    response = client.post("/db/import", data="".join(snapshot[:3]))
+
+    assert response.status_code == 400
+    assert response.get_json()["created"] == 2
+    assert "truncated" in response.get_json()["error"]
+    assert client.post("/db/import", data="".join(snapshot)).get_json() == {"created": 1, "replaced": 0, "conflict": 2}
+
+def test_rolled_back_replace_or_delete_keeps_the_old_audio(target_db, monkeypatch):
+    """Test that a replace batch or a delete that rolls back leaves the stored track playable, and a committed one drops its blob."""
+    target_db.insert({"title": "A", "encoded_track": encode_audio_to_base64("./Music/Fragments/_Davos.wav")})
+    old_digest = target_db.find_audio_digest("A")
+    audio = open("./Music/Tracks/good 4 u.wav", "rb").read()
+    replacement = (target_db.describe_audio("A", audio), audio, target_db.fingerprint(audio))
+    broken = (target_db.describe_audio("B", audio), audio, [(1,)])
+
+    with pytest.raises(ValueError):
+        target_db.insert_described([replacement, broken], on_conflict="replace")
+    assert target_db.find_track_by_title("A")["encoded_track"] == encode_audio_to_base64("./Music/Fragments/_Davos.wav")
+
+    def failing_bump(cursor):
+        raise sqlite3.OperationalError("disk I/O error")
+    with monkeypatch.context() as patched:
+        patched.setattr(target_db, "bump_version", failing_bump)
+        with pytest.raises(sqlite3.OperationalError):
+            target_db.remove_track_by_title("A")
+    assert target_db.blob_store.exists(old_digest)
+
+    assert target_db.insert_described([replacement], on_conflict="replace") == ["replaced"]
+    assert not target_db.blob_store.exists(old_digest)
+    assert target_db.find_track_by_title("A")["encoded_track"] == encode_audio_to_base64("./Music/Tracks/good 4 u.wav")
+
+def test_failed_reset_keeps_the_audio(source_db, monkeypatch):
+    """Test that a reset that rolls back leaves every track playable, and a committed one removes the blobs."""
+    digest = source_db.find_audio_digest("Davos")
+
+    def failing_bump(cursor):
+        raise sqlite3.OperationalError("disk I/O error")
+    with monkeypatch.context() as patched:
+        patched.setattr(source_db, "bump_version", failing_bump)
+        with pytest.raises(sqlite3.OperationalError):
+            source_db.reset_database()
+    assert source_db.find_track_by_title("Davos")["encoded_track"] == encode_audio_to_base64(TRACKS["Davos"])
+
+    source_db.reset_database()
+    assert not source_db.blob_store.exists(digest)
+
+def test_title_conflict_fails_with_409(client, source_db, monkeypatch):
+    """Test that on_conflict=fail answers 409 when a title is already stored."""
+    monkeypatch.setattr(database_management_microservice, "db", source_db)
+    snapshot = client.get("/db/export").get_data()
+
+    response = client.post("/db/import?on_conflict=fail", data=snapshot)
+
+    assert response.status_code == 409
+    assert response.get_json()["created"] == 0
+
+def test_malformed_snapshots_are_rejected(client, source_db, target_db, monkeypatch):
+    """Test that snapshots with a bad header, bad JSON, altered audio or a wrong count, and unknown modes, are refused."""
+    monkeypatch.setattr(database_management_microservice, "db", target_db)
+    header, track, *_, end = snapshot_of(source_db)
+    altered = json.loads(track)
+    altered["encoded_track"] = encode_audio_to_base64("./Music/Fragments/_Davos.wav")
+
+    assert client.post("/db/import", data='{"format": "other"}\n').status_code == 400
+    assert client.post("/db/import", data=header + "not json\n").status_code == 400
+    assert client.post("/db/import", data=header + json.dumps(altered) + "\n" + end).status_code == 400
+    assert client.post("/db/import", data=header + track + end).status_code == 400
+    assert client.post("/db/import?on_conflict=merge", data=header + track).status_code == 400
+    with pytest.raises(SnapshotError):
+        import_snapshot(target_db, [])
+    assert target_db.find_track_by_title("Blinding Lights") is None
@@ -0,0 +1,175 @@
+import requests
+import pytest
+import base64
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice"))
+import database_management_microservice
+from database_helper import MusicTrackDatabase
+from track_cache import TrackCache
+
+CATALOGUE_URL = "http://localhost:3000"
+DATABASE_URL = "http://localhost:3002"
+
+@pytest.fixture
+def test_db():
+    test_db = MusicTrackDatabase(table="version_test")
+    yield test_db
+    test_db.reset_database()
+
+@pytest.fixture
+def client(test_db, monkeypatch):
+    monkeypatch.setattr(database_management_microservice, "db", test_db)
+    database_management_microservice.app.config["TESTING"] = True
+    with database_management_microservice.app.test_client() as client:
+        yield client
+
+#Helper Function
+def encode_audio_to_base64(file_path):
+    """Reads a WAV file and encodes it to a base64 string."""
+    with open(file_path, "rb") as audio_file:
+        encoded_string = base64.b64encode(audio_file.read()).decode("utf-8")
+    return encoded_string
+
+def add_track(test_db, title, file_path="./Music/Tracks/Blinding Lights.wav"):
+    return test_db.insert({"title": title, "encoded_track": encode_audio_to_base64(file_path)})
+
+#Happy Paths
+def test_version_rises_on_every_change(test_db):
+    """Test that inserts, deletes and resets each raise the catalogue version."""
+    start = test_db.version
+
+    add_track(test_db, "Blinding Lights")
+    assert test_db.version == start + 1
+
+    test_db.insert_many([{"title": "Also Blinding", "encoded_track": encode_audio_to_base64("./Music/Tracks/Blinding Lights.wav")}])
+    assert test_db.version == start + 2
+
+    test_db.remove_track_by_title("Blinding Lights")
+    assert test_db.version == start + 3
+
+    test_db.reset_database()
+    assert test_db.version == start + 4
+
+def test_version_survives_restart(test_db):
+    """Test that the version is stored, so it keeps rising across restarts."""
+    add_track(test_db, "Blinding Lights")
+
+    reopened = MusicTrackDatabase(table="version_test")
+
+    assert reopened.version == test_db.version
+    assert reopened.catalogue_tag == test_db.catalogue_tag
+
+def test_repeated_lookups_skip_sqlite(test_db, monkeypatch):
+    """Test that a cached track (or miss) is served without borrowing a connection."""
+    add_track(test_db, "Blinding Lights")
+    track = test_db.find_track_by_title("Blinding Lights")
+    assert test_db.find_track_by_title("Unknown") is None
+
+    def no_sqlite():
+        raise AssertionError("SQLite was queried")
+    monkeypatch.setattr(test_db, "connection", no_sqlite)
+
+    assert test_db.find_track_by_title("Blinding Lights") == track
+    assert test_db.find_track_by_title("Unknown") is None
+    assert test_db.search_track("Blinding Lights") == (track, "exact")
+
+def test_changes_invalidate_cached_lookups(test_db):
+    """Test that a cached miss is dropped when the title is added, and a cached hit when it is deleted."""
+    assert test_db.find_track_by_title("Blinding Lights") is None
+
+    add_track(test_db, "Blinding Lights")
+    assert test_db.find_track_by_title("Blinding Lights")["title"] == "Blinding Lights"
+
+    test_db.remove_track_by_title("Blinding Lights")
+    assert test_db.find_track_by_title("Blinding Lights") is None
+
+    with open("./Music/Tracks/Blinding Lights.wav", "rb") as audio_file:
+        test_db.insert_stream("Blinding Lights", [audio_file.read()])
+    assert test_db.find_tracks_by_titles(["Blinding Lights"])["Blinding Lights"]["title"] == "Blinding Lights"
+
+    test_db.reset_database()
+    assert test_db.find_tracks_by_titles(["Blinding Lights"]) == {}
+
+def test_search_answers_not_modified(client, test_db):
+    """Test that a search repeated with its ETag gets 304 until the catalogue changes."""
+    add_track(test_db, "Blinding Lights")
+    first = client.get("/db/tracks/search", query_string={"title": "Blinding Lights"})
+    etag = first.headers["ETag"]
+
+    repeat = client.get("/db/tracks/search", query_string={"title": "Blinding Lights"}, headers={"If-None-Match": etag})
+    assert repeat.status_code == 304
+    assert repeat.headers["ETag"] == etag
+    assert repeat.data == b""
+
+    other = client.get("/db/tracks/search", query_string={"title": "Blinding Lights", "ranked": "true"}, headers={"If-None-Match": etag})
+    assert other.status_code == 200
+
+    add_track(test_db, "Another Track", "./Music/Tracks/good 4 u.wav")
+    changed = client.get("/db/tracks/search", query_string={"title": "Blinding Lights"}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+def test_listing_answers_not_modified(client, test_db):
+    """Test that a listing page repeated with its ETag gets 304."""
+    add_track(test_db, "Blinding Lights")
+    first = client.get("/db/tracks", query_string={"fields": "title"})
+
+    assert first.status_code == 200
+    assert first.get_json() == [{"title": "Blinding Lights"}]
+    assert client.get("/db/tracks", query_string={"fields": "title"}, headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+def test_cache_stats(client, test_db):
+    """Test that the cache endpoint reports the version and hit counters."""
+    test_db.find_track_by_title("Unknown")
+    test_db.find_track_by_title("Unknown")
+
+    stats = client.get("/db/cache").get_json()
+
+    assert stats["version"] == test_db.version
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+def test_catalogue_relays_listing_etag():
+    """Test that the catalogue passes the listing's ETag through and relays 304."""
+    first = requests.get(f"{CATALOGUE_URL}/tracks")
+    etag = first.headers["ETag"]
+
+    assert requests.get(f"{CATALOGUE_URL}/tracks", headers={"If-None-Match": etag}).status_code == 304
+
+    requests.post(f"{DATABASE_URL}/db/reset")
+    assert requests.get(f"{CATALOGUE_URL}/tracks", headers={"If-None-Match": etag}).status_code == 200
+
+#Unhappy Paths
+def test_rejected_changes_keep_version(test_db):
+    """Test that duplicate inserts and deletes of missing titles do not change the version."""
+    add_track(test_db, "Blinding Lights")
+    version = test_db.version
+
+    assert add_track(test_db, "Blinding Lights") == 409
+    assert test_db.remove_track_by_title("Unknown") == 0
+    assert test_db.version == version
+
+def test_stale_read_is_not_cached():
+    """Test that a result read before a change committed is not cached."""
+    cache = TrackCache()
+    read_version = cache.version
+
+    cache.invalidate(["Blinding Lights"], read_version + 1)
+    cache.put("Blinding Lights", None, read_version)
+
+    assert cache.get("Blinding Lights") == (False, None)
+    assert cache.stats()["stale_puts"] == 1
+
+def test_cache_is_bounded():
+    """Test that the least recently used tracks are evicted beyond the entry and byte bounds."""
+    cache = TrackCache(max_entries=2, max_bytes=100)
+    cache.put("a", {"title": "a", "encoded_track": "x" * 40}, 0)
+    cache.put("b", {"title": "b", "encoded_track": "x" * 40}, 0)
+    cache.get("a")
+    cache.put("c", {"title": "c", "encoded_track": "x" * 40}, 0)
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a")[0] and cache.get("c")[0]
+    cache.put("big", {"title": "big", "encoded_track": "x" * 200}, 0)
+    assert cache.get("big") == (False, None)
@@ -0,0 +1,161 @@
+import pytest
+import base64
+import time
+import sys
+import os
+os.environ.setdefault("AUDDIO_TOKEN", "test-token")
+from werkzeug.test import Client
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+from composed_microservice import create_app, database_service, catalogue_service, audio_service
+from database_helper import MusicTrackDatabase
+from database_transport import DatabaseUnavailableError, HttpDatabaseTransport
+from local_database_transport import LocalDatabaseTransport
+from ingestion_queue import IngestionQueue
+
+@pytest.fixture
+def test_db(monkeypatch):
+    test_db = MusicTrackDatabase(table="composed_test")
+    ingestion = IngestionQueue(test_db)
+    monkeypatch.setattr(database_service, "db", test_db)
+    monkeypatch.setattr(database_service, "ingestion", ingestion)
+    yield test_db
+    ingestion.reset()
+    test_db.reset_database()
+
+@pytest.fixture
+def client(test_db, monkeypatch):
+    """A client of the composed app, whose services may not touch the HTTP database client."""
+    # Restored after the test, since create_app rewires the service modules
+    monkeypatch.setattr(catalogue_service, "database", catalogue_service.database)
+    monkeypatch.setattr(audio_service, "database", audio_service.database)
+
+    def no_http(*args, **kwargs):
+        raise AssertionError("The database service was called over HTTP")
+    monkeypatch.setattr(catalogue_service.database_client, "request", no_http)
+    monkeypatch.setattr(audio_service.database_client, "request", no_http)
+    return Client(create_app())
+
+#Helper Function
+def encode_audio_to_base64(file_path):
+    """Reads a WAV file and encodes it to a base64 string."""
+    with open(file_path, "rb") as audio_file:
+        encoded_string = base64.b64encode(audio_file.read()).decode("utf-8")
+    return encoded_string
+
+def wait_for_job(client, job_url, timeout=30):
+    """Polls a queued track's job until it is done or failed, and returns it."""
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(job_url).get_json()
+        if job["status"] in ("done", "failed") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+#Happy Paths
+def test_catalogue_calls_database_in_process(client, test_db):
+    """Test that tracks added and listed through the catalogue go straight to the shared database."""
+    response = client.post("/tracks", json={"title": "Blinding Lights", "encoded_track": encode_audio_to_base64("./Music/Tracks/Blinding Lights.wav")})
+    assert response.status_code == 202
+    assert wait_for_job(client, response.headers["Location"])["status"] == "done"
+    assert test_db.find_track_by_title("Blinding Lights") is not None
+
+    listing = client.get("/tracks")
+    assert listing.status_code == 200
+    assert listing.get_json() == [{"title": "Blinding Lights"}]
+    assert client.get("/tracks", headers={"If-None-Match": listing.headers["ETag"]}).status_code == 304
+
+    assert client.delete("/tracks/Blinding Lights").status_code == 200
+    assert client.delete("/tracks/Blinding Lights").status_code == 404
+
+def test_uploads_and_batches_in_process(client, test_db):
+    """Test that raw uploads stream into the blob store and batches report per-item results."""
+    with open("./Music/Tracks/good 4 u.wav", "rb") as audio_file:
+        audio = audio_file.read()
+
+    upload = client.post("/tracks/upload", query_string={"title": "good 4 u"}, data=audio, content_type="audio/wav")
+    batch = client.post("/tracks/batch", json={"tracks": [
+        {"title": "Davos", "encoded_track": encode_audio_to_base64("./Music/Fragments/_Davos.wav")},
+        {"title": "good 4 u", "encoded_track": encode_audio_to_base64("./Music/Fragments/_Davos.wav")},
+    ]})
+
+    assert upload.status_code == 201
+    assert [result["status"] for result in batch.get_json()["results"]] == ["created", "conflict"]
+    assert client.get("/tracks/good 4 u/audio").data == audio
+    partial = client.get("/tracks/good 4 u/audio", headers={"Range": "bytes=0-3"})
+    assert partial.status_code == 206
+    assert partial.data == b"RIFF"
+
+def test_recognition_calls_database_in_process(client, test_db, monkeypatch):
+    """Test that fingerprint recognition and the track lookup run against the shared database."""
+    test_db.insert({"title": "Blinding Lights", "encoded_track": encode_audio_to_base64("./Music/Tracks/Blinding Lights.wav")})
+    monkeypatch.setattr(audio_service, "RECOGNITION_BACKEND", "local")
+    audio_service.recognition_cache.clear()
+
+    response = client.post("/recognise", json={"encoded_track_fragment": encode_audio_to_base64("./Music/Fragments/_Blinding Lights.wav")})
+
+    assert response.status_code == 200
+    assert response.get_json()["title"] == "Blinding Lights"
+
+def test_database_routes_are_mounted(client, test_db):
+    """Test that the database service's own routes are served by the composed app."""
+    test_db.insert({"title": "Davos", "encoded_track": encode_audio_to_base64("./Music/Fragments/_Davos.wav")})
+
+    assert client.get("/db/tracks/search", query_string={"title": "davos"}).get_json()["title"] == "Davos"
+    assert client.get("/health").get_json()["database"]["transport"] == "local"
+
+def test_catalogue_pages_past_non_ascii_titles(client, test_db):
+    """Test that the catalogue's listing hands out an ASCII cursor after a non-ASCII title, and follows it."""
+    for title in ("Sigur Rós – Hoppípolla", "Davos"):
+        test_db.insert({"title": title, "encoded_track": encode_audio_to_base64("./Music/Fragments/_Davos.wav")})
+
+    first = client.get("/tracks", query_string={"limit": 1})
+    assert first.get_json() == [{"title": "Davos"}]
+    cursor = first.headers["X-Next-Cursor"]
+    assert cursor.isascii()
+
+    assert client.get("/tracks", query_string={"after": cursor}).get_json() == [{"title": "Sigur Rós – Hoppípolla"}]
+
+def test_metrics_cover_every_service(client, test_db):
+    """Test that the composed app's /metrics reports the database and recognition services as well as the catalogue."""
+    client.get("/db/tracks", query_string={"fields": "title"})
+    client.post("/recognise", json={})
+    client.get("/tracks")
+
+    response = client.get("/metrics")
+    body = response.get_data(as_text=True)
+    assert response.status_code == 200
+    for service in ("database", "audio", "catalogue"):
+        assert f'service="{service}"' in body
+    assert "sqlite_method_duration_seconds" in body
+
+def test_listing_etags_match_across_transports(client, test_db):
+    """Test that a listing has the same ETag over HTTP, in either parameter order, and through the in-process transport."""
+    test_db.insert({"title": "Davos", "encoded_track": encode_audio_to_base64("./Music/Fragments/_Davos.wav")})
+    over_http = client.get("/db/tracks?fields=title%2Cduration&limit=5").headers["ETag"]
+    reordered = client.get("/db/tracks?limit=5&fields=title,duration").headers["ETag"]
+    in_process = LocalDatabaseTransport(test_db, database_service.ingestion).list_tracks({"fields": "title,duration", "limit": "5"})
+
+    assert over_http == reordered == in_process.headers["ETag"]
+    assert client.get("/tracks").headers["ETag"] == client.get("/db/tracks?fields=title").headers["ETag"]
+
+def test_services_default_to_http():
+    """Test that importing the composed module leaves the separate deployment's HTTP transport in place."""
+    assert isinstance(catalogue_service.database, HttpDatabaseTransport)
+    assert isinstance(audio_service.database, HttpDatabaseTransport)
+
+#Unhappy Paths
+def test_missing_tracks_and_bad_input(client):
+    """Test that the in-process transport answers with the database service's statuses."""
+    assert client.get("/tracks/Unknown/audio").status_code == 404
+    assert client.get("/tracks", query_string={"limit": "0"}).status_code == 400
+    assert client.get("/tracks", query_string={"after": "not a cursor!"}).status_code == 400
+    assert client.post("/tracks/batch", json={"tracks": []}).status_code == 400
+
+def test_database_failure_is_unavailable(test_db, monkeypatch):
+    """Test that a failing database surfaces as an unreachable service, which callers answer with 503."""
+    def broken(title):
+        raise OSError("disk gone")
+    monkeypatch.setattr(test_db, "remove_track_by_title", broken)
+
+    with pytest.raises(DatabaseUnavailableError):
+        LocalDatabaseTransport(test_db, database_service.ingestion).delete_track("Davos")
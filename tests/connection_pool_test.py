@@ -0,0 +1,68 @@
+import pytest
+import base64
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice"))
+from database_helper import MusicTrackDatabase
+
+@pytest.fixture
+def sample_track():
+    return {
+        "title": "good 4 u",
+        "encoded_track": encode_audio_to_base64("./Music/Fragments/_good 4 u.wav")
+    }
+
+@pytest.fixture
+def pool_db():
+    test_db = MusicTrackDatabase(table="pool_test", pool_size=4)
+    yield test_db
+    test_db.reset_database()
+    test_db.close()
+
+#Helper Function
+def encode_audio_to_base64(file_path):
+    """Reads a WAV file and encodes it to a base64 string."""
+    with open(file_path, "rb") as audio_file:
+        encoded_string = base64.b64encode(audio_file.read()).decode("utf-8")
+    return encoded_string
+
+#Happy Paths
+def test_connections_use_wal(pool_db):
+    """Test that pooled connections are opened in WAL mode with the tuned pragmas."""
+    with pool_db.connection() as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert connection.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+def test_connections_are_reused(pool_db):
+    """Test that a returned connection is handed out again instead of reconnecting."""
+    with pool_db.connection() as first:
+        pass
+    with pool_db.connection() as second:
+        assert second is first
+
+def test_concurrent_readers(pool_db, sample_track):
+    """Test that many threads can look tracks up at once through the pool."""
+    pool_db.insert(sample_track)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: pool_db.find_track_by_title(sample_track["title"]), range(32)))
+
+    assert all(result == sample_track for result in results)
+    assert pool_db.pool.qsize() <= 4
+
+#Unhappy Paths
+def test_duplicate_insert_conflicts(pool_db, sample_track):
+    """Test that the upsert reports a conflict for an existing title."""
+    assert pool_db.insert(sample_track) != 409
+    assert pool_db.insert(sample_track) == 409
+
+def test_failed_transaction_is_rolled_back(pool_db, sample_track):
+    """Test that an error inside a borrowed connection rolls back and still returns it to the pool."""
+    with pytest.raises(RuntimeError):
+        with pool_db.connection() as connection:
+            connection.execute("INSERT INTO pool_test (title, digest, byte_size) VALUES ('partial', 'x', 0)")
+            raise RuntimeError("boom")
+
+    assert pool_db.find_track_by_title("partial") is None
+    assert pool_db.pool.qsize() == 1
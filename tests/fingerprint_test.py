@@ -0,0 +1,66 @@
+import pytest
+import base64
+import sys
+import os
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Shared"))
+from database_helper import MusicTrackDatabase
+from fingerprint import fingerprint_wav, fingerprint_samples
+from wav_utils import read_wav
+
+TRACK_TITLES = ["Blinding Lights", "Dont Look Back In Anger", "Everybody (Backstreets Back) (Radio Edit)", "good 4 u"]
+
+@pytest.fixture
+def fingerprint_db():
+    """A throwaway database holding every track in Music/Tracks."""
+    test_db = MusicTrackDatabase(table="fingerprint_test")
+    for title in TRACK_TITLES:
+        test_db.insert({"title": title, "encoded_track": encode_audio_to_base64(f"./Music/Tracks/{title}.wav")})
+    yield test_db
+    test_db.reset_database()
+
+#Helper Function
+def encode_audio_to_base64(file_path):
+    """Reads a WAV file and encodes it to a base64 string."""
+    with open(file_path, "rb") as audio_file:
+        encoded_string = base64.b64encode(audio_file.read()).decode("utf-8")
+    return encoded_string
+
+def read_file(file_path):
+    with open(file_path, "rb") as audio_file:
+        return audio_file.read()
+
+#Happy Paths
+def test_fragment_matches_track(fingerprint_db):
+    """Test that a fragment cut from a catalogue track is recognised offline."""
+    hashes = fingerprint_wav(read_file("./Music/Fragments/_Blinding Lights.wav"))
+    match = fingerprint_db.match_fingerprints(hashes)
+
+    assert match is not None
+    assert match["title"] == "Blinding Lights"
+
+def test_noisy_excerpt_matches_track(fingerprint_db):
+    """Test that a noisy excerpt of a track is recognised at the right offset."""
+    samples, sample_rate = read_wav(read_file("./Music/Tracks/Dont Look Back In Anger.wav"))
+    excerpt = samples[2 * sample_rate:5 * sample_rate]
+    excerpt = excerpt + np.random.default_rng(0).normal(0, 0.02, excerpt.shape).astype(np.float32)
+
+    match = fingerprint_db.match_fingerprints(fingerprint_samples(excerpt, sample_rate))
+
+    assert match is not None
+    assert match["title"] == "Dont Look Back In Anger"
+    assert match["offset_seconds"] == pytest.approx(2.0, abs=0.1)
+
+#Unhappy Paths
+def test_unknown_fragment_has_no_match(fingerprint_db):
+    """Test that a fragment of a song outside the catalogue is not matched."""
+    hashes = fingerprint_wav(read_file("./Music/Fragments/_Davos.wav"))
+    assert fingerprint_db.match_fingerprints(hashes) is None
+
+def test_removed_track_is_unindexed(fingerprint_db):
+    """Test that removing a track also removes its fingerprints."""
+    fingerprint_db.remove_track_by_title("Blinding Lights")
+
+    hashes = fingerprint_wav(read_file("./Music/Fragments/_Blinding Lights.wav"))
+    assert fingerprint_db.match_fingerprints(hashes) is None
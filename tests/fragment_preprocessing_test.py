@@ -0,0 +1,91 @@
+import pytest
+import base64
+import sys
+import os
+import numpy as np
+os.environ.setdefault("AUDDIO_TOKEN", "test-token")
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Shared"))
+from wav_utils import parse_wav_header, read_wav, write_wav
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Audio_recognition_microservice"))
+import audio_recognition_microservice as service
+from fragment_preprocessor import preprocess_encoded_fragment, preprocess_fragment, report, trim_leading_silence
+
+class FakeResponse:
+    status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"status": "success", "result": {"title": "Blinding Lights"}}
+
+#Helper Function
+def encode_audio_to_base64(file_path):
+    """Reads a WAV file and encodes it to a base64 string."""
+    with open(file_path, "rb") as audio_file:
+        encoded_string = base64.b64encode(audio_file.read()).decode("utf-8")
+    return encoded_string
+
+def stereo_recording(rate=44100, silence_seconds=1.0, seconds=30.0):
+    """A stereo 440 Hz tone preceded by silence."""
+    times = np.arange(int(rate * seconds)) / rate
+    tone = 0.5 * np.sin(2 * np.pi * 440 * times).astype(np.float32)
+    tone[:int(rate * silence_seconds)] = 0
+    return write_wav(np.stack([tone, tone], axis=1), rate)
+
+#Happy Paths
+def test_fragment_is_mixed_down_resampled_trimmed_and_capped():
+    """Test that a long stereo recording becomes a short mono 16 kHz clip starting at the sound."""
+    processed = preprocess_fragment(stereo_recording(), sample_rate=16000, max_seconds=10)
+    header = parse_wav_header(processed)
+
+    assert (header["channels"], header["sample_rate"], header["bit_depth"]) == (1, 16000, 16)
+    assert header["duration"] == pytest.approx(10.0)
+    samples, _ = read_wav(processed)
+    assert np.abs(samples[:160]).max() > 0.1
+
+def test_trim_leaves_silent_signal_alone():
+    """Test that a fragment that is silent throughout is not trimmed away."""
+    silence = np.zeros(16000, dtype=np.float32)
+
+    assert len(trim_leading_silence(silence, 16000)) == 16000
+
+def test_fragment_payload_shrinks():
+    """Test that the Music/Fragments samples get substantially smaller."""
+    encoded_fragment = encode_audio_to_base64("./Music/Fragments/_Blinding Lights.wav")
+    processed, stats = preprocess_encoded_fragment(encoded_fragment)
+
+    assert len(processed) < len(encoded_fragment) / 2
+    assert stats["processed_bytes"] < stats["original_bytes"] / 2
+    assert parse_wav_header(base64.b64decode(processed))["sample_rate"] == 16000
+
+def test_report_covers_every_fragment(capsys):
+    """Test that the report lists each fragment and a total."""
+    rows = report("./Music/Fragments")
+
+    assert len(rows) == 5
+    assert all(row["processed_bytes"] < row["original_bytes"] for row in rows)
+    assert "Total:" in capsys.readouterr().out
+
+def test_audd_receives_preprocessed_fragment(monkeypatch):
+    """Test that the recognition service sends AudD.io the compact fragment."""
+    sent = {}
+
+    def fake_post(url, data=None, **kwargs):
+        sent.update(data)
+        return FakeResponse()
+
+    monkeypatch.setattr(service.requests, "post", fake_post)
+    encoded_fragment = encode_audio_to_base64("./Music/Fragments/_Blinding Lights.wav")
+    result = service.get_track_title_from_api(encoded_fragment)
+
+    assert result == {"success": True, "title": "Blinding Lights"}
+    assert len(sent["audio"]) < len(encoded_fragment) / 2
+
+#Unhappy Paths
+def test_non_wav_fragment_is_sent_untouched():
+    """Test that fragments in other formats are passed through unchanged."""
+    encoded_fragment = base64.b64encode(b"ID3 not a wav file").decode("utf-8")
+
+    assert preprocess_encoded_fragment(encoded_fragment) == (encoded_fragment, None)
+    assert preprocess_encoded_fragment("not base64!") == ("not base64!", None)
@@ -0,0 +1,170 @@
+import pytest
+import base64
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice"))
+import database_management_microservice
+import ingestion_queue
+from database_helper import MusicTrackDatabase
+from ingestion_queue import IngestionQueue
+
+TRACK_PATH = "./Music/Fragments/_Davos.wav"
+
+@pytest.fixture
+def test_db():
+    test_db = MusicTrackDatabase(table="ingest_test")
+    yield test_db
+    test_db.reset_database()
+
+@pytest.fixture
+def queue(test_db):
+    queue = IngestionQueue(test_db)
+    yield queue
+    queue.reset()
+
+@pytest.fixture
+def client(test_db, queue, monkeypatch):
+    monkeypatch.setattr(database_management_microservice, "db", test_db)
+    monkeypatch.setattr(database_management_microservice, "ingestion", queue)
+    database_management_microservice.app.config["TESTING"] = True
+    with database_management_microservice.app.test_client() as client:
+        yield client
+
+#Helper Function
+def encode_audio_to_base64(file_path):
+    """Reads a WAV file and encodes it to a base64 string."""
+    with open(file_path, "rb") as audio_file:
+        encoded_string = base64.b64encode(audio_file.read()).decode("utf-8")
+    return encoded_string
+
+def read_audio(file_path):
+    """Reads a WAV file's raw bytes."""
+    with open(file_path, "rb") as audio_file:
+        return audio_file.read()
+
+def wait_for_job(queue, job_id, timeout=30):
+    """Polls a job until it is done or failed, and returns it."""
+    deadline = time.monotonic() + timeout
+    while True:
+        job = queue.job(job_id)
+        if job["status"] in ("done", "failed") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+#Happy Paths
+def test_submitted_track_is_added_in_background(queue, test_db):
+    """Test that a queued track is processed by the workers and its spooled audio removed."""
+    job = queue.submit("Davos", read_audio(TRACK_PATH))
+    assert job["status"] in ("queued", "running")
+
+    finished = wait_for_job(queue, job["job_id"])
+
+    assert finished["status"] == "done"
+    assert finished["attempts"] == 1
+    assert finished["finished"] >= finished["started"] >= finished["submitted"]
+    assert test_db.find_track_by_title("Davos")["encoded_track"] == encode_audio_to_base64(TRACK_PATH)
+    assert os.listdir(queue.spool_dir) == []
+
+def test_service_accepts_and_reports_jobs(client, queue):
+    """Test that POST /db/jobs answers 202 straight away and the job can be polled until done."""
+    response = client.post("/db/jobs", json={"title": "Davos", "encoded_track": encode_audio_to_base64(TRACK_PATH)})
+
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+    assert response.headers["Location"] == f"/db/jobs/{job_id}"
+    wait_for_job(queue, job_id)
+    assert client.get(f"/db/jobs/{job_id}").get_json()["status"] == "done"
+    assert client.get("/db/jobs").get_json() == {"queued": 0, "running": 0, "done": 1, "failed": 0}
+
+def test_jobs_survive_a_restart(test_db, queue, monkeypatch):
+    """Test that jobs left queued, or running in a process that died, are run by the next process."""
+    monkeypatch.setattr(queue, "start", lambda: None)  # This "process" never drains its queue
+    queued = queue.submit("Davos", read_audio(TRACK_PATH))
+    running = queue.submit("Blinding Lights", read_audio("./Music/Tracks/Blinding Lights.wav"))
+    with monkeypatch.context() as expired:
+        expired.setattr(ingestion_queue, "INGEST_JOB_LEASE", -1)
+        assert queue.claim()["job_id"] == queued["job_id"]
+
+    restarted = IngestionQueue(test_db)
+    try:
+        restarted.start()
+        assert wait_for_job(restarted, queued["job_id"])["status"] == "done"
+        assert wait_for_job(restarted, running["job_id"])["status"] == "done"
+        assert restarted.job(queued["job_id"])["attempts"] == 2
+    finally:
+        restarted.stop()
+
+#Unhappy Paths
+def test_invalid_audio_fails_its_job(queue):
+    """Test that a track the database refuses fails its job with the reason."""
+    job = queue.submit("Empty", b"")
+
+    finished = wait_for_job(queue, job["job_id"])
+
+    assert finished["status"] == "failed"
+    assert finished["error"].startswith("Invalid track")
+
+def test_duplicate_titles_are_refused(client, test_db, queue, monkeypatch):
+    """Test that a title already stored or already queued is refused with 409."""
+    test_db.insert({"title": "Davos", "encoded_track": encode_audio_to_base64(TRACK_PATH)})
+    assert client.post("/db/jobs", json={"title": "Davos", "encoded_track": encode_audio_to_base64(TRACK_PATH)}).status_code == 409
+
+    monkeypatch.setattr(queue, "start", lambda: None)
+    assert queue.submit("Pending", read_audio(TRACK_PATH)) is not None
+    assert queue.submit("Pending", read_audio(TRACK_PATH)) is None
+
+def test_title_taken_while_queued_fails_job(queue, test_db, monkeypatch):
+    """Test that a job whose title was added with other audio in the meantime fails as a conflict."""
+    monkeypatch.setattr(queue, "start", lambda: None)
+    job = queue.submit("Davos", read_audio(TRACK_PATH))
+    test_db.insert({"title": "Davos", "encoded_track": encode_audio_to_base64("./Music/Tracks/good 4 u.wav")})
+
+    queue.process(queue.claim())
+
+    assert queue.job(job["job_id"])["status"] == "failed"
+    assert queue.job(job["job_id"])["error"] == "A track with this title already exists"
+
+def test_jobs_are_abandoned_after_max_attempts(queue, monkeypatch):
+    """Test that a job whose workers keep dying is failed instead of being retried forever."""
+    monkeypatch.setattr(queue, "start", lambda: None)
+    monkeypatch.setattr(ingestion_queue, "INGEST_JOB_LEASE", -1)
+    job = queue.submit("Davos", read_audio(TRACK_PATH))
+    for _ in range(ingestion_queue.INGEST_MAX_ATTEMPTS):
+        assert queue.claim() is not None
+
+    assert queue.claim() is None
+    assert queue.job(job["job_id"])["status"] == "failed"
+
+def test_transient_failures_are_retried_after_a_backoff(queue, test_db, monkeypatch):
+    """Test that a job failing on a database outage is not claimed again until its backoff has passed, doubling each time."""
+    monkeypatch.setattr(queue, "start", lambda: None)
+    monkeypatch.setattr(ingestion_queue, "INGEST_RETRY_BACKOFF", 0.2)
+    insert_stream = test_db.insert_stream
+    def unavailable(title, chunks):
+        raise OSError("database is locked")
+    monkeypatch.setattr(test_db, "insert_stream", unavailable)
+    job = queue.submit("Davos", read_audio(TRACK_PATH))
+
+    queue.process(queue.claim())
+    retried = queue.job(job["job_id"])
+    assert retried["status"] == "queued"
+    assert retried["not_before"] - time.time() == pytest.approx(0.2, abs=0.1)
+    assert queue.claim() is None
+
+    time.sleep(0.25)
+    queue.process(queue.claim())
+    assert queue.job(job["job_id"])["not_before"] - time.time() == pytest.approx(0.4, abs=0.1)
+    assert queue.claim() is None
+
+    monkeypatch.setattr(test_db, "insert_stream", insert_stream)
+    time.sleep(0.45)
+    queue.process(queue.claim())
+    assert queue.job(job["job_id"])["status"] == "done"
+    assert test_db.find_track_by_title("Davos") is not None
+
+def test_bad_requests_and_unknown_jobs(client):
+    """Test that malformed submissions are rejected and unknown jobs are not found."""
+    assert client.post("/db/jobs", json={"title": "Davos"}).status_code == 400
+    assert client.post("/db/jobs", json={"title": "Davos", "encoded_track": "not base64!"}).status_code == 400
+    assert client.get("/db/jobs/unknown").status_code == 404
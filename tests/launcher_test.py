@@ -0,0 +1,165 @@
+import pytest
+import base64
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Shared"))
+import launcher
+import executors
+from executors import PerProcessExecutor
+from database_helper import MusicTrackDatabase
+
+LAUNCHER = os.path.join(os.path.dirname(__file__), "..", "src", "launcher.py")
+
+@pytest.fixture
+def shared_table():
+    """Two databases on one table, as two worker processes would have."""
+    writer = MusicTrackDatabase(table="launcher_test", check_version=True)
+    reader = MusicTrackDatabase(table="launcher_test", check_version=True)
+    yield writer, reader
+    reader.close()
+    writer.reset_database()
+
+#Helper Function
+def encode_audio_to_base64(file_path):
+    """Reads a WAV file and encodes it to a base64 string."""
+    with open(file_path, "rb") as audio_file:
+        encoded_string = base64.b64encode(audio_file.read()).decode("utf-8")
+    return encoded_string
+
+def free_port():
+    """Finds a port nothing is listening on."""
+    with socket.socket() as probe:
+        probe.bind(("localhost", 0))
+        return probe.getsockname()[1]
+
+def wait_until_serving(url):
+    """Polls a service until it accepts connections, and returns its first response."""
+    for _ in range(100):
+        try:
+            return requests.get(url, timeout=1)
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.1)
+    raise AssertionError(f"{url} never started serving")
+
+#Happy Paths
+def test_settings_fall_back_to_shared_then_defaults(monkeypatch):
+    """Test that a service's own setting wins over the shared one, which wins over the default."""
+    monkeypatch.setenv("SERVICE_WORKERS", "3")
+    monkeypatch.setenv("DATABASE_SERVICE_WORKERS", "5")
+    monkeypatch.setenv("AUDIO_SERVICE_PORT", "4001")
+
+    assert launcher.gunicorn_options("database")["workers"] == 5
+    assert launcher.gunicorn_options("catalogue")["workers"] == 3
+    assert launcher.gunicorn_options("audio")["bind"] == "localhost:4001"
+    assert launcher.gunicorn_options("catalogue")["bind"] == "localhost:3000"
+    assert launcher.gunicorn_options("database")["preload_app"] is True
+
+def test_several_workers_share_metrics_and_versions(monkeypatch):
+    """Test that several workers get a metrics directory and check the stored catalogue version."""
+    # Set before being removed, so monkeypatch also removes what prepare_environment sets
+    for name in ("PROMETHEUS_MULTIPROC_DIR", "TRACK_CACHE_CHECK_VERSION"):
+        monkeypatch.setenv(name, "")
+        monkeypatch.delenv(name)
+
+    assert launcher.prepare_environment(1) is None
+    assert "PROMETHEUS_MULTIPROC_DIR" not in os.environ
+
+    metrics_dir = launcher.prepare_environment(4)
+    try:
+        assert os.environ["PROMETHEUS_MULTIPROC_DIR"] == metrics_dir
+        assert os.path.isdir(metrics_dir)
+        assert os.environ["TRACK_CACHE_CHECK_VERSION"] == "1"
+    finally:
+        os.rmdir(metrics_dir)
+
+def test_executors_are_made_per_process(monkeypatch):
+    """Test that an executor is made on first use, reused in the same process, and made again after a fork."""
+    made = []
+    executor = PerProcessExecutor(lambda: made.append(ThreadPoolExecutor(max_workers=1)) or made[-1])
+    assert made == []
+
+    assert executor.submit(lambda: 42).result() == 42
+    assert executor.get() is made[0]
+
+    monkeypatch.setattr(executors.os, "getpid", lambda: -1)
+    assert executor.submit(lambda: 43).result() == 43
+    assert len(made) == 2
+    for pool in made:
+        pool.shutdown()
+
+def test_cached_lookups_see_other_processes_writes(shared_table):
+    """Test that a cached miss or hit is dropped once another database on the same table writes."""
+    writer, reader = shared_table
+    assert reader.find_track_by_title("Davos") is None
+    tag = reader.catalogue_tag
+
+    writer.insert({"title": "Davos", "encoded_track": encode_audio_to_base64("./Music/Fragments/_Davos.wav")})
+    assert reader.find_track_by_title("Davos")["title"] == "Davos"
+    assert reader.catalogue_tag != tag
+
+    writer.remove_track_by_title("Davos")
+    assert reader.find_track_by_title("Davos") is None
+
+def test_database_service_serves_and_stops_cleanly(tmp_path):
+    """Test that the sharded database service runs under several workers and exits cleanly on SIGTERM."""
+    port = free_port()
+    env = dict(os.environ, DATABASE_DIR=str(tmp_path), DATABASE_SERVICE_PORT=str(port), SERVICE_WORKERS="2", DATABASE_SHARDS="2")
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    master = subprocess.Popen([sys.executable, LAUNCHER, "database"], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_serving(f"http://localhost:{port}/metrics")
+        # Searches are sent to every shard by each worker's own thread pool
+        for _ in range(6):
+            assert requests.get(f"http://localhost:{port}/db/tracks/search", params={"title": "Davos"}, timeout=5).status_code == 404
+        assert b"http_requests_total" in requests.get(f"http://localhost:{port}/metrics", timeout=1).content
+    finally:
+        master.send_signal(signal.SIGTERM)
+        assert master.wait(timeout=30) == 0
+
+#Unhappy Paths
+def test_workers_validate_large_tracks_concurrently(tmp_path):
+    """Test that several catalogue workers each validate large tracks, answering 503 when the database is down."""
+    port = free_port()
+    env = dict(os.environ, DATABASE_DIR=str(tmp_path), CATALOGUE_SERVICE_PORT=str(port), SERVICE_WORKERS="3",
+               DATABASE_URL=f"http://localhost:{free_port()}", DATABASE_RETRIES="0")
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    track = {"title": "good 4 u", "encoded_track": encode_audio_to_base64("./Music/Tracks/good 4 u.wav")}
+    assert len(track["encoded_track"]) > 1024 * 1024
+    master = subprocess.Popen([sys.executable, LAUNCHER, "catalogue"], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_serving(f"http://localhost:{port}/metrics")
+        with ThreadPoolExecutor(max_workers=12) as clients:
+            statuses = list(clients.map(lambda _: requests.post(f"http://localhost:{port}/tracks", json=track, timeout=30).status_code,
+                                        range(12)))
+        assert statuses == [503] * 12
+    finally:
+        master.send_signal(signal.SIGTERM)
+        assert master.wait(timeout=30) == 0
+
+def test_unchecked_cache_keeps_stale_entries():
+    """Test that without check_version a database only sees its own writes, as in one process."""
+    writer = MusicTrackDatabase(table="launcher_test")
+    reader = MusicTrackDatabase(table="launcher_test")
+    try:
+        assert reader.find_track_by_title("Davos") is None
+        writer.insert({"title": "Davos", "encoded_track": encode_audio_to_base64("./Music/Fragments/_Davos.wav")})
+        assert reader.find_track_by_title("Davos") is None
+    finally:
+        reader.close()
+        writer.reset_database()
+
+def test_invalid_settings_are_rejected(monkeypatch):
+    """Test that a non-numeric worker count fails before anything is started."""
+    monkeypatch.setenv("CATALOGUE_SERVICE_WORKERS", "many")
+    with pytest.raises(ValueError):
+        launcher.gunicorn_options("catalogue")
@@ -0,0 +1,147 @@
+import pytest
+import base64
+import sys
+import os
+import time
+os.environ.setdefault("AUDDIO_TOKEN", "test-token")
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Shared"))
+from prometheus_client import REGISTRY
+from flask import Flask
+from instrumentation import instrument_app, timed_method, time_outbound
+from service_client import ServiceClient
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice"))
+import database_management_microservice
+from database_helper import MusicTrackDatabase
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Audio_recognition_microservice"))
+import audio_recognition_microservice
+
+@pytest.fixture
+def client(monkeypatch):
+    test_db = MusicTrackDatabase(table="metrics_test")
+    monkeypatch.setattr(database_management_microservice, "db", test_db)
+    database_management_microservice.app.config["TESTING"] = True
+    with database_management_microservice.app.test_client() as client:
+        yield client
+    test_db.reset_database()
+
+#Helper Function
+def sample(name, **labels):
+    """Reads one metric sample from the default registry (0 if it has not been recorded yet)."""
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+def encode_audio_to_base64(file_path):
+    """Reads a WAV file and encodes it to a base64 string."""
+    with open(file_path, "rb") as audio_file:
+        encoded_string = base64.b64encode(audio_file.read()).decode("utf-8")
+    return encoded_string
+
+#Happy Paths
+def test_route_requests_are_counted_and_timed(client):
+    """Test that requests are counted by route pattern and status, and timed."""
+    labels = {"service": "database", "method": "GET", "route": "/db/tracks/search"}
+    before = sample("http_requests_total", status="404", **labels)
+    before_count = sample("http_request_duration_seconds_count", **labels)
+
+    client.get("/db/tracks/search", query_string={"title": "Unknown"})
+    client.get("/db/tracks/search", query_string={"title": "Also unknown"})
+
+    assert sample("http_requests_total", status="404", **labels) == before + 2
+    assert sample("http_request_duration_seconds_count", **labels) == before_count + 2
+    assert sample("http_requests_in_flight", service="database") == 0
+
+def test_metrics_endpoint_uses_prometheus_text_format(client):
+    """Test that /metrics serves every metric family in the exposition format."""
+    client.get("/db/tracks/search", query_string={"title": "Unknown"})
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    body = response.get_data(as_text=True)
+    for family in ("http_requests_total", "http_request_duration_seconds_bucket", "http_requests_in_flight",
+                   "sqlite_method_duration_seconds_bucket", "outbound_request_duration_seconds"):
+        assert family in body
+
+def test_payload_sizes_are_recorded(client):
+    """Test that request and response body sizes are observed."""
+    labels = {"service": "database", "route": "/db/tracks"}
+    before = sample("http_request_size_bytes_sum", **labels)
+    encoded_track = encode_audio_to_base64("./Music/Tracks/Blinding Lights.wav")
+
+    client.post("/db/tracks", json={"title": "Blinding Lights", "encoded_track": encoded_track})
+
+    assert sample("http_request_size_bytes_sum", **labels) - before > len(encoded_track)
+    assert sample("http_response_size_bytes_count", **labels) >= 1
+
+def test_database_methods_are_timed(client):
+    """Test that MusicTrackDatabase methods record their latency by name."""
+    before = sample("sqlite_method_duration_seconds_count", method="find_audio_digest")
+
+    client.get("/db/tracks/Unknown/audio")
+
+    assert sample("sqlite_method_duration_seconds_count", method="find_audio_digest") == before + 1
+
+def test_generator_time_excludes_consumer():
+    """Test that a timed generator only counts the time spent producing items."""
+    @timed_method
+    def slow_consumer_rows():
+        yield from range(3)
+
+    for _ in slow_consumer_rows():
+        time.sleep(0.05)
+
+    assert sample("sqlite_method_duration_seconds_sum", method="slow_consumer_rows") < 0.05
+    assert sample("sqlite_method_duration_seconds_count", method="slow_consumer_rows") == 1
+
+def test_outbound_calls_are_timed_by_target(monkeypatch):
+    """Test that AudD.io calls are timed under their own target with the fragment size."""
+    class FakeResponse:
+        status_code = 200
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"status": "success", "result": {"title": "Blinding Lights"}}
+
+    monkeypatch.setattr(audio_recognition_microservice.requests, "post", lambda *args, **kwargs: FakeResponse())
+    monkeypatch.setattr(audio_recognition_microservice, "PREPROCESS_FRAGMENTS", False)
+    before = sample("outbound_request_duration_seconds_count", target="audd", method="POST", outcome="200")
+    before_size = sample("outbound_request_size_bytes_sum", target="audd")
+
+    audio_recognition_microservice.get_track_title_from_api("UklGRg==")
+
+    assert sample("outbound_request_duration_seconds_count", target="audd", method="POST", outcome="200") == before + 1
+    assert sample("outbound_request_size_bytes_sum", target="audd") == before_size + 8
+
+#Unhappy Paths
+def test_failed_outbound_calls_are_recorded_as_errors():
+    """Test that a call that cannot connect is timed with outcome "error"."""
+    client = ServiceClient("http://localhost:9", connect_timeout=0.5, retries=0, name="unreachable")
+
+    with pytest.raises(Exception):
+        client.get("/anything")
+
+    assert sample("outbound_request_duration_seconds_count", target="unreachable", method="GET", outcome="error") == 1
+
+def test_outbound_exceptions_are_recorded_as_errors():
+    """Test that a timed call raising an exception is recorded with outcome "error"."""
+    with pytest.raises(RuntimeError):
+        with time_outbound("broken", "GET"):
+            raise RuntimeError("boom")
+
+    assert sample("outbound_request_duration_seconds_count", target="broken", method="GET", outcome="error") == 1
+
+def test_unhandled_errors_are_counted_as_500():
+    """Test that an exception escaping a route is counted and leaves no request in flight."""
+    app = Flask(__name__)
+    instrument_app(app, "broken_service")
+
+    @app.route("/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    with app.test_client() as client:
+        assert client.get("/boom").status_code == 500
+
+    assert sample("http_requests_total", service="broken_service", method="GET", route="/boom", status="500") == 1
+    assert sample("http_requests_in_flight", service="broken_service") == 0
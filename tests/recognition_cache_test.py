@@ -0,0 +1,128 @@
+import pytest
+import asyncio
+import base64
+import threading
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Audio_recognition_microservice"))
+from recognition_cache import RecognitionCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def cache(clock):
+    return RecognitionCache(max_entries=2, max_bytes=100, positive_ttl=60, negative_ttl=5, clock=clock)
+
+#Happy Paths
+def test_repeat_fragment_is_served_from_cache(cache):
+    """Test that the same decoded fragment is only recognised once."""
+    calls = []
+    def compute():
+        calls.append(1)
+        return 200, b'{"title": "x"}'
+
+    key = RecognitionCache.key_for(base64.b64encode(b"fragment").decode())
+    assert cache.get_or_compute(key, compute) == (200, b'{"title": "x"}')
+    assert cache.get_or_compute(key, compute) == (200, b'{"title": "x"}')
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_least_recently_used_entry_is_evicted(cache):
+    """Test that the entry bound evicts the least recently used key first."""
+    cache.get_or_compute("a", lambda: (200, b"a"))
+    cache.get_or_compute("b", lambda: (200, b"b"))
+    cache.get_or_compute("a", lambda: (200, b"stale"))
+    cache.get_or_compute("c", lambda: (200, b"c"))
+
+    assert cache.get_or_compute("a", lambda: (200, b"recomputed")) == (200, b"a")
+    assert cache.get_or_compute("b", lambda: (200, b"recomputed")) == (200, b"recomputed")
+    assert cache.stats()["evictions"] >= 1
+
+def test_byte_bound_evicts(cache):
+    """Test that the byte bound is enforced."""
+    cache.get_or_compute("a", lambda: (200, b"x" * 60))
+    cache.get_or_compute("b", lambda: (200, b"y" * 60))
+
+    stats = cache.stats()
+    assert stats["bytes"] <= 100
+    assert stats["entries"] == 1
+
+def test_negative_results_expire_sooner(cache, clock):
+    """Test that negative outcomes use the shorter TTL."""
+    cache.get_or_compute("hit", lambda: (200, b"track"))
+    cache.get_or_compute("miss", lambda: (404, b""))
+    clock.now = 10
+
+    assert cache.get_or_compute("hit", lambda: (500, b"")) == (200, b"track")
+    assert cache.get_or_compute("miss", lambda: (200, b"added")) == (200, b"added")
+    assert cache.stats()["expirations"] == 1
+
+def test_concurrent_requests_are_coalesced(cache):
+    """Test that identical in-flight requests share one upstream call."""
+    release = threading.Event()
+    calls = []
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 200, b"track"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()["coalesced"] < 4:
+        pass
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [(200, b"track")] * 5
+
+def test_cancelled_leader_leaves_followers_waiting(cache):
+    """Test that cancelling the async request that started a recognition still answers the coalesced ones."""
+    async def scenario():
+        release = asyncio.Event()
+        calls = []
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            return 200, b"track"
+
+        leader = asyncio.create_task(cache.get_or_compute_async("k", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get_or_compute_async("k", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return leader, await follower, calls
+
+    leader, result, calls = asyncio.run(scenario())
+
+    assert leader.cancelled()
+    assert result == (200, b"track")
+    assert len(calls) == 1
+    assert cache.get("k") == (200, b"track")
+    assert cache.stats()["in_flight"] == 0
+
+#Unhappy Paths
+def test_quota_error_is_not_cached(cache):
+    """Test that AudD token errors (900 -> 401) are never cached."""
+    cache.get_or_compute("k", lambda: (401, b""))
+    assert cache.get_or_compute("k", lambda: (200, b"track")) == (200, b"track")
+    assert cache.stats()["uncacheable"] == 1
+
+def test_invalid_base64_has_no_key():
+    """Test that fragments which are not base64 bypass the cache."""
+    assert RecognitionCache.key_for("unknown_base64_fragment") is None
@@ -0,0 +1,114 @@
+import pytest
+import socket
+import threading
+import sys
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from werkzeug.exceptions import ClientDisconnected
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Shared"))
+from service_client import ServiceClient, CircuitBreaker, CircuitOpenError
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Answers 503 for the first `failures` requests, then 200."""
+    protocol_version = "HTTP/1.1"
+    failures = 0
+    calls = 0
+
+    def do_GET(self):
+        FlakyHandler.calls += 1
+        status = 503 if FlakyHandler.calls <= FlakyHandler.failures else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def flaky_server():
+    FlakyHandler.failures = 0
+    FlakyHandler.calls = 0
+    server = ThreadingHTTPServer(("localhost", 0), FlakyHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://localhost:{server.server_address[1]}"
+    server.shutdown()
+
+@pytest.fixture
+def closed_port_url():
+    """A URL on a port nothing is listening on."""
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        port = sock.getsockname()[1]
+    return f"http://localhost:{port}"
+
+#Happy Paths
+def test_connections_are_kept_alive(flaky_server):
+    """Test that repeated calls reuse one pooled connection."""
+    client = ServiceClient(flaky_server)
+    for _ in range(5):
+        assert client.get("/").status_code == 200
+
+    stats = client.stats()
+    assert stats["pool"]["connections_opened"] == 1
+    assert stats["pool"]["requests_sent"] == 5
+
+def test_idempotent_call_is_retried(flaky_server):
+    """Test that a GET answered with 503 is retried until it succeeds."""
+    FlakyHandler.failures = 2
+    client = ServiceClient(flaky_server, retries=2, backoff=0.001)
+
+    assert client.get("/").status_code == 200
+    assert client.stats()["retries"] == 2
+
+#Unhappy Paths
+def test_post_is_not_retried(flaky_server):
+    """Test that a non-idempotent call is sent only once."""
+    FlakyHandler.failures = 1
+    client = ServiceClient(flaky_server, retries=2, backoff=0.001)
+
+    assert client.post("/").status_code == 503
+    assert FlakyHandler.calls == 1
+
+def test_breaker_opens_and_fails_fast(closed_port_url):
+    """Test that repeated connection failures open the circuit so later calls are refused immediately."""
+    client = ServiceClient(closed_port_url, retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    for _ in range(2):
+        with pytest.raises(Exception):
+            client.get("/")
+
+    with pytest.raises(CircuitOpenError):
+        client.get("/")
+    assert client.stats()["breaker"]["state"] == "open"
+    assert client.stats()["rejected"] == 1
+
+def test_breaker_half_opens_after_timeout():
+    """Test that one trial call is let through after the reset timeout and success closes the circuit."""
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=lambda: now[0])
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] = 6
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.stats()["state"] == "closed"
+
+def test_trial_is_released_when_the_call_raises_something_else(flaky_server, monkeypatch):
+    """Test that a half-open trial ended by a non-HTTP error (e.g. a broken upload body) lets the next call through."""
+    now = [0.0]
+    client = ServiceClient(flaky_server, retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=lambda: now[0]))
+    client.breaker.record_failure()
+    now[0] = 6
+
+    def broken_body():
+        yield b"start"
+        raise ClientDisconnected()
+    with pytest.raises(ClientDisconnected):
+        client.post("/", data=broken_body())
+
+    assert client.breaker.allow()
+    assert client.breaker.stats()["state"] == "half_open"
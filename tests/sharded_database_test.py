@@ -0,0 +1,178 @@
+import pytest
+import base64
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice"))
+import database_management_microservice
+from database_management_microservice import encode_cursor
+from database_helper import MusicTrackDatabase
+from sharded_database import ShardedMusicTrackDatabase, existing_layouts, shard_index
+from rebalance_shards import rebalance, remove_layout
+from fingerprint import fingerprint_wav
+
+TRACKS = {
+    "Blinding Lights": "./Music/Tracks/Blinding Lights.wav",
+    "Everybody (Backstreets Back) (Radio Edit)": "./Music/Tracks/Everybody (Backstreets Back) (Radio Edit).wav",
+    "good 4 u": "./Music/Tracks/good 4 u.wav",
+    "Davos": "./Music/Fragments/_Davos.wav",
+}
+
+@pytest.fixture
+def sharded_db():
+    test_db = ShardedMusicTrackDatabase(table="sharded_test", shards=3)
+    yield test_db
+    test_db.close()
+    remove_layout("sharded_test", 3)
+
+@pytest.fixture
+def loaded_db(sharded_db):
+    sharded_db.insert_many([{"title": title, "encoded_track": encode_audio_to_base64(path)} for title, path in TRACKS.items()])
+    return sharded_db
+
+@pytest.fixture
+def client(loaded_db, monkeypatch):
+    monkeypatch.setattr(database_management_microservice, "db", loaded_db)
+    database_management_microservice.app.config["TESTING"] = True
+    with database_management_microservice.app.test_client() as client:
+        yield client
+
+#Helper Function
+def encode_audio_to_base64(file_path):
+    """Reads a WAV file and encodes it to a base64 string."""
+    with open(file_path, "rb") as audio_file:
+        encoded_string = base64.b64encode(audio_file.read()).decode("utf-8")
+    return encoded_string
+
+def shard_titles(shard):
+    """Lists the titles stored in one shard."""
+    return [track["title"] for track in shard.get_all_tracks(fields=["title"])]
+
+#Happy Paths
+def test_tracks_are_spread_by_title_hash(loaded_db):
+    """Test that each track is stored only in the shard its title hashes to."""
+    for title in TRACKS:
+        for index, shard in enumerate(loaded_db.shards):
+            assert (title in shard_titles(shard)) == (index == shard_index(title, 3))
+    assert len({shard_index(title, 3) for title in TRACKS}) > 1
+    assert shard_index("Blinding Lights", 3) == shard_index("Blinding Lights", 3)
+
+def test_listing_merges_shards_in_order(loaded_db):
+    """Test that pages from every shard are merged by title, with the same cursors as a single file."""
+    titles = sorted(TRACKS)
+
+    first_page = list(loaded_db.get_all_tracks(fields=["title", "byte_size"], limit=2))
+    cursor = loaded_db.next_cursor(None, 2)
+    second_page = list(loaded_db.get_all_tracks(fields=["title"], after=cursor, limit=2))
+
+    assert [track["title"] for track in first_page] == titles[:2]
+    assert first_page[0]["byte_size"] == os.path.getsize(TRACKS[titles[0]])
+    assert [track["title"] for track in second_page] == titles[2:]
+    assert loaded_db.next_cursor(cursor, 2) is None
+    assert [track["title"] for track in loaded_db.get_all_tracks(fields=["title"])] == titles
+
+def test_lookups_are_routed_to_one_shard(loaded_db):
+    """Test that exact lookups and deletes only touch the title's shard."""
+    title = "good 4 u"
+    for index, shard in enumerate(loaded_db.shards):
+        if index != shard_index(title, 3):
+            shard.connection = None  # Any use of another shard would fail
+
+    assert loaded_db.find_track_by_title(title)["encoded_track"] == encode_audio_to_base64(TRACKS[title])
+    assert loaded_db.remove_track_by_title(title) == 1
+    assert loaded_db.find_track_by_title(title) is None
+
+def test_search_gathers_every_shard(loaded_db):
+    """Test that normalised, fuzzy, ranked and batch searches find tracks in any shard."""
+    assert loaded_db.search_track("everybody (backstreet's back)")[0]["title"] == "Everybody (Backstreets Back) (Radio Edit)"
+    assert loaded_db.search_track("Blindng Lights")[1] == "fuzzy"
+    assert loaded_db.rank_titles("Good 4 You", limit=2)[0]["title"] == "good 4 u"
+
+    tracks = loaded_db.find_tracks_by_titles(["Davos", "BLINDING LIGHTS", "Unknown"])
+    assert set(tracks) == {"Davos", "BLINDING LIGHTS"}
+    assert tracks["BLINDING LIGHTS"]["title"] == "Blinding Lights"
+
+def test_batch_results_keep_their_order(sharded_db):
+    """Test that a batch split across shards reports its items in the order given."""
+    encoded_track = encode_audio_to_base64("./Music/Fragments/_Davos.wav")
+
+    results = sharded_db.insert_many([
+        {"title": f"Track {index}", "encoded_track": encoded_track} for index in range(6)
+    ] + [{"title": "Track 0", "encoded_track": encoded_track}, {"encoded_track": encoded_track}])
+
+    assert [result["title"] for result in results] == [f"Track {index}" for index in range(6)] + ["Track 0", None]
+    assert [result["status"] for result in results] == ["created"] * 6 + ["conflict", "invalid"]
+
+def test_fingerprints_match_across_shards(loaded_db):
+    """Test that fingerprint votes are gathered from every shard's index."""
+    with open("./Music/Fragments/_Blinding Lights.wav", "rb") as fragment:
+        hashes = fingerprint_wav(fragment.read())
+
+    assert loaded_db.match_fingerprints(hashes)["title"] == "Blinding Lights"
+
+def test_service_serves_sharded_catalogue(client, loaded_db):
+    """Test that the database service lists, searches, serves audio and reports caches from shards."""
+    listing = client.get("/db/tracks", query_string={"fields": "title", "limit": 3})
+    assert [track["title"] for track in listing.get_json()] == sorted(TRACKS)[:3]
+    assert listing.headers["X-Next-Cursor"] == encode_cursor(sorted(TRACKS)[2])
+
+    assert client.get("/db/tracks/search", query_string={"title": "Davos"}).status_code == 200
+    audio = client.get("/db/tracks/Blinding Lights/audio")
+    with open(TRACKS["Blinding Lights"], "rb") as audio_file:
+        assert audio.data == audio_file.read()
+
+    stats = client.get("/db/cache").get_json()
+    assert stats["shards"] == 3
+    assert stats["version"] == loaded_db.version
+
+def test_rebalance_moves_every_track(loaded_db):
+    """Test that rebalancing to another shard count keeps every track, its audio and fingerprints."""
+    loaded_db.close()
+
+    summary = rebalance("sharded_test", 2)
+
+    assert summary["sources"][3] == {"copied": 4, "skipped": 0}
+    assert summary["tracks"] == 4
+    assert existing_layouts("sharded_test") == [2]
+    moved = ShardedMusicTrackDatabase(table="sharded_test", shards=2)
+    try:
+        assert [track["title"] for track in moved.get_all_tracks(fields=["title"])] == sorted(TRACKS)
+        assert moved.find_track_by_title("Davos")["encoded_track"] == encode_audio_to_base64(TRACKS["Davos"])
+        assert moved.search_track("blinding lights")[1] == "normalised"
+    finally:
+        moved.close()
+        remove_layout("sharded_test", 2)
+
+def test_rebalance_to_single_file(sharded_db):
+    """Test that shards can be merged back into the single data/<table>.db layout."""
+    sharded_db.insert({"title": "Davos", "encoded_track": encode_audio_to_base64(TRACKS["Davos"])})
+    sharded_db.close()
+
+    assert rebalance("sharded_test", 1)["tracks"] == 1
+    merged = MusicTrackDatabase(table="sharded_test")
+    try:
+        assert merged.find_track_by_title("Davos") is not None
+    finally:
+        merged.close()
+        remove_layout("sharded_test", 1)
+
+#Unhappy Paths
+def test_unknown_listing_fields_are_rejected(sharded_db):
+    """Test that a listing of unknown fields raises, as it does for a single file."""
+    with pytest.raises(ValueError):
+        next(sharded_db.get_all_tracks(fields=["title", "lyrics"]))
+
+def test_sharding_needs_two_shards():
+    """Test that a one-shard ShardedMusicTrackDatabase is refused in favour of MusicTrackDatabase."""
+    with pytest.raises(ValueError):
+        ShardedMusicTrackDatabase(table="sharded_test", shards=1)
+
+def test_rebalance_skips_titles_already_moved(loaded_db):
+    """Test that rerunning an interrupted rebalance skips the tracks already copied."""
+    loaded_db.close()
+    rebalance("sharded_test", 2, keep_source=True)
+
+    summary = rebalance("sharded_test", 2)
+
+    assert summary["sources"][3] == {"copied": 0, "skipped": 4}
+    assert summary["tracks"] == 4
+    remove_layout("sharded_test", 2)
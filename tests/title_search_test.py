@@ -0,0 +1,131 @@
+import pytest
+import base64
+import sqlite3
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice"))
+import database_management_microservice
+from database_helper import MusicTrackDatabase, normalise_title, searchable_title
+
+TITLES = ["Dont Look Back In Anger", "Everybody (Backstreets Back) (Radio Edit)", "good 4 u", "Blinding Lights"]
+
+@pytest.fixture
+def search_db():
+    test_db = MusicTrackDatabase(table="search_test")
+    for title in TITLES:
+        test_db.insert({"title": title, "encoded_track": encode_audio_to_base64(f"./Music/Tracks/{title}.wav")})
+    yield test_db
+    test_db.reset_database()
+
+@pytest.fixture
+def client(search_db, monkeypatch):
+    monkeypatch.setattr(database_management_microservice, "db", search_db)
+    database_management_microservice.app.config["TESTING"] = True
+    with database_management_microservice.app.test_client() as client:
+        yield client
+
+#Helper Function
+def encode_audio_to_base64(file_path):
+    """Reads a WAV file and encodes it to a base64 string."""
+    with open(file_path, "rb") as audio_file:
+        encoded_string = base64.b64encode(audio_file.read()).decode("utf-8")
+    return encoded_string
+
+#Happy Paths
+def test_normalise_title():
+    """Test that case, punctuation, spacing and qualifier suffixes are ignored."""
+    assert normalise_title("Dont Look Back in Anger") == normalise_title("Don't Look Back In  Anger") == "dontlookbackinanger"
+    assert normalise_title("Everybody (Backstreet's Back) (Radio Edit)") == "everybodybackstreetsback"
+    assert normalise_title("Blinding Lights - Remastered 2020") == "blindinglights"
+    assert normalise_title("Beyoncé [Live]") == "beyonce"
+    assert searchable_title("good 4 u (feat. Someone)") == "good 4 u"
+
+def test_normalised_title_is_indexed(search_db):
+    """Test that normalised titles are stored at insert time and looked up through their index."""
+    with sqlite3.connect(search_db.database_path) as connection:
+        stored = connection.execute("SELECT normalised_title FROM search_test WHERE title='good 4 u'").fetchone()
+        plan = connection.execute("EXPLAIN QUERY PLAN SELECT title FROM search_test WHERE normalised_title=?", ("x",)).fetchall()
+    assert stored == ("good4u",)
+    assert "search_test_normalised_title" in plan[0][-1]
+
+def test_search_matches_exactly_first(client):
+    """Test that an exact title is reported as an exact match."""
+    response = client.get("/db/tracks/search", query_string={"title": "good 4 u"})
+
+    assert response.status_code == 200
+    assert response.headers["X-Title-Match"] == "exact"
+    assert response.json["title"] == "good 4 u"
+
+def test_search_matches_normalised_title(client):
+    """Test that titles differing only in case, punctuation or qualifiers are found."""
+    response = client.get("/db/tracks/search", query_string={"title": "Don't Look Back in Anger"})
+    assert response.status_code == 200
+    assert response.headers["X-Title-Match"] == "normalised"
+    assert response.json["title"] == "Dont Look Back In Anger"
+
+    response = client.get("/db/tracks/search", query_string={"title": "Everybody (Backstreet's Back)"})
+    assert response.json["title"] == "Everybody (Backstreets Back) (Radio Edit)"
+
+def test_search_matches_fuzzy_title(client):
+    """Test that a misspelt title is resolved through the trigram index."""
+    response = client.get("/db/tracks/search", query_string={"title": "Blindin Light"})
+
+    assert response.status_code == 200
+    assert response.headers["X-Title-Match"] == "fuzzy"
+    assert response.json["title"] == "Blinding Lights"
+
+def test_ranked_search(client):
+    """Test that ranked search lists the closest titles first with their scores."""
+    response = client.get("/db/tracks/search", query_string={"title": "Look Back in Anger", "ranked": "true", "limit": 2})
+
+    assert response.status_code == 200
+    matches = response.json["matches"]
+    assert matches[0]["title"] == "Dont Look Back In Anger"
+    assert len(matches) <= 2
+    assert all(0 < match["score"] <= 1 for match in matches)
+
+def test_batch_search_falls_back_to_normalised_titles(search_db):
+    """Test that batch lookups are keyed by the title asked for."""
+    tracks = search_db.find_tracks_by_titles(["GOOD 4 U", "good 4 u", "Unknown"])
+
+    assert set(tracks) == {"GOOD 4 U", "good 4 u"}
+    assert tracks["GOOD 4 U"]["title"] == "good 4 u"
+
+def test_title_index_follows_deletes(search_db):
+    """Test that deleted tracks can no longer be matched."""
+    search_db.remove_track_by_title("Blinding Lights")
+
+    assert "Blinding Lights" not in [match["title"] for match in search_db.rank_titles("Blinding Lights")]
+    assert search_db.search_track("blinding lights") == (None, None)
+
+def test_existing_table_gains_normalised_titles(search_db):
+    """Test that a tracks table created before normalised titles is migrated on startup."""
+    search_db.close()
+    with sqlite3.connect(search_db.database_path) as connection:
+        connection.execute("DROP TABLE search_test_titles")
+        connection.execute("DROP INDEX search_test_normalised_title")
+        connection.execute("ALTER TABLE search_test DROP COLUMN normalised_title")
+
+    migrated_db = MusicTrackDatabase(table="search_test")
+    track, match = migrated_db.search_track("DONT LOOK BACK IN ANGER")
+    assert match == "normalised"
+    assert track["title"] == "Dont Look Back In Anger"
+    assert migrated_db.rank_titles("good 4 you")[0]["title"] == "good 4 u"
+
+#Unhappy Paths
+def test_search_without_fuzzy_misses_misspelling(client):
+    """Test that fuzzy=false only accepts exact and normalised matches."""
+    response = client.get("/db/tracks/search", query_string={"title": "Blindin Light", "fuzzy": "false"})
+
+    assert response.status_code == 404
+
+def test_search_rejects_weak_fuzzy_match(client):
+    """Test that unrelated titles are not matched."""
+    response = client.get("/db/tracks/search", query_string={"title": "Bohemian Rhapsody"})
+
+    assert response.status_code == 404
+
+def test_search_rejects_bad_limit(client):
+    """Test that an out of range or malformed limit is a bad request."""
+    assert client.get("/db/tracks/search", query_string={"title": "good", "ranked": "true", "limit": 0}).status_code == 400
+    assert client.get("/db/tracks/search", query_string={"title": "good", "limit": "many"}).status_code == 400
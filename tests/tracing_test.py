@@ -0,0 +1,119 @@
+import requests
+import pytest
+import base64
+import logging
+import sys
+import os
+os.environ.setdefault("AUDDIO_TOKEN", "test-token")
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Shared"))
+from tracing import REQUEST_ID_HEADER, configure_span_export, format_trace, load_spans, slowest_requests
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice"))
+import database_management_microservice
+from database_helper import MusicTrackDatabase
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Audio_recognition_microservice"))
+import audio_recognition_microservice
+
+CATALOGUE_URL = "http://localhost:3000"
+DATABASE_LOG = os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice", "database.log")
+
+class FakeResponse:
+    status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"status": "success", "result": {"title": "Not In The Catalogue"}}
+
+@pytest.fixture
+def client(monkeypatch):
+    test_db = MusicTrackDatabase(table="tracing_test")
+    monkeypatch.setattr(database_management_microservice, "db", test_db)
+    database_management_microservice.app.config["TESTING"] = True
+    with database_management_microservice.app.test_client() as client:
+        yield client
+    test_db.reset_database()
+
+@pytest.fixture
+def spans_path(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    configure_span_export(str(path))
+    yield path
+    configure_span_export(None)
+
+#Happy Paths
+def test_request_id_is_generated_and_echoed(client):
+    """Test that a request without an ID is given one, returned in the response."""
+    first = client.get("/db/tracks/search", query_string={"title": "Unknown"})
+    second = client.get("/db/tracks/search", query_string={"title": "Unknown"})
+
+    assert first.headers[REQUEST_ID_HEADER]
+    assert first.headers[REQUEST_ID_HEADER] != second.headers[REQUEST_ID_HEADER]
+
+def test_supplied_request_id_is_reused_in_logs(client, caplog):
+    """Test that a caller's request ID is kept and stamped on the request's log records."""
+    caplog.set_level(logging.INFO)
+    response = client.post("/db/tracks/upload", headers={REQUEST_ID_HEADER: "trace-me-123"})
+
+    assert response.headers[REQUEST_ID_HEADER] == "trace-me-123"
+    assert any(record.request_id == "trace-me-123" and record.getMessage() == "Missing title query parameter"
+               for record in caplog.records)
+
+def test_spans_break_a_request_down(client, spans_path):
+    """Test that the request and the database methods it called are exported as related spans."""
+    client.get("/db/tracks/search", query_string={"title": "Unknown"}, headers={REQUEST_ID_HEADER: "slow-one"})
+
+    spans = load_spans([spans_path], "slow-one")
+    server = next(span for span in spans if span["kind"] == "server")
+    assert server["name"] == "GET /db/tracks/search"
+    assert server["service"] == "database"
+    assert server["status"] == 404
+    search = next(span for span in spans if span["name"] == "search_track")
+    assert search["parent_id"] == server["span_id"]
+    assert search["duration_ms"] <= server["duration_ms"]
+
+    lines = format_trace(spans)
+    assert "database: GET /db/tracks/search status=404" in lines[0]
+    assert slowest_requests(load_spans([spans_path]))[0][0] == "slow-one"
+
+def test_recognition_forwards_request_id(monkeypatch, spans_path):
+    """Test that a batch's AudD.io calls, made on worker threads, carry the request's ID and span."""
+    sent = []
+
+    def fake_post(url, data=None, headers=None, **kwargs):
+        sent.append(headers)
+        return FakeResponse()
+
+    monkeypatch.setattr(audio_recognition_microservice.requests, "post", fake_post)
+    monkeypatch.setattr(audio_recognition_microservice, "PREPROCESS_FRAGMENTS", False)
+    fragment = base64.b64encode(b"tracing test fragment").decode("utf-8")
+
+    with audio_recognition_microservice.app.test_client() as client:
+        response = client.post("/recognise/batch", json={"fragments": [fragment]}, headers={REQUEST_ID_HEADER: "batch-42"})
+        response.get_data()
+
+    assert sent and sent[0][REQUEST_ID_HEADER] == "batch-42"
+    audd = next(span for span in load_spans([spans_path], "batch-42") if span["name"] == "POST audd")
+    assert sent[0]["X-Parent-Span-ID"] == audd["span_id"]
+
+def test_request_id_crosses_services():
+    """Test that the catalogue forwards its request ID to the database service's logs."""
+    response = requests.delete(f"{CATALOGUE_URL}/tracks/Unknown", headers={REQUEST_ID_HEADER: "cross-service-7"})
+
+    assert response.headers[REQUEST_ID_HEADER] == "cross-service-7"
+    with open(DATABASE_LOG) as log_file:
+        assert "[cross-service-7] - Track not found" in log_file.read()
+
+#Unhappy Paths
+def test_unusable_request_id_is_replaced(client):
+    """Test that an over-long request ID is not trusted."""
+    response = client.get("/db/tracks/search", query_string={"title": "Unknown"}, headers={REQUEST_ID_HEADER: "x" * 500})
+
+    assert len(response.headers[REQUEST_ID_HEADER]) < 500
+
+def test_no_spans_without_export(client, tmp_path):
+    """Test that nothing is written when span export is off."""
+    configure_span_export(None)
+    client.get("/db/tracks/search", query_string={"title": "Unknown"})
+
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,94 @@
+import requests
+import pytest
+import hashlib
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice"))
+import database_management_microservice
+from database_helper import MusicTrackDatabase
+
+CATALOGUE_URL = "http://localhost:3000"
+DATABASE_URL = "http://localhost:3002"
+TRACK_PATH = "./Music/Tracks/good 4 u.wav"
+
+@pytest.fixture
+def audio():
+    with open(TRACK_PATH, "rb") as audio_file:
+        return audio_file.read()
+
+@pytest.fixture
+def client(audio, monkeypatch):
+    test_db = MusicTrackDatabase(table="audio_test")
+    test_db.insert_stream("good 4 u", [audio])
+    monkeypatch.setattr(database_management_microservice, "db", test_db)
+    database_management_microservice.app.config["TESTING"] = True
+    with database_management_microservice.app.test_client() as client:
+        yield client
+    test_db.reset_database()
+
+#Happy Paths
+def test_full_track_is_served_as_wav(client, audio):
+    """Test that the whole track is returned as audio/wav with validators."""
+    response = client.get("/db/tracks/good 4 u/audio")
+
+    assert response.status_code == 200
+    assert response.mimetype == "audio/wav"
+    assert response.data == audio
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.headers["ETag"] == f'"{hashlib.sha256(audio).hexdigest()}"'
+    assert "Last-Modified" in response.headers
+
+def test_range_request_returns_partial_content(client, audio):
+    """Test that byte ranges are answered with 206 and only the requested span."""
+    response = client.get("/db/tracks/good 4 u/audio", headers={"Range": "bytes=100000-100099"})
+    assert response.status_code == 206
+    assert response.data == audio[100000:100100]
+    assert response.headers["Content-Range"] == f"bytes 100000-100099/{len(audio)}"
+
+    response = client.get("/db/tracks/good 4 u/audio", headers={"Range": "bytes=-44"})
+    assert response.status_code == 206
+    assert response.data == audio[-44:]
+
+def test_conditional_request_returns_not_modified(client):
+    """Test that a client holding the current ETag or modification date gets 304."""
+    first = client.get("/db/tracks/good 4 u/audio")
+
+    assert client.get("/db/tracks/good 4 u/audio", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+    assert client.get("/db/tracks/good 4 u/audio", headers={"If-Modified-Since": first.headers["Last-Modified"]}).status_code == 304
+
+def test_stale_if_range_returns_whole_track(client, audio):
+    """Test that a range is ignored when the client's copy is out of date."""
+    response = client.get("/db/tracks/good 4 u/audio", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+
+    assert response.status_code == 200
+    assert response.data == audio
+
+def test_catalogue_proxies_ranges(audio):
+    """Test that the catalogue passes ranges and validators through to the database service."""
+    requests.post(f"{DATABASE_URL}/db/tracks/upload", params={"title": "good 4 u"}, data=audio)
+    try:
+        response = requests.get(f"{CATALOGUE_URL}/tracks/good 4 u/audio", headers={"Range": "bytes=44-1043"})
+        assert response.status_code == 206
+        assert response.content == audio[44:1044]
+        assert response.headers["Content-Type"] == "audio/wav"
+        assert response.headers["Content-Range"] == f"bytes 44-1043/{len(audio)}"
+
+        etag = response.headers["ETag"]
+        assert requests.get(f"{CATALOGUE_URL}/tracks/good 4 u/audio", headers={"If-None-Match": etag}).status_code == 304
+    finally:
+        requests.post(f"{DATABASE_URL}/db/reset")
+
+#Unhappy Paths
+def test_unknown_track_audio_is_not_found(client):
+    """Test that audio for a missing title is a 404."""
+    assert client.get("/db/tracks/Unknown/audio").status_code == 404
+
+def test_unsatisfiable_range(client, audio):
+    """Test that a range starting past the end of the track is rejected with 416."""
+    response = client.get("/db/tracks/good 4 u/audio", headers={"Range": f"bytes={len(audio) + 10}-"})
+
+    assert response.status_code == 416
+
+def test_catalogue_audio_not_found():
+    """Test that the catalogue relays a missing track as 404."""
+    assert requests.get(f"{CATALOGUE_URL}/tracks/Unknown/audio").status_code == 404
@@ -0,0 +1,89 @@
+import pytest
+import base64
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice"))
+import database_management_microservice
+from database_management_microservice import app, encode_cursor
+from database_helper import MusicTrackDatabase
+
+@pytest.fixture
+def listing_db(monkeypatch):
+    """Points the database service at a throwaway table holding five tracks."""
+    test_db = MusicTrackDatabase(table="listing_test")
+    encoded_track = encode_audio_to_base64("./Music/Fragments/_Blinding Lights.wav")
+    for title in ["e", "c", "a", "d", "b"]:
+        test_db.insert({"title": title, "encoded_track": encoded_track})
+    monkeypatch.setattr(database_management_microservice, "db", test_db)
+    yield test_db
+    test_db.reset_database()
+
+#Helper Function
+def encode_audio_to_base64(file_path):
+    """Reads a WAV file and encodes it to a base64 string."""
+    with open(file_path, "rb") as audio_file:
+        encoded_string = base64.b64encode(audio_file.read()).decode("utf-8")
+    return encoded_string
+
+#Happy Paths
+def test_pages_follow_cursor(listing_db):
+    """Test that keyset pagination walks every title in order exactly once."""
+    client = app.test_client()
+    titles = []
+    params = {"fields": "title", "limit": 2}
+    while True:
+        response = client.get("/db/tracks", query_string=params)
+        assert response.status_code == 200
+        titles += [track["title"] for track in response.get_json()]
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["after"] = response.headers["X-Next-Cursor"]
+
+    assert titles == ["a", "b", "c", "d", "e"]
+
+def test_title_projection_skips_audio(listing_db, monkeypatch):
+    """Test that a title-only listing never reads the blob store."""
+    def fail_encode(digest):
+        raise AssertionError("audio was read")
+    monkeypatch.setattr(listing_db, "encode_audio", fail_encode)
+
+    response = app.test_client().get("/db/tracks", query_string={"fields": "title"})
+    assert response.status_code == 200
+    assert response.get_json() == [{"title": title} for title in ["a", "b", "c", "d", "e"]]
+
+def test_default_listing_includes_audio(listing_db):
+    """Test that the default fields keep the original listing shape."""
+    response = app.test_client().get("/db/tracks", query_string={"limit": 1})
+    assert set(response.get_json()[0]) == {"title", "encoded_track"}
+    assert response.headers["X-Next-Cursor"] == encode_cursor("a")
+
+def test_non_ascii_titles_page_with_ascii_cursors(listing_db):
+    """Test that a page ending on a non-ASCII title gets a cursor that can be sent as a header and followed."""
+    listing_db.insert({"title": "Sigur Rós – Hoppípolla", "encoded_track": encode_audio_to_base64("./Music/Fragments/_Davos.wav")})
+    client = app.test_client()
+
+    first = client.get("/db/tracks", query_string={"fields": "title", "limit": 1})
+    assert first.get_json() == [{"title": "Sigur Rós – Hoppípolla"}]
+    cursor = first.headers["X-Next-Cursor"]
+    assert cursor.isascii()
+
+    rest = client.get("/db/tracks", query_string={"fields": "title", "after": cursor})
+    assert [track["title"] for track in rest.get_json()] == ["a", "b", "c", "d", "e"]
+
+#Unhappy Paths
+def test_unknown_field_is_rejected(listing_db):
+    """Test that projecting an unknown field returns 400."""
+    response = app.test_client().get("/db/tracks", query_string={"fields": "title,lyrics"})
+    assert response.status_code == 400
+
+def test_malformed_cursor_is_rejected(listing_db):
+    """Test that an after cursor that is not base64url encoded UTF-8 returns 400."""
+    client = app.test_client()
+
+    assert client.get("/db/tracks", query_string={"after": "not a cursor!"}).status_code == 400
+    assert client.get("/db/tracks", query_string={"after": "__8"}).status_code == 400
+
+def test_oversized_page_is_rejected(listing_db):
+    """Test that a page larger than the maximum returns 400."""
+    response = app.test_client().get("/db/tracks", query_string={"limit": 100000})
+    assert response.status_code == 400
@@ -0,0 +1,187 @@
+import requests
+import pytest
+import base64
+import hashlib
+import io
+import os
+import sys
+from types import SimpleNamespace
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice"))
+import database_management_microservice
+from database_helper import MusicTrackDatabase
+from blob_store import BlobStore
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Catalogue_management_microservice"))
+import catalogue_management_microservice
+
+CATALOGUE_URL = "http://localhost:3000"
+DATABASE_URL = "http://localhost:3002"
+TRACK_PATH = "./Music/Tracks/Blinding Lights.wav"
+
+@pytest.fixture
+def upload_db():
+    test_db = MusicTrackDatabase(table="upload_test")
+    yield test_db
+    test_db.reset_database()
+
+@pytest.fixture
+def database_client(upload_db, monkeypatch):
+    monkeypatch.setattr(database_management_microservice, "db", upload_db)
+    database_management_microservice.app.config["TESTING"] = True
+    with database_management_microservice.app.test_client() as client:
+        yield client
+
+@pytest.fixture
+def catalogue_client():
+    catalogue_management_microservice.app.config["TESTING"] = True
+    with catalogue_management_microservice.app.test_client() as client:
+        yield client
+
+@pytest.fixture
+def forwarded(monkeypatch):
+    """Replaces the catalogue's call to the database service, recording what would be sent."""
+    calls = []
+
+    class FakeResponse:
+        status_code = 201
+
+    def fake_post(path, params=None, data=None, headers=None):
+        calls.append({"path": path, "params": params, "chunks": list(data)})
+        return FakeResponse()
+
+    monkeypatch.setattr(catalogue_management_microservice.database_client, "post", fake_post)
+    return calls
+
+@pytest.fixture
+def relayed(upload_db, monkeypatch):
+    """Sends the catalogue's calls to the database service to the database app in this process instead."""
+    monkeypatch.setattr(database_management_microservice, "db", upload_db)
+    database_client = database_management_microservice.app.test_client()
+
+    def relay_post(path, params=None, data=None, headers=None):
+        response = database_client.post(path, query_string=params, data=b"".join(data), content_type=headers["Content-Type"])
+        return SimpleNamespace(status_code=response.status_code)
+
+    monkeypatch.setattr(catalogue_management_microservice.database_client, "post", relay_post)
+
+#Helper Function
+def read_track(file_path):
+    """Reads a WAV file's raw bytes."""
+    with open(file_path, "rb") as audio_file:
+        return audio_file.read()
+
+#Happy Paths
+def test_blob_store_streams_payload(tmp_path):
+    """Test that a chunked payload is hashed and sized as it is written."""
+    store = BlobStore(str(tmp_path))
+    digest, size = store.put_stream(iter([b"audio ", b"in ", b"chunks"]))
+
+    assert digest == hashlib.sha256(b"audio in chunks").hexdigest()
+    assert size == len(b"audio in chunks")
+    with store.open(digest) as blob:
+        assert blob.read() == b"audio in chunks"
+    assert os.listdir(store.temp_dir) == []
+
+def test_database_accepts_raw_body(database_client, upload_db):
+    """Test that raw WAV bytes are stored and served back like a JSON upload."""
+    audio = read_track(TRACK_PATH)
+    response = database_client.post("/db/tracks/upload", query_string={"title": "Blinding Lights"},
+                                    data=audio, content_type="application/octet-stream")
+
+    assert response.status_code == 201
+    assert upload_db.find_track_by_title("Blinding Lights")["encoded_track"] == base64.b64encode(audio).decode("utf-8")
+    assert upload_db.match_fingerprints(upload_db.fingerprint(audio))["title"] == "Blinding Lights"
+    assert os.listdir(upload_db.blob_store.temp_dir) == []
+
+def test_catalogue_forwards_raw_body_in_chunks(catalogue_client, forwarded):
+    """Test that a raw upload is forwarded in bounded chunks rather than as one payload."""
+    audio = read_track(TRACK_PATH)
+    response = catalogue_client.post("/tracks/upload", query_string={"title": "Blinding Lights"},
+                                     data=audio, content_type="audio/wav")
+
+    assert response.status_code == 201
+    assert forwarded[0]["path"] == "/db/tracks/upload"
+    assert forwarded[0]["params"] == {"title": "Blinding Lights"}
+    assert b"".join(forwarded[0]["chunks"]) == audio
+    assert max(len(chunk) for chunk in forwarded[0]["chunks"]) <= catalogue_management_microservice.UPLOAD_CHUNK_SIZE
+
+def test_catalogue_accepts_multipart(catalogue_client, forwarded):
+    """Test that a multipart upload is titled by its file name unless a title is given."""
+    audio = read_track(TRACK_PATH)
+    response = catalogue_client.post("/tracks/upload", data={"track": (io.BytesIO(audio), "Blinding Lights.wav")},
+                                     content_type="multipart/form-data")
+    assert response.status_code == 201
+    assert forwarded[0]["params"] == {"title": "Blinding Lights"}
+    assert b"".join(forwarded[0]["chunks"]) == audio
+
+    catalogue_client.post("/tracks/upload", data={"title": "Renamed", "track": (io.BytesIO(audio), "Blinding Lights.wav")},
+                          content_type="multipart/form-data")
+    assert forwarded[1]["params"] == {"title": "Renamed"}
+
+def test_upload_streams_through_services():
+    """Test that a raw upload to the catalogue ends up in the database service."""
+    audio = read_track(TRACK_PATH)
+    try:
+        response = requests.post(f"{CATALOGUE_URL}/tracks/upload", params={"title": "Blinding Lights"},
+                                 data=audio, headers={"Content-Type": "audio/wav"})
+        assert response.status_code == 201
+
+        search_response = requests.get(f"{DATABASE_URL}/db/tracks/search", params={"title": "Blinding Lights"})
+        assert search_response.json()["encoded_track"] == base64.b64encode(audio).decode("utf-8")
+    finally:
+        requests.post(f"{DATABASE_URL}/db/reset")
+
+#Unhappy Paths
+def test_duplicate_upload_is_rejected(database_client, upload_db):
+    """Test that uploading an existing title conflicts and leaves no staged file behind."""
+    audio = read_track(TRACK_PATH)
+    database_client.post("/db/tracks/upload", query_string={"title": "Blinding Lights"}, data=audio, content_type="application/octet-stream")
+    response = database_client.post("/db/tracks/upload", query_string={"title": "Blinding Lights"}, data=audio, content_type="application/octet-stream")
+
+    assert response.status_code == 409
+    assert os.listdir(upload_db.blob_store.temp_dir) == []
+
+def test_empty_upload_is_rejected(database_client, upload_db):
+    """Test that an upload with no audio is a bad request."""
+    response = database_client.post("/db/tracks/upload", query_string={"title": "Empty"}, data=b"", content_type="application/octet-stream")
+
+    assert response.status_code == 400
+    assert upload_db.find_track_by_title("Empty") is None
+
+def test_upload_requires_title(database_client, catalogue_client, forwarded):
+    """Test that both services reject an upload without a title."""
+    assert database_client.post("/db/tracks/upload", data=b"RIFF", content_type="application/octet-stream").status_code == 400
+    assert catalogue_client.post("/tracks/upload", data=b"RIFF", content_type="audio/wav").status_code == 400
+    assert forwarded == []
+
+def test_catalogue_rejects_unsupported_content_type(catalogue_client, forwarded):
+    """Test that a body that is not audio or multipart is refused."""
+    response = catalogue_client.post("/tracks/upload", query_string={"title": "Text"}, data="hello", content_type="text/plain")
+
+    assert response.status_code == 415
+    assert forwarded == []
+
+def test_database_rejects_malformed_tracks(database_client, upload_db):
+    """Test that each way of adding a track to the database service refuses audio that is not a complete WAV file."""
+    truncated = read_track(TRACK_PATH)[:100000]
+    malformed = {"title": "Cut", "encoded_track": base64.b64encode(truncated).decode("utf-8")}
+
+    assert database_client.post("/db/tracks", json=malformed).status_code == 422
+    assert database_client.post("/db/tracks", json={"title": "Text", "encoded_track": "dGV4dA=="}).status_code == 422
+    assert database_client.post("/db/jobs", json=malformed).status_code == 422
+    response = database_client.post("/db/tracks/upload", query_string={"title": "Cut"}, data=truncated, content_type="application/octet-stream")
+    assert response.status_code == 422
+    assert "truncated" in response.json["error"]
+    assert upload_db.find_track_by_title("Cut") is None
+    assert upload_db.find_track_by_title("Text") is None
+    assert os.listdir(upload_db.blob_store.temp_dir) == []
+
+def test_chunked_upload_of_truncated_track_is_rejected(catalogue_client, relayed, upload_db):
+    """Test that a truncated track sent without a Content-Length is refused once the database service has staged it."""
+    truncated = read_track(TRACK_PATH)[:100000]
+    response = catalogue_client.post("/tracks/upload", query_string={"title": "Cut"}, input_stream=io.BytesIO(truncated),
+                                     headers={"Content-Type": "audio/wav", "Transfer-Encoding": "chunked"},
+                                     environ_overrides={"wsgi.input_terminated": True})
+
+    assert response.status_code == 422
+    assert upload_db.find_track_by_title("Cut") is None
+    assert os.listdir(upload_db.blob_store.temp_dir) == []
@@ -1,6 +1,7 @@
 import requests
 import pytest
 import base64
+import time
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice"))
@@ -31,11 +32,21 @@ def encode_audio_to_base64(file_path):
         encoded_string = base64.b64encode(audio_file.read()).decode("utf-8")
     return encoded_string
 
+def wait_for_job(job_url, timeout=30):
+    """Polls a queued track's job until it is done or failed, and returns it."""
+    deadline = time.monotonic() + timeout
+    while True:
+        job = requests.get(job_url).json()
+        if job["status"] in ("done", "failed") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.1)
+
 #Happy Paths
 def test_add_valid_track(sample_track):
     """Test that a valid track can be added successfully."""
     response = requests.post(f"{CATALOGUE_URL}/tracks", json=sample_track)
-    assert response.status_code == 201
+    assert response.status_code == 202
+    assert wait_for_job(CATALOGUE_URL + response.headers["Location"])["status"] == "done"
 
     # Verify the track is in the database
     tracks_response = requests.get(f"{DATABASE_URL}/db/tracks")
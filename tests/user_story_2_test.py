@@ -61,21 +61,21 @@ def test_delete_track_database_unreachable(monkeypatch, sample_track):
     Test that deleting a track via the catalogue microservice returns a 503 when the database is unreachable.
     """
     # Import the catalogue microservice's app
-    from catalogue_management_microservice import app as catalogue_app
+    from catalogue_management_microservice import app as catalogue_app, database_client
     client = catalogue_app.test_client()
 
     # Add the track normally using the catalogue endpoint.
     add_response = client.post("/tracks", json=sample_track)
-    assert add_response.status_code == 201
+    assert add_response.status_code == 202
 
-    # Monkeypatch requests.delete so that when the catalogue service calls it, it simulates a database failure.
+    # Monkeypatch the database client's delete so that when the catalogue service calls it, it simulates a database failure.
     def fake_requests_delete(url, *args, **kwargs):
         class FakeResponse:
             status_code = 503
             def json(self):
                 return {}
         return FakeResponse()
-    monkeypatch.setattr(requests, "delete", fake_requests_delete)
+    monkeypatch.setattr(database_client, "delete", fake_requests_delete)
 
     # Attempt to delete the track via the catalogue microservice.
     response = client.delete(f"/tracks/{sample_track['title']}")
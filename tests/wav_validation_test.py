@@ -0,0 +1,143 @@
+import pytest
+import base64
+import sqlite3
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Shared"))
+from wav_utils import WavFormatError, decoded_size, validate_encoded_wav, write_wav
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Database_management_microservice"))
+from database_helper import MusicTrackDatabase
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src", "Catalogue_management_microservice"))
+import catalogue_management_microservice
+import numpy as np
+
+TRACK_PATH = "./Music/Tracks/good 4 u.wav"
+
+@pytest.fixture
+def sample_track():
+    return {
+        "title": "good 4 u",
+        "encoded_track": encode_audio_to_base64(TRACK_PATH)
+    }
+
+@pytest.fixture
+def format_db():
+    test_db = MusicTrackDatabase(table="format_test")
+    yield test_db
+    test_db.reset_database()
+
+@pytest.fixture
+def client():
+    catalogue_management_microservice.app.config["TESTING"] = True
+    with catalogue_management_microservice.app.test_client() as client:
+        yield client
+
+@pytest.fixture
+def forwarded(monkeypatch):
+    """Replaces the catalogue's calls to the database service, recording what would be sent."""
+    calls = []
+
+    class FakeResponse:
+        status_code = 202
+
+        def json(self):
+            return {"job_id": "0" * 32, "status": "queued"}
+
+    def fake_post(path, **kwargs):
+        if "data" in kwargs:
+            kwargs["data"] = b"".join(kwargs["data"])
+        calls.append((path, kwargs))
+        return FakeResponse()
+
+    monkeypatch.setattr(catalogue_management_microservice.database_client, "post", fake_post)
+    return calls
+
+#Helper Function
+def encode_audio_to_base64(file_path):
+    """Reads a WAV file and encodes it to a base64 string."""
+    with open(file_path, "rb") as audio_file:
+        encoded_string = base64.b64encode(audio_file.read()).decode("utf-8")
+    return encoded_string
+
+#Happy Paths
+def test_validate_encoded_wav(sample_track):
+    """Test that a valid track's format is read from its header."""
+    header = validate_encoded_wav(sample_track["encoded_track"], chunk_chars=4096)
+
+    assert (header["channels"], header["sample_rate"], header["bit_depth"]) == (1, 48000, 16)
+    assert header["duration"] == pytest.approx(11.09, abs=0.01)
+    assert decoded_size(sample_track["encoded_track"]) == os.path.getsize(TRACK_PATH)
+
+def test_valid_track_is_forwarded(client, forwarded, sample_track):
+    """Test that a valid track passes validation and reaches the database service."""
+    response = client.post("/tracks", json=sample_track)
+
+    assert response.status_code == 202
+    assert response.headers["Location"] == "/tracks/jobs/" + "0" * 32
+    assert forwarded[0][0] == "/db/jobs"
+
+def test_whole_payload_is_validated_before_forwarding(client, forwarded, sample_track):
+    """Test that bad base64 after a valid header is caught before the track reaches the database service."""
+    assert client.post("/tracks", json=sample_track).status_code == 202
+    bad = sample_track["encoded_track"][:-8] + "!!!!!!!!"
+    assert client.post("/tracks", json={"title": "Bad", "encoded_track": bad}).status_code == 422
+    assert len(forwarded) == 1
+
+def test_format_is_stored(format_db, sample_track):
+    """Test that duration, channels, sample rate and bit depth are stored and listed."""
+    format_db.insert(sample_track)
+    stereo = base64.b64encode(write_wav(np.zeros((8000, 2), dtype=np.float32), 8000)).decode("utf-8")
+    format_db.insert({"title": "Stereo", "encoded_track": stereo})
+
+    tracks = list(format_db.get_all_tracks(fields=("title", "duration", "channels", "sample_rate", "bit_depth")))
+    assert tracks[0] == {"title": "Stereo", "duration": 1.0, "channels": 2, "sample_rate": 8000, "bit_depth": 16}
+    assert tracks[1]["channels"] == 1 and tracks[1]["sample_rate"] == 48000 and tracks[1]["bit_depth"] == 16
+
+def test_existing_table_gains_format_columns(format_db, sample_track):
+    """Test that a tracks table created before the format columns is back-filled on startup."""
+    format_db.insert(sample_track)
+    format_db.close()
+    with sqlite3.connect(format_db.database_path) as connection:
+        connection.execute("ALTER TABLE format_test DROP COLUMN channels")
+        connection.execute("ALTER TABLE format_test DROP COLUMN bit_depth")
+
+    migrated_db = MusicTrackDatabase(table="format_test")
+    assert list(migrated_db.get_all_tracks(fields=("channels", "bit_depth"))) == [{"channels": 1, "bit_depth": 16}]
+
+#Unhappy Paths
+@pytest.mark.parametrize("encoded_track", [
+    base64.b64encode(b"definitely not a wav file").decode("utf-8"),
+    "not base64!",
+    "UklGRg",
+    base64.b64encode(open(TRACK_PATH, "rb").read()[:50000]).decode("utf-8"),
+    base64.b64encode(write_wav(np.zeros(0, dtype=np.float32), 8000)).decode("utf-8"),
+])
+def test_malformed_track_is_rejected(client, forwarded, encoded_track):
+    """Test that non-WAV, non-base64, truncated and empty tracks are rejected before storage."""
+    response = client.post("/tracks", json={"title": "Malformed", "encoded_track": encoded_track})
+
+    assert response.status_code == 422
+    assert "error" in response.json
+    assert forwarded == []
+
+def test_non_string_track_is_rejected(client, forwarded):
+    """Test that an encoded_track that is not a string is a bad request."""
+    response = client.post("/tracks", json={"title": "Malformed", "encoded_track": 42})
+
+    assert response.status_code == 400
+    assert forwarded == []
+
+def test_malformed_upload_is_rejected(client, forwarded):
+    """Test that raw uploads are checked before any bytes are forwarded."""
+    with open(TRACK_PATH, "rb") as audio_file:
+        truncated = audio_file.read()[:100000]
+
+    assert client.post("/tracks/upload", query_string={"title": "Text"}, data=b"plain text", content_type="audio/wav").status_code == 422
+    assert client.post("/tracks/upload", query_string={"title": "Cut"}, data=truncated, content_type="audio/wav").status_code == 422
+    assert forwarded == []
+
+def test_invalid_base64_raises_format_error():
+    """Test that a bad character after the header is found by full validation."""
+    encoded_track = encode_audio_to_base64(TRACK_PATH)
+    with pytest.raises(WavFormatError):
+        validate_encoded_wav(encoded_track[:200000] + "*" * 4 + encoded_track[200004:])